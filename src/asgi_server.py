@@ -0,0 +1,503 @@
+# src/asgi_server.py
+"""
+Container entry point: the chat and feedback routes over ASGI, for a fixed
+fleet with no cold starts.
+
+Routes (same request and response contracts as the Lambda handlers):
+  POST /chat      lambda_chat_handler (JSON, or a true SSE stream with "stream": true;
+                  job mode as in the Lambda: 202 + jobId when CHAT_JOB_MODE allows it)
+  GET  /chat      job status (?jobId=…&userId=…); a POST body holding only those works too
+  POST /feedback  lambda_feedback_handler
+  GET  /healthz   liveness / load (503 while shutting down)
+
+One process holds one event loop. The OpenAI clients (sync and async) and the
+DynamoDB resource are built at startup and shared by every request, and
+blocking work (boto3 calls, the streaming pipeline) runs on a bounded thread
+pool. Background tasks:
+- DLQ consumer: long-polls CHAT_DLQ_URL and reprocesses records with
+  lambda_dlq_reprocessor.process_records (deleting only the ones that succeed);
+- metrics flush: EMF lines every SERVER_METRICS_FLUSH_S;
+- retry budget refill: the per-invocation OpenAI retry budget becomes a
+  budget per SERVER_RETRY_BUDGET_WINDOW_S for the DLQ consumer; every chat
+  request gets its own OPENAI_RETRY_BUDGET.
+
+Run:  python -m src.asgi_server          (needs requirements-server.txt)
+      uvicorn src.asgi_server:app ...    (any ASGI server)
+
+Env (optional):
+- SERVER_HOST / SERVER_PORT         (default: 0.0.0.0 / 8080)
+- SERVER_WORKERS                    (default: 1; processes, each with its own pools)
+- SERVER_MAX_CONCURRENCY            (default: 64; chat requests in flight per process)
+- SERVER_QUEUE_TIMEOUT_MS           (default: 2000; wait for a free slot, then job + 202, or 503)
+- SERVER_THREADS                    (default: 32; blocking-call pool per process)
+- SERVER_REQUEST_BUDGET_MS          (default: 29000; per-request deadline)
+- SERVER_DLQ_CONSUMER               (default: "1"; needs CHAT_DLQ_URL)
+- SERVER_DLQ_BATCH_BUDGET_MS        (default: 300000; keep below the queue's visibility timeout)
+- SERVER_METRICS_FLUSH_S            (default: 10)
+- SERVER_RETRY_BUDGET_WINDOW_S      (default: 60; DLQ consumer's retry budget window)
+"""
+import asyncio
+import contextvars
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qsl
+
+from src import lambda_chat_handler, lambda_dlq_reprocessor, lambda_feedback_handler
+from src.assistant.resilience import reset_retry_budget, start_request_budget
+from src.services import chat_jobs
+from src.config.openai_client import get_pool_stats
+from src.services.async_chat_service import get_ai_response_async
+from src.services.chat_service import stream_ai_response
+from src.utils.deadline import Deadline, DeadlineExceeded
+from src.utils.logging_utils import bind_request_id, flush_logs, flush_metrics, log_event
+from src.utils.sse_utils import iter_sse
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes")
+
+
+@dataclass(frozen=True)
+class ServerConfig:
+    host: str = "0.0.0.0"
+    port: int = 8080
+    workers: int = 1
+    max_concurrency: int = 64
+    queue_timeout_ms: int = 2000
+    threads: int = 32
+    request_budget_ms: int = 29000
+    dlq_consumer: bool = True
+    dlq_queue_url: Optional[str] = None
+    dlq_batch_budget_ms: int = 300000
+    metrics_flush_s: int = 10
+    retry_budget_window_s: int = 60
+
+
+def get_server_config() -> ServerConfig:
+    return ServerConfig(
+        host=os.getenv("SERVER_HOST", "0.0.0.0"),
+        port=_env_int("SERVER_PORT", 8080),
+        workers=max(1, _env_int("SERVER_WORKERS", 1)),
+        max_concurrency=max(1, _env_int("SERVER_MAX_CONCURRENCY", 64)),
+        queue_timeout_ms=max(0, _env_int("SERVER_QUEUE_TIMEOUT_MS", 2000)),
+        threads=max(2, _env_int("SERVER_THREADS", 32)),
+        request_budget_ms=max(1000, _env_int("SERVER_REQUEST_BUDGET_MS", 29000)),
+        dlq_consumer=_env_flag("SERVER_DLQ_CONSUMER", "1"),
+        dlq_queue_url=os.getenv("CHAT_DLQ_URL"),
+        dlq_batch_budget_ms=max(1000, _env_int("SERVER_DLQ_BATCH_BUDGET_MS", 300000)),
+        metrics_flush_s=max(1, _env_int("SERVER_METRICS_FLUSH_S", 10)),
+        retry_budget_window_s=max(1, _env_int("SERVER_RETRY_BUDGET_WINDOW_S", 60)),
+    )
+
+
+class ServerContext:
+    """Stand-in for the Lambda context: a name, a request id and a time budget."""
+
+    def __init__(self, function_name: str, request_id: str, budget_ms: int):
+        self.function_name = function_name
+        self.aws_request_id = request_id
+        self._expires_at = time.monotonic() + budget_ms / 1000.0
+
+    def get_remaining_time_in_millis(self) -> int:
+        return max(0, int((self._expires_at - time.monotonic()) * 1000))
+
+
+_CORS_PREFLIGHT = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Headers": "Content-Type,Authorization,Idempotency-Key",
+    "Access-Control-Allow-Methods": "OPTIONS,POST,GET",
+}
+
+
+# -------- ASGI plumbing --------
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+def _header_pairs(headers: Dict[str, str]) -> list:
+    return [(k.lower().encode("latin-1"), str(v).encode("latin-1")) for k, v in headers.items()]
+
+
+async def _send_response(send, resp: Dict[str, Any]) -> None:
+    """Write a Lambda proxy response dict ({statusCode, headers, body})."""
+    body = (resp.get("body") or "").encode("utf-8")
+    await send({"type": "http.response.start", "status": resp["statusCode"],
+                "headers": _header_pairs(resp.get("headers") or {})})
+    await send({"type": "http.response.body", "body": body})
+
+
+def _lambda_event(scope, body: bytes, request_id: str) -> dict:
+    """API Gateway proxy-style event, so the handlers' parsing applies unchanged."""
+    headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope.get("headers") or []}
+    query = dict(parse_qsl((scope.get("query_string") or b"").decode("latin-1")))
+    return {
+        "httpMethod": scope["method"],
+        "path": scope["path"],
+        "headers": headers,
+        "queryStringParameters": query or None,
+        "body": body.decode("utf-8") if body else "{}",
+        "requestContext": {"requestId": request_id},
+    }
+
+
+class ChatServer:
+    """The ASGI application. `app` below is the instance built from the environment."""
+
+    def __init__(self, config: Optional[ServerConfig] = None):
+        self.config = config or get_server_config()
+        self.started_at = time.time()
+        self.inflight = 0
+        self.draining = False
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._tasks: list = []
+        self.dlq_state = "off"
+
+    # ---- lifecycle ----
+    async def startup(self) -> None:
+        cfg = self.config
+        loop = asyncio.get_running_loop()
+        self._executor = ThreadPoolExecutor(max_workers=cfg.threads, thread_name_prefix="server")
+        loop.set_default_executor(self._executor)  # asyncio.to_thread uses it too
+        self._slots = asyncio.Semaphore(cfg.max_concurrency)
+        # Every blocking thread may hold a DynamoDB connection at once
+        os.environ.setdefault("DYNAMODB_MAX_POOL_CONNECTIONS", str(cfg.threads))
+        await asyncio.to_thread(self._warm_sync_pools)
+        self._warm_async_pool()
+
+        self._tasks = [
+            asyncio.create_task(self._every(cfg.metrics_flush_s, flush_metrics)),
+            asyncio.create_task(self._every(cfg.retry_budget_window_s, reset_retry_budget)),
+        ]
+        consume_dlq = cfg.dlq_consumer and bool(cfg.dlq_queue_url)
+        if consume_dlq:
+            self._tasks.append(asyncio.create_task(self._consume_dlq()))
+        log_event("server_started", {
+            "max_concurrency": cfg.max_concurrency,
+            "threads": cfg.threads,
+            "dlq_consumer": consume_dlq,
+        })
+
+    async def shutdown(self) -> None:
+        self.draining = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        flush_metrics()
+        flush_logs()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def _warm_sync_pools(self) -> None:
+        """Build the shared clients now, so the first request doesn't pay for them."""
+        from src.storage.dynamo import get_resource
+        try:
+            get_resource()
+            if os.getenv("OPENAI_API_KEY"):
+                from src.config.settings import get_openai_client
+                get_openai_client()
+        except Exception as e:
+            log_event("server_warmup_failed", {"stage": "sync"}, level="warning", error=e)
+
+    def _warm_async_pool(self) -> None:
+        if not os.getenv("OPENAI_API_KEY"):
+            return
+        try:
+            from src.config.settings import get_async_openai_client
+            get_async_openai_client()  # bound to this (the serving) loop
+        except Exception as e:
+            log_event("server_warmup_failed", {"stage": "async"}, level="warning", error=e)
+
+    @staticmethod
+    async def _every(seconds: int, fn) -> None:
+        while True:
+            await asyncio.sleep(seconds)
+            try:
+                fn()
+            except Exception as e:
+                log_event("server_task_failed", {"task": getattr(fn, "__name__", "?")}, level="warning", error=e)
+
+    # ---- ASGI entry ----
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        method, path = scope["method"], scope["path"].rstrip("/") or "/"
+        if method == "OPTIONS":
+            await _send_response(send, {"statusCode": 204, "headers": _CORS_PREFLIGHT, "body": ""})
+        elif path == "/healthz" and method == "GET":
+            await _send_response(send, self._health())
+        elif path == "/chat" and method in ("POST", "GET"):
+            await self._chat(scope, receive, send)
+        elif path == "/feedback" and method == "POST":
+            await self._feedback(scope, receive, send)
+        else:
+            await _send_response(send, lambda_chat_handler.response(404, {"error": "Not found"}))
+
+    async def _lifespan(self, receive, send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.startup()
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def _health(self) -> Dict[str, Any]:
+        resp = lambda_chat_handler.response(503 if self.draining else 200, {
+            "ok": not self.draining,
+            "inflight": self.inflight,
+            "maxConcurrency": self.config.max_concurrency,
+            "dlqConsumer": self.dlq_state,
+            "uptimeS": round(time.time() - self.started_at, 1),
+            "openaiPool": get_pool_stats(),
+        })
+        resp["headers"]["Cache-Control"] = "no-store"
+        return resp
+
+    # ---- routes ----
+    def _context(self, name: str, event: dict) -> ServerContext:
+        headers = {k.lower(): v for k, v in event["headers"].items()}
+        request_id = headers.get("x-request-id") or event["requestContext"]["requestId"]
+        bind_request_id(request_id)
+        return ServerContext(name, request_id, self.config.request_budget_ms)
+
+    async def _feedback(self, scope, receive, send) -> None:
+        event = _lambda_event(scope, await _read_body(receive), str(uuid.uuid4()))
+        self._context("server:feedback", event)
+        resp = await asyncio.to_thread(lambda_feedback_handler.handle_feedback, event)
+        await _send_response(send, resp)
+
+    async def _acquire_slot(self) -> None:
+        if self._slots is None:  # served without a lifespan (tests, some runners)
+            self._slots = asyncio.Semaphore(self.config.max_concurrency)
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.config.queue_timeout_ms / 1000.0)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"No free slot within {self.config.queue_timeout_ms} ms "
+                                   f"({self.inflight} requests in flight)")
+
+    async def _chat(self, scope, receive, send) -> None:
+        event = _lambda_event(scope, await _read_body(receive), str(uuid.uuid4()))
+        context = self._context("server:chat", event)
+        deadline = Deadline.for_api_gateway(context)
+        body: dict = {}
+        log_event("lambda_invocation", {
+            "source": "RomaChatServer",
+            "has_body": bool(event["body"]),
+        })
+
+        try:
+            job_id = lambda_chat_handler.polled_job_id(event)
+            if job_id or event["httpMethod"] == "GET":
+                resp = (await asyncio.to_thread(lambda_chat_handler.job_status_response, job_id, event) if job_id
+                        else lambda_chat_handler.response(400, {"error": "Missing jobId"}))
+                await _send_response(send, resp)
+                return
+            request, body = lambda_chat_handler.parse_chat_request(event)
+            invalid = lambda_chat_handler.validate_chat_request(request)
+            if invalid is not None:
+                await _send_response(send, invalid)
+                return
+            # Job mode: queued for the chat worker without taking a slot
+            if not request["stream"] and chat_jobs.wants_job(event, body):
+                job = await asyncio.to_thread(chat_jobs.submit, body, request["user_id"], request["page"])
+                if job is not None:
+                    await _send_response(send, lambda_chat_handler.response(202, job))
+                    return
+            await self._acquire_slot()
+        except Exception as e:
+            await _send_response(send, await asyncio.to_thread(lambda_chat_handler.chat_error_response, e, body))
+            return
+
+        self.inflight += 1
+        try:
+            if request.pop("stream"):
+                await self._stream_chat(request, deadline, body, receive, send)
+                return
+            try:
+                ai_reply, conversation_id = await get_ai_response_async(**request, deadline=deadline)
+                resp = lambda_chat_handler.chat_success(request["user_id"], ai_reply, conversation_id)
+            except Exception as e:
+                resp = await asyncio.to_thread(lambda_chat_handler.chat_error_response, e, body)
+            await _send_response(send, resp)
+        finally:
+            self.inflight -= 1
+            self._slots.release()
+
+    async def _stream_chat(self, request: dict, deadline, body: dict, receive, send) -> None:
+        """
+        Relay stream_ai_response as SSE frames as they are produced (no
+        buffering, unlike the Lambda path). The pipeline runs on one worker
+        thread; if the client disconnects it is closed, which releases the
+        idempotency claim. Failures before the first frame get the same JSON
+        error responses as the blocking path.
+        """
+        loop = asyncio.get_running_loop()
+        frames: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+
+        def pump():
+            sse = iter_sse(stream_ai_response(**request, deadline=deadline))
+            count = 0
+            try:
+                for frame in sse:
+                    if stop.is_set():
+                        break
+                    count += 1
+                    loop.call_soon_threadsafe(frames.put_nowait, ("frame", frame))
+                else:
+                    lambda_chat_handler.log_stream_success(request["user_id"], count)
+            except Exception as e:
+                loop.call_soon_threadsafe(frames.put_nowait, ("error", e))
+            finally:
+                sse.close()
+                loop.call_soon_threadsafe(frames.put_nowait, ("end", None))
+
+        start_request_budget()  # the copied context carries it to the pipeline thread
+        producer = loop.run_in_executor(None, contextvars.copy_context().run, pump)
+        watcher = asyncio.create_task(self._watch_disconnect(receive, stop))
+        started = False
+        try:
+            while True:
+                kind, item = await frames.get()
+                if kind == "end":
+                    break
+                if kind == "error":
+                    if not started:
+                        resp = await asyncio.to_thread(lambda_chat_handler.chat_error_response, item, body)
+                        await _send_response(send, resp)
+                        return
+                    # iter_sse already sent the "error" frame
+                    log_event("lambda_exception", {"source": "RomaChatServer", "stream": True},
+                              level="error", error=item)
+                    continue
+                if not started:
+                    started = True
+                    await send({"type": "http.response.start", "status": 200,
+                                "headers": _header_pairs(lambda_chat_handler.STREAM_HEADERS)})
+                await send({"type": "http.response.body", "body": item.encode("utf-8"), "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            stop.set()
+            watcher.cancel()
+            await asyncio.shield(producer)
+
+    @staticmethod
+    async def _watch_disconnect(receive, stop: threading.Event) -> None:
+        while not stop.is_set():
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                stop.set()
+                return
+
+    # ---- DLQ consumer ----
+    async def _consume_dlq(self) -> None:
+        from src.storage.queues import _sqs_client
+
+        self.dlq_state = "running"
+        try:
+            while True:
+                try:
+                    await self.drain_dlq_once(_sqs_client())
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    log_event("server_dlq_poll_failed", {}, level="warning", error=e)
+                    await asyncio.sleep(5)
+        finally:
+            self.dlq_state = "stopped"
+
+    async def drain_dlq_once(self, sqs, wait_s: int = 20) -> int:
+        """
+        One long poll of the DLQ. Records run through the reprocessor exactly as
+        in the Lambda (same grouping, ordering and deadline planning); only the
+        ones that succeeded are deleted, the rest reappear after the visibility
+        timeout. Returns the number of records processed.
+        """
+        url = self.config.dlq_queue_url
+        resp = await asyncio.to_thread(
+            sqs.receive_message, QueueUrl=url, MaxNumberOfMessages=10, WaitTimeSeconds=wait_s,
+            AttributeNames=["ApproximateReceiveCount"],
+        )
+        messages = resp.get("Messages") or []
+        if not messages:
+            return 0
+
+        records = [{
+            "messageId": m["MessageId"],
+            "receiptHandle": m["ReceiptHandle"],
+            "body": m.get("Body", "{}"),
+            "attributes": m.get("Attributes") or {},
+        } for m in messages]
+        request_id = str(uuid.uuid4())
+        context = ServerContext("server:dlq", request_id, self.config.dlq_batch_budget_ms)
+
+        def run():
+            bind_request_id(request_id)
+            return lambda_dlq_reprocessor.process_records(records, context)
+
+        result = await asyncio.to_thread(run)
+        failed = {f["itemIdentifier"] for f in result.get("batchItemFailures", [])}
+        done = [r for r in records if r["messageId"] not in failed]
+        if done:
+            await asyncio.to_thread(sqs.delete_message_batch, QueueUrl=url, Entries=[
+                {"Id": str(i), "ReceiptHandle": r["receiptHandle"]} for i, r in enumerate(done)
+            ])
+        return len(records)
+
+
+app = ChatServer()
+
+
+def main() -> None:
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("uvicorn is not installed: pip install -r requirements-server.txt")
+
+    cfg = get_server_config()
+    uvicorn.run(
+        "src.asgi_server:app",
+        host=cfg.host,
+        port=cfg.port,
+        workers=cfg.workers,
+        lifespan="on",
+        log_config=None,   # logs go through logging_utils' JSON handler
+        access_log=False,
+        timeout_graceful_shutdown=30,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,24 @@
 # src/assistant/assistant_client.py
 
-from typing import List, Dict, Any
+import functools
+import os
+import time
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Iterator
 
-from src.config.settings import get_openai_client, get_vector_search_max_results
-from src.config.model_config import get_model_config
+from src.config.settings import (
+    get_async_openai_client,
+    get_openai_client,
+    get_retrieval_mode,
+    get_vector_search_max_results,
+)
+from src.config.model_config import ModelConfig, get_model_config
 from src.config.system_instructions import build_system_instructions
-from src.config.page_vectorstores import get_stores_for_page
+from src.config.page_vectorstores import get_stores_for_page, get_page_key, normalize_page_path
 from src.utils.time_utils import get_current_time_info
+from src.assistant.resilience import acall_with_resilience, call_with_resilience
+from src.assistant import local_retrieval
+from src.utils.logging_utils import log_event, stage
 
 
 def _to_responses_content(parts: List[Dict[str, Any]] | None) -> List[Dict[str, Any]]:
@@ -44,14 +56,21 @@ def _to_responses_content(parts: List[Dict[str, Any]] | None) -> List[Dict[str,
     return converted
 
 
-def _build_runtime_signals(user_id: str | None, page: str | None, name: str | None, email: str | None) -> str:
-    """
-    Build the runtime 'RUNTIME SIGNALS' block appended to the base system prompt.
-    """
+def _page_signals(page: str | None) -> List[str]:
+    """Page-level block: identical for every user on the same page."""
+    path = normalize_page_path(page)
+    return [f"The user is on the page: {path} — respond strictly according to the context of that page."]
+
+
+def _date_signals() -> List[str]:
+    """Date at day resolution, so the prefix stays cacheable all day."""
     tinfo = get_current_time_info()
+    return [f"Today is {tinfo['date_human']}."]
+
+
+def _user_signals(user_id: str | None, name: str | None, email: str | None) -> List[str]:
+    """Per-user block: least stable, so it goes last."""
     signals = [
-        f"Today is {tinfo['full_human']}.",
-        f"The user is on the page: {page or '/'} — respond strictly according to the context of that page.",
         ("They are browsing as a guest." if not user_id or user_id == "anonymous"
          else f"Their user ID is {user_id}."),
     ]
@@ -59,22 +78,65 @@ def _build_runtime_signals(user_id: str | None, page: str | None, name: str | No
         signals.append(f"Display name: {name}.")
     if email:
         signals.append(f"Email: {email}.")
+    return signals
+
+
+def _build_runtime_signals(user_id: str | None, page: str | None, name: str | None, email: str | None) -> str:
+    """
+    Build the system prompt ordered from most to least stable:
+    base instructions → page block → date (day resolution) → user signals.
+    Requests on the same page and day then share the longest possible prefix.
+    """
+    signals = _page_signals(page) + _date_signals() + _user_signals(user_id, name, email)
     return build_system_instructions(extras=signals)
 
 
-def send_message_to_assistant(
+def get_prompt_cache_key(page: str | None) -> str:
+    """Per-page prompt_cache_key so requests with the same prefix land together."""
+    prefix = os.getenv("PROMPT_CACHE_KEY_PREFIX", "roma")
+    return f"{prefix}:{get_page_key(page)}"
+
+
+@dataclass(frozen=True)
+class AssistantResult:
+    text: str
+    response_id: str | None = None
+    usage: Dict[str, Any] = field(default_factory=dict)
+    model: str | None = None
+    incomplete: bool = False   # API stopped early (e.g. max_output_tokens)
+
+
+def _build_request(
     content_parts,
-    user_id: str | None = None,
-    page: str | None = None,
-    name: str | None = None,
-    email: str | None = None,
-) -> str:
+    user_id: str | None,
+    page: str | None,
+    name: str | None,
+    email: str | None,
+    chained: bool = False,
+    previous_response_id: str | None = None,
+    max_num_results: int | None = None,
+    max_output_tokens: int | None = None,
+    model_config: ModelConfig | None = None,
+    retrieval_mode: str | None = None,
+    client=None,
+) -> Dict[str, Any]:
     """
-    Sends structured content (text + images) via OpenAI Responses API and
-    returns the assistant's reply text. No threads/runs used.
+    Build the keyword arguments for client.responses.create(...), shared by the
+    blocking and the streaming entry points.
+
+    max_num_results / max_output_tokens override the defaults when a deadline
+    forces a degraded tier; model_config overrides the default model (router).
+    retrieval_mode "local" replaces the file_search tool with chunks retrieved
+    in-process (see _local_context); default from RETRIEVAL_MODE. A query with
+    no local hits still gets file_search.
+
+    chained=True sends the system prompt as `instructions` (which are NOT carried
+    over by previous_response_id) and stores the response server-side, so the
+    next turn can chain from it without re-sending the transcript. The local
+    context goes in the instructions too, after the prompt: it is for this turn
+    only and must not pile up in the stored chain.
     """
-    client = get_openai_client()
-    cfg = get_model_config()
+    cfg = model_config or get_model_config()
 
     # 1) System + user content
     system_text = _build_runtime_signals(user_id=user_id, page=page, name=name, email=email)
@@ -82,24 +144,80 @@ def send_message_to_assistant(
 
     # 2) Resolve vector stores for this page
     vector_store_ids = get_stores_for_page(page)
+    top_k = max_num_results or get_vector_search_max_results()
 
-    # 3) Call Responses API with file_search tool
-    resp = client.responses.create(
-        model=cfg.model,
-        temperature=cfg.temperature,
-        top_p=cfg.top_p,
-        input=[
-            {"role": "system", "content": [{"type": "input_text", "text": system_text}]},
-            {"role": "user",   "content": user_content},
-        ],
-        tools=[{
+    # 3) Retrieval: local chunks as context, or the hosted file_search tool
+    context = None
+    if (retrieval_mode or get_retrieval_mode()) == "local":
+        context = _local_context(vector_store_ids, user_content, top_k, client)
+    if context and not chained:
+        user_content = [{"type": "input_text", "text": context}] + user_content
+
+    request: Dict[str, Any] = {
+        "model": cfg.model,
+        "temperature": cfg.temperature,
+        "top_p": cfg.top_p,
+        # Not a named argument in the pinned SDK yet, so pass it through the body
+        "extra_body": {"prompt_cache_key": get_prompt_cache_key(page)},
+    }
+    if not context:
+        request["tools"] = [{
             "type": "file_search",
             "vector_store_ids": vector_store_ids,
-            "max_num_results": get_vector_search_max_results(),
-        }],
-    )
+            "max_num_results": top_k,
+        }]
+    if max_output_tokens:
+        request["max_output_tokens"] = max_output_tokens
+    if chained:
+        request["instructions"] = system_text + "\n\n" + context if context else system_text
+        request["input"] = [{"role": "user", "content": user_content}]
+        request["store"] = True
+        if previous_response_id:
+            request["previous_response_id"] = previous_response_id
+    else:
+        request["input"] = [
+            {"role": "system", "content": [{"type": "input_text", "text": system_text}]},
+            {"role": "user",   "content": user_content},
+        ]
+    return request
 
-    # 4) Extract text safely
+
+def _local_context(vector_store_ids: List[str], user_content: List[Dict[str, Any]], k: int, client=None) -> str | None:
+    """
+    Context block from the local index for this turn's text, "" when the index
+    has no match, or None when no store has a local index. Both fall back to
+    file_search.
+    """
+    query = " ".join(p.get("text", "") for p in user_content if p.get("type") == "input_text").strip()
+    if not query:
+        return None
+    t0 = time.perf_counter()
+    try:
+        with stage("local_retrieval"):
+            query_vector = local_retrieval.embed_query(client or get_openai_client(), query) \
+                if local_retrieval.dense_enabled() else None
+            hits = local_retrieval.retrieve(vector_store_ids, query, k, query_vector=query_vector)
+    except Exception as e:
+        # A broken or missing index must never fail the turn: use file_search instead
+        log_event("local_retrieval_failed", {"stores": vector_store_ids}, level="warning", error=e)
+        return None
+    if hits is None:
+        return None
+    log_event("local_retrieval", lambda: {
+        "stores": vector_store_ids,
+        "hits": len(hits),
+        "top": [h.chunk_id for h in hits[:3]],
+        "dense": query_vector is not None,
+        "latency_ms": round((time.perf_counter() - t0) * 1000.0, 2),
+    })
+    return local_retrieval.format_context(hits) if hits else ""
+
+
+def _extract_text(resp) -> str:
+    """
+    Extract the reply text from a Responses API result, tolerating both the
+    SDK object (output_text) and raw dict-shaped output blocks.
+    """
     text = getattr(resp, "output_text", None)
     if not text:
         try:
@@ -111,5 +229,212 @@ def send_message_to_assistant(
             text = "\n".join([s for s in chunks if s]).strip()
         except Exception:
             text = ""
+    return text or ""
+
+
+def _extract_usage(resp) -> Dict[str, Any]:
+    """Token usage of a Responses API result as a plain dict (empty if absent)."""
+    usage = getattr(resp, "usage", None)
+    if not usage:
+        return {}
+    details = getattr(usage, "input_tokens_details", None)
+    return {
+        "input_tokens": getattr(usage, "input_tokens", None),
+        "output_tokens": getattr(usage, "output_tokens", None),
+        "cached_tokens": getattr(details, "cached_tokens", None) if details else None,
+    }
+
+
+def is_missing_chain_error(err: Exception) -> bool:
+    """
+    True if the API rejected previous_response_id (expired, deleted or unknown),
+    in which case the caller should rebuild the transcript and retry unchained.
+    """
+    status = getattr(err, "status_code", None)
+    text = str(err).lower()
+    return status in (400, 404) and ("previous_response" in text or "previous response" in text)
+
+
+def _attempt_timeout(timeout: float | None, deadline) -> float | None:
+    """Per-attempt timeout: the explicit one, tightened by what the deadline leaves."""
+    candidates = [t for t in (timeout, deadline.plan().timeout_s if deadline is not None else None) if t]
+    return min(candidates) if candidates else None
+
+
+def create_assistant_response(
+    content_parts,
+    user_id: str | None = None,
+    page: str | None = None,
+    name: str | None = None,
+    email: str | None = None,
+    chained: bool = False,
+    previous_response_id: str | None = None,
+    max_num_results: int | None = None,
+    max_output_tokens: int | None = None,
+    timeout: float | None = None,
+    deadline=None,
+    model_config: ModelConfig | None = None,
+    retrieval_mode: str | None = None,
+    client=None,
+) -> AssistantResult:
+    """
+    Sends structured content via the Responses API and returns the reply text
+    together with the response id and token usage. `timeout` (seconds)
+    overrides the client's read timeout for this call. Transient failures are
+    retried (and optionally hedged) by resilience.call_with_resilience.
+    """
+    client = client or get_openai_client()
+    request = _build_request(
+        content_parts, user_id=user_id, page=page, name=name, email=email,
+        chained=chained, previous_response_id=previous_response_id,
+        max_num_results=max_num_results, max_output_tokens=max_output_tokens,
+        model_config=model_config, retrieval_mode=retrieval_mode, client=client,
+    )
+
+    def attempt():
+        per_attempt = _attempt_timeout(timeout, deadline)
+        if per_attempt:
+            return client.responses.create(timeout=per_attempt, **request)
+        return client.responses.create(**request)
+
+    resp = call_with_resilience(attempt, label="responses.create", deadline=deadline)
+    return _to_result(resp, request["model"])
+
+
+def _to_result(resp, model: str) -> AssistantResult:
+    return AssistantResult(
+        text=_extract_text(resp),
+        response_id=getattr(resp, "id", None),
+        usage=_extract_usage(resp),
+        model=model,
+        incomplete=getattr(resp, "status", None) == "incomplete",
+    )
+
+
+async def acreate_assistant_response(
+    content_parts,
+    user_id: str | None = None,
+    page: str | None = None,
+    name: str | None = None,
+    email: str | None = None,
+    chained: bool = False,
+    previous_response_id: str | None = None,
+    max_num_results: int | None = None,
+    max_output_tokens: int | None = None,
+    timeout: float | None = None,
+    deadline=None,
+    model_config: ModelConfig | None = None,
+    retrieval_mode: str | None = None,
+    client=None,
+) -> AssistantResult:
+    """
+    Async variant of create_assistant_response on openai.AsyncOpenAI (the
+    shared async client unless `client` is given). Same request, retries and
+    result. In local retrieval mode the request is built on a worker thread,
+    since it may embed the query with the blocking client.
+    """
+    import asyncio
+
+    client = client or get_async_openai_client()
+    build = functools.partial(
+        _build_request, content_parts, user_id=user_id, page=page, name=name, email=email,
+        chained=chained, previous_response_id=previous_response_id,
+        max_num_results=max_num_results, max_output_tokens=max_output_tokens,
+        model_config=model_config, retrieval_mode=retrieval_mode,
+    )
+    if (retrieval_mode or get_retrieval_mode()) == "local":
+        request = await asyncio.to_thread(build)
+    else:
+        request = build()
+
+    def attempt():
+        per_attempt = _attempt_timeout(timeout, deadline)
+        if per_attempt:
+            return client.responses.create(timeout=per_attempt, **request)
+        return client.responses.create(**request)
+
+    resp = await acall_with_resilience(attempt, label="responses.create", deadline=deadline)
+    return _to_result(resp, request["model"])
+
+
+def send_message_to_assistant(
+    content_parts,
+    user_id: str | None = None,
+    page: str | None = None,
+    name: str | None = None,
+    email: str | None = None,
+    retrieval_mode: str | None = None,
+    client=None,
+) -> str:
+    """
+    Sends structured content (text + images) via OpenAI Responses API and
+    returns the assistant's reply text. No threads/runs used.
+    retrieval_mode: "file_search" | "local" (default: RETRIEVAL_MODE).
+    """
+    result = create_assistant_response(
+        content_parts, user_id=user_id, page=page, name=name, email=email,
+        retrieval_mode=retrieval_mode, client=client,
+    )
+    return result.text or "[No assistant response found]"
+
+
+def stream_message_to_assistant(
+    content_parts,
+    user_id: str | None = None,
+    page: str | None = None,
+    name: str | None = None,
+    email: str | None = None,
+    chained: bool = False,
+    previous_response_id: str | None = None,
+    max_num_results: int | None = None,
+    max_output_tokens: int | None = None,
+    timeout: float | None = None,
+    deadline=None,
+    meta: Dict[str, Any] | None = None,
+    model_config: ModelConfig | None = None,
+    retrieval_mode: str | None = None,
+    client=None,
+) -> Iterator[str]:
+    """
+    Same request as create_assistant_response, but with stream=True.
+    Yields output_text deltas as they arrive; the caller assembles the full
+    reply. If `meta` is given, it receives response_id, usage and incomplete
+    (the API stopped early, e.g. max_output_tokens) once the stream ends.
+    Raises RuntimeError if the stream reports a failure.
+    Only opening the stream is retried (never hedged): once deltas have been
+    relayed a retry would duplicate output.
+    """
+    client = client or get_openai_client()
+    request = _build_request(
+        content_parts, user_id=user_id, page=page, name=name, email=email,
+        chained=chained, previous_response_id=previous_response_id,
+        max_num_results=max_num_results, max_output_tokens=max_output_tokens,
+        model_config=model_config, retrieval_mode=retrieval_mode, client=client,
+    )
+
+    def attempt():
+        per_attempt = _attempt_timeout(timeout, deadline)
+        if per_attempt:
+            return client.responses.create(stream=True, timeout=per_attempt, **request)
+        return client.responses.create(stream=True, **request)
 
-    return text or "[No assistant response found]"
+    stream = call_with_resilience(attempt, label="responses.stream", deadline=deadline, hedge=False)
+    try:
+        for event in stream:
+            etype = getattr(event, "type", "")
+            if etype == "response.output_text.delta":
+                delta = getattr(event, "delta", "")
+                if delta:
+                    yield delta
+            elif etype in ("response.completed", "response.incomplete") and meta is not None:
+                final = getattr(event, "response", None)
+                meta["response_id"] = getattr(final, "id", None)
+                meta["usage"] = _extract_usage(final)
+                meta["incomplete"] = etype == "response.incomplete"
+            elif etype in ("response.failed", "error"):
+                err = getattr(event, "message", None) or getattr(getattr(event, "response", None), "error", None)
+                raise RuntimeError(f"Responses stream failed: {err}")
+    finally:
+        close = getattr(stream, "close", None)
+        if callable(close):
+            close()
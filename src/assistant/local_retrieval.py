@@ -0,0 +1,449 @@
+# src/assistant/local_retrieval.py
+"""
+In-process retrieval over the knowledge folders, used instead of the hosted
+file_search tool when RETRIEVAL_MODE=local.
+
+`knowledge_admin.py build-index` chunks every store folder and writes one
+directory per store under LOCAL_INDEX_DIR, plus a catalog.json that maps
+each store to its VECTOR_STORE_* env key:
+
+  meta.json      counts, BM25 parameters, source hashes, dense model/dim
+  chunks.jsonl   one {"id", "source", "text"} per chunk
+  terms.json     term → [postings offset, document frequency]
+  postings.i32   chunk ids, grouped by term          (memory-mapped)
+  tfs.u16        term frequency of each posting      (memory-mapped)
+  doclens.i32    tokens per chunk                    (memory-mapped)
+  dense.f32      unit-norm embeddings, n × dim       (optional, memory-mapped)
+
+Binary files are read through mmap + memoryview, so loading a store costs one
+JSON parse of its vocabulary and pages are faulted in on demand. Indexes are
+loaded lazily, on the first query that needs them, and kept per container.
+
+Dense vectors are only used when numpy is installed and
+LOCAL_RETRIEVAL_DENSE=1 (embedding the query is one extra API call); BM25 and
+dense rankings are then merged with reciprocal rank fusion.
+
+Env (optional):
+- LOCAL_INDEX_DIR          (default: src/knowledge_index)
+- LOCAL_RETRIEVAL_DENSE    (default: "0")
+- LOCAL_EMBEDDING_MODEL    (default: text-embedding-3-small; must match the build)
+- LOCAL_CONTEXT_MAX_CHARS  (default: 6000; total context injected per turn)
+"""
+import json
+import math
+import mmap
+import os
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+INDEX_VERSION = 1
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+CHUNK_MAX_CHARS = 1500
+DEFAULT_INDEX_DIR = Path(__file__).resolve().parents[1] / "knowledge_index"
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def index_dir() -> Path:
+    return Path(os.getenv("LOCAL_INDEX_DIR") or DEFAULT_INDEX_DIR)
+
+
+def dense_enabled() -> bool:
+    return os.getenv("LOCAL_RETRIEVAL_DENSE", "0").strip().lower() in ("1", "true", "yes")
+
+
+def embedding_model() -> str:
+    return os.getenv("LOCAL_EMBEDDING_MODEL", "text-embedding-3-small")
+
+
+# -------- Text analysis --------
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset("""
+a al algo ante como con cual cuales cuando de del desde donde el ella ellas ellos en entre era es esa ese eso
+esta este esto fue ha hay la las le les lo los mas me mi muy no nos o para pero por que se si sin sobre su sus
+te tu un una uno unos unas y ya
+an and are as at be by for from in is it of on or the to was were what which with
+""".split())
+
+
+def _fold(text: str) -> str:
+    """Lowercase and strip accents (á → a, ñ → n), so queries match with or without tildes."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def _stem(word: str) -> str:
+    # Plural folding only: ecuaciones → ecuacion, ángulos → angulo
+    if len(word) > 5 and word.endswith("ones"):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    return [_stem(w) for w in _WORD_RE.findall(_fold(text or ""))
+            if w not in _STOPWORDS and (len(w) > 1 or w.isdigit())]
+
+
+# -------- Chunking --------
+_SKIP_KEYS = {"id", "page", "context_id", "type"}
+
+
+def _render(value, indent: str = "") -> List[str]:
+    """Flatten JSON into 'key: value' lines; nested structures are indented."""
+    lines: List[str] = []
+    if isinstance(value, dict):
+        for k, v in value.items():
+            if k in _SKIP_KEYS:
+                continue
+            if isinstance(v, (dict, list)):
+                lines.append(f"{indent}{k}:")
+                lines.extend(_render(v, indent + "  "))
+            elif v not in (None, ""):
+                lines.append(f"{indent}{k}: {v}")
+    elif isinstance(value, list):
+        for v in value:
+            if isinstance(v, (dict, list)):
+                lines.extend(_render(v, indent + "  "))
+            else:
+                lines.append(f"{indent}- {v}")
+    elif value not in (None, ""):
+        lines.append(f"{indent}{value}")
+    return lines
+
+
+def _split(text: str, max_chars: int = CHUNK_MAX_CHARS) -> List[str]:
+    """Pack lines/paragraphs into pieces of at most max_chars (a longer line stays whole)."""
+    pieces, current = [], ""
+    for line in text.split("\n"):
+        if current and len(current) + len(line) + 1 > max_chars:
+            pieces.append(current)
+            current = ""
+        current = f"{current}\n{line}" if current else line
+    if current.strip():
+        pieces.append(current)
+    return pieces
+
+
+def chunk_file(path: Path, rel: str) -> List[dict]:
+    """
+    Chunks of one knowledge file as {"id", "source", "text"}.
+    JSON arrays give one chunk per record, JSON objects one per top-level key;
+    .md/.txt/.html are packed by paragraph. Binary formats (pdf, docx, pptx)
+    have no local parser and return no chunks.
+    """
+    suffix = path.suffix.lower()
+    if suffix == ".json":
+        data = json.loads(path.read_text(encoding="utf-8"))
+        if isinstance(data, list):
+            records = [(r.get("id") if isinstance(r, dict) else None, r) for r in data]
+        elif isinstance(data, dict):
+            # Shared header (exam name, etc.) keeps each section self-explanatory
+            header = [f"{k}: {v}" for k, v in data.items() if not isinstance(v, (dict, list)) and k not in _SKIP_KEYS]
+            records = [(None, {"_header": header, k: v}) for k, v in data.items() if isinstance(v, (dict, list))]
+            if not records:
+                records = [(None, data)]
+        else:
+            records = [(None, data)]
+        chunks = []
+        for i, (rid, record) in enumerate(records):
+            if isinstance(record, dict) and "_header" in record:
+                lines = record.pop("_header") + _render(record)
+            else:
+                lines = _render(record)
+            for j, text in enumerate(_split("\n".join(lines))):
+                cid = rid or f"{rel}#{i}"
+                chunks.append({"id": cid if j == 0 else f"{cid}~{j}", "source": rel, "text": text})
+        return chunks
+    if suffix in (".md", ".txt", ".html"):
+        text = path.read_text(encoding="utf-8", errors="replace")
+        if suffix == ".html":
+            text = re.sub(r"<[^>]+>", " ", text)
+        paragraphs = "\n".join(p.strip() for p in re.split(r"\n\s*\n", text) if p.strip())
+        return [{"id": f"{rel}#{i}", "source": rel, "text": t} for i, t in enumerate(_split(paragraphs))]
+    return []
+
+
+# -------- Build --------
+def _write_array(path: Path, typecode: str, values: Iterable[int | float]) -> None:
+    with open(path, "wb") as fh:
+        array(typecode, values).tofile(fh)
+
+
+def build_store_index(
+    chunks: Sequence[dict],
+    out_dir: Path,
+    *,
+    store_name: str,
+    env_key: str,
+    sources: Dict[str, str] | None = None,
+    embed: Callable[[List[str]], List[List[float]]] | None = None,
+) -> dict:
+    """
+    Write the BM25 (and, with `embed`, dense) index of one store to out_dir.
+    `sources` ({relpath: sha256}) is recorded so unchanged stores can be skipped.
+    Returns the meta dict.
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    postings: Dict[str, List[Tuple[int, int]]] = {}
+    doclens: List[int] = []
+    for doc_id, chunk in enumerate(chunks):
+        tokens = tokenize(chunk["text"])
+        doclens.append(len(tokens))
+        counts: Dict[str, int] = {}
+        for t in tokens:
+            counts[t] = counts.get(t, 0) + 1
+        for term, tf in counts.items():
+            postings.setdefault(term, []).append((doc_id, min(tf, 0xFFFF)))
+
+    terms: Dict[str, List[int]] = {}
+    flat_docs: List[int] = []
+    flat_tfs: List[int] = []
+    for term in sorted(postings):
+        plist = postings[term]
+        terms[term] = [len(flat_docs), len(plist)]
+        flat_docs.extend(d for d, _ in plist)
+        flat_tfs.extend(tf for _, tf in plist)
+
+    _write_array(out_dir / "postings.i32", "i", flat_docs)
+    _write_array(out_dir / "tfs.u16", "H", flat_tfs)
+    _write_array(out_dir / "doclens.i32", "i", doclens)
+    (out_dir / "terms.json").write_text(json.dumps(terms, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+    with open(out_dir / "chunks.jsonl", "w", encoding="utf-8") as fh:
+        for chunk in chunks:
+            fh.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+
+    dense = None
+    (out_dir / "dense.f32").unlink(missing_ok=True)
+    if embed is not None and chunks:
+        vectors = embed([c["text"] for c in chunks])
+        dim = len(vectors[0])
+        flat: List[float] = []
+        for v in vectors:
+            norm = math.sqrt(sum(x * x for x in v)) or 1.0
+            flat.extend(x / norm for x in v)
+        _write_array(out_dir / "dense.f32", "f", flat)
+        dense = {"model": embedding_model(), "dim": dim}
+
+    meta = {
+        "version": INDEX_VERSION,
+        "store_name": store_name,
+        "env_key": env_key,
+        "chunks": len(chunks),
+        "terms": len(terms),
+        "avgdl": (sum(doclens) / len(doclens)) if doclens else 0.0,
+        "k1": BM25_K1,
+        "b": BM25_B,
+        "dense": dense,
+        "sources": sources or {},
+        "built_at": int(time.time()),
+    }
+    (out_dir / "meta.json").write_text(json.dumps(meta, indent=2, ensure_ascii=False), encoding="utf-8")
+    return meta
+
+
+def write_catalog(root: Path, metas: Dict[str, dict]) -> None:
+    catalog = {"version": INDEX_VERSION, "stores": {
+        name: {"env_key": m["env_key"], "chunks": m["chunks"], "dense": bool(m.get("dense"))}
+        for name, m in sorted(metas.items())
+    }}
+    (root / "catalog.json").write_text(json.dumps(catalog, indent=2, ensure_ascii=False), encoding="utf-8")
+
+
+# -------- Load & search --------
+def _map_array(path: Path, typecode: str):
+    """Read-only memoryview over a file of native-endian values (empty file → empty array)."""
+    if not path.exists() or path.stat().st_size == 0:
+        return array(typecode)
+    with open(path, "rb") as fh:
+        mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    return memoryview(mm).cast(typecode)
+
+
+@dataclass(frozen=True)
+class Hit:
+    store: str
+    chunk_id: str
+    source: str
+    text: str
+    score: float
+
+
+class LocalIndex:
+    """One store's index, memory-mapped from disk."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.meta = json.loads((path / "meta.json").read_text(encoding="utf-8"))
+        self.name = self.meta["store_name"]
+        self.terms: Dict[str, List[int]] = json.loads((path / "terms.json").read_text(encoding="utf-8"))
+        with open(path / "chunks.jsonl", encoding="utf-8") as fh:
+            self.chunks = [json.loads(line) for line in fh if line.strip()]
+        self.postings = _map_array(path / "postings.i32", "i")
+        self.tfs = _map_array(path / "tfs.u16", "H")
+        self.doclens = _map_array(path / "doclens.i32", "i")
+        self.n = len(self.chunks)
+        self.avgdl = float(self.meta.get("avgdl") or 1.0)
+        self._dense = None
+
+    def bm25(self, query_terms: Sequence[str], k: int) -> List[Tuple[float, int]]:
+        """Top-k (score, chunk index) by Okapi BM25."""
+        k1, b = self.meta.get("k1", BM25_K1), self.meta.get("b", BM25_B)
+        scores: Dict[int, float] = {}
+        for term in set(query_terms):
+            entry = self.terms.get(term)
+            if not entry:
+                continue
+            start, df = entry
+            idf = math.log(1.0 + (self.n - df + 0.5) / (df + 0.5))
+            for i in range(start, start + df):
+                doc, tf = self.postings[i], self.tfs[i]
+                norm = tf + k1 * (1.0 - b + b * self.doclens[doc] / self.avgdl)
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (k1 + 1.0) / norm
+        return sorted(((s, d) for d, s in scores.items()), reverse=True)[:k]
+
+    @property
+    def has_dense(self) -> bool:
+        return bool(self.meta.get("dense"))
+
+    def dense(self, query_vector: Sequence[float], k: int) -> List[Tuple[float, int]]:
+        """Top-k (cosine, chunk index). Needs numpy."""
+        import numpy as np  # optional dependency, only for dense retrieval
+        if self._dense is None:
+            dim = self.meta["dense"]["dim"]
+            self._dense = np.memmap(self.path / "dense.f32", dtype=np.float32, mode="r").reshape(-1, dim)
+        q = np.asarray(query_vector, dtype=np.float32)
+        q /= (np.linalg.norm(q) or 1.0)
+        sims = self._dense @ q
+        top = np.argsort(-sims)[:k]
+        return [(float(sims[i]), int(i)) for i in top]
+
+    def hit(self, score: float, doc: int) -> Hit:
+        chunk = self.chunks[doc]
+        return Hit(store=self.name, chunk_id=chunk["id"], source=chunk["source"], text=chunk["text"], score=score)
+
+
+_lock = threading.Lock()
+_indexes: Dict[str, Optional[LocalIndex]] = {}
+_catalog: Dict[str, object] = {}
+
+
+def _store_names(root: Path) -> Dict[str, str]:
+    """store id or name → store name, from catalog.json and the VECTOR_STORE_* env vars."""
+    cached = _catalog.get(str(root))
+    if cached is not None:
+        return cached
+    try:
+        stores = json.loads((root / "catalog.json").read_text(encoding="utf-8")).get("stores", {})
+    except FileNotFoundError:
+        stores = {}
+    names: Dict[str, str] = {}
+    for name, info in stores.items():
+        names[name] = name
+        sid = os.getenv(info.get("env_key") or "", "")
+        if sid:
+            names[sid] = name
+    _catalog[str(root)] = names
+    return names
+
+
+def get_index(store_name: str, root: Path | None = None) -> Optional[LocalIndex]:
+    root = root or index_dir()
+    key = str(root / store_name)
+    if key in _indexes:
+        return _indexes[key]
+    with _lock:
+        if key not in _indexes:
+            path = root / store_name
+            _indexes[key] = LocalIndex(path) if (path / "meta.json").exists() else None
+    return _indexes[key]
+
+
+def clear_cache() -> None:
+    with _lock:
+        _indexes.clear()
+        _catalog.clear()
+
+
+def _rrf(*rankings: List[Tuple[float, Any]]) -> List[Tuple[float, Any]]:
+    """Reciprocal rank fusion; ties keep the order of first appearance."""
+    fused: Dict[Any, float] = {}
+    for ranking in rankings:
+        for rank, (_score, doc) in enumerate(ranking):
+            fused[doc] = fused.get(doc, 0.0) + 1.0 / (RRF_K + rank + 1)
+    return sorted(((s, d) for d, s in fused.items()), key=lambda sd: -sd[0])
+
+
+def retrieve(
+    stores: Sequence[str],
+    query: str,
+    k: int = 8,
+    *,
+    root: Path | None = None,
+    query_vector: Sequence[float] | None = None,
+) -> Optional[List[Hit]]:
+    """
+    Top-k chunks for `query` across the given stores (vector store ids or
+    store names). Returns None when none of the stores has a local index,
+    so the caller can fall back to file_search; [] means "indexed, no match".
+    With `query_vector` (and numpy), BM25 and dense rankings are fused.
+    Several stores are merged by rank (RRF), never by raw score: BM25 and
+    fused scores are on different scales.
+    """
+    root = root or index_dir()
+    names = _store_names(root)
+    indexes = [idx for idx in (get_index(names[s], root) for s in dict.fromkeys(stores) if s in names) if idx]
+    if not indexes:
+        return None
+
+    terms = tokenize(query)
+    rankings = []
+    for idx in indexes:
+        ranking = idx.bm25(terms, k)
+        if query_vector is not None and idx.has_dense:
+            ranking = _rrf(ranking, idx.dense(query_vector, k))[:k]
+        rankings.append(ranking)
+    if len(indexes) == 1:
+        return [indexes[0].hit(score, doc) for score, doc in rankings[0]]
+    fused = _rrf(*([(score, (i, doc)) for score, doc in ranking] for i, ranking in enumerate(rankings)))
+    return [indexes[i].hit(score, doc) for score, (i, doc) in fused[:k]]
+
+
+def embed_query(client, query: str) -> Optional[List[float]]:
+    """Query embedding for dense retrieval, or None when dense retrieval is off or unavailable."""
+    if not dense_enabled():
+        return None
+    try:
+        import numpy  # noqa: F401  (dense search needs it; skip the API call without it)
+    except ImportError:
+        return None
+    resp = client.embeddings.create(model=embedding_model(), input=query)
+    return list(resp.data[0].embedding)
+
+
+def format_context(hits: Sequence[Hit], max_chars: int | None = None) -> str:
+    """Numbered context block injected ahead of the user's message."""
+    budget = max_chars if max_chars is not None else _env_int("LOCAL_CONTEXT_MAX_CHARS", 6000)
+    lines = ["Contexto de la base de conocimiento (úsalo si es relevante para la pregunta):"]
+    used = 0
+    for i, h in enumerate(hits, 1):
+        block = f"[{i}] ({h.source}) {h.text}"
+        if used and used + len(block) > budget:
+            break
+        lines.append(block[:budget] if not used else block)
+        used += len(block)
+    return "\n\n".join(lines)
@@ -0,0 +1,320 @@
+# src/assistant/resilience.py
+"""
+Retry, backoff and hedging around the Responses API call.
+
+- Jittered exponential backoff ("full jitter"), honoring Retry-After /
+  retry-after-ms headers on 429/5xx.
+- A retry budget shared by every call in one invocation, so a bad minute
+  upstream can't multiply the work of a whole DLQ batch. A long-running server
+  gives each chat request its own budget (start_request_budget), so
+  concurrent requests don't drain one shared pool.
+- Optional hedging: if the first attempt is slower than the hedge threshold
+  (fixed, or the rolling p95 of recent calls), a second identical request is
+  fired and whichever finishes first wins. The loser is left to finish in the
+  background (it cannot be cancelled mid-flight), so hedging trades cost for tail
+  latency and is off by default.
+
+Every attempt is reported through log_event("openai_attempt", ...).
+
+Env (optional):
+- OPENAI_RETRY_MAX_ATTEMPTS  (default: 3)
+- OPENAI_RETRY_BASE_MS       (default: 300)
+- OPENAI_RETRY_MAX_MS        (default: 4000)
+- OPENAI_RETRY_BUDGET        (default: 4 retries per invocation, or per server request)
+- OPENAI_HEDGE               (default: "0")
+- OPENAI_HEDGE_AFTER_MS      (default: 0 → rolling p95, once 20 samples exist)
+"""
+import email.utils
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional
+
+from src.utils.logging_utils import log_event
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    max_attempts: int = 3
+    base_delay_ms: int = 300
+    max_delay_ms: int = 4000
+    hedge: bool = False
+    hedge_after_ms: int = 0
+
+
+def get_retry_policy() -> RetryPolicy:
+    return RetryPolicy(
+        max_attempts=max(1, _env_int("OPENAI_RETRY_MAX_ATTEMPTS", 3)),
+        base_delay_ms=max(0, _env_int("OPENAI_RETRY_BASE_MS", 300)),
+        max_delay_ms=max(0, _env_int("OPENAI_RETRY_MAX_MS", 4000)),
+        hedge=os.getenv("OPENAI_HEDGE", "0").strip().lower() in ("1", "true", "yes"),
+        hedge_after_ms=max(0, _env_int("OPENAI_HEDGE_AFTER_MS", 0)),
+    )
+
+
+# -------- Retry budget (per invocation, or per request) --------
+_budget_lock = threading.Lock()
+_budget = {"remaining": _env_int("OPENAI_RETRY_BUDGET", 4)}
+_request_budget: ContextVar[Optional[dict]] = ContextVar("openai_request_retry_budget", default=None)
+
+
+def reset_retry_budget(budget: Optional[int] = None) -> None:
+    """Call at the start of each invocation."""
+    with _budget_lock:
+        _budget["remaining"] = budget if budget is not None else _env_int("OPENAI_RETRY_BUDGET", 4)
+
+
+def start_request_budget(budget: Optional[int] = None) -> None:
+    """
+    Give the current request its own retry budget. It follows the request's
+    context (tasks, asyncio.to_thread, copy_context().run); calls outside any
+    request keep using the process-wide budget above.
+    """
+    _request_budget.set({"remaining": budget if budget is not None else _env_int("OPENAI_RETRY_BUDGET", 4)})
+
+
+def _take_retry_token() -> bool:
+    budget = _request_budget.get()
+    if budget is None:
+        budget = _budget
+    with _budget_lock:
+        if budget["remaining"] <= 0:
+            return False
+        budget["remaining"] -= 1
+        return True
+
+
+# -------- Latency window (for the p95 hedge threshold) --------
+_latencies: deque = deque(maxlen=200)
+_MIN_SAMPLES = 20
+
+
+def _record_latency(ms: float) -> None:
+    _latencies.append(ms)
+
+
+def latency_p95() -> Optional[float]:
+    samples = sorted(_latencies)
+    if len(samples) < _MIN_SAMPLES:
+        return None
+    return samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+
+# -------- Error classification --------
+def is_retryable(err: Exception) -> bool:
+    """429, 408, 409 and 5xx, plus connection errors and timeouts."""
+    if getattr(err, "code", None) == "insufficient_quota":
+        return False  # billing problem, not a transient 429
+    status = getattr(err, "status_code", None)
+    if status is not None:
+        return status in (408, 409, 429) or status >= 500
+    try:
+        import openai
+        if isinstance(err, (openai.APIConnectionError, openai.APITimeoutError)):
+            return True
+    except ImportError:
+        pass
+    return isinstance(err, (TimeoutError, ConnectionError))
+
+
+def retry_after_ms(err: Exception) -> Optional[float]:
+    """Server-requested delay from retry-after-ms / Retry-After (seconds or HTTP date)."""
+    headers = getattr(getattr(err, "response", None), "headers", None) or {}
+    try:
+        raw_ms = headers.get("retry-after-ms")
+        if raw_ms is not None:
+            return max(0.0, float(raw_ms))
+        raw = headers.get("retry-after")
+        if raw is None:
+            return None
+        try:
+            return max(0.0, float(raw) * 1000.0)
+        except ValueError:
+            parsed = email.utils.parsedate_to_datetime(raw)
+            return max(0.0, (parsed.timestamp() - time.time()) * 1000.0)
+    except Exception:
+        return None
+
+
+def _backoff_ms(policy: RetryPolicy, attempt: int, err: Exception) -> float:
+    ceiling = min(policy.max_delay_ms, policy.base_delay_ms * (2 ** (attempt - 1)))
+    delay = random.uniform(0, ceiling)
+    server = retry_after_ms(err)
+    return max(delay, server) if server is not None else delay
+
+
+# -------- Hedging --------
+_hedge_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hedge")
+
+
+def _hedge_threshold_ms(policy: RetryPolicy) -> Optional[float]:
+    if not policy.hedge:
+        return None
+    return float(policy.hedge_after_ms) if policy.hedge_after_ms else latency_p95()
+
+
+def _run_hedged(fn: Callable[[], Any], threshold_ms: float, label: str, attempt: int):
+    first = _hedge_pool.submit(fn)
+    done, _ = wait([first], timeout=threshold_ms / 1000.0)
+    if done:
+        return first.result(), False
+
+    log_event("openai_hedge_fired", {"label": label, "attempt": attempt, "after_ms": round(threshold_ms, 1)})
+    second = _hedge_pool.submit(fn)
+    pending = {first, second}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for fut in done:
+            if fut.exception() is None:
+                return fut.result(), fut is second
+            error = fut.exception()
+    raise error
+
+
+# -------- Attempt bookkeeping (shared by the sync and async wrappers) --------
+def _after_failure(policy: RetryPolicy, attempt: int, err: Exception, t0: float, label: str, deadline) -> Optional[float]:
+    """Log a failed attempt. Returns the delay before the next one, or None to give up."""
+    latency_ms = (time.perf_counter() - t0) * 1000.0
+    retryable = is_retryable(err)
+    delay_ms = _backoff_ms(policy, attempt, err) if retryable else None
+    give_up = (
+        not retryable
+        or attempt >= policy.max_attempts
+        or (deadline is not None and deadline.remaining_ms() <= (delay_ms or 0))
+        or not _take_retry_token()
+    )
+    log_event("openai_attempt", {
+        "label": label,
+        "attempt": attempt,
+        "outcome": "error",
+        "status": getattr(err, "status_code", None),
+        "error_type": type(err).__name__,
+        "retryable": retryable,
+        "latency_ms": round(latency_ms, 1),
+        "next_delay_ms": None if give_up else round(delay_ms, 1),
+    }, level="warning")
+    return None if give_up else delay_ms
+
+
+def _after_success(attempt: int, t0: float, label: str, threshold: Optional[float], hedge_won: bool) -> None:
+    latency_ms = (time.perf_counter() - t0) * 1000.0
+    _record_latency(latency_ms)
+    log_event("openai_attempt", {
+        "label": label,
+        "attempt": attempt,
+        "outcome": "success",
+        "latency_ms": round(latency_ms, 1),
+        "hedged": bool(threshold) and latency_ms >= (threshold or 0),
+        "hedge_won": hedge_won,
+    })
+
+
+# -------- Public API --------
+def call_with_resilience(
+    fn: Callable[[], Any],
+    *,
+    label: str = "responses.create",
+    policy: Optional[RetryPolicy] = None,
+    deadline=None,
+    hedge: bool = True,
+):
+    """
+    Run fn() with retries (and hedging, if enabled and `hedge` is True).
+    Gives up early when the retry budget is spent or the deadline leaves no
+    room for the backoff delay. Re-raises the last error.
+    """
+    policy = policy or get_retry_policy()
+    threshold = _hedge_threshold_ms(policy) if hedge else None
+
+    for attempt in range(1, policy.max_attempts + 1):
+        t0 = time.perf_counter()
+        try:
+            if threshold:
+                result, hedge_won = _run_hedged(fn, threshold, label, attempt)
+            else:
+                result, hedge_won = fn(), False
+        except Exception as e:
+            delay_ms = _after_failure(policy, attempt, e, t0, label, deadline)
+            if delay_ms is None:
+                raise
+            time.sleep(delay_ms / 1000.0)
+            continue
+
+        _after_success(attempt, t0, label, threshold, hedge_won)
+        return result
+
+
+async def _arun_hedged(fn: Callable[[], Awaitable[Any]], threshold_ms: float, label: str, attempt: int):
+    import asyncio
+
+    first = asyncio.ensure_future(fn())
+    done, _ = await asyncio.wait({first}, timeout=threshold_ms / 1000.0)
+    if done:
+        return first.result(), False
+
+    log_event("openai_hedge_fired", {"label": label, "attempt": attempt, "after_ms": round(threshold_ms, 1)})
+    second = asyncio.ensure_future(fn())
+    pending = {first, second}
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for fut in done:
+                if fut.exception() is None:
+                    return fut.result(), fut is second
+                error = fut.exception()
+        raise error
+    finally:
+        # Unlike the thread pool, a pending coroutine can be cancelled: the loser stops here
+        for fut in pending:
+            fut.cancel()
+
+
+async def acall_with_resilience(
+    fn: Callable[[], Awaitable[Any]],
+    *,
+    label: str = "responses.create",
+    policy: Optional[RetryPolicy] = None,
+    deadline=None,
+    hedge: bool = True,
+):
+    """
+    Async counterpart of call_with_resilience: fn() returns an awaitable (a
+    call on openai.AsyncOpenAI). Same policy, retry budget, latency window and
+    openai_attempt logs; backoff uses asyncio.sleep so the loop keeps serving
+    other requests, and a losing hedge is cancelled instead of left running.
+    """
+    import asyncio  # deferred: the sync handlers never pay for it
+
+    policy = policy or get_retry_policy()
+    threshold = _hedge_threshold_ms(policy) if hedge else None
+
+    for attempt in range(1, policy.max_attempts + 1):
+        t0 = time.perf_counter()
+        try:
+            if threshold:
+                result, hedge_won = await _arun_hedged(fn, threshold, label, attempt)
+            else:
+                result, hedge_won = await fn(), False
+        except Exception as e:
+            delay_ms = _after_failure(policy, attempt, e, t0, label, deadline)
+            if delay_ms is None:
+                raise
+            await asyncio.sleep(delay_ms / 1000.0)
+            continue
+
+        _after_success(attempt, t0, label, threshold, hedge_won)
+        return result
@@ -0,0 +1,114 @@
+# src/config/model_router.py
+"""
+Complexity-based model routing.
+
+Each request is scored locally (no model call) from the message length,
+images, math/LaTeX markers and the page. Only turns with a positive trivial
+signal (a bare greeting or thanks, a short FAQ about prices, dates or
+contact) go to a small, fast model; everything else, including any turn with
+no signal at all, to the main model from get_model_config().
+
+Env (optional):
+- MODEL_ROUTER_ENABLED  (default: "0")
+- OPENAI_FAST_MODEL     (default: gpt-4.1-nano)
+"""
+import os
+import re
+from dataclasses import dataclass, replace
+from typing import List
+
+from src.config.model_config import ModelConfig, get_model_config
+from src.config.page_vectorstores import get_page_key
+
+_MATH_RE = re.compile(
+    r"(\$|\\\(|\\\[|\\frac|\\sqrt|\^|√|∫|≤|≥|π"
+    r"|\d\s*[-+*/×÷=<>]\s*\d"
+    r"|\b(?:resuelve|resolver|calcula|calcular|demuestra|despeja|deriva|derivada|integral|ecuaci[oó]n"
+    r"|funci[oó]n|probabilidad|porcentaje|velocidad|aceleraci[oó]n|fuerza|energ[ií]a|paso a paso)\b)",
+    re.IGNORECASE,
+)
+# The whole message is a greeting/thanks ("hola", "¡Muchas gracias!"), not a question that opens with one
+_GREETING_RE = re.compile(
+    r"^\W*(?:muchas\s+)?(?:hola|buen[oa]s(?:\s+(?:d[ií]as|tardes|noches))?|gracias|ok|vale|listo|perfecto"
+    r"|chao|adi[oó]s|hi|hello|thanks)(?:\s+roma)?\W*$",
+    re.IGNORECASE,
+)
+_FAQ_RE = re.compile(
+    r"\b(?:precio|cu[aá]nto cuesta|costo|pago|inscripci[oó]n|fecha|horario|cu[aá]ndo es|contacto|whatsapp)\b",
+    re.IGNORECASE,
+)
+# Peso amounts like "$50.000" are neither LaTeX delimiters nor math markers
+_PRICE_RE = re.compile(r"\$\s?\d{1,3}(?:[.,]\d{3})+(?:[.,]\d+)?|\$\s?\d+\s?(?:COP|pesos|mil)\b", re.IGNORECASE)
+# Subject pages where questions are usually worked problems
+_SUBJECT_PAGES = ("matematicas", "ciencias-naturales", "analisis-de-imagen")
+
+
+@dataclass(frozen=True)
+class Route:
+    name: str            # "fast" | "main"
+    config: ModelConfig
+    score: int
+    reasons: List[str]
+
+
+def router_enabled() -> bool:
+    return os.getenv("MODEL_ROUTER_ENABLED", "0").strip().lower() in ("1", "true", "yes")
+
+
+def get_fast_model_config() -> ModelConfig:
+    return replace(get_model_config(), model=os.getenv("OPENAI_FAST_MODEL", "gpt-4.1-nano"))
+
+
+def score_request(message: str | None, has_images: bool, page: str | None) -> tuple:
+    """Return (score, reasons). score < 0 (a trivial signal) means the fast model is enough."""
+    text = message or ""
+    score, reasons = 0, []
+    if has_images:
+        score += 3
+        reasons.append("images")
+    math_hits = len(_MATH_RE.findall(_PRICE_RE.sub(" ", text)))
+    if math_hits:
+        score += 2 + min(math_hits, 3)
+        reasons.append(f"math:{math_hits}")
+    if len(text) > 400:
+        score += 2
+        reasons.append("long")
+    elif len(text) > 160:
+        score += 1
+        reasons.append("medium")
+    if any(p in get_page_key(page) for p in _SUBJECT_PAGES):
+        score += 1
+        reasons.append("subject_page")
+    if _GREETING_RE.match(text):
+        score -= 2
+        reasons.append("greeting")
+    elif _FAQ_RE.search(text) and len(text) <= 160:
+        score -= 2
+        reasons.append("faq")
+    return score, reasons
+
+
+def route_request(message: str | None, has_images: bool, page: str | None) -> Route:
+    """Pick the model for this turn. With routing disabled, always the main model."""
+    main = get_model_config()
+    if not router_enabled():
+        return Route(name="main", config=main, score=0, reasons=["router_disabled"])
+    score, reasons = score_request(message, has_images, page)
+    if score < 0:
+        return Route(name="fast", config=get_fast_model_config(), score=score, reasons=reasons)
+    return Route(name="main", config=main, score=score, reasons=reasons)
+
+
+def looks_truncated(text: str | None, incomplete: bool = False) -> bool:
+    """
+    Heuristic check on a fast-model answer: empty, flagged incomplete by the
+    API, or cut off mid-formula (unbalanced $ / $$ or \\begin without \\end).
+    """
+    if incomplete or not text or not text.strip() or "No assistant response" in text:
+        return True
+    text = _PRICE_RE.sub("", text)
+    if text.count("$$") % 2 or (text.replace("$$", "").count("$") % 2):
+        return True
+    if text.count("\\begin{") != text.count("\\end{"):
+        return True
+    return False
@@ -0,0 +1,283 @@
+# src/config/openai_client.py
+"""
+Process-wide OpenAI client registry.
+
+The client (and its httpx connection pool) is built once per container and
+reused across warm Lambda invocations, so only the first request pays for the
+TCP + TLS handshake. The registry rebuilds the client when OPENAI_API_KEY
+rotates and keeps connection-reuse counters for logging.
+
+Env (optional):
+- OPENAI_HTTP_MAX_CONNECTIONS    (default: 20)
+- OPENAI_HTTP_MAX_KEEPALIVE      (default: 10)
+- OPENAI_HTTP_KEEPALIVE_EXPIRY   (default: 120 seconds)
+- OPENAI_HTTP2                   (default: "0"; requires the 'h2' package)
+- OPENAI_CONNECT_TIMEOUT         (default: 5 seconds)
+- OPENAI_READ_TIMEOUT            (default: 60 seconds)
+- OPENAI_WRITE_TIMEOUT           (default: 10 seconds)
+- OPENAI_POOL_TIMEOUT            (default: 5 seconds)
+- OPENAI_MAX_RETRIES             (default: 0; retries live in assistant.resilience)
+"""
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+if TYPE_CHECKING:
+    import httpx
+    import openai
+
+# httpx/openai are imported when the first client is built: handlers that
+# never call the model (and cold starts before the first call) skip them.
+
+
+@dataclass(frozen=True)
+class PoolConfig:
+    max_connections: int
+    max_keepalive: int
+    keepalive_expiry: float
+    http2: bool
+    connect_timeout: float
+    read_timeout: float
+    write_timeout: float
+    pool_timeout: float
+    max_retries: int
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def _h2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def get_pool_config() -> PoolConfig:
+    http2 = os.getenv("OPENAI_HTTP2", "0").strip().lower() in ("1", "true", "yes")
+    return PoolConfig(
+        max_connections=max(1, _env_int("OPENAI_HTTP_MAX_CONNECTIONS", 20)),
+        max_keepalive=max(0, _env_int("OPENAI_HTTP_MAX_KEEPALIVE", 10)),
+        keepalive_expiry=max(0.0, _env_float("OPENAI_HTTP_KEEPALIVE_EXPIRY", 120.0)),
+        # HTTP/2 silently falls back to HTTP/1.1 keep-alive when 'h2' is missing
+        http2=http2 and _h2_available(),
+        connect_timeout=_env_float("OPENAI_CONNECT_TIMEOUT", 5.0),
+        read_timeout=_env_float("OPENAI_READ_TIMEOUT", 60.0),
+        write_timeout=_env_float("OPENAI_WRITE_TIMEOUT", 10.0),
+        pool_timeout=_env_float("OPENAI_POOL_TIMEOUT", 5.0),
+        max_retries=max(0, _env_int("OPENAI_MAX_RETRIES", 0)),
+    )
+
+
+# -------- Connection-reuse counters --------
+_stats_lock = threading.Lock()
+_stats: Dict[str, Any] = {
+    "clients_built": 0,
+    "key_rotations": 0,
+    "requests": 0,
+    "new_connections": 0,
+    "reused_connections": 0,
+    "handshake_ms_total": 0.0,
+}
+
+
+def _bump(key: str, amount: float = 1) -> None:
+    with _stats_lock:
+        _stats[key] += amount
+
+
+def _make_trace():
+    """
+    httpcore trace callback for one request. connect_tcp/start_tls events only
+    fire when the pool opens a new connection, so their absence means reuse.
+    """
+    state = {"connected": False, "t0": None}
+
+    def trace(event_name: str, _info: dict) -> None:
+        if event_name == "connection.connect_tcp.started":
+            state["t0"] = time.perf_counter()
+        elif event_name in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+            if event_name == "connection.connect_tcp.complete":
+                state["connected"] = True
+                _bump("new_connections")
+            if state["t0"] is not None:
+                now = time.perf_counter()
+                _bump("handshake_ms_total", (now - state["t0"]) * 1000.0)
+                state["t0"] = now
+        elif event_name.endswith("send_request_headers.started") and not state["connected"]:
+            _bump("reused_connections")
+
+    return trace
+
+
+def _on_request(request: "httpx.Request") -> None:
+    _bump("requests")
+    request.extensions["trace"] = _make_trace()
+
+
+async def _on_request_async(request: "httpx.Request") -> None:
+    # httpx.AsyncClient awaits its hooks and httpcore awaits the trace callback
+    _bump("requests")
+    trace = _make_trace()
+
+    async def atrace(event_name: str, info: dict) -> None:
+        trace(event_name, info)
+
+    request.extensions["trace"] = atrace
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """
+    Snapshot of the connection-reuse counters since the container started.
+    avg_handshake_ms approximates the latency saved by each reused connection.
+    """
+    with _stats_lock:
+        snap = dict(_stats)
+    new = snap["new_connections"]
+    snap["avg_handshake_ms"] = round(snap["handshake_ms_total"] / new, 2) if new else None
+    snap["handshake_ms_total"] = round(snap["handshake_ms_total"], 2)
+    snap["est_saved_ms"] = (
+        round(snap["avg_handshake_ms"] * snap["reused_connections"], 2)
+        if snap["avg_handshake_ms"] is not None else None
+    )
+    return snap
+
+
+# -------- Registry --------
+_lock = threading.Lock()
+_client: Optional["openai.OpenAI"] = None
+_client_key: Optional[str] = None
+# Async clients are bound to the event loop their connections were opened on
+_async_client: Optional["openai.AsyncOpenAI"] = None
+_async_key: Optional[Tuple[str, int]] = None
+
+
+def _http_options(cfg: PoolConfig) -> Dict[str, Any]:
+    import httpx
+
+    return dict(
+        http2=cfg.http2,
+        limits=httpx.Limits(
+            max_connections=cfg.max_connections,
+            max_keepalive_connections=cfg.max_keepalive,
+            keepalive_expiry=cfg.keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(
+            connect=cfg.connect_timeout,
+            read=cfg.read_timeout,
+            write=cfg.write_timeout,
+            pool=cfg.pool_timeout,
+        ),
+    )
+
+
+def _build_client(api_key: str, cfg: PoolConfig) -> "openai.OpenAI":
+    import httpx
+    import openai
+
+    http_client = httpx.Client(**_http_options(cfg), event_hooks={"request": [_on_request]})
+    return openai.OpenAI(
+        api_key=api_key,
+        http_client=http_client,
+        max_retries=cfg.max_retries,
+    )
+
+
+def get_client(api_key: str) -> "openai.OpenAI":
+    """
+    Return the shared client for this container, building it on first use.
+
+    If api_key differs from the key the current client was built with (key
+    rotation), a new client is built and swapped in. The previous client is
+    not closed here, so requests already in flight on it can finish; its
+    pooled sockets are released when it is garbage-collected.
+    """
+    global _client, _client_key
+    client = _client
+    if client is not None and _client_key == api_key:
+        return client
+
+    with _lock:
+        if _client is not None and _client_key == api_key:
+            return _client
+        if _client is not None:
+            _bump("key_rotations")
+        _client = _build_client(api_key, get_pool_config())
+        _client_key = api_key
+        _bump("clients_built")
+        return _client
+
+
+def _build_async_client(api_key: str, cfg: PoolConfig) -> "openai.AsyncOpenAI":
+    import httpx
+    import openai
+
+    http_client = httpx.AsyncClient(**_http_options(cfg), event_hooks={"request": [_on_request_async]})
+    return openai.AsyncOpenAI(
+        api_key=api_key,
+        http_client=http_client,
+        max_retries=cfg.max_retries,
+    )
+
+
+def get_async_client(api_key: str) -> "openai.AsyncOpenAI":
+    """
+    Async counterpart of get_client() for the async chat path, with the same
+    pool limits and reuse counters. Must be called from a running event loop.
+
+    httpx async connections belong to the loop that opened them, so the client
+    is rebuilt when the key rotates or the running loop changes (e.g. a new
+    asyncio.run() per Lambda invocation); within one loop it is shared.
+    """
+    import asyncio
+
+    global _async_client, _async_key
+    key = (api_key, id(asyncio.get_running_loop()))
+    client = _async_client
+    if client is not None and _async_key == key:
+        return client
+
+    with _lock:
+        if _async_client is not None and _async_key == key:
+            return _async_client
+        if _async_client is not None and _async_key[0] != api_key:
+            _bump("key_rotations")
+        # The previous client is left for the GC: its sockets belong to another loop
+        _async_client = _build_async_client(api_key, get_pool_config())
+        _async_key = key
+        _bump("clients_built")
+        return _async_client
+
+
+def reset_client() -> None:
+    """
+    Close and drop the shared client (tests, or forcing a rebuild after an
+    auth failure). The next get_client() call builds a fresh one. The async
+    client is dropped too; get_async_client() builds a new one.
+    """
+    global _client, _client_key, _async_client, _async_key
+    with _lock:
+        old = _client
+        _client = None
+        _client_key = None
+        _async_client = None
+        _async_key = None
+    if old is not None:
+        try:
+            old.close()
+        except Exception:
+            pass
@@ -6,11 +6,29 @@ Page → Vector Store resolver.
 - If the page matches a known component, return [specific_store, global].
 - Otherwise return [global].
 - Env vars must be set in .env (VECTOR_STORE_*).
+
+Routes are compiled into a trie over path segments; the longest matching
+prefix wins, and resolutions are memoized per raw page string. The built-in
+routes below can be extended or overridden without a redeploy from:
+
+- PAGE_ROUTES_FILE   JSON or YAML (YAML needs PyYAML):
+                       {"global": "vs_...", "routes": {"/simulacro-x/y": "vs_..."}}
+- PAGE_ROUTES_TABLE  DynamoDB table (see storage/page_routes_table.py)
+
+A store id written as "$VECTOR_STORE_X" is read from that env var. Sources
+are re-read every PAGE_ROUTES_TTL_SECONDS (default 300; the file only when
+its mtime changed); a failed reload keeps the current routes.
 """
 
+import json
 import os
+import threading
+import time
+from dataclasses import dataclass, field
 from urllib.parse import urlparse
-from typing import List
+from typing import Dict, List, Optional, Tuple
+
+from src.utils.logging_utils import log_event
 
 # Single global store
 VSTORE_GLOBAL = os.getenv("VECTOR_STORE_GLOBAL", "")
@@ -56,6 +74,167 @@ def _normalize_path(page: str | None) -> str:
     return path.lower()
 
 
+def normalize_page_path(page: str | None) -> str:
+    """Lowercased path of a page URL or path, without host or query string."""
+    return _normalize_path(page)
+
+
+def _segments(path: str) -> List[str]:
+    return [seg for seg in path.split("/") if seg]
+
+
+@dataclass
+class _Node:
+    children: Dict[str, "_Node"] = field(default_factory=dict)
+    prefix: Optional[str] = None   # set when a route ends here
+    store: str = ""
+
+
+class RouteTable:
+    """Compiled longest-prefix matcher with a bounded resolution memo."""
+
+    def __init__(self, routes: Dict[str, str], global_store: str = "", memo_size: int = 4096):
+        self.global_store = global_store
+        self.route_count = 0
+        self._root = _Node()
+        self._memo: Dict[str, Tuple[str, Tuple[str, ...]]] = {}
+        self._memo_size = memo_size
+        for prefix, store in routes.items():
+            self._add(prefix, store)
+
+    def _add(self, prefix: str, store: str) -> None:
+        path = _normalize_path(prefix).rstrip("/")
+        if not path:
+            return  # "/" is the default route, not a prefix
+        node = self._root
+        for seg in _segments(path):
+            node = node.children.setdefault(seg, _Node())
+        node.prefix, node.store = path, store or ""
+        self.route_count += 1
+
+    def _match(self, path: str) -> Tuple[str, str]:
+        """(deepest matching route, deepest matching route that has a store)."""
+        node, key, store = self._root, "/", ""
+        for seg in _segments(path):
+            node = node.children.get(seg)
+            if node is None:
+                break
+            if node.prefix is not None:
+                key = node.prefix
+                if node.store:
+                    store = node.store
+        return key, store
+
+    def resolve(self, page: str | None) -> Tuple[str, Tuple[str, ...]]:
+        """(page key, vector store ids by priority) for a raw page URL or path."""
+        raw = page or ""
+        hit = self._memo.get(raw)
+        if hit is not None:
+            return hit
+        key, specific = self._match(_normalize_path(page))
+        stores = [specific] if specific else []
+        if self.global_store and self.global_store not in stores:
+            stores.append(self.global_store)
+        result = (key, tuple(stores))
+        if len(self._memo) >= self._memo_size:
+            self._memo.clear()  # cheap bound; hot pages re-fill it immediately
+        self._memo[raw] = result
+        return result
+
+
+# -------- Route sources + hot reload --------
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def _expand(value) -> str:
+    value = str(value or "").strip()
+    return os.getenv(value[1:], "") if value.startswith("$") else value
+
+
+def _read_routes_file(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    if path.endswith((".yaml", ".yml")):
+        import yaml  # optional dependency, only for YAML route files
+        data = yaml.safe_load(text) or {}
+    else:
+        data = json.loads(text)
+    return data if isinstance(data, dict) else {}
+
+
+def _load_sources() -> Tuple[Dict[str, str], str]:
+    routes = dict(_PAGE_MAP)
+    global_store = VSTORE_GLOBAL
+
+    path = os.getenv("PAGE_ROUTES_FILE", "")
+    if path:
+        data = _read_routes_file(path)
+        routes.update({p: _expand(sid) for p, sid in (data.get("routes") or {}).items()})
+        if data.get("global"):
+            global_store = _expand(data["global"])
+
+    if os.getenv("PAGE_ROUTES_TABLE", ""):
+        from src.storage.page_routes_table import list_page_routes
+        extra = list_page_routes()
+        if extra.get("global"):
+            global_store = _expand(extra.pop("global"))
+        routes.update({p: _expand(sid) for p, sid in extra.items()})
+
+    return routes, global_store
+
+
+def _file_mtime() -> Optional[float]:
+    path = os.getenv("PAGE_ROUTES_FILE", "")
+    try:
+        return os.path.getmtime(path) if path else None
+    except OSError:
+        return None
+
+
+_state = {"table": None, "loaded_at": 0.0, "mtime": None}
+_reload_lock = threading.Lock()
+
+
+def reload_routes() -> RouteTable:
+    """Rebuild the route table from env + file + config table now."""
+    with _reload_lock:
+        try:
+            routes, global_store = _load_sources()
+            table = RouteTable(routes, global_store)
+            log_event("page_routes_loaded", {"routes": table.route_count, "has_global": bool(global_store)})
+        except Exception as e:
+            table = _state["table"] or RouteTable(dict(_PAGE_MAP), VSTORE_GLOBAL)
+            log_event("page_routes_reload_failed", {"routes": table.route_count}, level="warning", error=e)
+        _state.update(table=table, loaded_at=time.monotonic(), mtime=_file_mtime())
+        return table
+
+
+def _route_table() -> RouteTable:
+    table = _state["table"]
+    if table is None:
+        return reload_routes()
+    if time.monotonic() - _state["loaded_at"] < _env_int("PAGE_ROUTES_TTL_SECONDS", 300):
+        return table
+    only_file = not os.getenv("PAGE_ROUTES_TABLE", "")
+    if only_file and _file_mtime() == _state["mtime"]:
+        _state["loaded_at"] = time.monotonic()  # nothing changed; check again after the next TTL
+        return table
+    return reload_routes()
+
+
+def get_page_key(page: str | None) -> str:
+    """
+    Stable, low-cardinality key for a page: the deepest matching route
+    (deeper pages collapse onto their prefix), or "/" for unknown pages.
+    Used for prompt-cache keys and metric dimensions.
+    """
+    return _route_table().resolve(page)[0]
+
+
 def get_stores_for_page(page: str | None) -> List[str]:
     """
     Returns vector_store_ids ordered by priority.
@@ -63,21 +242,4 @@ def get_stores_for_page(page: str | None) -> List[str]:
     - Unknown page:    [global]
     Ensures at least one id if VECTOR_STORE_GLOBAL is set.
     """
-    path = _normalize_path(page)
-
-    specific = _PAGE_MAP.get(path)
-    # prefix match for deeper routes
-    if not specific:
-        for prefix, sid in _PAGE_MAP.items():
-            if sid and (path == prefix or path.startswith(prefix + "/")):
-                specific = sid
-                break
-
-    stores: List[str] = []
-    if specific:
-        stores.append(specific)
-
-    if VSTORE_GLOBAL and VSTORE_GLOBAL not in stores:
-        stores.append(VSTORE_GLOBAL)
-
-    return stores
+    return list(_route_table().resolve(page)[1])
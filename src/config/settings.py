@@ -1,20 +1,36 @@
 # src/config/settings.py
 import os
-from dotenv import load_dotenv
-import openai
 
-# Load .env file once
-load_dotenv()
+from src.config.openai_client import get_async_client, get_client
+
+# Load .env file once, for local runs only (Lambda gets its env from the
+# function configuration, so the import is skipped there)
+if not os.getenv("AWS_LAMBDA_FUNCTION_NAME"):
+    from dotenv import load_dotenv
+    load_dotenv()
 
 def get_openai_client():
     """
-    Returns an authenticated OpenAI client instance using the API key from .env.
+    Returns the shared, pooled OpenAI client using the API key from .env.
+    The client is built once per container and rebuilt if the key rotates.
+    """
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY not found in environment variables")
+
+    return get_client(api_key)
+
+
+def get_async_openai_client():
+    """
+    Async counterpart of get_openai_client() (openai.AsyncOpenAI on the same
+    pool settings). Call it from inside the running event loop.
     """
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         raise ValueError("OPENAI_API_KEY not found in environment variables")
-    
-    return openai.Client(api_key=api_key)
+
+    return get_async_client(api_key)
 
 
 def get_vector_search_max_results() -> int:
@@ -26,3 +42,13 @@ def get_vector_search_max_results() -> int:
         return int(os.getenv("VECTOR_SEARCH_MAX_RESULTS", "8"))
     except ValueError:
         return 8
+
+
+def get_retrieval_mode() -> str:
+    """
+    "file_search" (default): hosted file_search tool on the page's stores.
+    "local": top-k chunks from the in-process index (assistant/local_retrieval.py),
+    injected as context; falls back to file_search for stores without a local index.
+    """
+    mode = os.getenv("RETRIEVAL_MODE", "file_search").strip().lower()
+    return mode if mode in ("file_search", "local") else "file_search"
@@ -57,6 +57,9 @@ def build_system_instructions(extras: Optional[Iterable[str]] = None) -> str:
     """
     Returns the full system prompt. Optionally appends runtime signals (extras)
     such as: current date/time, resolved page, and user identity hints.
+
+    Extras are appended in the given order; pass them from most to least
+    stable (page, then date, then user) so the provider can cache the prefix.
     """
     blocks = [BASE_SYSTEM_INSTRUCTIONS]
     if extras:
@@ -1,8 +1,13 @@
 # src/lambda_chat_handler.py
 import json
 import logging
-from src.services.chat_service import get_ai_response
-from src.utils.logging_utils import log_event, set_invocation_context  # 👈 add context hook
+from src.services.chat_service import get_ai_response, stream_ai_response
+from src.services import chat_jobs, idempotency
+from src.config.openai_client import get_pool_stats
+from src.utils.logging_utils import log_event, set_invocation_context, flush_metrics, flush_logs  # 👈 add context hook
+from src.utils.sse_utils import iter_sse
+from src.assistant.resilience import reset_retry_budget
+from src.utils.deadline import Deadline, DeadlineExceeded
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -17,9 +22,32 @@ def _none_if_empty(val):
     return val
 
 
+def _client_idempotency_key(event: dict, body: dict):
+    """Idempotency-Key header (any case) or body.idempotencyKey."""
+    headers = (event or {}).get("headers") or {}
+    for k, v in headers.items():
+        if k.lower() == "idempotency-key" and v:
+            return v
+    return body.get("idempotencyKey")
+
+
 def lambda_handler(event, context):
+    try:
+        return _handle(event, context)
+    finally:
+        # Per-stage latencies for this invocation as EMF lines (stage_latency_ms)
+        flush_metrics()
+        flush_logs()  # queued log records must be written before the container freezes
+
+
+def _handle(event, context):
     # Attach AWS context to all subsequent logs (function, request_id, etc.)
     set_invocation_context(context)
+    reset_retry_budget()
+
+    # Time budget: Lambda remaining time, capped by the API Gateway timeout
+    deadline = Deadline.for_api_gateway(context)
+    body = {}
 
     try:
         # Log raw event (lightweight)
@@ -28,63 +56,222 @@ def lambda_handler(event, context):
             "has_body": "body" in (event or {}),
         })
 
-        # Parse request body
-        body = json.loads(event.get("body", "{}"))
-
-        # ---- Raw inputs from client ----
-        message     = body.get("message")                # Optional text
-        image_urls  = body.get("imageUrls", [])          # Optional list of image URLs
-        user_id     = body.get("userId")                 # Null/None for guests
-        name        = body.get("name")
-        email       = body.get("email")
-        page        = body.get("page")
-        conversation_id_in = body.get("conversationId")  # Optional conversation reuse
-
-        # ---- Normalize / sanitize ----
-        user_id = user_id or "anonymous"
-        name = name if isinstance(name, str) else (name or "")
-        email = _none_if_empty(email)  # '' -> None so we can omit Email in Dynamo
-        page = page or "/"
-        if not isinstance(image_urls, list):
-            image_urls = []
-
-        # Validate input: require at least message or images
-        if not message and not image_urls:
-            log_event("input_validation_failed", {
-                "reason": "Missing message or imageUrls",
-                "has_message": bool(message),
-                "image_count": len(image_urls or []),
-            }, level="warning")
-            return response(400, {"error": "Missing message or imageUrls"})
+        job_id = polled_job_id(event)
+        if job_id:
+            return job_status_response(job_id, event)
 
-        # Call service layer
-        ai_reply, conversation_id = get_ai_response(
-            message=message,
-            user_id=user_id,
-            name=name,
-            email=email,                    # already normalized
-            page=page,
-            conversation_id=conversation_id_in,
-            image_urls=image_urls
-        )
-
-        log_event("chat_response_success", {
-            "user_id": user_id,
-            "conversation_id": conversation_id,
-            "reply_snippet": (ai_reply or "")[:100]
-        })
+        request, body = parse_chat_request(event)
+        invalid = validate_chat_request(request)
+        if invalid is not None:
+            return invalid
 
-        return response(200, {
-            "reply": ai_reply,
-            "conversationId": conversation_id
-        })
+        if request.pop("stream"):
+            return _stream_response(**request, deadline=deadline)
+
+        # Burst mode: queue the request for the chat worker and answer 202 at once
+        if chat_jobs.wants_job(event, body):
+            job = chat_jobs.submit(body, request["user_id"], request["page"])
+            if job is not None:
+                return response(202, job)
+
+        # Call service layer
+        ai_reply, conversation_id = get_ai_response(**request, deadline=deadline)
+        return chat_success(request["user_id"], ai_reply, conversation_id)
 
     except Exception as e:
-        # Capture stack trace in CloudWatch (via logging_utils)
-        log_event("lambda_exception", {
-            "source": "RomaChatHandler"
-        }, level="error", error=e)
-        return response(500, {"error": "Internal error"})
+        return chat_error_response(e, body)
+
+
+def polled_job_id(event: dict):
+    """jobId of a poll: GET with a path/query jobId, or a body holding only a jobId."""
+    event = event or {}
+    for params in (event.get("pathParameters"), event.get("queryStringParameters")):
+        if params and params.get("jobId"):
+            return params["jobId"]
+    if (event.get("httpMethod") or "").upper() == "GET":
+        return None
+    try:
+        body = json.loads(event.get("body") or "{}")
+    except ValueError:
+        return None
+    if isinstance(body, dict) and body.get("jobId") and not body.get("message") and not body.get("imageUrls"):
+        return body["jobId"]
+    return None
+
+
+def _poller_user_id(event: dict) -> str:
+    """userId of a poll (query/path parameter or body), "anonymous" for guests."""
+    event = event or {}
+    for params in (event.get("pathParameters"), event.get("queryStringParameters")):
+        if params and params.get("userId"):
+            return params["userId"]
+    try:
+        body = json.loads(event.get("body") or "{}")
+    except ValueError:
+        body = {}
+    return (body.get("userId") if isinstance(body, dict) else None) or "anonymous"
+
+
+def job_status_response(job_id: str, event: dict):
+    """
+    200 with the job's status (reply once done), or 404 for an unknown or
+    expired job, or one submitted by another userId.
+    """
+    job = chat_jobs.status(str(job_id), _poller_user_id(event))
+    if job is None:
+        return response(404, {"error": "Unknown job"})
+    return response(200, job)
+
+
+def parse_chat_request(event: dict):
+    """
+    Parse and normalize the request body. Returns (request, body): request
+    holds get_ai_response's keyword arguments plus "stream"; body is the raw
+    JSON body, carrying the resolved idempotency key for a job hand-off.
+    Shared with the container server (src/asgi_server.py).
+    """
+    # Parse request body
+    body = json.loads(event.get("body", "{}"))
+
+    # ---- Raw inputs from client ----
+    message     = body.get("message")                # Optional text
+    image_urls  = body.get("imageUrls", [])          # Optional list of image URLs
+    user_id     = body.get("userId")                 # Null/None for guests
+    name        = body.get("name")
+    email       = body.get("email")
+    page        = body.get("page")
+    conversation_id_in = body.get("conversationId")  # Optional conversation reuse
+    stream      = bool(body.get("stream"))           # Optional SSE streaming mode
+
+    # ---- Normalize / sanitize ----
+    user_id = user_id or "anonymous"
+    name = name if isinstance(name, str) else (name or "")
+    email = _none_if_empty(email)  # '' -> None so we can omit Email in Dynamo
+    page = page or "/"
+    if not isinstance(image_urls, list):
+        image_urls = []
+
+    # Same key for browser double-submits, API Gateway retries and DLQ replays
+    idempotency_key = idempotency.resolve_key(
+        _client_idempotency_key(event, body), user_id, conversation_id_in, message, image_urls, page,
+    )
+    if idempotency_key:
+        body["idempotencyKey"] = idempotency_key
+
+    request = {
+        "message": message,
+        "user_id": user_id,
+        "name": name,
+        "email": email,                    # already normalized
+        "page": page,
+        "conversation_id": conversation_id_in,
+        "image_urls": image_urls,
+        "idempotency_key": idempotency_key,
+        "stream": stream,
+    }
+    return request, body
+
+
+def validate_chat_request(request: dict):
+    """Require at least message or images; returns the 400 response, or None when valid."""
+    if not request["message"] and not request["image_urls"]:
+        log_event("input_validation_failed", {
+            "reason": "Missing message or imageUrls",
+            "has_message": bool(request["message"]),
+            "image_count": len(request["image_urls"] or []),
+        }, level="warning")
+        return response(400, {"error": "Missing message or imageUrls"})
+    return None
+
+
+def chat_success(user_id, ai_reply: str, conversation_id: str):
+    log_event("chat_response_success", {
+        "user_id": user_id,
+        "conversation_id": conversation_id,
+        "reply_snippet": (ai_reply or "")[:100]
+    })
+
+    # Connection reuse across warm invocations (pooled OpenAI client)
+    log_event("openai_pool_stats", get_pool_stats())
+
+    return response(200, {
+        "reply": ai_reply,
+        "conversationId": conversation_id
+    })
+
+
+def chat_error_response(e: Exception, body: dict):
+    """Map a failed chat request to its response (409 / 202 with a pollable job or 503 / 500)."""
+    if isinstance(e, idempotency.DuplicateRequestInFlight):
+        # The first attempt is still running; the client should retry shortly
+        return response(409, {"error": "Duplicate request in progress, please retry"})
+
+    if isinstance(e, DeadlineExceeded):
+        # Not enough time left for a model call: hand it to the chat worker as a
+        # job and fail fast. A conversation created before the check goes with
+        # it, so the worker continues it instead of opening a second one.
+        if getattr(e, "conversation_id", None) and body and not body.get("conversationId"):
+            body["conversationId"] = e.conversation_id
+        job = _submit_job(body)
+        log_event("deadline_fail_fast", {
+            "source": "RomaChatHandler",
+            "reason": str(e),
+            "queued_for_retry": job is not None,
+            "job_id": job["jobId"] if job else None,
+            "conversation_id": body.get("conversationId") if body else None,
+        }, level="warning")
+        if job is not None:
+            # Accepted: the client polls the job for the reply. Asking it to retry
+            # as well would pay for (and write) the turn twice.
+            return response(202, job)
+        return response(503, {"error": "Service busy, please retry", "queued": False})
+
+    # Capture stack trace in CloudWatch (via logging_utils)
+    log_event("lambda_exception", {
+        "source": "RomaChatHandler"
+    }, level="error", error=e)
+    return response(500, {"error": "Internal error"})
+
+
+def _submit_job(body: dict):
+    """Queue the original request body as a chat job (needs CHAT_JOB_QUEUE_URL); None when it can't be."""
+    if not body:
+        return None
+    return chat_jobs.submit(body, body.get("userId") or "anonymous", body.get("page") or "/")
+
+
+STREAM_HEADERS = {
+    "Content-Type": "text/event-stream; charset=utf-8",
+    "Cache-Control": "no-cache",
+    "Access-Control-Allow-Origin": "*"
+}
+
+
+def _stream_response(**kwargs):
+    """
+    Run the streaming pipeline and return its output as a text/event-stream body.
+
+    The Python Lambda runtime has no native response streaming, so behind API
+    Gateway the frames are buffered into one body. Hosts that can stream (a
+    Function URL behind a web adapter, or the container server) should iterate
+    stream_ai_response()/iter_sse() directly to get time-to-first-token.
+    """
+    frames = list(iter_sse(stream_ai_response(**kwargs)))
+    log_stream_success(kwargs.get("user_id"), len(frames))
+
+    return {
+        "statusCode": 200,
+        "headers": dict(STREAM_HEADERS),
+        "body": "".join(frames)
+    }
+
+
+def log_stream_success(user_id, frame_count: int) -> None:
+    log_event("chat_stream_success", {
+        "user_id": user_id,
+        "frame_count": frame_count,
+    })
+    log_event("openai_pool_stats", get_pool_stats())
 
 
 def response(status_code, body):
@@ -0,0 +1,35 @@
+# src/lambda_chat_worker.py
+import logging
+
+from src.lambda_dlq_reprocessor import process_records
+from src.utils.logging_utils import log_event, set_invocation_context, flush_metrics, flush_logs
+from src.assistant.resilience import reset_retry_budget
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+def lambda_handler(event, context):
+    """
+    Triggered by the chat job queue (CHAT_JOB_QUEUE_URL). Runs each queued
+    chat request through get_ai_response and stores the reply under its job
+    id (src/services/chat_jobs.py), using the DLQ reprocessor's batch
+    pipeline: conversations in parallel, each one in order, deadline-aware.
+
+    Returns an SQS partial batch response (ReportBatchItemFailures), so only
+    failed jobs are redelivered; point the queue's redrive policy at the
+    chat DLQ so the reprocessor picks up jobs that keep failing.
+    Concurrency is set on the event source mapping (maximum concurrency),
+    which is what keeps a class-wide burst from throttling the account.
+    """
+    set_invocation_context(context)
+    reset_retry_budget()
+    records = (event or {}).get("Records", []) or []
+    result = process_records(records, context)
+    log_event("chat_job_batch_completed", {
+        "record_count": len(records),
+        "failed_count": len(result["batchItemFailures"]),
+    })
+    flush_metrics()
+    flush_logs()
+    return result
@@ -1,70 +1,225 @@
 # src/lambda_dlq_reprocessor.py
 import json
 import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 from src.services.chat_service import get_ai_response
-from src.utils.logging_utils import log_event, set_invocation_context  # 👈 add context hook
+from src.services import chat_jobs, idempotency
+from src.utils.logging_utils import log_event, set_invocation_context, flush_metrics, flush_logs  # 👈 add context hook
+from src.assistant.resilience import reset_retry_budget
+from src.utils.deadline import Deadline
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 
-def lambda_handler(event, context):
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+# Upper bound on parallel model calls (DLQ traffic is often rate-limit fallout)
+MAX_WORKERS = max(1, _env_int("DLQ_MAX_WORKERS", 4))
+# Rough cost of one record (model call + writes): a record starts only if it still fits the deadline
+RECORD_ESTIMATE_MS = max(1, _env_int("DLQ_RECORD_ESTIMATE_MS", 15000))
+# Time kept in reserve to log and return before Lambda kills the invocation
+SAFETY_MS = max(0, _env_int("DLQ_SAFETY_MS", 3000))
+
+
+def _remaining_ms(context) -> int:
+    try:
+        return int(context.get_remaining_time_in_millis())
+    except Exception:
+        return 15 * 60 * 1000  # no context (local runs): assume the Lambda max
+
+
+def _conversation_key(record: dict) -> str:
     """
-    Triggered by SQS DLQ messages. Reprocesses failed chatbot requests.
+    Records of the same conversation share a key so they run in order.
+    Records without a conversationId (or with an unreadable body) run alone.
     """
-    # Attach AWS context to all logs (function name, request_id, etc.)
-    set_invocation_context(context)
+    try:
+        conv_id = json.loads(record.get("body", "{}")).get("conversationId")
+    except Exception:
+        conv_id = None
+    return f"conv:{conv_id}" if conv_id else f"msg:{record.get('messageId')}"
 
-    records = (event or {}).get("Records", []) or []
-    log_event("dlq_event_received", {"record_count": len(records)})
 
+def _group_records(records: list) -> list:
+    """Group records by conversation, preserving arrival order inside each group."""
+    groups: dict = {}
     for record in records:
-        try:
-            # Body contains the original event as JSON
-            body_raw = record.get("body", "{}")
-            body = json.loads(body_raw)
-
-            message     = body.get("message")
-            image_urls  = body.get("imageUrls", [])
-            user_id     = body.get("userId")
-            name        = body.get("name")
-            email       = body.get("email")
-            page        = body.get("page")
-            conv_id_in  = body.get("conversationId")
-
-            # Validate: require at least text or images
-            if not message and not image_urls:
-                log_event("dlq_skipped_message", {
-                    "reason": "No valid content (missing message and imageUrls)",
-                    "has_message": bool(message),
-                    "image_count": len(image_urls or [])
-                }, level="warning")
-                continue
-
-            # Retry processing the failed message
-            ai_reply, conversation_id = get_ai_response(
-                message=message,
-                user_id=user_id,
-                name=name,
-                email=email,
-                page=page,
-                conversation_id=conv_id_in,
-                image_urls=image_urls
-            )
-
-            log_event("dlq_reprocess_success", {
-                "user_id": user_id,
-                "page": page,
-                "conversation_id": conversation_id,
-                "reply_snippet": (ai_reply or "")[:100]
-            })
+        groups.setdefault(_conversation_key(record), []).append(record)
+    return list(groups.values())
+
+
+def _worker_count(group_count: int) -> int:
+    """
+    One worker per conversation group, up to DLQ_MAX_WORKERS: independent
+    conversations never wait on each other. The remaining time only decides
+    which records still start (see _run_group).
+    """
+    return max(1, min(MAX_WORKERS, group_count))
+
+
+def _process_record(record: dict, context=None) -> None:
+    """Reprocess one SQS record. Raises on failure so the record is retried."""
+    # Body contains the original event as JSON
+    body_raw = record.get("body", "{}")
+    try:
+        body = json.loads(body_raw)
+    except ValueError:
+        body = None
+    if not isinstance(body, dict):
+        # A redelivery can never succeed (nothing to retry → drop)
+        log_event("dlq_skipped_message", {
+            "reason": "invalid JSON",
+            "record_id": record.get("messageId"),
+        }, level="warning")
+        return
+
+    message     = body.get("message")
+    image_urls  = body.get("imageUrls", [])
+    user_id     = body.get("userId")
+    name        = body.get("name")
+    email       = body.get("email")
+    page        = body.get("page")
+    conv_id_in  = body.get("conversationId")
+
+    # Validate: require at least text or images (nothing to retry → drop)
+    if not message and not image_urls:
+        log_event("dlq_skipped_message", {
+            "reason": "No valid content (missing message and imageUrls)",
+            "has_message": bool(message),
+            "image_count": len(image_urls or [])
+        }, level="warning")
+        return
+
+    # Queued chat jobs (src/services/chat_jobs.py) also store their reply under the job id
+    job_id = body.get("jobId")
+    if job_id and not chat_jobs.start(job_id):
+        return  # already done: a redelivered message
+
+    # Retry processing the failed message
+    try:
+        ai_reply, conversation_id = get_ai_response(
+            message=message,
+            user_id=user_id,
+            name=name,
+            email=email,
+            page=page,
+            conversation_id=conv_id_in,
+            image_urls=image_urls,
+            deadline=Deadline.from_context(context),
+            # Records that already succeeded (or are still running elsewhere) are not paid for twice
+            idempotency_key=idempotency.resolve_key(
+                body.get("idempotencyKey"), user_id, conv_id_in, message, image_urls, page, trusted=True,
+            ),
+        )
+    except Exception as e:
+        if job_id:
+            chat_jobs.fail_attempt(job_id, e)
+        raise
+
+    if job_id:
+        chat_jobs.finish(job_id, ai_reply, conversation_id, user_id=user_id)
 
+    log_event("dlq_reprocess_success", {
+        "user_id": user_id,
+        "page": page,
+        "conversation_id": conversation_id,
+        "reply_snippet": (ai_reply or "")[:100]
+    })
+
+
+def _run_group(group: list, context) -> list:
+    """
+    Process one conversation's records in order. After a failure (or when there
+    is no time left to start another record) the rest of the group is reported
+    as failed too, so the retry preserves the original order.
+    Returns the messageIds that failed.
+    """
+    for i, record in enumerate(group):
+        if _remaining_ms(context) - SAFETY_MS < RECORD_ESTIMATE_MS:
+            log_event("dlq_deadline_deferred", {
+                "deferred_count": len(group) - i,
+                "remaining_ms": _remaining_ms(context),
+            }, level="warning")
+            return [r.get("messageId") for r in group[i:]]
+        try:
+            _process_record(record, context)
         except Exception as e:
             # Capture stack trace via logging_utils
             log_event("dlq_reprocess_failed", {
                 "record_id": record.get("messageId"),
-                "approx_receive_count": record.get("attributes", {}).get("ApproximateReceiveCount")
+                "approx_receive_count": record.get("attributes", {}).get("ApproximateReceiveCount"),
+                "deferred_in_group": len(group) - i - 1,
             }, level="error", error=e)
+            return [r.get("messageId") for r in group[i:]]
+    return []
+
+
+def lambda_handler(event, context):
+    """
+    Triggered by SQS DLQ messages. Reprocesses failed chatbot requests.
+
+    Conversations run in parallel on a bounded pool; records of the same
+    conversation stay ordered. Returns an SQS partial batch response
+    (requires ReportBatchItemFailures on the event source mapping), so only
+    failed records are retried.
+    """
+    # Attach AWS context to all logs (function name, request_id, etc.)
+    set_invocation_context(context)
+    reset_retry_budget()
+    result = process_records((event or {}).get("Records", []) or [], context)
+    flush_metrics()
+    flush_logs()
+    return result
+
+
+def process_records(records: list, context) -> dict:
+    """
+    Reprocess a batch of SQS records within the time `context` reports and
+    return the partial batch response. Shared with the container server's
+    DLQ consumer (src/asgi_server.py), which flushes metrics on its own.
+    """
+    t0 = time.perf_counter()
+    groups = _group_records(records)
+    workers = _worker_count(len(groups))
+    log_event("dlq_event_received", {
+        "record_count": len(records),
+        "conversation_groups": len(groups),
+        "workers": workers,
+        "remaining_ms": _remaining_ms(context),
+    })
+
+    failed: list = []
+    lock = threading.Lock()
+
+    def run(group):
+        ids = _run_group(group, context)
+        with lock:
+            failed.extend(ids)
+
+    if workers == 1:
+        for group in groups:
+            run(group)
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dlq") as pool:
+            list(pool.map(run, groups))
+
+    log_event("dlq_batch_completed", {
+        "record_count": len(records),
+        "failed_count": len(failed),
+        "duration_ms": round((time.perf_counter() - t0) * 1000.0, 1),
+    })
 
-    # SQS events don’t require a specific return value
-    return {"ok": True, "processed": len(records)}
+    return {
+        "batchItemFailures": [{"itemIdentifier": mid} for mid in failed if mid],
+        "processed": len(records) - len(failed),
+    }
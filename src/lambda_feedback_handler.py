@@ -3,7 +3,7 @@ import json
 import logging
 
 from src.storage.feedback_table import save_feedback
-from src.utils.logging_utils import log_event, set_invocation_context  # 👈 add context hook
+from src.utils.logging_utils import log_event, set_invocation_context, flush_logs  # 👈 add context hook
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -23,7 +23,11 @@ def _none_if_empty(val):
 def lambda_handler(event, context):
     # Attach AWS context to logs (function, request_id, etc.)
     set_invocation_context(context)
+    return handle_feedback(event)
 
+
+def handle_feedback(event):
+    """Validate and store one feedback event (shared with the container server)."""
     try:
         # Lightweight invocation log (avoid dumping full event)
         log_event("feedback_lambda_invocation", {
@@ -105,6 +109,7 @@ def lambda_handler(event, context):
 
 
 def _response(status_code, body):
+    flush_logs()  # every return path builds its response here; drain queued logs first
     return {
         "statusCode": status_code,
         "headers": {
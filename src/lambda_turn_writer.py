@@ -0,0 +1,48 @@
+# src/lambda_turn_writer.py
+import json
+import logging
+
+from src.services.turn_persistence import write_payload
+from src.services import conversation_summary
+from src.utils.logging_utils import log_event, set_invocation_context, flush_metrics, flush_logs, stage
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+def lambda_handler(event, context):
+    """
+    Triggered by the write-behind turn queue (TURN_WRITE_QUEUE_URL).
+    Writes each queued turn to ConversationMessages; {"kind": "summary"}
+    records refresh a conversation's rolling summary. Returns an SQS partial
+    batch response (ReportBatchItemFailures), so only failed turns are retried;
+    writes are idempotent, so a retried turn never duplicates messages.
+    """
+    set_invocation_context(context)
+
+    records = (event or {}).get("Records", []) or []
+    failed = []
+    for record in records:
+        try:
+            payload = json.loads(record.get("body", "{}"))
+            if payload.get("kind") == "summary":
+                with stage("summary_refresh"):
+                    conversation_summary.run_payload(payload)
+                continue
+            with stage("turn_write"):
+                write_payload(payload)
+        except Exception as e:
+            log_event("turn_write_failed", {
+                "record_id": record.get("messageId"),
+                "approx_receive_count": record.get("attributes", {}).get("ApproximateReceiveCount"),
+            }, level="error", error=e)
+            failed.append(record.get("messageId"))
+
+    log_event("turn_batch_completed", {
+        "record_count": len(records),
+        "failed_count": len(failed),
+    })
+    flush_metrics()
+    flush_logs()
+
+    return {"batchItemFailures": [{"itemIdentifier": mid} for mid in failed if mid]}
@@ -13,6 +13,12 @@ Usage:
   # Upload a single file to a specific store name
   python src/scripts/knowledge_admin.py upload --store "icfes-matematicas" --file src/knowledge/icfes/matematicas.json
 
+  # Incremental sync: upload only new/changed files, remove deleted ones
+  python src/scripts/knowledge_admin.py sync --root src/knowledge [--workers 8] [--dry-run]
+
+  # Build the local retrieval index (RETRIEVAL_MODE=local); --dense also embeds chunks
+  python src/scripts/knowledge_admin.py build-index --root src/knowledge [--out src/knowledge_index] [--dense]
+
 Notes:
 - Requires OPENAI_API_KEY in .env at project root
 - Store naming:
@@ -20,28 +26,53 @@ Notes:
     icfes/<component>     -> "icfes-<component>"
     unal/<component>      -> "unal-<component>"
 - Prints a block to paste into .env with VECTOR_STORE_* IDs.
+- sync keeps a content-hash manifest (default: <root>/.sync_manifest.json)
+  with the file_id of every uploaded file, per store. Files are uploaded
+  on a bounded thread pool and attached with one file batch per store;
+  replaced and removed files are detached from the store and deleted.
+- Store name → id lookups go through a StoreIndex: every page of
+  vector_stores.list is walked once, and the result is cached in
+  .vector_stores.json at the project root for STORE_INDEX_TTL_SECONDS
+  (default: 3600). --refresh-index forces a new listing.
+- build-index writes one BM25 index per store (see
+  src/assistant/local_retrieval.py); stores whose files are unchanged
+  since the last build are skipped unless --force. No API key is needed
+  unless --dense.
 """
 
 import argparse
+import hashlib
+import json
 import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 from dotenv import load_dotenv
-from openai import OpenAI
 
 # ---------- setup ----------
 # climb two levels up (src/scripts → project root)
 ROOT = Path(__file__).resolve().parents[2]
 load_dotenv(ROOT / ".env", override=True)
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))  # so `python src/scripts/knowledge_admin.py` can import src.*
+
+_client = None
 
-api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
-    print("ERROR: OPENAI_API_KEY not set in .env", file=sys.stderr)
-    sys.exit(1)
 
-client = OpenAI(api_key=api_key)
+def get_client():
+    """OpenAI client, created on first use (so importing this module needs no key)."""
+    global _client
+    if _client is None:
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            print("ERROR: OPENAI_API_KEY not set in .env", file=sys.stderr)
+            sys.exit(1)
+        from openai import OpenAI
+        _client = OpenAI(api_key=api_key)
+    return _client
 
 SUPPORTED_EXTS = {
     ".json", ".pdf", ".md", ".txt", ".docx", ".pptx", ".html",
@@ -95,34 +126,378 @@ def _collect_files(dirpath: Path) -> List[Path]:
     return files
 
 
-def _ensure_store(name: str) -> str:
+def _iter_targets(root: Path) -> List[Path]:
+    """Store folders: knowledge/general, knowledge/icfes/*, knowledge/unal/*"""
+    targets = []
+    for sub in sorted([p for p in root.iterdir() if p.is_dir()]):
+        nested = [p for p in sub.iterdir() if p.is_dir()]
+        targets.extend(sorted(nested or [sub]))
+    return targets
+
+
+# ----------------- store index -----------------
+INDEX_PATH = ROOT / ".vector_stores.json"
+LIST_PAGE_SIZE = 100  # API maximum
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def list_all_stores(client) -> List[Tuple[str, str]]:
+    """(id, name) for every vector store, following the `after` cursor page by page."""
+    out: List[Tuple[str, str]] = []
+    after = None
+    while True:
+        kwargs = {"limit": LIST_PAGE_SIZE}
+        if after:
+            kwargs["after"] = after
+        page = client.vector_stores.list(**kwargs)
+        out.extend((vs.id, getattr(vs, "name", "") or "") for vs in page.data)
+        if not page.data or not getattr(page, "has_more", False):
+            return out
+        after = page.data[-1].id
+
+
+class StoreIndex:
     """
-    Create a vector store if needed. Return its id.
-    Reuse by name if it already exists.
+    name → vector store id for the whole account, listed at most once per run
+    and persisted between runs. ensure() only creates a store after a full,
+    fresh listing missed it, so names are never duplicated by a stale cache.
     """
-    stores = client.vector_stores.list(limit=100)
-    for vs in stores.data:
-        if getattr(vs, "name", "") == name:
-            return vs.id
-    vs = client.vector_stores.create(name=name)
-    return vs.id
+
+    def __init__(self, client, path: Path = None, ttl_s: int = None):
+        self.client = client
+        self.path = path
+        self.ttl_s = _env_int("STORE_INDEX_TTL_SECONDS", 3600) if ttl_s is None else ttl_s
+        self.by_name: Dict[str, str] = {}
+        self.duplicates: Dict[str, List[str]] = {}
+        self.listed_at = 0.0
+        self.fresh = False      # listed during this run
+        self.list_calls = 0
+
+    @classmethod
+    def load(cls, client, path: Path = None, ttl_s: int = None, refresh: bool = False) -> "StoreIndex":
+        index = cls(client, path, ttl_s)
+        if not refresh and path is not None:
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+                if time.time() - float(data.get("listed_at", 0)) < index.ttl_s:
+                    index.by_name = dict(data.get("stores", {}))
+                    index.listed_at = float(data["listed_at"])
+                    return index
+            except (FileNotFoundError, ValueError, KeyError):
+                pass
+        index.refresh()
+        return index
+
+    def refresh(self) -> None:
+        stores = list_all_stores(self.client)
+        self.list_calls += 1
+        by_name: Dict[str, str] = {}
+        duplicates: Dict[str, List[str]] = {}
+        for sid, name in stores:  # newest first: the newest store of a name wins
+            if name in by_name:
+                duplicates.setdefault(name, [by_name[name]]).append(sid)
+                continue
+            by_name[name] = sid
+        self.by_name, self.duplicates = by_name, duplicates
+        self.listed_at, self.fresh = time.time(), True
+        self.save()
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps({"listed_at": self.listed_at, "stores": self.by_name},
+                                  indent=2, sort_keys=True, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def get(self, name: str):
+        return self.by_name.get(name)
+
+    def ensure(self, name: str) -> str:
+        """Id of the store called `name`, creating it if it does not exist."""
+        sid = self.by_name.get(name)
+        if sid:
+            return sid
+        if not self.fresh:
+            self.refresh()  # cached index may predate a store someone else created
+            sid = self.by_name.get(name)
+            if sid:
+                return sid
+        sid = self.client.vector_stores.create(name=name).id
+        self.by_name[name] = sid
+        self.save()
+        return sid
+
+    def env_block(self, root: Path) -> Dict[str, str]:
+        """ENV key → store id for every knowledge folder that has a store."""
+        env_out: Dict[str, str] = {}
+        for folder in _iter_targets(root):
+            store_name, env_key = _store_name_for(folder)
+            sid = self.by_name.get(store_name)
+            if sid:
+                env_out[env_key] = sid
+        return env_out
+
+
+def _store_index(args, client=None) -> StoreIndex:
+    return StoreIndex.load(
+        client or get_client(),
+        path=Path(args.index) if getattr(args, "index", None) else INDEX_PATH,
+        refresh=getattr(args, "refresh_index", False),
+    )
 
 
-def _upload_file(file_path: Path) -> str:
+def _upload_file(file_path: Path, client=None) -> str:
+    client = client or get_client()
     with open(file_path, "rb") as fh:
         f = client.files.create(file=fh, purpose="assistants")
     return f.id
 
 
-def _attach_file(store_id: str, file_id: str) -> None:
-    client.vector_stores.files.create(vector_store_id=store_id, file_id=file_id)
+def _attach_file(store_id: str, file_id: str, client=None) -> None:
+    (client or get_client()).vector_stores.files.create(vector_store_id=store_id, file_id=file_id)
+
+
+# ----------------- sync -----------------
+MANIFEST_NAME = ".sync_manifest.json"
+BATCH_MAX_FILES = 500  # file_batches accepts up to 500 file_ids per call
+
+
+def _file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_manifest(path: Path) -> dict:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {"version": 1, "stores": {}}
+    data.setdefault("stores", {})
+    return data
+
+
+def save_manifest(path: Path, manifest: dict) -> None:
+    # write-then-rename so an interrupted sync never leaves a truncated manifest
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2, sort_keys=True, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def diff_store(files: Dict[str, str], entry: dict) -> Dict[str, List[str]]:
+    """
+    Compare {relpath: sha256} on disk with a manifest entry.
+    Returns added / changed / removed / unchanged relpaths.
+    """
+    known = entry.get("files", {})
+    out = {"added": [], "changed": [], "removed": [], "unchanged": []}
+    for rel, digest in sorted(files.items()):
+        if rel not in known:
+            out["added"].append(rel)
+        elif known[rel].get("sha256") != digest:
+            out["changed"].append(rel)
+        else:
+            out["unchanged"].append(rel)
+    out["removed"] = sorted(set(known) - set(files))
+    return out
+
+
+def _detach_and_delete(client, store_id: str, file_id: str) -> None:
+    # The file may already be gone (manual cleanup); the manifest is still updated
+    try:
+        client.vector_stores.files.delete(file_id, vector_store_id=store_id)
+    except Exception as e:
+        print(f"  ! detach {file_id}: {type(e).__name__}: {e}", file=sys.stderr)
+    try:
+        client.files.delete(file_id)
+    except Exception as e:
+        print(f"  ! delete {file_id}: {type(e).__name__}: {e}", file=sys.stderr)
+
+
+def sync_store(
+    client,
+    pool: ThreadPoolExecutor,
+    store_name: str,
+    store_id: str,
+    folder: Path,
+    root: Path,
+    entry: dict,
+    *,
+    dry_run: bool = False,
+) -> Tuple[Dict[str, List[str]], Dict[str, float]]:
+    """
+    Bring one vector store in line with its folder. Mutates `entry`
+    ({"store_id", "files": {relpath: {"sha256", "file_id", "bytes"}}}).
+    Returns (diff, timings in ms); diff["failed"] lists the files that
+    did not upload or index (kept out of the manifest, retried next sync).
+    """
+    timings = {"hash": 0.0, "upload": 0.0, "attach": 0.0, "delete": 0.0}
+
+    t0 = time.perf_counter()
+    paths = {fp.relative_to(root).as_posix(): fp for fp in _collect_files(folder)}
+    digests = dict(zip(paths, pool.map(_file_sha256, paths.values())))
+    timings["hash"] = (time.perf_counter() - t0) * 1000.0
+
+    diff = diff_store(digests, entry)
+    if dry_run:
+        return diff, timings
+
+    known = entry.setdefault("files", {})
+    entry["store_id"] = store_id
+
+    # 1) Upload new and changed files in parallel; one failed upload doesn't
+    #    orphan the others, it just stays out of this run
+    to_upload = diff["added"] + diff["changed"]
+    t0 = time.perf_counter()
+    uploaded = dict(zip(to_upload, pool.map(lambda rel: _try_upload(client, paths[rel]), to_upload)))
+    new_ids = {rel: fid for rel, fid in uploaded.items() if fid}
+    timings["upload"] = (time.perf_counter() - t0) * 1000.0
+
+    # 2) Attach them with file batches (one indexing job per ≤500 files)
+    t0 = time.perf_counter()
+    ids = list(new_ids.values())
+    failed_ids: set = set()
+    for i in range(0, len(ids), BATCH_MAX_FILES):
+        batch = client.vector_stores.file_batches.create_and_poll(
+            vector_store_id=store_id, file_ids=ids[i:i + BATCH_MAX_FILES],
+        )
+        failed_ids |= _failed_batch_files(client, store_id, batch)
+    if failed_ids:
+        print(f"  ! [{store_name}] {len(failed_ids)} file(s) failed to index", file=sys.stderr)
+        # Drop the broken copies; the previous versions stay attached
+        list(pool.map(lambda fid: _detach_and_delete(client, store_id, fid), failed_ids))
+    new_ids = {rel: fid for rel, fid in new_ids.items() if fid not in failed_ids}
+    diff["failed"] = sorted(rel for rel in to_upload if rel not in new_ids)
+    timings["attach"] = (time.perf_counter() - t0) * 1000.0
+
+    # 3) Retire replaced and removed files (only once the new version is attached;
+    #    failed files keep their old version and manifest entry, so the next sync retries them)
+    replaced = [rel for rel in diff["changed"] if rel in new_ids]
+    stale = [known[rel]["file_id"] for rel in replaced + diff["removed"] if known.get(rel, {}).get("file_id")]
+    t0 = time.perf_counter()
+    list(pool.map(lambda fid: _detach_and_delete(client, store_id, fid), stale))
+    timings["delete"] = (time.perf_counter() - t0) * 1000.0
+
+    for rel in diff["removed"]:
+        known.pop(rel, None)
+    for rel, fid in new_ids.items():
+        known[rel] = {"sha256": digests[rel], "file_id": fid, "bytes": paths[rel].stat().st_size}
+    return diff, timings
+
+
+def _try_upload(client, file_path: Path) -> Optional[str]:
+    try:
+        return _upload_file(file_path, client)
+    except Exception as e:
+        print(f"  ! upload {file_path.name}: {type(e).__name__}: {e}", file=sys.stderr)
+        return None
+
+
+def _failed_batch_files(client, store_id: str, batch) -> set:
+    """Ids of the batch's files that did not index (failed or cancelled)."""
+    counts = getattr(batch, "file_counts", None)
+    failed: set = set()
+    for status in ("failed", "cancelled"):
+        if counts is not None and getattr(counts, status, 0):
+            for f in client.vector_stores.file_batches.list_files(batch.id, vector_store_id=store_id, filter=status):
+                failed.add(f.id)
+    return failed
+
+
+def _print_env_block(env_out: Dict[str, str]) -> None:
+    # provide a default if you rely on it
+    if "VECTOR_STORE_DEFAULT" not in env_out and "VECTOR_STORE_GLOBAL" in env_out:
+        env_out["VECTOR_STORE_DEFAULT"] = env_out["VECTOR_STORE_GLOBAL"]
+
+    print("\n# ---- Paste into .env ----")
+    for k, v in sorted(env_out.items()):
+        print(f"{k}={v}")
+
+
+# ----------------- local index -----------------
+EMBED_BATCH = 100
+
+
+def _embedder(client):
+    from src.assistant.local_retrieval import embedding_model
+
+    def embed(texts: List[str]) -> List[List[float]]:
+        vectors: List[List[float]] = []
+        for i in range(0, len(texts), EMBED_BATCH):
+            resp = client.embeddings.create(model=embedding_model(), input=texts[i:i + EMBED_BATCH])
+            vectors.extend(list(d.embedding) for d in resp.data)
+        return vectors
+    return embed
+
+
+def cmd_build_index(args, client=None) -> dict:
+    # Imported here so the other commands don't pay for it
+    from src.assistant.local_retrieval import build_store_index, chunk_file, write_catalog
+
+    root = Path(args.root).resolve()
+    if not root.exists():
+        print(f"Knowledge root not found: {root}", file=sys.stderr)
+        sys.exit(1)
+    out = Path(args.out).resolve()
+    out.mkdir(parents=True, exist_ok=True)
+    embed = _embedder(client or get_client()) if args.dense else None
+
+    t_start = time.perf_counter()
+    metas: Dict[str, dict] = {}
+    built = skipped = 0
+    for folder in _iter_targets(root):
+        files = _collect_files(folder)
+        if not files:
+            continue
+        store_name, env_key = _store_name_for(folder)
+        sources = {fp.relative_to(root).as_posix(): _file_sha256(fp) for fp in sorted(files)}
+
+        meta_path = out / store_name / "meta.json"
+        if meta_path.exists() and not args.force:
+            previous = json.loads(meta_path.read_text(encoding="utf-8"))
+            if previous.get("sources") == sources and bool(previous.get("dense")) == bool(args.dense):
+                metas[store_name] = previous
+                skipped += 1
+                continue
+
+        t0 = time.perf_counter()
+        chunks = []
+        for fp in sorted(files):
+            rel = fp.relative_to(root).as_posix()
+            file_chunks = chunk_file(fp, rel)
+            if not file_chunks:
+                print(f"  ! [{store_name}] {rel}: no local parser for {fp.suffix}, skipped", file=sys.stderr)
+            chunks.extend(file_chunks)
+        metas[store_name] = build_store_index(
+            chunks, out / store_name, store_name=store_name, env_key=env_key, sources=sources, embed=embed,
+        )
+        built += 1
+        print(f"[{store_name}] {len(chunks)} chunks, {metas[store_name]['terms']} terms "
+              f"in {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    write_catalog(out, metas)
+    elapsed = time.perf_counter() - t_start
+    print(f"\nindex: {built} built, {skipped} unchanged → {out} in {elapsed:.1f}s")
+    return {"built": built, "skipped": skipped, "stores": sorted(metas)}
 
 
 # ----------------- commands -----------------
-def cmd_list_stores(_args):
-    stores = client.vector_stores.list(limit=100)
-    for vs in stores.data:
-        print(f"{vs.id}\t{vs.name}")
+def cmd_list_stores(args, client=None):
+    index = StoreIndex.load(client or get_client(), path=Path(args.index) if args.index else INDEX_PATH,
+                            refresh=True)
+    for name, sid in sorted(index.by_name.items()):
+        print(f"{sid}\t{name}")
+    for name, ids in sorted(index.duplicates.items()):
+        print(f"! duplicate store name {name!r}: {', '.join(ids)} (using {ids[0]})", file=sys.stderr)
 
 
 def cmd_upload(args):
@@ -131,46 +506,93 @@ def cmd_upload(args):
     if not file_path.exists():
         print(f"File not found: {file_path}", file=sys.stderr)
         sys.exit(1)
-    store_id = _ensure_store(store_name)
+    store_id = _store_index(args).ensure(store_name)
     fid = _upload_file(file_path)
     _attach_file(store_id, fid)
     print(f"Uploaded {file_path.name} -> {store_name} ({store_id})")
     print(f"file_id: {fid}")
 
 
-def cmd_bootstrap(args):
+def cmd_bootstrap(args, client=None):
+    client = client or get_client()
     root = Path(args.root).resolve()
     if not root.exists():
         print(f"Knowledge root not found: {root}", file=sys.stderr)
         sys.exit(1)
 
-    env_out: Dict[str, str] = {}
+    index = _store_index(args, client)
 
     # traverse: knowledge/general, knowledge/icfes/*, knowledge/unal/*
-    for sub in sorted([p for p in root.iterdir() if p.is_dir()]):
-        nested = [p for p in sub.iterdir() if p.is_dir()]
-        targets = nested or [sub]
-        for folder in sorted(targets):
-            files = _collect_files(folder)
-            if not files:
-                continue
-            store_name, env_key = _store_name_for(folder)
-            store_id = _ensure_store(store_name)
+    for folder in _iter_targets(root):
+        files = _collect_files(folder)
+        if not files:
+            continue
+        store_name, _env_key = _store_name_for(folder)
+        store_id = index.ensure(store_name)
 
-            for fp in files:
-                fid = _upload_file(fp)
-                _attach_file(store_id, fid)
-                print(f"[{store_name}] + {fp.relative_to(root)} (file_id={fid})")
+        for fp in files:
+            fid = _upload_file(fp, client)
+            _attach_file(store_id, fid, client)
+            print(f"[{store_name}] + {fp.relative_to(root)} (file_id={fid})")
 
-            env_out[env_key] = store_id
+    _print_env_block(index.env_block(root))
+    return index
 
-    # provide a default if you rely on it
-    if "VECTOR_STORE_DEFAULT" not in env_out and "VECTOR_STORE_GLOBAL" in env_out:
-        env_out["VECTOR_STORE_DEFAULT"] = env_out["VECTOR_STORE_GLOBAL"]
 
-    print("\n# ---- Paste into .env ----")
-    for k, v in sorted(env_out.items()):
-        print(f"{k}={v}")
+def cmd_sync(args, client=None) -> dict:
+    client = client or get_client()
+    root = Path(args.root).resolve()
+    if not root.exists():
+        print(f"Knowledge root not found: {root}", file=sys.stderr)
+        sys.exit(1)
+    manifest_path = Path(args.manifest) if args.manifest else root / MANIFEST_NAME
+    manifest = load_manifest(manifest_path)
+
+    t_start = time.perf_counter()
+    index = _store_index(args, client)
+    totals = {"added": 0, "changed": 0, "removed": 0, "unchanged": 0, "failed": 0}
+    timings = {"hash": 0.0, "upload": 0.0, "attach": 0.0, "delete": 0.0}
+
+    with ThreadPoolExecutor(max_workers=max(1, args.workers), thread_name_prefix="sync") as pool:
+        for folder in _iter_targets(root):
+            store_name, _env_key = _store_name_for(folder)
+            entry = manifest["stores"].setdefault(store_name, {"files": {}})
+            if not _collect_files(folder) and not entry.get("files"):
+                continue
+
+            if entry.get("store_id") and entry["store_id"] != index.get(store_name):
+                if not index.fresh:
+                    index.refresh()
+                if entry["store_id"] != index.get(store_name):
+                    # store was deleted remotely: its file ids are gone, upload everything again
+                    entry.pop("store_id")
+                    entry["files"] = {}
+            if args.dry_run:
+                store_id = index.get(store_name) or "(new)"
+            else:
+                store_id = index.ensure(store_name)
+                entry["store_id"] = store_id
+
+            diff, t = sync_store(client, pool, store_name, store_id, folder, root, entry, dry_run=args.dry_run)
+            for k in totals:
+                totals[k] += len(diff.get(k, []))
+            for k in timings:
+                timings[k] += t[k]
+
+            for sign, key in (("+", "added"), ("~", "changed"), ("-", "removed"), ("!", "failed")):
+                for rel in diff.get(key, []):
+                    print(f"[{store_name}] {sign} {rel}")
+            if not args.dry_run:
+                save_manifest(manifest_path, manifest)  # after each store: a crash loses at most one store
+
+    elapsed = time.perf_counter() - t_start
+    mode = "DRY RUN" if args.dry_run else "synced"
+    print(f"\n{mode}: +{totals['added']} ~{totals['changed']} -{totals['removed']} "
+          f"={totals['unchanged']} !{totals['failed']} in {elapsed:.1f}s "
+          f"(hash {timings['hash']:.0f} ms, upload {timings['upload']:.0f} ms, "
+          f"attach {timings['attach']:.0f} ms, delete {timings['delete']:.0f} ms; workers={args.workers})")
+    _print_env_block(index.env_block(root))
+    return {**totals, "timings_ms": timings, "elapsed_s": elapsed, "list_calls": index.list_calls}
 
 
 # ----------------- CLI -----------------
@@ -178,17 +600,36 @@ def main():
     ap = argparse.ArgumentParser()
     sub = ap.add_subparsers(dest="cmd")
 
-    sub.add_parser("list-stores").set_defaults(func=cmd_list_stores)
+    # store index options shared by every command
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--index", default=None, help=f"Store index cache (default: {INDEX_PATH.name} at project root)")
+    common.add_argument("--refresh-index", action="store_true", help="Ignore the cached store index")
 
-    up = sub.add_parser("upload")
+    sub.add_parser("list-stores", parents=[common]).set_defaults(func=cmd_list_stores)
+
+    up = sub.add_parser("upload", parents=[common])
     up.add_argument("--store", required=True, help="Target store name (e.g., icfes-matematicas)")
     up.add_argument("--file", required=True, help="Path to file")
     up.set_defaults(func=cmd_upload)
 
-    boot = sub.add_parser("bootstrap")
+    boot = sub.add_parser("bootstrap", parents=[common])
     boot.add_argument("--root", default="src/knowledge", help="Knowledge root folder")
     boot.set_defaults(func=cmd_bootstrap)
 
+    sy = sub.add_parser("sync", parents=[common])
+    sy.add_argument("--root", default="src/knowledge", help="Knowledge root folder")
+    sy.add_argument("--manifest", default=None, help=f"Manifest path (default: <root>/{MANIFEST_NAME})")
+    sy.add_argument("--workers", type=int, default=8, help="Parallel uploads / deletes")
+    sy.add_argument("--dry-run", action="store_true", help="Print the diff only, change nothing")
+    sy.set_defaults(func=cmd_sync)
+
+    bi = sub.add_parser("build-index")
+    bi.add_argument("--root", default="src/knowledge", help="Knowledge root folder")
+    bi.add_argument("--out", default="src/knowledge_index", help="Index output folder")
+    bi.add_argument("--dense", action="store_true", help="Also embed chunks (needs OPENAI_API_KEY; numpy at query time)")
+    bi.add_argument("--force", action="store_true", help="Rebuild stores whose files are unchanged")
+    bi.set_defaults(func=cmd_build_index)
+
     args = ap.parse_args()
     if not args.cmd:
         ap.print_help()
@@ -0,0 +1,159 @@
+# src/scripts/migrate_messages.py
+#!/usr/bin/env python3
+"""
+Backfill ConversationMessages from the legacy per-message schema (v1) to
+turn records (v2, see src/storage/message_codec.py).
+
+Usage (from the project root):
+  # Count what would change, write nothing
+  python -m src.scripts.migrate_messages backfill --dry-run
+
+  # Migrate with 8 parallel scan segments and remove the v1 items afterwards
+  python -m src.scripts.migrate_messages backfill --segments 8
+
+  # Keep the v1 items (readers handle both schemas, so this is safe)
+  python -m src.scripts.migrate_messages backfill --keep-old
+
+Notes:
+- All items of a conversation share a partition key, so a conversation is
+  always inside one scan segment; each segment is migrated independently.
+- Re-runnable: v2 items are filtered out of the scan, and a turn's key is
+  derived from its first message, so a second run rewrites the same items.
+- Deploy the v2-aware readers before running this, and only then set
+  MESSAGES_SCHEMA_VERSION=2 so new turns are written as v2 too.
+- Segments are read page by page (--page-size) and written as they go;
+  memory holds one conversation, not the whole segment.
+"""
+
+import argparse
+import contextlib
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+
+import boto3
+from boto3.dynamodb.conditions import Attr
+
+from src.storage.message_codec import encode_turn, group_legacy_turns
+from src.storage.messages_table import turn_sort_key
+
+TABLE_NAME = "ConversationMessages"
+
+
+def _thread_table(name: str):
+    # boto3 resources are not thread-safe: one session per segment worker
+    return boto3.session.Session().resource("dynamodb").Table(name)
+
+
+def scan_legacy_items(table, segment: int, total_segments: int, page_size: int):
+    """Yield v1 items of one scan segment, following LastEvaluatedKey."""
+    kwargs = {
+        "Segment": segment,
+        "TotalSegments": total_segments,
+        "FilterExpression": Attr("SchemaVersion").not_exists(),
+        "Limit": page_size,
+    }
+    while True:
+        resp = table.scan(**kwargs)
+        yield from resp.get("Items", [])
+        if "LastEvaluatedKey" not in resp:
+            return
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def _conversations(items):
+    """
+    Group a scan stream into (conversation_id, items) runs. A scan returns a
+    partition's items together, so one conversation is held in memory at a time.
+    """
+    current, group = None, []
+    for item in items:
+        if item["ConversationId"] != current:
+            if group:
+                yield current, group
+            current, group = item["ConversationId"], []
+        group.append(item)
+    if group:
+        yield current, group
+
+
+def migrate_segment(
+    table_factory: Callable[[], object],
+    segment: int,
+    total_segments: int,
+    *,
+    dry_run: bool = False,
+    keep_old: bool = False,
+    page_size: int = 500,
+) -> Dict[str, int]:
+    """Migrate one scan segment page by page, writing each conversation as soon as it is read."""
+    table = table_factory()
+    stats = {"segment": segment, "items": 0, "conversations": 0, "turns": 0, "deleted": 0}
+    with contextlib.ExitStack() as stack:
+        writer = None if dry_run else stack.enter_context(
+            table.batch_writer(overwrite_by_pkeys=["ConversationId", "Timestamp"]))
+        for conversation_id, items in _conversations(scan_legacy_items(table, segment, total_segments, page_size)):
+            stats["items"] += len(items)
+            stats["conversations"] += 1
+            items.sort(key=lambda m: m["Timestamp"])
+            for ts, user_text, images, assistant_text, sources in group_legacy_turns(items):
+                stats["turns"] += 1
+                if writer is None:
+                    continue
+                key = turn_sort_key(ts, 0)
+                writer.put_item(Item=encode_turn(conversation_id, key, user_text, images, assistant_text))
+                if keep_old:
+                    continue
+                for src in sources:
+                    if src["Timestamp"] != key:  # same key was just overwritten by the turn item
+                        writer.delete_item(Key={"ConversationId": conversation_id, "Timestamp": src["Timestamp"]})
+                        stats["deleted"] += 1
+    return stats
+
+
+def cmd_backfill(args, table_factory: Callable[[], object] = None):
+    table_factory = table_factory or (lambda: _thread_table(args.table))
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.segments) as pool:
+        results = list(pool.map(
+            lambda seg: migrate_segment(
+                table_factory, seg, args.segments,
+                dry_run=args.dry_run, keep_old=args.keep_old, page_size=args.page_size,
+            ),
+            range(args.segments),
+        ))
+
+    totals = {k: sum(r[k] for r in results) for k in ("items", "conversations", "turns", "deleted")}
+    for r in results:
+        print(f"[segment {r['segment']}] items={r['items']} conversations={r['conversations']} "
+              f"turns={r['turns']} deleted={r['deleted']}")
+    mode = "DRY RUN" if args.dry_run else "migrated"
+    print(f"\n{mode}: {totals['items']} v1 items → {totals['turns']} turn items "
+          f"({totals['conversations']} conversations, {totals['deleted']} deleted) "
+          f"in {time.perf_counter() - t0:.1f}s")
+    return totals
+
+
+# ----------------- CLI -----------------
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd")
+
+    bf = sub.add_parser("backfill")
+    bf.add_argument("--table", default=TABLE_NAME, help="Messages table name")
+    bf.add_argument("--segments", type=int, default=4, help="Parallel scan segments (one thread each)")
+    bf.add_argument("--page-size", type=int, default=500, help="Scan page size")
+    bf.add_argument("--dry-run", action="store_true", help="Count only, write nothing")
+    bf.add_argument("--keep-old", action="store_true", help="Do not delete the v1 items")
+    bf.set_defaults(func=cmd_backfill)
+
+    args = ap.parse_args()
+    if not args.cmd:
+        ap.print_help()
+        sys.exit(1)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
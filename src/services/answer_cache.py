@@ -0,0 +1,326 @@
+# src/services/answer_cache.py
+"""
+Answer cache for repeated first-turn questions on the same page.
+
+Entries are namespaced by the page's vector store set (get_stores_for_page)
+plus the model that answered (the routed one, see config/model_router), so
+two pages that resolve to the same stores share answers.
+Lookup is an exact match on the normalized question, then an approximate
+match over locally computed hashed n-gram vectors (cosine >= threshold).
+
+Env (optional):
+- ANSWER_CACHE_BACKEND      ("off" | "memory" | "dynamodb"; default: off)
+- ANSWER_CACHE_TTL_SECONDS  (default: 3600)
+- ANSWER_CACHE_MAX_ENTRIES  (default: 2000, in-memory LRU size)
+- ANSWER_CACHE_SIMILARITY   (default: 0.9)
+- ANSWER_CACHE_SCAN_LIMIT   (default: 200, newest DynamoDB candidates per lookup)
+- ANSWER_CACHE_TABLE        (default: AnswerCache)
+- ANSWER_CACHE_RECENT_INDEX GSI (Namespace, CreatedAt) for approximate matching
+                            across containers; unset: approximate matching uses
+                            the in-memory entries only
+"""
+import hashlib
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_VECTOR_DIM = 1024
+_WORD_RE = re.compile(r"[a-z0-9ñ]+")
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)?")
+# Function words carry no meaning for matching; numbers are never stopwords
+_STOPWORDS = frozenset(
+    "a al con de del el en es la las lo los me mi o para por se su un una uno y "
+    "the a an of to is".split()
+)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+# -------- Normalization & local vectors --------
+def normalize_question(text: str | None) -> str:
+    """Lowercase, strip accents (keeping ñ), drop punctuation, collapse whitespace."""
+    s = (text or "").lower().replace("ñ", "\x00")
+    s = unicodedata.normalize("NFKD", s)
+    s = "".join(ch for ch in s if not unicodedata.combining(ch)).replace("\x00", "ñ")
+    return " ".join(_WORD_RE.findall(s))
+
+
+def question_key(normalized: str) -> str:
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:32]
+
+
+def namespace_for(vector_store_ids: Iterable[str], model: str) -> str:
+    raw = model + "|" + "|".join(sorted(v for v in vector_store_ids if v))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:24]
+
+
+def _bucket(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=4).digest(), "big") % _VECTOR_DIM
+
+
+def vectorize(normalized: str) -> Dict[int, float]:
+    """
+    Sparse L2-normalized vector of hashed word unigrams/bigrams and character
+    trigrams. Cheap, local and deterministic — no embedding call.
+    """
+    words = [w for w in normalized.split() if w not in _STOPWORDS] or normalized.split()
+    feats: Dict[int, float] = {}
+    for w in words:
+        k = _bucket("w:" + w)
+        feats[k] = feats.get(k, 0.0) + 1.0
+    for a, b in zip(words, words[1:]):
+        k = _bucket(f"b:{a} {b}")
+        feats[k] = feats.get(k, 0.0) + 1.0
+    padded = f" {' '.join(words)} "
+    for i in range(len(padded) - 2):
+        k = _bucket("c:" + padded[i:i + 3])
+        feats[k] = feats.get(k, 0.0) + 0.5
+    norm = math.sqrt(sum(v * v for v in feats.values())) or 1.0
+    return {k: v / norm for k, v in feats.items()}
+
+
+def cosine(a: Dict[int, float], b: Dict[int, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+
+def _numbers(normalized: str) -> Tuple[str, ...]:
+    # "pregunta 3" vs "pregunta 5" are near-identical text but different items
+    return tuple(sorted(_NUMBER_RE.findall(normalized)))
+
+
+# -------- Backends --------
+@dataclass
+class _Entry:
+    question: str
+    answer: str
+    vector: Dict[int, float]
+    expires_at: float
+
+
+class MemoryAnswerCache:
+    """In-container LRU with TTL. Thread-safe."""
+
+    def __init__(self, max_entries: int = 2000, ttl_seconds: int = 3600):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_exact(self, namespace: str, qkey: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get((namespace, qkey))
+            if entry is None:
+                return None
+            if entry.expires_at <= time.time():
+                del self._entries[(namespace, qkey)]
+                return None
+            self._entries.move_to_end((namespace, qkey))
+            return entry.answer
+
+    def get_similar(self, namespace: str, normalized: str, vector, threshold: float) -> Tuple[Optional[str], float]:
+        now = time.time()
+        best_key, best_score = None, 0.0
+        numbers = _numbers(normalized)
+        with self._lock:
+            for key, entry in self._entries.items():
+                if key[0] != namespace or entry.expires_at <= now:
+                    continue
+                if _numbers(entry.question) != numbers:
+                    continue
+                score = cosine(vector, entry.vector)
+                if score > best_score:
+                    best_key, best_score = key, score
+            if best_key is None or best_score < threshold:
+                return None, best_score
+            self._entries.move_to_end(best_key)
+            return self._entries[best_key].answer, best_score
+
+    def put(self, namespace: str, qkey: str, normalized: str, answer: str, vector=None) -> None:
+        with self._lock:
+            self._entries[(namespace, qkey)] = _Entry(
+                question=normalized,
+                answer=answer,
+                vector=vector if vector is not None else vectorize(normalized),
+                expires_at=time.time() + self.ttl_seconds,
+            )
+            self._entries.move_to_end((namespace, qkey))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class DynamoAnswerCache:
+    """
+    DynamoDB-backed cache shared by all containers, fronted by a small
+    in-memory LRU so hot entries skip the network. Expiry uses DynamoDB TTL.
+    """
+
+    def __init__(self, max_entries: int = 2000, ttl_seconds: int = 3600, scan_limit: int = 200):
+        from src.storage import answer_cache_table  # lazy: only when this backend is enabled
+        self._table = answer_cache_table
+        self.ttl_seconds = ttl_seconds
+        self.scan_limit = scan_limit
+        self.local = MemoryAnswerCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+
+    def get_exact(self, namespace: str, qkey: str) -> Optional[str]:
+        answer = self.local.get_exact(namespace, qkey)
+        if answer is not None:
+            return answer
+        item = self._table.get_cached_answer(namespace, qkey)
+        if not item:
+            return None
+        self.local.put(namespace, qkey, item.get("Question", ""), item["Answer"])
+        return item["Answer"]
+
+    def get_similar(self, namespace: str, normalized: str, vector, threshold: float) -> Tuple[Optional[str], float]:
+        answer, score = self.local.get_similar(namespace, normalized, vector, threshold)
+        if answer is not None:
+            return answer, score
+
+        numbers = _numbers(normalized)
+        best, best_score = None, score
+        for item in self._table.list_cached_questions(namespace, limit=self.scan_limit):
+            q = item.get("Question", "")
+            if _numbers(q) != numbers:
+                continue
+            s = cosine(vector, vectorize(q))
+            if s > best_score:
+                best, best_score = item, s
+        if best is None or best_score < threshold:
+            return None, best_score
+        hit = self._table.get_cached_answer(namespace, best["QuestionKey"])
+        if not hit:
+            return None, best_score
+        self.local.put(namespace, best["QuestionKey"], hit.get("Question", ""), hit["Answer"])
+        return hit["Answer"], best_score
+
+    def put(self, namespace: str, qkey: str, normalized: str, answer: str, vector=None) -> None:
+        self.local.put(namespace, qkey, normalized, answer, vector)
+        self._table.put_cached_answer(namespace, qkey, normalized, answer, self.ttl_seconds)
+
+
+# -------- Service API --------
+_backend = None
+_backend_name: Optional[str] = None
+_metrics_lock = threading.Lock()
+_metrics = {"hits_exact": 0, "hits_similar": 0, "misses": 0, "stores": 0, "bypassed": 0, "errors": 0}
+
+
+def _backend_setting() -> str:
+    return os.getenv("ANSWER_CACHE_BACKEND", "off").strip().lower()
+
+
+def is_enabled() -> bool:
+    return _backend_setting() in ("memory", "dynamodb")
+
+
+def get_backend():
+    """Build the configured backend once per container (rebuilt if the setting changes)."""
+    global _backend, _backend_name
+    name = _backend_setting()
+    if _backend is None or _backend_name != name:
+        ttl = _env_int("ANSWER_CACHE_TTL_SECONDS", 3600)
+        size = _env_int("ANSWER_CACHE_MAX_ENTRIES", 2000)
+        if name == "dynamodb":
+            _backend = DynamoAnswerCache(size, ttl, _env_int("ANSWER_CACHE_SCAN_LIMIT", 200))
+        else:
+            _backend = MemoryAnswerCache(size, ttl)
+        _backend_name = name
+    return _backend
+
+
+def _count(key: str) -> None:
+    with _metrics_lock:
+        _metrics[key] += 1
+
+
+def get_metrics() -> Dict[str, int]:
+    with _metrics_lock:
+        snap = dict(_metrics)
+    lookups = snap["hits_exact"] + snap["hits_similar"] + snap["misses"]
+    snap["hit_ratio"] = round((snap["hits_exact"] + snap["hits_similar"]) / lookups, 3) if lookups else None
+    return snap
+
+
+def is_cacheable(message: str | None, image_urls: List[str] | None, has_history: bool) -> bool:
+    """Only standalone text questions: no images and no conversation history."""
+    if not is_enabled():
+        return False
+    if image_urls or has_history or not normalize_question(message):
+        _count("bypassed")
+        return False
+    return True
+
+
+def lookup(message: str, vector_store_ids: List[str], model: str) -> Tuple[Optional[str], Dict]:
+    """
+    Return (answer | None, info). info carries match type, similarity and
+    latency for logging. Backend errors count as misses.
+    """
+    t0 = time.perf_counter()
+    info = {"match": None, "similarity": None}
+    normalized = normalize_question(message)
+    ns = namespace_for(vector_store_ids, model)
+    answer = None
+    try:
+        backend = get_backend()
+        answer = backend.get_exact(ns, question_key(normalized))
+        if answer is not None:
+            info.update(match="exact", similarity=1.0)
+            _count("hits_exact")
+        else:
+            threshold = _env_float("ANSWER_CACHE_SIMILARITY", 0.9)
+            answer, score = backend.get_similar(ns, normalized, vectorize(normalized), threshold)
+            info["similarity"] = round(score, 4)
+            if answer is not None:
+                info["match"] = "similar"
+                _count("hits_similar")
+            else:
+                _count("misses")
+    except Exception as e:
+        _count("errors")
+        info["error"] = str(e)[:200]
+        answer = None
+    info["latency_ms"] = round((time.perf_counter() - t0) * 1000.0, 2)
+    return answer, info
+
+
+def store(message: str, vector_store_ids: List[str], model: str, answer: str, private_values: Iterable[str] = ()) -> bool:
+    """
+    Cache an answer unless it echoes user-specific values (name, email, id),
+    which must never be served to another student. Returns True if stored.
+    """
+    lowered = answer.lower()
+    for val in private_values:
+        if val and len(val) > 2 and val.lower() in lowered:
+            return False
+    normalized = normalize_question(message)
+    try:
+        get_backend().put(namespace_for(vector_store_ids, model), question_key(normalized), normalized, answer)
+    except Exception:
+        _count("errors")
+        return False
+    _count("stores")
+    return True
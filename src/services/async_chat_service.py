@@ -0,0 +1,260 @@
+# src/services/async_chat_service.py
+"""
+Async variant of chat_service.get_ai_response.
+
+Same arguments, same (reply, conversation_id) result and the same exceptions
+(RuntimeError / ValueError / DeadlineExceeded, so failed records still land
+in the DLQ), but steps that don't depend on each other overlap:
+
+- new conversation: the header write runs while the answer cache is checked
+  and the model answers; only the message write needs its id;
+- existing conversation with chaining on: the header (chain) lookup and the
+  history fetch run together, and the messages are used only when the chain
+  is missing or expired (one read spent to save a round trip on fallback);
+- after the reply: the message writes, the chain update and the answer-cache
+  store run together.
+
+The model call goes through openai.AsyncOpenAI (acreate_assistant_response).
+DynamoDB stays on boto3 and is offloaded with asyncio.to_thread (the loop's
+default executor). Step helpers, logs and stage timings are the ones of
+chat_service, so both paths report identically.
+"""
+import asyncio
+import time
+
+from src.assistant.assistant_client import AssistantResult, acreate_assistant_response, is_missing_chain_error
+from src.assistant.resilience import start_request_budget
+from src.config.model_config import get_model_config
+from src.config.model_router import Route, looks_truncated, route_request
+from src.config.page_vectorstores import get_page_key, get_stores_for_page
+from src.services import idempotency
+from src.services.chat_service import (
+    _Turn,
+    _build_history_block,
+    _cached_answer,
+    _chain_from_header,
+    _chaining_enabled,
+    _check_deadline,
+    _fetch_history,
+    _finish_chain,
+    _log_prompt_cache,
+    _log_replay,
+    _log_route,
+    _lookup_header,
+    _message_parts,
+    _model_kwargs,
+    _normalize_page,
+    _open_conversation,
+    _persist_turn,
+    _resume,
+    _store_cached_answer,
+)
+from src.utils.deadline import Deadline, DeadlineExceeded
+from src.utils.logging_utils import log_event, reset_stage_timings, set_metric_dimensions, stage
+
+
+async def get_ai_response_async(
+    message: str | None,
+    user_id: str | None,
+    name: str | None,
+    email: str | None,
+    page: str | None,
+    conversation_id: str | None = None,
+    image_urls: list[str] | None = None,
+    deadline: Deadline | None = None,
+    idempotency_key: str | None = None,
+):
+    """
+    Async get_ai_response: same contract, independent steps run concurrently.
+    A cancelled call (client went away) releases its idempotency claim so a
+    retry can take over. Each call gets its own OpenAI retry budget.
+    Returns: (assistant_reply: str, conversation_id: str)
+    """
+    start_request_budget()
+    claim = await asyncio.to_thread(idempotency.begin, idempotency_key) if idempotency_key else None
+    if claim is not None and claim.replay:
+        _log_replay(claim, user_id)
+        return claim.reply, claim.conversation_id
+
+    try:
+        reply, conversation_id = await _get_ai_response(
+            message, user_id, name, email, page, conversation_id, image_urls, deadline, claim,
+        )
+    except BaseException:
+        if claim is not None:
+            await asyncio.to_thread(idempotency.release, claim)
+        raise
+    if claim is not None:
+        await asyncio.to_thread(idempotency.complete, claim, reply, conversation_id)
+    return reply, conversation_id
+
+
+async def _get_ai_response(message, user_id, name, email, page, conversation_id, image_urls, deadline, claim):
+    page = _normalize_page(page)
+    reset_stage_timings(page=get_page_key(page))
+
+    conversation_id = _resume(claim, conversation_id)
+    plan = _check_deadline(deadline, "start", conversation_id)
+    stores = get_stores_for_page(page)
+    turn = _Turn(conversation_id=conversation_id, message_parts=_message_parts(message, image_urls, user_id),
+                 user_id=user_id, plan=plan, deadline=deadline, stores=stores,
+                 follow_up=conversation_id is not None)
+
+    creating = None
+    if conversation_id:
+        _open_conversation(message, user_id, name, email, page, conversation_id, stores)  # logs the reuse
+        await _load_history(turn)
+    else:
+        creating = asyncio.create_task(_create_conversation(turn, claim, message, name, email, page))
+    # A new conversation is chained from its first reply, before its header exists
+    chained = _chaining_enabled() and (creating is not None or turn.header_key is not None)
+
+    # Steps 1 and 4 overlap for a new conversation: a failed header write
+    # cancels the model call, a failed model call still waits for the header
+    answering = asyncio.create_task(_answer(turn, message, image_urls, page, name, email, chained))
+    if creating is not None:
+        try:
+            await creating
+        except BaseException:
+            answering.cancel()
+            if answering.done() and not answering.cancelled():
+                answering.exception()  # the conversation error wins
+            raise
+    try:
+        result, cached = await answering
+    except DeadlineExceeded as e:
+        # The deadline check may have run before the header write finished
+        e.conversation_id = e.conversation_id or turn.conversation_id
+        raise
+    conversation_id = turn.conversation_id
+
+    assistant_reply = result.text
+    if not assistant_reply or "No assistant response" in assistant_reply:
+        raise ValueError("❌ Assistant returned an empty or invalid response.")
+
+    # Step 5: Persist messages, alongside the chain update and the cache store
+    writes = [asyncio.to_thread(
+        _persist_turn, conversation_id, user_id, message, image_urls, assistant_reply,
+        turn_timestamp=claim.turn_timestamp if claim else None,
+    )]
+    if not cached:
+        log_event("openai_response_received", {
+            "conversation_id": conversation_id,
+            "reply_snippet": assistant_reply[:100],
+        })
+        _log_prompt_cache(page, result.usage)
+        writes.append(asyncio.to_thread(_finish_chain, turn, page, result.response_id, result.usage))
+        if not result.incomplete:
+            writes.append(asyncio.to_thread(
+                _store_cached_answer, turn, message, image_urls, page, assistant_reply, (name, email, user_id),
+            ))
+    for outcome in await asyncio.gather(*writes, return_exceptions=True):
+        if isinstance(outcome, BaseException):
+            raise outcome  # only _persist_turn raises; the others log and degrade
+
+    return assistant_reply, conversation_id
+
+
+async def _create_conversation(turn: _Turn, claim, message, name, email, page: str) -> None:
+    turn.conversation_id, turn.header_key = await asyncio.to_thread(
+        _open_conversation, message, turn.user_id, name, email, page, None, turn.stores,
+    )
+    if claim is not None:
+        await asyncio.to_thread(idempotency.note_conversation, claim, turn.conversation_id)
+
+
+async def _nothing():
+    return None
+
+
+async def _fetch_history_async(conversation_id: str) -> list:
+    try:
+        return await asyncio.to_thread(_fetch_history, conversation_id)
+    except Exception as e:
+        # Don't fail the request if history fetch fails; just skip history
+        log_event("history_fetch_failed", {"conversation_id": conversation_id}, level="warning", error=e)
+        return []
+
+
+async def _load_history(turn: _Turn) -> None:
+    """Steps 2-3 for an existing conversation: chain lookup and history fetch together."""
+    chaining = _chaining_enabled()
+    fetch = not turn.plan.skip_history
+    header, msgs = await asyncio.gather(
+        asyncio.to_thread(_lookup_header, turn.user_id, turn.conversation_id) if chaining else _nothing(),
+        _fetch_history_async(turn.conversation_id) if fetch else _nothing(),
+    )
+    if chaining:
+        turn.header_key, turn.previous_response_id = _chain_from_header(header)
+        if turn.previous_response_id:
+            turn.history_mode = "chained"
+            return
+        turn.fallbacks.append("chain_missing")
+    if not fetch:
+        # Degraded tier: answer without history rather than spend the time budget
+        return
+
+    turn.history_window = await asyncio.to_thread(
+        _build_history_block, turn.conversation_id, turn.user_id, msgs, header,
+    )
+    turn.history_block = turn.history_window.text if turn.history_window else None
+    turn.history_mode = "transcript" if turn.history_block else "none"
+
+
+async def _answer(turn: _Turn, message, image_urls, page: str, name, email, chained: bool):
+    """Step 4: answer cache, then the routed model. Returns (result, from_cache)."""
+    turn.route = route_request(message, bool(image_urls), page)
+    cached = await asyncio.to_thread(_cached_answer, turn, message, image_urls, page)
+    if cached is not None:
+        return AssistantResult(text=cached), True
+
+    turn.plan = _check_deadline(turn.deadline, "model_call", turn.conversation_id)
+    set_metric_dimensions(model=turn.route.config.model)
+    try:
+        log_event("openai_request_sent", lambda: {
+            "user_id": turn.user_id,
+            "page": page,
+            "content_parts_count": len(turn.content_parts),
+            "history_mode": turn.history_mode,
+            "tier": turn.plan.tier,
+            "vector_stores": turn.stores,
+        })
+        return await _call_model(turn, page, name, email, chained), False
+    except Exception as e:
+        raise RuntimeError(f"❌ OpenAI Responses API failed: {e}")
+
+
+async def _call_model(turn: _Turn, page: str, name, email, chained: bool):
+    """Async chat_service._call_model: fast-model answers that look truncated escalate once."""
+    t0 = time.perf_counter()
+    result = await _call_model_once(turn, page, name, email, chained)
+    first = turn.route
+    escalated = False
+    if first and first.name == "fast" and looks_truncated(result.text, result.incomplete):
+        escalated = True
+        turn.route = Route(name="main", config=get_model_config(), score=first.score, reasons=first.reasons + ["escalated"])
+        result = await _call_model_once(turn, page, name, email, chained)
+    if turn.route:
+        _log_route(turn, page, (time.perf_counter() - t0) * 1000.0, escalated, first if escalated else None)
+    return result
+
+
+async def _call_model_once(turn: _Turn, page: str, name, email, chained: bool):
+    kwargs = _model_kwargs(turn, turn.user_id, page, name, email)
+    model = turn.route.config.model if turn.route else None
+    try:
+        with stage("model_call", model=model):
+            return await acreate_assistant_response(
+                turn.content_parts, chained=chained, previous_response_id=turn.previous_response_id, **kwargs,
+            )
+    except Exception as e:
+        if not (turn.previous_response_id and is_missing_chain_error(e)):
+            raise
+        log_event("conversation_chain_fallback", {
+            "conversation_id": turn.conversation_id,
+            "reason": str(e)[:200],
+        }, level="warning")
+        turn.fallbacks.append("chain_expired")
+        await asyncio.to_thread(turn.use_transcript)
+        with stage("model_call", model=model):
+            return await acreate_assistant_response(turn.content_parts, chained=chained, **kwargs)
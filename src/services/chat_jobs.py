@@ -0,0 +1,379 @@
+# src/services/chat_jobs.py
+"""
+Async job mode for chat requests (burst load).
+
+Instead of holding an API Gateway connection for the whole model call, the
+chat handler records a job, sends the request to CHAT_JOB_QUEUE_URL and
+answers 202 {"jobId", "status": "queued"} right away. The chat worker
+(src/lambda_chat_worker.py) runs get_ai_response for each queued request and
+stores the reply under the job id; clients poll it (GET ?jobId=…&userId=…
+or a body with only "jobId" and "userId"), and an optional webhook is called
+when it is done.
+
+Lifecycle of a job:
+  submit   → queued (page queue depth +1)
+  start    → running (wait time recorded)
+  failure  → retrying; the queue redelivers it, then its redrive queue
+             (point it at CHAT_DLQ_URL so the DLQ reprocessor finishes it)
+  finish   → done, reply and conversationId stored until CHAT_JOB_TTL_SECONDS
+Every store update returns the job as it was, and whichever one moves it out
+of "queued" takes it off the depth counter (so a start that failed open is
+still counted by finish).
+
+Job ids are random, so they can't be guessed from a request's content, and a
+job is only shown to the userId that submitted it. A request with an
+idempotency key also links that key to its job id (a separate conditional
+item), so a double-submit gets the same job instead of a second queued
+request.
+If the queue can't be reached the request is answered synchronously.
+A request that fails fast on its deadline (DeadlineExceeded) is submitted as
+a job too, whatever CHAT_JOB_MODE says, so the client gets a pollable 202
+instead of a 503.
+
+Metrics (EMF, dimension Page): chat_job_queue_depth, chat_job_submitted,
+chat_job_wait_ms. The depth is approximate: a queued job that is never
+picked up (expired by TTL, purged queue) is never subtracted, so read it as
+a trend, not an exact count.
+
+Env (optional):
+- CHAT_JOB_MODE                "off" (default) | "opt_in" (body "async": true
+                               or "Prefer: respond-async") | "always"
+- CHAT_JOB_QUEUE_URL           worker queue; job mode is off without it
+- CHAT_JOB_BACKEND             "dynamodb" (default) | "memory" (tests, local runs)
+- CHAT_JOBS_TABLE              (default: ChatJobs)
+- CHAT_JOB_TTL_SECONDS         (default: 86400)
+- CHAT_JOB_POLL_AFTER_MS       (default: 2000; hint returned to pollers)
+- CHAT_JOB_WEBHOOK_URL         POSTed the finished job (server-side setting only)
+- CHAT_JOB_WEBHOOK_SECRET      signs the webhook body (X-Signature: sha256=<hex>)
+- CHAT_JOB_WEBHOOK_TIMEOUT_MS  (default: 2000)
+"""
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+from src.config.page_vectorstores import get_page_key
+from src.storage.queues import get_queue
+from src.utils.logging_utils import log_event, record_page_metric
+
+QUEUED = "queued"
+RUNNING = "running"
+RETRYING = "retrying"
+DONE = "done"
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+# -------- Backends --------
+class MemoryJobStore:
+    """In-container store with the same contract as the DynamoDB one (tests, local runs)."""
+
+    def __init__(self):
+        self._items: Dict[str, Dict[str, Any]] = {}
+        self._keys: Dict[str, str] = {}
+        self._depth: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def link_key(self, key_id: str, job_id: str, ttl_seconds: int) -> Optional[str]:
+        with self._lock:
+            existing = self._keys.get(key_id)
+            if existing is not None:
+                return existing
+            self._keys[key_id] = job_id
+            return None
+
+    def unlink_key(self, key_id: str) -> None:
+        with self._lock:
+            self._keys.pop(key_id, None)
+
+    def create(self, job_id: str, page_key: str, user_id: str, ttl_seconds: int) -> bool:
+        with self._lock:
+            if job_id in self._items:
+                return False
+            self._items[job_id] = {
+                "JobId": job_id, "Status": QUEUED, "Page": page_key, "UserId": user_id,
+                "CreatedAt": int(time.time() * 1000), "Attempts": 0,
+            }
+            return True
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self._items.get(job_id)
+            return dict(item) if item else None
+
+    def start(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self._items.get(job_id)
+            if item is None or item["Status"] == DONE:
+                return None
+            old = dict(item)
+            item.setdefault("StartedAt", int(time.time() * 1000))
+            item.update(Status=RUNNING, Attempts=item["Attempts"] + 1)
+            return old
+
+    def complete(self, job_id: str, reply: str, conversation_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self._items.setdefault(job_id, {"JobId": job_id})
+            old = dict(item)
+            item.pop("LastError", None)
+            item.update(Status=DONE, Reply=reply, ConversationId=conversation_id)
+            return old
+
+    def fail_attempt(self, job_id: str, error: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self._items.get(job_id)
+            if not item or item["Status"] == DONE:
+                return None
+            old = dict(item)
+            item.update(Status=RETRYING, LastError=error)
+            return old
+
+    def delete(self, job_id: str) -> None:
+        with self._lock:
+            self._items.pop(job_id, None)
+
+    def add_depth(self, page_key: str, delta: int) -> int:
+        with self._lock:
+            self._depth[page_key] = self._depth.get(page_key, 0) + delta
+            return self._depth[page_key]
+
+
+class DynamoJobStore:
+    """Shared by the chat handler and the worker; writes in storage/chat_jobs_table."""
+
+    def link_key(self, key_id, job_id, ttl_seconds):
+        from src.storage.chat_jobs_table import link_key
+        return link_key(key_id, job_id, ttl_seconds)
+
+    def unlink_key(self, key_id):
+        from src.storage.chat_jobs_table import unlink_key
+        unlink_key(key_id)
+
+    def create(self, job_id, page_key, user_id, ttl_seconds):
+        from src.storage.chat_jobs_table import create_job
+        return create_job(job_id, page_key, user_id, ttl_seconds)
+
+    def get(self, job_id):
+        from src.storage.chat_jobs_table import get_job
+        return get_job(job_id)
+
+    def start(self, job_id):
+        from src.storage.chat_jobs_table import start_job
+        return start_job(job_id)
+
+    def complete(self, job_id, reply, conversation_id):
+        from src.storage.chat_jobs_table import complete_job
+        return complete_job(job_id, reply, conversation_id)
+
+    def fail_attempt(self, job_id, error):
+        from src.storage.chat_jobs_table import fail_attempt
+        return fail_attempt(job_id, error)
+
+    def delete(self, job_id):
+        from src.storage.chat_jobs_table import delete_job
+        delete_job(job_id)
+
+    def add_depth(self, page_key, delta):
+        from src.storage.chat_jobs_table import add_depth
+        return add_depth(page_key, delta)
+
+
+_backend = None
+_backend_name: Optional[str] = None
+
+
+def get_backend():
+    """Build the configured backend once per container (rebuilt if the setting changes)."""
+    global _backend, _backend_name
+    name = os.getenv("CHAT_JOB_BACKEND", "dynamodb").strip().lower()
+    if _backend is None or _backend_name != name:
+        _backend = MemoryJobStore() if name == "memory" else DynamoJobStore()
+        _backend_name = name
+    return _backend
+
+
+def _job_queue():
+    return get_queue(os.getenv("CHAT_JOB_QUEUE_URL"))
+
+
+# -------- Submit (chat handler) --------
+def _mode() -> str:
+    return os.getenv("CHAT_JOB_MODE", "off").strip().lower()
+
+
+def wants_job(event: dict, body: dict) -> bool:
+    """Whether this (non-streaming) request should run as a job."""
+    mode = _mode()
+    if mode == "always":
+        return True
+    if mode != "opt_in":
+        return False
+    if body.get("async") is True:
+        return True
+    headers = (event or {}).get("headers") or {}
+    return any(k.lower() == "prefer" and "respond-async" in str(v).lower() for k, v in headers.items())
+
+
+def _key_id(idempotency_key: str) -> str:
+    return hashlib.sha256(idempotency_key.encode("utf-8")).hexdigest()[:32]
+
+
+def _depth_metric(page_key: str, delta: int) -> None:
+    """Adjust and report a page's queue depth; a counter error only costs the metric."""
+    try:
+        depth = get_backend().add_depth(page_key, delta)
+    except Exception as e:
+        log_event("chat_job_depth_failed", {"page": page_key}, level="warning", error=e)
+        return
+    record_page_metric("chat_job_queue_depth", max(0, depth), page=page_key)
+
+
+def poll_after_ms() -> int:
+    return max(0, _env_int("CHAT_JOB_POLL_AFTER_MS", 2000))
+
+
+def submit(body: dict, user_id: str, page: str) -> Optional[Dict[str, Any]]:
+    """
+    Queue a validated request body (as parsed by the chat handler, with its
+    resolved idempotency key). Returns the job view for the 202 response, or
+    None when job mode can't be used and the request should run inline.
+    """
+    queue = _job_queue()
+    if queue is None:
+        return None
+    page_key = get_page_key(page)
+    job_id = uuid.uuid4().hex
+    key = body.get("idempotencyKey")
+    key_id = _key_id(key) if key else None
+    ttl_seconds = _env_int("CHAT_JOB_TTL_SECONDS", 86400)
+    store = get_backend()
+    linked = False
+    try:
+        if key_id:
+            existing = store.link_key(key_id, job_id, ttl_seconds)
+            if existing is not None:
+                # Double-submit: answer with the job that already exists
+                log_event("chat_job_duplicate", {"job_id": existing, "page": page_key})
+                return status(existing, user_id) or {"jobId": existing, "status": QUEUED}
+            linked = True
+        store.create(job_id, page_key, user_id, ttl_seconds)
+    except Exception as e:
+        log_event("chat_job_submit_failed", {"page": page_key, "step": "create"}, level="error", error=e)
+        if linked:
+            _safe("unlink_key", job_id, store.unlink_key, key_id)
+        return None
+
+    try:
+        # FIFO queues: order within a conversation only, so one page's burst isn't serialized
+        queue.send(dict(body, jobId=job_id), group_id=body.get("conversationId") or job_id, dedup_id=job_id)
+    except Exception as e:
+        log_event("chat_job_submit_failed", {"job_id": job_id, "page": page_key, "step": "enqueue"},
+                  level="error", error=e)
+        # Answered inline: drop the job so a resubmit doesn't wait on one nobody runs
+        _safe("delete", job_id, store.delete, job_id)
+        if linked:
+            _safe("unlink_key", job_id, store.unlink_key, key_id)
+        return None
+
+    record_page_metric("chat_job_submitted", 1, page=page_key)
+    _depth_metric(page_key, +1)
+    log_event("chat_job_submitted", {"job_id": job_id, "page": page_key, "user_id": user_id})
+    return {"jobId": job_id, "status": QUEUED, "pollAfterMs": poll_after_ms()}
+
+
+def status(job_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Public view of a job for its submitter, or None when it is unknown,
+    expired, or belongs to another userId (reported the same way).
+    """
+    item = get_backend().get(job_id)
+    if not item or item.get("UserId", user_id) != user_id:
+        return None
+    view = {"jobId": job_id, "status": item.get("Status", QUEUED)}
+    if view["status"] == DONE:
+        view.update(reply=item.get("Reply"), conversationId=item.get("ConversationId"))
+    else:
+        view["pollAfterMs"] = poll_after_ms()
+    return view
+
+
+# -------- Worker side --------
+def _safe(action: str, job_id: str, fn, *args):
+    try:
+        return fn(*args)
+    except Exception as e:
+        log_event("chat_job_store_failed", {"action": action, "job_id": job_id}, level="warning", error=e)
+        return None
+
+
+def start(job_id: str) -> bool:
+    """
+    Mark a job running before its model call. False when it is already done
+    (a redelivered message), so the caller skips it. Store errors fail open.
+    """
+    try:
+        old = get_backend().start(job_id)
+    except Exception as e:
+        log_event("chat_job_store_failed", {"action": "start", "job_id": job_id}, level="warning", error=e)
+        return True
+    if old is None:
+        log_event("chat_job_skipped", {"job_id": job_id, "reason": "done or unknown"})
+        return False
+    _left_queue(old)
+    return True
+
+
+def _left_queue(old: Optional[Dict[str, Any]]) -> None:
+    """Depth -1 and wait time, when `old` (the job before an update) was still queued."""
+    if not old or old.get("Status") != QUEUED:
+        return
+    page_key = old.get("Page", "unknown")
+    _depth_metric(page_key, -1)
+    created = old.get("CreatedAt")
+    if created is not None:
+        record_page_metric("chat_job_wait_ms", time.time() * 1000 - float(created),
+                           unit="Milliseconds", page=page_key)
+
+
+def finish(job_id: str, reply: str, conversation_id: str, user_id: Optional[str] = None) -> None:
+    """Store the reply under the job id, then call the webhook (if configured)."""
+    _left_queue(_safe("complete", job_id, get_backend().complete, job_id, reply, conversation_id))
+    log_event("chat_job_done", {"job_id": job_id, "conversation_id": conversation_id})
+    _notify({"jobId": job_id, "status": DONE, "reply": reply, "conversationId": conversation_id, "userId": user_id})
+
+
+def fail_attempt(job_id: str, error: Exception) -> None:
+    _left_queue(_safe("fail_attempt", job_id, get_backend().fail_attempt, job_id, str(error)[:500]))
+
+
+def _notify(payload: dict) -> None:
+    """
+    POST the finished job to CHAT_JOB_WEBHOOK_URL. Only the server-side URL is
+    used (never one from the request), and failures are logged, not raised:
+    pollers still get the reply.
+    """
+    url = os.getenv("CHAT_JOB_WEBHOOK_URL")
+    if not url:
+        return
+    import urllib.request  # deferred: only workers with a webhook pay for it
+
+    data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+    secret = os.getenv("CHAT_JOB_WEBHOOK_SECRET")
+    if secret:
+        headers["X-Signature"] = "sha256=" + hmac.new(secret.encode("utf-8"), data, hashlib.sha256).hexdigest()
+    try:
+        req = urllib.request.Request(url, data=data, headers=headers, method="POST")
+        with urllib.request.urlopen(req, timeout=_env_int("CHAT_JOB_WEBHOOK_TIMEOUT_MS", 2000) / 1000.0) as resp:
+            resp.read()
+    except Exception as e:
+        log_event("chat_job_webhook_failed", {"job_id": payload.get("jobId")}, level="warning", error=e)
@@ -1,10 +1,50 @@
 # src/services/chat_service.py
-from src.assistant.assistant_client import send_message_to_assistant
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from src.assistant.assistant_client import (
+    create_assistant_response,
+    is_missing_chain_error,
+    stream_message_to_assistant,
+)
+from src.assistant.assistant_client import AssistantResult
 from src.assistant.image_handler import format_image_urls_for_openai
-from src.storage.conversations_table import save_conversation
-from src.storage.messages_table import save_message, get_recent_messages
-from src.config.page_vectorstores import get_stores_for_page  # ✅ visibility/debug
-from src.utils.logging_utils import log_event  # ✅ structured logger
+from src.config.model_config import get_model_config
+from src.config.model_router import Route, route_request, looks_truncated
+from src.services import answer_cache, conversation_summary, idempotency
+from src.services.history_window import HistoryWindow, build_window, fetch_limit
+from src.storage.conversations_table import save_conversation, find_conversation, update_conversation_chain
+from src.storage.messages_table import get_recent_messages, seed_tail
+from src.services.turn_persistence import persist_turn
+from src.config.page_vectorstores import get_stores_for_page, get_page_key  # ✅ visibility/debug
+from src.utils.logging_utils import log_event, stage, record_stage, reset_stage_timings, set_metric_dimensions  # ✅ structured logger + stage timings
+from src.utils.deadline import Deadline, DeadlineExceeded, DegradationPlan, FULL_PLAN, plan_for
+from src.utils.token_count import count_tokens
+
+
+def _chaining_enabled() -> bool:
+    """
+    CONVERSATION_CHAINING=1 chains turns with previous_response_id instead of a
+    transcript. Needs the CONVERSATIONS_ID_INDEX GSI to find the chain across
+    containers (see storage/conversations_table).
+    """
+    return os.getenv("CONVERSATION_CHAINING", "0").strip().lower() in ("1", "true", "yes")
+
+
+def _chain_max_age() -> timedelta:
+    """Stored responses expire server-side; treat older chains as missing (default 29 days)."""
+    try:
+        hours = float(os.getenv("CHAIN_MAX_AGE_HOURS", "696"))
+    except ValueError:
+        hours = 696.0
+    return timedelta(hours=hours)
+
+
+def _estimate_tokens(text: str | None) -> int:
+    """Token count for logging (tiktoken when installed, else ~4 chars per token)."""
+    return count_tokens(text)
 
 
 def _normalize_email_for_storage(val):
@@ -23,78 +63,222 @@ def _normalize_page(val: str | None) -> str:
     return val
 
 
-def _build_history_block(conversation_id: str, max_turns: int = 8, max_chars_per_msg: int = 600) -> str | None:
+def _fetch_history(conversation_id: str) -> list:
+    with stage("history_fetch"):
+        return get_recent_messages(conversation_id=conversation_id, limit=fetch_limit(), ascending=True)
+
+
+def _build_history_block(
+    conversation_id: str,
+    user_id: str | None = None,
+    msgs: list | None = None,
+    header: dict | None = None,
+) -> HistoryWindow | None:
     """
-    Fetch last N messages and return a compact Spanish transcript.
-    Oldest→newest order to preserve coherence. Truncates long messages.
+    Fetch the newest messages and fit them, oldest→newest, into the history
+    token budget (see services/history_window). When older turns no longer
+    fit, the rolling summary from the conversation header goes first and a
+    refresh is scheduled once enough turns are left out of it.
+    Callers that already hold the messages or the header pass them in.
     """
     try:
-        msgs = get_recent_messages(conversation_id=conversation_id, limit=max_turns * 2, ascending=True)
+        limit = fetch_limit()
+        if msgs is None:
+            msgs = _fetch_history(conversation_id)
         if not msgs:
             return None
 
-        lines = ["[HISTORIAL RECIENTE]"]
-        for m in msgs:
-            role = m.get("Role", "user")
-            text = m.get("MessageText", "")
-            if max_chars_per_msg and len(text) > max_chars_per_msg:
-                text = text[:max_chars_per_msg] + "…"
-            speaker = "Usuario" if role == "user" else "Roma"
-            lines.append(f"{speaker}: {text}")
-        return "\n".join(lines)
+        complete = len(msgs) < limit
+        window = build_window(msgs, complete=complete)
+        scheduled = None
+        if (window.dropped or not complete) and conversation_summary.summary_every_turns():
+            if header is None:
+                header = _summary_header(user_id, conversation_id)
+            if header and header.get("Summary"):
+                window = build_window(msgs, summary=header["Summary"], complete=complete)
+            scheduled = conversation_summary.maybe_schedule_refresh(conversation_id, header, window)
+
+        log_event("history_window", lambda: {
+            "conversation_id": conversation_id,
+            "tokens": window.tokens,
+            "legacy_tokens": window.legacy_tokens,
+            "tokens_saved": window.tokens_saved,
+            "messages_included": len(window.included),
+            "messages_dropped": len(window.dropped),
+            "images_dropped": window.images_dropped,
+            "summary_used": window.summary_used,
+            "summary_refresh": scheduled,
+        })
+        return window if window.text else None
     except Exception as e:
         # Don't fail the request if history fetch fails; just skip history
         log_event("history_fetch_failed", {"conversation_id": conversation_id}, level="warning", error=e)
         return None
 
 
-def get_ai_response(
+def _summary_header(user_id: str | None, conversation_id: str) -> dict | None:
+    try:
+        with stage("summary_lookup"):
+            return find_conversation(user_id, conversation_id)
+    except Exception as e:
+        log_event("conversation_summary_lookup_failed", {"conversation_id": conversation_id},
+                  level="warning", error=e)
+        return None
+
+
+@dataclass
+class _Turn:
+    """Per-request state shared by the blocking and streaming paths."""
+    conversation_id: str
+    message_parts: list
+    user_id: str | None = None
+    header_key: tuple | None = None          # (UserId, Timestamp) of the conversation header
+    previous_response_id: str | None = None
+    history_block: str | None = None
+    history_window: HistoryWindow | None = None
+    history_mode: str = "none"               # "chained" | "transcript" | "none"
+    fallbacks: list = field(default_factory=list)
+    plan: DegradationPlan = FULL_PLAN
+    deadline: Deadline | None = None
+    route: Route | None = None
+    stores: list = field(default_factory=list)  # vector stores for the page, resolved once
+    follow_up: bool = False                  # the request named an existing conversation
+
+    @property
+    def content_parts(self) -> list:
+        parts = []
+        if self.history_block:
+            parts.append({"type": "text", "text": self.history_block})
+        return parts + self.message_parts
+
+    def use_transcript(self) -> None:
+        """Drop the server-side chain and rebuild the transcript from DynamoDB."""
+        self.previous_response_id = None
+        if self.plan.skip_history:
+            # Degraded tier: answer without history rather than spend the time budget
+            self.history_block = None
+            self.history_mode = "none"
+            return
+        self.history_window = _build_history_block(self.conversation_id, self.user_id)
+        self.history_block = self.history_window.text if self.history_window else None
+        self.history_mode = "transcript" if self.history_block else "none"
+
+
+def _resolve_chain(user_id: str | None, conversation_id: str):
+    """
+    Look up the conversation header and return (header_key, previous_response_id).
+    previous_response_id is None when the chain is missing or older than
+    CHAIN_MAX_AGE_HOURS. Lookup failures degrade to transcript mode.
+    """
+    return _chain_from_header(_lookup_header(user_id, conversation_id))
+
+
+def _lookup_header(user_id: str | None, conversation_id: str) -> dict | None:
+    try:
+        with stage("chain_lookup"):
+            return find_conversation(user_id, conversation_id)
+    except Exception as e:
+        log_event("conversation_header_lookup_failed", {"conversation_id": conversation_id}, level="warning", error=e)
+        return None
+
+
+def _chain_from_header(header: dict | None):
+    if not header:
+        return None, None
+
+    header_key = (header["UserId"], header["Timestamp"])
+    prev_id = header.get("LastResponseId")
+    prev_at = header.get("LastResponseAt")
+    if prev_id and prev_at:
+        try:
+            if datetime.utcnow() - datetime.fromisoformat(prev_at) > _chain_max_age():
+                prev_id = None
+        except ValueError:
+            prev_id = None
+    return header_key, prev_id
+
+
+def _prepare_turn(
     message: str | None,
     user_id: str | None,
     name: str | None,
     email: str | None,
-    page: str | None,
-    conversation_id: str | None = None,   # ✅ reuse if provided
-    image_urls: list[str] | None = None,
-):
+    page: str,
+    conversation_id: str | None,
+    image_urls: list[str] | None,
+    plan: DegradationPlan = FULL_PLAN,
+) -> _Turn:
     """
-    Handles user input (text + images) and returns AI response using the Responses API.
-    No threads/runs are used. Raises exceptions for DLQ-friendly retries.
-    Returns: (assistant_reply: str, conversation_id: str)
+    Steps 1-3 shared by the blocking and streaming paths: find-or-create the
+    conversation, format images and resolve history (chain or transcript).
     """
-    page = _normalize_page(page)
+    stores = get_stores_for_page(page)
+    follow_up = conversation_id is not None
+    conversation_id, header_key = _open_conversation(message, user_id, name, email, page, conversation_id, stores)
+    message_parts = _message_parts(message, image_urls, user_id)
 
-    # Step 1: Find-or-create conversation (REUSE if conversation_id provided)
+    turn = _Turn(conversation_id=conversation_id, message_parts=message_parts, user_id=user_id,
+                 header_key=header_key, plan=plan, stores=stores, follow_up=follow_up)
+
+    if header_key is not None:
+        # New conversation: nothing to chain from or replay yet
+        return turn
+
+    if _chaining_enabled():
+        turn.header_key, turn.previous_response_id = _resolve_chain(user_id, conversation_id)
+        if turn.previous_response_id:
+            turn.history_mode = "chained"
+            return turn
+        turn.fallbacks.append("chain_missing")
+
+    turn.use_transcript()
+    return turn
+
+
+def _open_conversation(message, user_id, name, email, page: str, conversation_id: str | None, stores: list):
+    """
+    Step 1: find-or-create the conversation (REUSE if conversation_id provided).
+    Returns (conversation_id, header_key); header_key is only known for a new one.
+    """
+    header_key = None
     try:
         if conversation_id:
-            log_event("conversation_reused", {
+            log_event("conversation_reused", lambda: {
                 "conversation_id": conversation_id,
                 "user_id": user_id,
                 "page": page,
-                "vector_stores": get_stores_for_page(page),  # ✅ visibility
+                "vector_stores": stores,  # ✅ visibility
             })
         else:
             sanitized_email = _normalize_email_for_storage(email)
-            conversation_data = save_conversation(
-                user_id=user_id,
-                name=name or "",
-                email=sanitized_email,
-                title=(message or "[Sin texto]")[:40],
-                page=page,
-            )
+            with stage("conversation_save"):
+                conversation_data = save_conversation(
+                    user_id=user_id,
+                    name=name or "",
+                    email=sanitized_email,
+                    title=(message or "[Sin texto]")[:40],
+                    page=page,
+                )
             conversation_id = conversation_data["ConversationId"]
-            log_event("conversation_created", {
+            header_key = (user_id, conversation_data["Timestamp"])
+            seed_tail(conversation_id)  # new conversation: next turn's history comes from memory
+            log_event("conversation_created", lambda: {
                 "conversation_id": conversation_id,
                 "user_id": user_id,
                 "page": page,
-                "vector_stores": get_stores_for_page(page),  # ✅ visibility
+                "vector_stores": stores,  # ✅ visibility
             })
     except Exception as e:
         raise RuntimeError(f"❌ Failed to save/reuse conversation: {e}")
+    return conversation_id, header_key
+
 
+def _message_parts(message: str | None, image_urls: list[str] | None, user_id: str | None) -> list:
+    """Steps 2-3: the turn's own content parts (text, then image blocks)."""
     # Step 2: Format image blocks
     try:
-        image_blocks = format_image_urls_for_openai(image_urls or [])
+        with stage("image_format"):
+            image_blocks = format_image_urls_for_openai(image_urls or [])
         log_event("image_blocks_formatted", {
             "image_count": len(image_blocks),
             "user_id": user_id
@@ -102,57 +286,466 @@ def get_ai_response(
     except Exception as e:
         raise RuntimeError(f"❌ Failed to format image URLs: {e}")
 
-    # Step 3: Build content_parts (include recent history as first block)
-    content_parts = []
+    # Step 3: Build content_parts (history — chained or transcript — comes first)
+    message_parts = []
+    if message:
+        message_parts.append({"type": "text", "text": message})
+    return message_parts + image_blocks
 
-    history_block = _build_history_block(conversation_id, max_turns=8, max_chars_per_msg=600)
-    if history_block:
-        content_parts.append({"type": "text", "text": history_block})
 
-    if message:
-        content_parts.append({"type": "text", "text": message})
+def _finish_chain(turn: _Turn, page: str, response_id: str | None, usage: dict) -> None:
+    """
+    Record the new response id on the conversation header (chaining mode) and
+    log per-turn input tokens by history mode so both modes can be compared.
+    """
+    if _chaining_enabled() and turn.header_key and response_id:
+        try:
+            with stage("chain_update"):
+                update_conversation_chain(turn.header_key[0], turn.header_key[1], turn.conversation_id, response_id)
+        except Exception as e:
+            # Next turn falls back to the transcript; don't fail this one
+            log_event("conversation_chain_update_failed", {
+                "conversation_id": turn.conversation_id,
+            }, level="warning", error=e)
 
-    content_parts += image_blocks
+    history_tokens = _estimate_tokens(turn.history_block)
+    log_event("history_mode_usage", {
+        "conversation_id": turn.conversation_id,
+        "page": page,
+        "history_mode": turn.history_mode,
+        "fallbacks": turn.fallbacks,
+        "input_tokens": usage.get("input_tokens"),
+        "cached_tokens": usage.get("cached_tokens"),
+        # Transcript tokens re-sent by us this turn (0 when chained); compare
+        # input_tokens across modes to see the net saving per turn
+        "history_tokens_sent": history_tokens,
+        "history_tokens_saved": turn.history_window.tokens_saved if turn.history_window else 0,
+        "history_query_skipped": turn.history_mode == "chained",
+    })
 
-    # Step 4: Send to model
-    try:
-        log_event("openai_request_sent", {
-            "user_id": user_id,
-            "page": page,
-            "content_parts_count": len(content_parts),
-            "vector_stores": get_stores_for_page(page),  # ✅ visibility
-        })
-        assistant_reply = send_message_to_assistant(
-            content_parts=content_parts,
-            user_id=user_id,
-            page=page,
-            name=(name or None),
-            email=_normalize_email_for_storage(email),
-        )
-    except Exception as e:
-        raise RuntimeError(f"❌ OpenAI Responses API failed: {e}")
 
-    if not assistant_reply or "No assistant response" in assistant_reply:
-        raise ValueError("❌ Assistant returned an empty or invalid response.")
+def _log_prompt_cache(page: str, usage: dict) -> None:
+    """Per-page prompt-cache hit ratio from usage.input_tokens_details.cached_tokens."""
+    input_tokens = usage.get("input_tokens") or 0
+    cached_tokens = usage.get("cached_tokens") or 0
+    log_event("prompt_cache_usage", {
+        "page_key": get_page_key(page),
+        "input_tokens": input_tokens,
+        "cached_tokens": cached_tokens,
+        "cache_hit_ratio": round(cached_tokens / input_tokens, 3) if input_tokens else None,
+    })
 
-    log_event("openai_response_received", {
-        "conversation_id": conversation_id,
-        "reply_snippet": assistant_reply[:100],
+
+def _cached_answer(turn: _Turn, message, image_urls, page: str) -> str | None:
+    """
+    Answer-cache lookup for standalone questions (no images, first turn of a
+    conversation), in the namespace of the model this turn is routed to. A
+    follow-up bypasses the cache even when its history could not be loaded.
+    """
+    has_history = turn.follow_up or turn.history_mode != "none"
+    if not answer_cache.is_cacheable(message, image_urls, has_history=has_history):
+        return None
+    with stage("answer_cache"):
+        answer, info = answer_cache.lookup(message, turn.stores, turn.route.config.model)
+    log_event("answer_cache_lookup", lambda: {
+        "conversation_id": turn.conversation_id,
+        "page_key": get_page_key(page),
+        "hit": answer is not None,
+        **info,
+        "metrics": answer_cache.get_metrics(),
+    })
+    return answer
+
+
+def _store_cached_answer(turn: _Turn, message, image_urls, page: str, reply: str, private_values) -> None:
+    """Cache a fresh answer under the model that produced it (after any escalation)."""
+    if not answer_cache.is_enabled() or image_urls or not message:
+        return
+    if turn.follow_up or turn.history_mode != "none":
+        return
+    answer_cache.store(message, turn.stores, turn.route.config.model, reply, private_values)
+
+
+def _check_deadline(deadline: Deadline | None, stage: str, conversation_id: str | None = None) -> DegradationPlan:
+    """
+    Re-evaluate the degradation tier, log it, and fail fast (DeadlineExceeded)
+    when there is no time left for a model call.
+    """
+    plan = plan_for(deadline)
+    if deadline is not None:
+        log_event("deadline_tier", {
+            "stage": stage,
+            "tier": plan.tier,
+            "remaining_ms": plan.remaining_ms,
+            "conversation_id": conversation_id,
+        }, level="warning" if plan.tier == "fail_fast" else "info")
+    if plan.tier == "fail_fast":
+        raise DeadlineExceeded(f"Only {plan.remaining_ms} ms left at {stage}", conversation_id=conversation_id)
+    return plan
+
+
+def _model_kwargs(turn: _Turn, user_id, page, name, email) -> dict:
+    plan = turn.plan
+    return dict(
+        user_id=user_id,
+        page=page,
+        name=(name or None),
+        email=_normalize_email_for_storage(email),
+        max_num_results=plan.max_num_results,
+        max_output_tokens=plan.max_output_tokens,
+        timeout=plan.timeout_s,
+        deadline=turn.deadline,
+        model_config=turn.route.config if turn.route else None,
+    )
+
+
+def _log_route(turn: _Turn, page: str, latency_ms: float, escalated: bool = False, first=None) -> None:
+    route = turn.route
+    log_event("model_route", {
+        "conversation_id": turn.conversation_id,
+        "page_key": get_page_key(page),
+        "route": first.name if first else route.name,
+        "model": route.config.model,
+        "score": route.score,
+        "reasons": route.reasons,
+        "escalated": escalated,
+        "latency_ms": round(latency_ms, 1),
     })
 
-    # Step 5: Persist messages
+
+def _call_model(turn: _Turn, user_id, page, name, email):
+    """
+    Step 4 (blocking): call the routed model. Answers from the fast model that
+    look empty or truncated are escalated once to the main model.
+    """
+    t0 = time.perf_counter()
+    result = _call_model_once(turn, user_id, page, name, email)
+    first = turn.route
+    escalated = False
+    if first and first.name == "fast" and looks_truncated(result.text, result.incomplete):
+        escalated = True
+        turn.route = Route(name="main", config=get_model_config(), score=first.score, reasons=first.reasons + ["escalated"])
+        result = _call_model_once(turn, user_id, page, name, email)
+    if turn.route:
+        _log_route(turn, page, (time.perf_counter() - t0) * 1000.0, escalated, first if escalated else None)
+    return result
+
+
+def _call_model_once(turn: _Turn, user_id, page, name, email):
+    """
+    One model call, falling back to the transcript when the server-side chain
+    is missing or expired.
+    """
+    kwargs = _model_kwargs(turn, user_id, page, name, email)
+    chained = _chaining_enabled() and turn.header_key is not None
+    model = turn.route.config.model if turn.route else None
+    try:
+        with stage("model_call", model=model):
+            return create_assistant_response(
+                turn.content_parts, chained=chained, previous_response_id=turn.previous_response_id, **kwargs,
+            )
+    except Exception as e:
+        if not (turn.previous_response_id and is_missing_chain_error(e)):
+            raise
+        log_event("conversation_chain_fallback", {
+            "conversation_id": turn.conversation_id,
+            "reason": str(e)[:200],
+        }, level="warning")
+        turn.fallbacks.append("chain_expired")
+        turn.use_transcript()
+        with stage("model_call", model=model):
+            return create_assistant_response(turn.content_parts, chained=chained, **kwargs)
+
+
+def _persist_turn(
+    conversation_id: str,
+    user_id: str | None,
+    message: str | None,
+    image_urls: list[str] | None,
+    assistant_reply: str,
+    turn_timestamp: str | None = None,
+) -> None:
+    """
+    Step 5: persist the user text, image references and assistant reply in one
+    batch, or queue them for the turn writer in write-behind mode.
+    """
     try:
-        if message:
-            save_message(conversation_id, role="user", message_text=message)
-        for img in image_urls or []:
-            save_message(conversation_id, role="user", message_text=f"[Imagen] {img}")
-        save_message(conversation_id, role="assistant", message_text=assistant_reply)
+        with stage("messages_save"):
+            mode = persist_turn(conversation_id, message, image_urls, assistant_reply, turn_timestamp=turn_timestamp)
 
         log_event("messages_saved", {
             "conversation_id": conversation_id,
             "user_id": user_id,
+            "mode": mode,
         })
     except Exception as e:
         raise RuntimeError(f"❌ Failed to save messages to DynamoDB: {e}")
 
+
+def _resume(claim, conversation_id: str | None) -> str | None:
+    """A retry of a request whose first attempt already created the conversation reuses it."""
+    if conversation_id or claim is None:
+        return conversation_id
+    return claim.conversation_id
+
+
+def _log_replay(claim, user_id) -> None:
+    log_event("idempotent_replay", {
+        "key": claim.key,
+        "conversation_id": claim.conversation_id,
+        "user_id": user_id,
+        "attempts": claim.attempts,
+    })
+
+
+def get_ai_response(
+    message: str | None,
+    user_id: str | None,
+    name: str | None,
+    email: str | None,
+    page: str | None,
+    conversation_id: str | None = None,   # ✅ reuse if provided
+    image_urls: list[str] | None = None,
+    deadline: Deadline | None = None,
+    idempotency_key: str | None = None,
+):
+    """
+    Handles user input (text + images) and returns AI response using the Responses API.
+    No threads/runs are used. Raises exceptions for DLQ-friendly retries.
+    With a deadline, degrades (see utils.deadline) and raises DeadlineExceeded
+    instead of starting a model call that cannot finish.
+    With an idempotency_key (see services.idempotency), a repeated request
+    returns the stored reply without calling the model again.
+    Returns: (assistant_reply: str, conversation_id: str)
+    """
+    claim = idempotency.begin(idempotency_key) if idempotency_key else None
+    if claim is not None and claim.replay:
+        _log_replay(claim, user_id)
+        return claim.reply, claim.conversation_id
+
+    try:
+        reply, conversation_id = _get_ai_response(
+            message, user_id, name, email, page, conversation_id, image_urls, deadline, claim,
+        )
+    except Exception:
+        idempotency.release(claim)
+        raise
+    idempotency.complete(claim, reply, conversation_id)
+    return reply, conversation_id
+
+
+def _get_ai_response(message, user_id, name, email, page, conversation_id, image_urls, deadline, claim):
+    page = _normalize_page(page)
+    reset_stage_timings(page=get_page_key(page))
+
+    conversation_id = _resume(claim, conversation_id)
+    plan = _check_deadline(deadline, "start", conversation_id)
+    turn = _prepare_turn(message, user_id, name, email, page, conversation_id, image_urls, plan)
+    if conversation_id is None:
+        idempotency.note_conversation(claim, turn.conversation_id)
+    turn.deadline = deadline
+    conversation_id = turn.conversation_id
+
+    # Step 4: Answer cache, then model
+    turn.route = route_request(message, bool(image_urls), page)
+    cached = _cached_answer(turn, message, image_urls, page)
+    if cached is not None:
+        result = AssistantResult(text=cached)
+    else:
+        turn.plan = _check_deadline(deadline, "model_call", conversation_id)
+        set_metric_dimensions(model=turn.route.config.model)
+        try:
+            log_event("openai_request_sent", lambda: {
+                "user_id": user_id,
+                "page": page,
+                "content_parts_count": len(turn.content_parts),
+                "history_mode": turn.history_mode,
+                "tier": turn.plan.tier,
+                "vector_stores": turn.stores,  # ✅ visibility
+            })
+            result = _call_model(turn, user_id, page, name, email)
+        except Exception as e:
+            raise RuntimeError(f"❌ OpenAI Responses API failed: {e}")
+
+    assistant_reply = result.text
+    if not assistant_reply or "No assistant response" in assistant_reply:
+        raise ValueError("❌ Assistant returned an empty or invalid response.")
+
+    if cached is None:
+        log_event("openai_response_received", {
+            "conversation_id": conversation_id,
+            "reply_snippet": assistant_reply[:100],
+        })
+        _finish_chain(turn, page, result.response_id, result.usage)
+        _log_prompt_cache(page, result.usage)
+        if not result.incomplete:
+            _store_cached_answer(turn, message, image_urls, page, assistant_reply, (name, email, user_id))
+
+    # Step 5: Persist messages (a retried request rewrites the same turn keys)
+    _persist_turn(conversation_id, user_id, message, image_urls, assistant_reply,
+                  turn_timestamp=claim.turn_timestamp if claim else None)
+
     return assistant_reply, conversation_id
+
+
+def _stream_model(turn: _Turn, user_id, page, name, email, meta: dict):
+    """
+    Relay one streamed model call, falling back to the transcript when the
+    server-side chain is missing or expired. The chain can only be rejected
+    before the first delta arrives.
+    """
+    kwargs = _model_kwargs(turn, user_id, page, name, email)
+    chained = _chaining_enabled() and turn.header_key is not None
+    try:
+        deltas = stream_message_to_assistant(
+            turn.content_parts, chained=chained,
+            previous_response_id=turn.previous_response_id, meta=meta, **kwargs,
+        )
+        first = next(deltas, None)
+    except Exception as e:
+        if not (turn.previous_response_id and is_missing_chain_error(e)):
+            raise
+        log_event("conversation_chain_fallback", {
+            "conversation_id": turn.conversation_id,
+            "reason": str(e)[:200],
+        }, level="warning")
+        turn.fallbacks.append("chain_expired")
+        turn.use_transcript()
+        deltas = stream_message_to_assistant(turn.content_parts, chained=chained, meta=meta, **kwargs)
+        first = next(deltas, None)
+    if first is None:
+        return
+    yield first
+    yield from deltas
+
+
+def stream_ai_response(
+    message: str | None,
+    user_id: str | None,
+    name: str | None,
+    email: str | None,
+    page: str | None,
+    conversation_id: str | None = None,
+    image_urls: list[str] | None = None,
+    deadline: Deadline | None = None,
+    idempotency_key: str | None = None,
+):
+    """
+    Streaming variant of get_ai_response. Yields events as dicts:
+      {"type": "start", "conversationId": ...}
+      {"type": "delta", "text": ...}            # one per output_text delta
+      {"type": "reset"}                         # fast-model answer escalated: drop the deltas so far
+      {"type": "done",  "reply": ..., "conversationId": ...}
+    The full reply is assembled and persisted before "done" is yielded.
+    A replayed idempotent request yields the stored reply as a single delta.
+    Raises the same exceptions as get_ai_response.
+    """
+    claim = idempotency.begin(idempotency_key) if idempotency_key else None
+    if claim is not None and claim.replay:
+        _log_replay(claim, user_id)
+        yield {"type": "start", "conversationId": claim.conversation_id}
+        yield {"type": "delta", "text": claim.reply}
+        yield {"type": "done", "reply": claim.reply, "conversationId": claim.conversation_id}
+        return
+
+    try:
+        for event in _stream_ai_response(
+            message, user_id, name, email, page, conversation_id, image_urls, deadline, claim,
+        ):
+            if event["type"] == "done":
+                idempotency.complete(claim, event["reply"], event["conversationId"])
+            yield event
+    except BaseException:
+        # Includes GeneratorExit (client went away): let a retry take over
+        idempotency.release(claim)
+        raise
+
+
+def _stream_ai_response(message, user_id, name, email, page, conversation_id, image_urls, deadline, claim):
+    page = _normalize_page(page)
+    reset_stage_timings(page=get_page_key(page))
+
+    conversation_id = _resume(claim, conversation_id)
+    plan = _check_deadline(deadline, "start", conversation_id)
+    turn = _prepare_turn(message, user_id, name, email, page, conversation_id, image_urls, plan)
+    if conversation_id is None:
+        idempotency.note_conversation(claim, turn.conversation_id)
+    turn.deadline = deadline
+    conversation_id = turn.conversation_id
+    yield {"type": "start", "conversationId": conversation_id}
+
+    turn.route = route_request(message, bool(image_urls), page)
+    cached = _cached_answer(turn, message, image_urls, page)
+    if cached is not None:
+        _persist_turn(conversation_id, user_id, message, image_urls, cached,
+                      turn_timestamp=claim.turn_timestamp if claim else None)
+        yield {"type": "delta", "text": cached}
+        yield {"type": "done", "reply": cached, "conversationId": conversation_id}
+        return
+
+    # Step 4: Stream from model
+    turn.plan = _check_deadline(deadline, "model_call", conversation_id)
+    set_metric_dimensions(model=turn.route.config.model)
+    log_event("openai_request_sent", lambda: {
+        "user_id": user_id,
+        "page": page,
+        "content_parts_count": len(turn.content_parts),
+        "history_mode": turn.history_mode,
+        "tier": turn.plan.tier,
+        "vector_stores": turn.stores,
+        "stream": True,
+    })
+    meta: dict = {}
+    chunks: list[str] = []
+    t0 = time.perf_counter()
+    ttft_ms = None
+    first_route = turn.route
+    escalated = False
+    try:
+        for delta in _stream_model(turn, user_id, page, name, email, meta):
+            if ttft_ms is None:
+                ttft_ms = round((time.perf_counter() - t0) * 1000.0, 1)
+                record_stage("model_first_token", ttft_ms)
+                log_event("openai_stream_first_token", {
+                    "conversation_id": conversation_id,
+                    "ttft_ms": ttft_ms,
+                })
+            chunks.append(delta)
+            yield {"type": "delta", "text": delta}
+
+        # Same escalation as the blocking path; the client drops what it has so far
+        if first_route.name == "fast" and looks_truncated("".join(chunks), meta.get("incomplete", False)):
+            escalated = True
+            turn.route = Route(name="main", config=get_model_config(), score=first_route.score,
+                               reasons=first_route.reasons + ["escalated"])
+            meta.clear()
+            chunks = []
+            yield {"type": "reset"}
+            for delta in _stream_model(turn, user_id, page, name, email, meta):
+                chunks.append(delta)
+                yield {"type": "delta", "text": delta}
+    except Exception as e:
+        raise RuntimeError(f"❌ OpenAI Responses API stream failed: {e}")
+
+    record_stage("model_call", (time.perf_counter() - t0) * 1000.0)
+    assistant_reply = "".join(chunks).strip()
+    if not assistant_reply:
+        raise ValueError("❌ Assistant returned an empty or invalid response.")
+
+    log_event("openai_response_received", {
+        "conversation_id": conversation_id,
+        "reply_snippet": assistant_reply[:100],
+        "ttft_ms": ttft_ms,
+        "total_ms": round((time.perf_counter() - t0) * 1000.0, 1),
+    })
+    _log_route(turn, page, (time.perf_counter() - t0) * 1000.0, escalated, first_route if escalated else None)
+    _finish_chain(turn, page, meta.get("response_id"), meta.get("usage") or {})
+    _log_prompt_cache(page, meta.get("usage") or {})
+    if not meta.get("incomplete"):
+        _store_cached_answer(turn, message, image_urls, page, assistant_reply, (name, email, user_id))
+
+    # Step 5: Persist messages (full text, same as the blocking path)
+    _persist_turn(conversation_id, user_id, message, image_urls, assistant_reply,
+                  turn_timestamp=claim.turn_timestamp if claim else None)
+
+    yield {"type": "done", "reply": assistant_reply, "conversationId": conversation_id}
@@ -0,0 +1,237 @@
+# src/services/conversation_summary.py
+"""
+Rolling summary of the turns that no longer fit the history window.
+
+The summary lives on the UserConversations header (Summary, SummaryThrough,
+SummaryAt). Once HISTORY_SUMMARY_EVERY_TURNS turns have fallen out of the
+window since SummaryThrough, a refresh is scheduled. It folds those messages
+into the previous summary with the fast model and writes the result back,
+conditioned on SummaryThrough (if two refreshes race, the second is dropped).
+
+Refreshes never run on the request path:
+- with HISTORY_SUMMARY_QUEUE_URL (or the write-behind TURN_WRITE_QUEUE_URL)
+  a {"kind": "summary"} message is queued for lambda_turn_writer;
+- otherwise a background thread runs it. A container frozen mid-refresh
+  just loses it; the trigger still holds on the next turn, so it is retried
+  (unlike a turn, a summary can always be recomputed).
+
+Env (optional):
+- HISTORY_SUMMARY_EVERY_TURNS  (default: 6; 0 disables summaries; the
+                               header lookup needs the CONVERSATIONS_ID_INDEX GSI)
+- HISTORY_SUMMARY_MODEL        (default: OPENAI_FAST_MODEL, else gpt-4.1-nano)
+- HISTORY_SUMMARY_MAX_TOKENS   (default: 350)
+- HISTORY_SUMMARY_QUEUE_URL
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from src.services.history_window import HistoryWindow, is_image_line
+from src.storage.conversations_table import get_conversation, update_conversation_summary
+from src.storage.messages_table import get_messages_between
+from src.storage.queues import get_queue
+from src.utils.logging_utils import log_event
+from src.utils.token_count import count_tokens
+
+# Messages folded into the summary per model call
+_FOLD_MESSAGES = 60
+
+_SUMMARY_INSTRUCTIONS = (
+    "Eres el asistente Roma. Actualiza el resumen de una conversación de tutoría con un estudiante "
+    "que se prepara para el ICFES o la UNAL. Conserva: datos que el estudiante dio de sí mismo, "
+    "temas y preguntas trabajados, resultados o respuestas clave, dudas pendientes y acuerdos. "
+    "Omite saludos y relleno. Escribe en español, en prosa compacta o viñetas, máximo {words} palabras. "
+    "Responde solo con el resumen."
+)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def summary_every_turns() -> int:
+    return max(0, _env_int("HISTORY_SUMMARY_EVERY_TURNS", 6))
+
+
+def summary_model() -> str:
+    return os.getenv("HISTORY_SUMMARY_MODEL") or os.getenv("OPENAI_FAST_MODEL", "gpt-4.1-nano")
+
+
+def pending_turns(window: HistoryWindow, through: Optional[str]) -> int:
+    """
+    Turns (user messages) outside the window and not yet in the summary.
+    When the fetch did not reach the start of the conversation and the summary
+    does not reach the fetch either, there is an unseen backlog: report it as
+    due right away.
+    """
+    dropped = [m for m in window.dropped if not through or (m.get("Timestamp") or "") > through]
+    count = sum(1 for m in dropped if m.get("Role", "user") == "user")
+    oldest_fetched = (window.dropped or window.included or [{}])[0].get("Timestamp") or ""
+    if not window.complete and (not through or through < oldest_fetched):
+        count = max(count, summary_every_turns())
+    return count
+
+
+# -------- Scheduling --------
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+_inflight: set = set()
+
+
+def _background_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="summary")
+        return _pool
+
+
+def get_summary_queue():
+    return get_queue(os.getenv("HISTORY_SUMMARY_QUEUE_URL") or os.getenv("TURN_WRITE_QUEUE_URL"))
+
+
+def summary_payload(conversation_id: str, user_id: str, header_timestamp: str, until: str) -> dict:
+    return {
+        "kind": "summary",
+        "conversationId": conversation_id,
+        "userId": user_id,
+        "headerTimestamp": header_timestamp,
+        "until": until,
+    }
+
+
+def _summary_until(window: HistoryWindow) -> str:
+    """
+    Timestamp of the first turn the window holds in full. v2 items expand to
+    messages sharing their turn's key, so a budget cut inside a turn leaves
+    its user message out of the window: that turn goes to the summary too.
+    """
+    included = [m.get("Timestamp") or "" for m in window.included]
+    cut = (window.dropped[-1].get("Timestamp") or "") if window.dropped else None
+    return next((ts for ts in included if ts != cut), included[0])
+
+
+def maybe_schedule_refresh(
+    conversation_id: str,
+    header: Optional[Dict[str, Any]],
+    window: HistoryWindow,
+) -> Optional[str]:
+    """
+    Schedule a refresh when enough turns left the window since the last one.
+    Returns how it was scheduled ("queued" | "thread") or None.
+    """
+    every = summary_every_turns()
+    if not every or not header or not window.included:
+        return None
+    if pending_turns(window, header.get("SummaryThrough")) < every:
+        return None
+    if conversation_id in _inflight:
+        return None
+
+    payload = summary_payload(conversation_id, header["UserId"], header["Timestamp"], _summary_until(window))
+    queue = get_summary_queue()
+    if queue is not None:
+        try:
+            queue.send(payload, group_id=conversation_id, dedup_id=f"summary:{conversation_id}:{payload['until']}")
+            return "queued"
+        except Exception as e:
+            log_event("conversation_summary_enqueue_failed", {"conversation_id": conversation_id},
+                      level="warning", error=e)
+
+    _inflight.add(conversation_id)
+
+    def run():
+        try:
+            run_payload(payload)
+        except Exception as e:
+            log_event("conversation_summary_failed", {"conversation_id": conversation_id}, level="warning", error=e)
+        finally:
+            _inflight.discard(conversation_id)
+
+    _background_pool().submit(run)
+    return "thread"
+
+
+# -------- Refresh --------
+def _transcript(messages: List[Dict[str, Any]]) -> str:
+    lines = []
+    for m in messages:
+        if is_image_line(m):
+            continue
+        speaker = "Usuario" if m.get("Role", "user") == "user" else "Roma"
+        lines.append(f"{speaker}: {m.get('MessageText', '')}")
+    return "\n".join(lines)
+
+
+def summarize(previous: Optional[str], messages: List[Dict[str, Any]], client=None) -> str:
+    """Fold `messages` into `previous` with one call to the summary model."""
+    from src.assistant.resilience import call_with_resilience
+    from src.config.settings import get_openai_client
+
+    client = client or get_openai_client()
+    max_tokens = max(50, _env_int("HISTORY_SUMMARY_MAX_TOKENS", 350))
+    parts = []
+    if previous:
+        parts.append(f"Resumen actual:\n{previous}")
+    parts.append(f"Nuevos mensajes:\n{_transcript(messages)}")
+    resp = call_with_resilience(lambda: client.responses.create(
+        model=summary_model(),
+        instructions=_SUMMARY_INSTRUCTIONS.format(words=int(max_tokens * 0.6)),
+        input=[{"role": "user", "content": [{"type": "input_text", "text": "\n\n".join(parts)}]}],
+        max_output_tokens=max_tokens,
+        temperature=0.2,
+    ), label="summary.create", hedge=False)
+    return (getattr(resp, "output_text", None) or "").strip() or (previous or "")
+
+
+def refresh_summary(
+    conversation_id: str,
+    user_id: str,
+    header_timestamp: str,
+    until: str,
+    client=None,
+) -> Optional[str]:
+    """
+    Fold every message older than `until` and newer than the current
+    SummaryThrough into the summary. Returns the new summary, or None when
+    there was nothing to do or a concurrent refresh won.
+    """
+    t0 = time.perf_counter()
+    header = get_conversation(user_id, header_timestamp) or {}  # the payload carries the key
+    previous = header.get("Summary")
+    through = header.get("SummaryThrough")
+    if through and through >= until:
+        return None
+
+    messages = get_messages_between(conversation_id, through, until, limit=_FOLD_MESSAGES * 10)
+    texts = [m for m in messages if not is_image_line(m)]
+    if not texts:
+        return None
+
+    summary = previous
+    for i in range(0, len(texts), _FOLD_MESSAGES):
+        summary = summarize(summary, texts[i:i + _FOLD_MESSAGES], client=client)
+    new_through = messages[-1]["Timestamp"]
+    stored = update_conversation_summary(user_id, header_timestamp, summary, new_through, through)
+
+    log_event("conversation_summary_refreshed", {
+        "conversation_id": conversation_id,
+        "messages_folded": len(texts),
+        "summary_tokens": count_tokens(summary),
+        "folded_tokens": count_tokens(_transcript(texts)),
+        "stored": stored,
+        "latency_ms": round((time.perf_counter() - t0) * 1000.0, 1),
+    })
+    return summary if stored else None
+
+
+def run_payload(payload: dict, client=None) -> Optional[str]:
+    """Consumer side (lambda_turn_writer or the background thread)."""
+    return refresh_summary(
+        payload["conversationId"], payload["userId"], payload["headerTimestamp"], payload["until"], client=client,
+    )
@@ -0,0 +1,129 @@
+# src/services/history_window.py
+"""
+Token-budgeted conversation history for transcript mode.
+
+build_window() takes the newest messages (oldest→newest) and:
+- drops the "[Imagen] <url>" pseudo-messages: the model never sees the image
+  through a transcript line, so they cost tokens and carry nothing;
+- keeps whole messages newest-first until HISTORY_TOKEN_BUDGET is spent,
+  clipping any single message to HISTORY_MAX_MESSAGE_TOKENS;
+- puts the rolling summary of older turns (services/conversation_summary.py)
+  ahead of the transcript, counted against the same budget.
+
+legacy_tokens is what the previous fixed window (last 16 messages, 600
+characters each, image lines included) would have cost, so every request can
+log the tokens saved.
+
+Env (optional):
+- HISTORY_TOKEN_BUDGET        (default: 1000; summary + transcript)
+- HISTORY_MAX_MESSAGE_TOKENS  (default: 400)
+- HISTORY_FETCH_MESSAGES      (default: 40; newest messages read per turn)
+"""
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from src.storage.message_codec import IMAGE_PREFIX
+from src.utils.token_count import clip_to_tokens, count_tokens
+
+HISTORY_HEADER = "[HISTORIAL RECIENTE]"
+SUMMARY_HEADER = "[RESUMEN DE LA CONVERSACIÓN ANTERIOR]"
+_LEGACY_MESSAGES = 16
+_LEGACY_CHARS = 600
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def token_budget() -> int:
+    return max(0, _env_int("HISTORY_TOKEN_BUDGET", 1000))
+
+
+def fetch_limit() -> int:
+    return max(1, _env_int("HISTORY_FETCH_MESSAGES", 40))
+
+
+@dataclass
+class HistoryWindow:
+    text: Optional[str]
+    tokens: int = 0
+    included: List[Dict[str, Any]] = field(default_factory=list)
+    dropped: List[Dict[str, Any]] = field(default_factory=list)   # fetched, older than the window
+    images_dropped: int = 0
+    legacy_tokens: int = 0
+    summary_used: bool = False
+    complete: bool = True        # the fetch reached the start of the conversation
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.legacy_tokens - self.tokens
+
+
+def is_image_line(message: Dict[str, Any]) -> bool:
+    return (message.get("MessageText") or "").startswith(IMAGE_PREFIX)
+
+
+def _line(message: Dict[str, Any], max_chars: int | None = None, max_tokens: int | None = None) -> str:
+    text = message.get("MessageText", "") or ""
+    if max_chars and len(text) > max_chars:
+        text = text[:max_chars] + "…"
+    if max_tokens:
+        text = clip_to_tokens(text, max_tokens)
+    speaker = "Usuario" if message.get("Role", "user") == "user" else "Roma"
+    return f"{speaker}: {text}"
+
+
+def legacy_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Tokens the old builder would have sent for the same conversation."""
+    tail = messages[-_LEGACY_MESSAGES:]
+    if not tail:
+        return 0
+    return count_tokens("\n".join([HISTORY_HEADER] + [_line(m, max_chars=_LEGACY_CHARS) for m in tail]))
+
+
+def build_window(
+    messages: List[Dict[str, Any]],
+    summary: str | None = None,
+    budget: int | None = None,
+    max_message_tokens: int | None = None,
+    complete: bool = True,
+) -> HistoryWindow:
+    """Fit summary + newest messages (oldest→newest input) into the token budget."""
+    budget = token_budget() if budget is None else budget
+    max_message_tokens = max_message_tokens or max(1, _env_int("HISTORY_MAX_MESSAGE_TOKENS", 400))
+
+    texts = [m for m in messages if not is_image_line(m)]
+    window = HistoryWindow(text=None, images_dropped=len(messages) - len(texts),
+                           legacy_tokens=legacy_tokens(messages), complete=complete)
+
+    head: List[str] = []
+    if summary:
+        # The summary never takes more than half the budget
+        block = f"{SUMMARY_HEADER}\n{clip_to_tokens(summary.strip(), budget // 2)}"
+        head = [block, ""]
+        window.summary_used = True
+    used = count_tokens("\n".join(head + [HISTORY_HEADER]))
+
+    lines: List[str] = []
+    cut = len(texts)
+    for i in range(len(texts) - 1, -1, -1):
+        line = _line(texts[i], max_tokens=max_message_tokens)
+        cost = count_tokens(line) + 1  # + newline
+        if used + cost > budget:
+            break
+        lines.append(line)
+        used += cost
+        cut = i
+    lines.reverse()
+
+    window.included = texts[cut:]
+    window.dropped = texts[:cut]
+    if not lines and not head:
+        return window
+    window.text = "\n".join(head + [HISTORY_HEADER] + lines)
+    window.tokens = count_tokens(window.text)
+    return window
@@ -0,0 +1,267 @@
+# src/services/idempotency.py
+"""
+Idempotent chat requests: a retried or double-submitted request returns the
+stored reply instead of paying for a second model call.
+
+Key: the client's Idempotency-Key (header or body "idempotencyKey"), scoped
+to the user, or, for signed-in users only, a hash of user, conversation (or
+page, for a new one), message, images and a time bucket. Guests without a
+client key get no idempotency. Resolved keys start with "idem:v1:"; only the
+DLQ / job worker path (trusted=True) passes them through unchanged, so a
+replay runs under its original key.
+
+Lifecycle of a key:
+  claim      → in_flight with a lease; fixes the turn timestamp
+  (conversation created → its id is recorded on the key)
+  complete   → completed, reply stored until IDEMPOTENCY_TTL_SECONDS
+  failure    → lease released; the next attempt reuses the same turn
+               timestamp and conversation, so nothing is written twice
+
+A duplicate that finds the key in flight waits up to IDEMPOTENCY_WAIT_MS for
+the reply, then gets DuplicateRequestInFlight. Store errors fail open (the
+request runs without idempotency) and are logged.
+
+Env (optional):
+- IDEMPOTENCY_BACKEND        "off" (default) | "memory" | "dynamodb"
+- IDEMPOTENCY_TABLE          (default: ChatIdempotency)
+- IDEMPOTENCY_BUCKET_SECONDS (default: 300; window for derived keys)
+- IDEMPOTENCY_LEASE_SECONDS  (default: 120)
+- IDEMPOTENCY_TTL_SECONDS    (default: 86400)
+- IDEMPOTENCY_WAIT_MS        (default: 8000)
+"""
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.storage.messages_table import new_turn_timestamp
+from src.utils.logging_utils import log_event
+
+KEY_PREFIX = "idem:v1:"
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+class DuplicateRequestInFlight(RuntimeError):
+    """Another attempt with the same key is still running."""
+
+
+@dataclass
+class Claim:
+    key: str
+    turn_timestamp: str
+    conversation_id: Optional[str] = None
+    reply: Optional[str] = None          # set when the key was already completed
+    attempts: int = 1
+
+    @property
+    def replay(self) -> bool:
+        return self.reply is not None
+
+
+# -------- Backends --------
+class MemoryIdempotencyStore:
+    """In-container store with the same contract as the DynamoDB one (tests, local runs)."""
+
+    def __init__(self):
+        self._items: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def claim(self, key: str, turn_timestamp: str, lease_seconds: int, ttl_seconds: int) -> Tuple[str, Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            item = self._items.get(key)
+            if item and item.get("ExpiresAt", 0) <= now:
+                item = None
+            if item and not (item["Status"] == "in_flight" and item["LeaseUntil"] < now):
+                return item["Status"], dict(item)
+            item = item or {"IdempotencyKey": key, "TurnTimestamp": turn_timestamp, "Attempts": 0}
+            item.update(Status="in_flight", LeaseUntil=now + lease_seconds, ExpiresAt=now + ttl_seconds)
+            item["Attempts"] += 1
+            self._items[key] = item
+            return "claimed", dict(item)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self._items.get(key)
+            return dict(item) if item else None
+
+    def set_conversation(self, key: str, conversation_id: str) -> None:
+        with self._lock:
+            if key in self._items:
+                self._items[key]["ConversationId"] = conversation_id
+
+    def complete(self, key: str, reply: str, conversation_id: str, ttl_seconds: int) -> None:
+        with self._lock:
+            item = self._items.setdefault(key, {"IdempotencyKey": key})
+            item.update(Status="completed", Reply=reply, ConversationId=conversation_id,
+                        ExpiresAt=time.time() + ttl_seconds)
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            item = self._items.get(key)
+            if item and item["Status"] == "in_flight":
+                item["LeaseUntil"] = 0
+
+
+class DynamoIdempotencyStore:
+    """Shared across containers; conditional writes in storage/idempotency_table."""
+
+    def claim(self, key, turn_timestamp, lease_seconds, ttl_seconds):
+        from src.storage.idempotency_table import claim_key
+        return claim_key(key, turn_timestamp, lease_seconds, ttl_seconds)
+
+    def get(self, key):
+        from src.storage.idempotency_table import get_key
+        return get_key(key)
+
+    def set_conversation(self, key, conversation_id):
+        from src.storage.idempotency_table import set_conversation
+        set_conversation(key, conversation_id)
+
+    def complete(self, key, reply, conversation_id, ttl_seconds):
+        from src.storage.idempotency_table import complete_key
+        complete_key(key, reply, conversation_id, ttl_seconds)
+
+    def release(self, key):
+        from src.storage.idempotency_table import release_key
+        release_key(key)
+
+
+_backend = None
+_backend_name: Optional[str] = None
+
+
+def _backend_setting() -> str:
+    return os.getenv("IDEMPOTENCY_BACKEND", "off").strip().lower()
+
+
+def is_enabled() -> bool:
+    return _backend_setting() in ("memory", "dynamodb")
+
+
+def get_backend():
+    """Build the configured backend once per container (rebuilt if the setting changes)."""
+    global _backend, _backend_name
+    name = _backend_setting()
+    if _backend is None or _backend_name != name:
+        _backend = DynamoIdempotencyStore() if name == "dynamodb" else MemoryIdempotencyStore()
+        _backend_name = name
+    return _backend
+
+
+# -------- Keys --------
+def _is_guest(user_id: Optional[str]) -> bool:
+    return not user_id or str(user_id).strip().lower() == "anonymous"
+
+
+def resolve_key(
+    client_key: Optional[str],
+    user_id: Optional[str],
+    conversation_id: Optional[str],
+    message: Optional[str],
+    image_urls: Optional[List[str]],
+    page: Optional[str] = None,
+    now: Optional[float] = None,
+    trusted: bool = False,
+) -> Optional[str]:
+    """
+    Final idempotency key for a request, or None when idempotency is off or
+    the request can't be told apart from another user's.
+
+    - trusted=True (DLQ / job worker replaying a body this service wrote):
+      an already resolved "idem:v1:" key is used as is.
+    - A client key (including one that looks resolved) is always scoped to
+      the user, so it can't address someone else's stored reply.
+    - Keys are only derived from the content for signed-in users: every
+      guest shares user_id "anonymous", and two guests opening with the same
+      "hola" must not share a reply (or a conversation).
+    """
+    if not is_enabled():
+        return None
+    if trusted and client_key and str(client_key).startswith(KEY_PREFIX):
+        return str(client_key)  # already resolved (replayed from the DLQ or the job queue)
+    if client_key:
+        raw = f"client|{user_id or 'anonymous'}|{client_key}"
+    elif _is_guest(user_id):
+        return None
+    else:
+        bucket = int((now if now is not None else time.time()) // max(1, _env_int("IDEMPOTENCY_BUCKET_SECONDS", 300)))
+        scope = conversation_id or f"new:{page or '/'}"
+        raw = "|".join([
+            "auto", user_id, scope, (message or "").strip(), ",".join(image_urls or []), str(bucket),
+        ])
+    return KEY_PREFIX + hashlib.sha256(raw.encode("utf-8")).hexdigest()[:40]
+
+
+# -------- Lifecycle --------
+def begin(key: str) -> Optional[Claim]:
+    """
+    Claim a key. Returns a Claim (replay=True if the reply is already stored),
+    or None if the store is unavailable. Raises DuplicateRequestInFlight when
+    another attempt holds the key past the wait window.
+    """
+    backend = get_backend()
+    lease = _env_int("IDEMPOTENCY_LEASE_SECONDS", 120)
+    ttl = _env_int("IDEMPOTENCY_TTL_SECONDS", 86400)
+    wait_until = time.monotonic() + _env_int("IDEMPOTENCY_WAIT_MS", 8000) / 1000.0
+    try:
+        while True:
+            state, item = backend.claim(key, new_turn_timestamp(), lease, ttl)
+            if state != "in_flight":
+                break
+            if time.monotonic() >= wait_until:
+                log_event("idempotency_in_flight", {"key": key}, level="warning")
+                raise DuplicateRequestInFlight(f"Request {key} is already being processed")
+            time.sleep(0.25)
+    except DuplicateRequestInFlight:
+        raise
+    except Exception as e:
+        log_event("idempotency_unavailable", {"key": key}, level="warning", error=e)
+        return None
+
+    claim = Claim(
+        key=key,
+        turn_timestamp=item.get("TurnTimestamp") or new_turn_timestamp(),
+        conversation_id=item.get("ConversationId"),
+        reply=item.get("Reply") if state == "completed" else None,
+        attempts=int(item.get("Attempts", 1) or 1),
+    )
+    log_event("idempotency_claim", {
+        "key": key,
+        "state": "replay" if claim.replay else "claimed",
+        "attempts": claim.attempts,
+        "resumed_conversation": bool(claim.conversation_id) and not claim.replay,
+    })
+    return claim
+
+
+def _safe(action: str, claim: Optional[Claim], fn, *args) -> None:
+    if claim is None:
+        return
+    try:
+        fn(claim.key, *args)
+    except Exception as e:
+        log_event("idempotency_update_failed", {"key": claim.key, "action": action}, level="warning", error=e)
+
+
+def note_conversation(claim: Optional[Claim], conversation_id: str) -> None:
+    """Record a newly created conversation so a retry of this request reuses it."""
+    if claim is not None:
+        claim.conversation_id = conversation_id
+    _safe("set_conversation", claim, get_backend().set_conversation, conversation_id)
+
+
+def complete(claim: Optional[Claim], reply: str, conversation_id: str) -> None:
+    _safe("complete", claim, get_backend().complete, reply, conversation_id, _env_int("IDEMPOTENCY_TTL_SECONDS", 86400))
+
+
+def release(claim: Optional[Claim]) -> None:
+    _safe("release", claim, get_backend().release)
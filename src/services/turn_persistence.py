@@ -0,0 +1,91 @@
+# src/services/turn_persistence.py
+"""
+Turn persistence: write the turn to DynamoDB now, or hand it to a queue.
+
+Write-behind (MESSAGES_WRITE_BEHIND=1 + TURN_WRITE_QUEUE_URL) sends the turn
+to SQS and returns right away; lambda_turn_writer drains the queue with
+save_turn(). Guarantees:
+
+- Delivery: SQS is at-least-once. Failed records are reported as batch item
+  failures and retried; after maxReceiveCount they land in the queue's DLQ
+  and can be redriven.
+- Idempotency: the turn timestamp is fixed before enqueueing, so every
+  redelivery writes the same ConversationId/Timestamp keys (an overwrite,
+  never a duplicate).
+- Crash recovery: once send() returns the turn is durable in SQS, even if
+  this Lambda dies. If send() fails the turn is written synchronously
+  instead, so a queue outage costs latency, not data.
+
+An in-process flusher was left out on purpose: a frozen or recycled Lambda
+container would silently drop whatever it had not flushed yet.
+"""
+import os
+from typing import List, Optional
+
+from src.storage.messages_table import build_turn_items, new_turn_timestamp, save_turn, update_tail_cache
+from src.storage.queues import get_queue
+from src.utils.logging_utils import log_event
+
+
+def write_behind_enabled() -> bool:
+    return os.getenv("MESSAGES_WRITE_BEHIND", "0").strip().lower() in ("1", "true", "yes")
+
+
+def get_turn_queue():
+    """Queue for write-behind turns (None when TURN_WRITE_QUEUE_URL is unset)."""
+    return get_queue(os.getenv("TURN_WRITE_QUEUE_URL"))
+
+
+def turn_payload(
+    conversation_id: str,
+    user_text: Optional[str],
+    image_urls: Optional[List[str]],
+    assistant_text: str,
+    turn_timestamp: str,
+) -> dict:
+    return {
+        "kind": "turn",
+        "conversationId": conversation_id,
+        "userText": user_text,
+        "imageUrls": list(image_urls or []),
+        "assistantText": assistant_text,
+        "turnTimestamp": turn_timestamp,
+    }
+
+
+def write_payload(payload: dict) -> list:
+    """Consumer side: write one queued turn (safe to repeat)."""
+    return save_turn(
+        payload["conversationId"],
+        payload.get("userText"),
+        payload.get("imageUrls") or [],
+        payload["assistantText"],
+        turn_timestamp=payload["turnTimestamp"],
+    )
+
+
+def persist_turn(
+    conversation_id: str,
+    user_text: Optional[str],
+    image_urls: Optional[List[str]],
+    assistant_text: str,
+    turn_timestamp: Optional[str] = None,
+) -> str:
+    """
+    Persist a turn and return how: "queued" (write-behind) or "direct".
+    Raises only if the direct write fails.
+    """
+    turn_timestamp = turn_timestamp or new_turn_timestamp()
+    queue = get_turn_queue() if write_behind_enabled() else None
+    if queue is not None:
+        payload = turn_payload(conversation_id, user_text, image_urls, assistant_text, turn_timestamp)
+        try:
+            queue.send(payload, group_id=conversation_id, dedup_id=f"{conversation_id}:{turn_timestamp}")
+            # Keep this container's tail cache in step with what the consumer will write
+            update_tail_cache(build_turn_items(conversation_id, user_text, image_urls, assistant_text, turn_timestamp))
+            return "queued"
+        except Exception as e:
+            log_event("turn_enqueue_failed", {"conversation_id": conversation_id}, level="warning", error=e)
+
+    save_turn(conversation_id, user_text, image_urls, assistant_text, turn_timestamp=turn_timestamp)
+    return "direct"
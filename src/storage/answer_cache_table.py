@@ -0,0 +1,71 @@
+# src/storage/answer_cache_table.py
+
+import os
+import time
+from typing import Optional, Dict, Any, List
+
+from src.storage.dynamo import lazy_resource, lazy_table
+
+# DynamoDB setup (built on first use)
+dynamodb = lazy_resource()
+table = lazy_table(os.getenv("ANSWER_CACHE_TABLE", "AnswerCache"))
+
+# GSI PK = Namespace, SK = CreatedAt (projecting QuestionKey, Question,
+# ExpiresAt). Approximate matching reads the newest entries of a namespace
+# from it; without it only exact lookups go to DynamoDB.
+RECENT_INDEX = os.getenv("ANSWER_CACHE_RECENT_INDEX", "")
+
+
+def get_cached_answer(namespace: str, question_key: str) -> Optional[Dict[str, Any]]:
+    """
+    Exact lookup of a cached answer.
+
+    SCHEMA:
+      PK  = Namespace (S)     # hash of the page's vector store set + model
+      SK  = QuestionKey (S)   # hash of the normalized question
+      Attrs:
+        - Question (S)        # normalized question text (for approximate matching)
+        - Answer (S)
+        - CreatedAt (N, epoch seconds)
+        - ExpiresAt (N, epoch seconds; DynamoDB TTL attribute)
+    """
+    resp = table.get_item(Key={"Namespace": namespace, "QuestionKey": question_key})
+    item = resp.get("Item")
+    if not item or int(item.get("ExpiresAt", 0)) <= int(time.time()):
+        return None
+    return item
+
+
+def list_cached_questions(namespace: str, limit: int = 200) -> List[Dict[str, Any]]:
+    """
+    Read the `limit` newest live entries of a namespace (question text only)
+    for approximate matching. Expired items still awaiting TTL deletion are
+    skipped. Empty when ANSWER_CACHE_RECENT_INDEX is not set: the base table's
+    sort key is a hash, so a bounded query there is an arbitrary subset.
+    """
+    if not RECENT_INDEX:
+        return []
+    from boto3.dynamodb.conditions import Key
+
+    resp = table.query(
+        IndexName=RECENT_INDEX,
+        KeyConditionExpression=Key("Namespace").eq(namespace),
+        ProjectionExpression="QuestionKey, Question, ExpiresAt",
+        ScanIndexForward=False,
+        Limit=limit,
+    )
+    now = int(time.time())
+    return [it for it in resp.get("Items", []) if int(it.get("ExpiresAt", 0)) > now]
+
+
+def put_cached_answer(namespace: str, question_key: str, question: str, answer: str, ttl_seconds: int) -> None:
+    """Store an answer with a TTL (ExpiresAt)."""
+    now = int(time.time())
+    table.put_item(Item={
+        "Namespace": namespace,
+        "QuestionKey": question_key,
+        "Question": question,
+        "Answer": answer,
+        "CreatedAt": now,
+        "ExpiresAt": now + int(ttl_seconds),
+    })
@@ -0,0 +1,173 @@
+# src/storage/chat_jobs_table.py
+
+import os
+import time
+from typing import Optional, Dict, Any
+
+from src.storage.dynamo import lazy_resource, lazy_table
+
+# DynamoDB setup (built on first use)
+dynamodb = lazy_resource()
+table = lazy_table(os.getenv("CHAT_JOBS_TABLE", "ChatJobs"))
+
+QUEUED = "queued"
+RUNNING = "running"
+RETRYING = "retrying"
+DONE = "done"
+
+# Per-page queue depth counters share the table under this key prefix
+DEPTH_PREFIX = "depth#"
+# Idempotency key → job id links (double-submit dedup) share it under this one
+KEY_PREFIX = "key#"
+
+
+def _condition_failed(err: Exception) -> bool:
+    # botocore ClientError, checked by shape so botocore isn't imported up front
+    return (getattr(err, "response", None) or {}).get("Error", {}).get("Code") == "ConditionalCheckFailedException"
+
+
+def create_job(job_id: str, page_key: str, user_id: str, ttl_seconds: int) -> bool:
+    """
+    Record a queued job. False when the job id already exists (a double-submit
+    of the same request), in which case nothing is written.
+
+    SCHEMA:
+      PK  = JobId (S)
+      Attrs:
+        - Status ('queued' | 'running' | 'retrying' | 'done')
+        - Page (S, page key), UserId (S)
+        - CreatedAt (N, epoch ms), StartedAt (N, epoch ms, first start)
+        - Attempts (N)
+        - Reply (S), ConversationId (S)   # when done
+        - LastError (S)                   # when retrying
+        - ExpiresAt (N, epoch seconds; DynamoDB TTL attribute)
+      Depth counters: JobId = 'depth#<page key>', Depth (N)
+      Key links:      JobId = 'key#<idempotency key hash>', LinkedJobId (S), ExpiresAt
+    """
+    now = time.time()
+    try:
+        table.put_item(
+            Item={
+                "JobId": job_id,
+                "Status": QUEUED,
+                "Page": page_key,
+                "UserId": user_id,
+                "CreatedAt": int(now * 1000),
+                "Attempts": 0,
+                "ExpiresAt": int(now) + int(ttl_seconds),
+            },
+            ConditionExpression="attribute_not_exists(JobId)",
+        )
+        return True
+    except Exception as e:
+        if not _condition_failed(e):
+            raise
+    return False
+
+
+def link_key(key_id: str, job_id: str, ttl_seconds: int) -> Optional[str]:
+    """
+    Link an idempotency key hash to a new job id. Returns the job id it is
+    already linked to (a double-submit), or None when this call linked it.
+    """
+    try:
+        table.put_item(
+            Item={
+                "JobId": KEY_PREFIX + key_id,
+                "LinkedJobId": job_id,
+                "ExpiresAt": int(time.time()) + int(ttl_seconds),
+            },
+            ConditionExpression="attribute_not_exists(JobId)",
+        )
+        return None
+    except Exception as e:
+        if not _condition_failed(e):
+            raise
+    item = table.get_item(Key={"JobId": KEY_PREFIX + key_id}, ConsistentRead=True).get("Item") or {}
+    return item.get("LinkedJobId") or job_id
+
+
+def unlink_key(key_id: str) -> None:
+    table.delete_item(Key={"JobId": KEY_PREFIX + key_id})
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    resp = table.get_item(Key={"JobId": job_id})
+    return resp.get("Item")
+
+
+def start_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Mark a job running and count the attempt. Returns the item as it was
+    before this call, or None when the job is already done (or unknown).
+    """
+    try:
+        resp = table.update_item(
+            Key={"JobId": job_id},
+            UpdateExpression=(
+                "SET #s = :running, StartedAt = if_not_exists(StartedAt, :now) "
+                "ADD Attempts :one"
+            ),
+            ConditionExpression="attribute_exists(JobId) AND #s <> :done",
+            ExpressionAttributeNames={"#s": "Status"},
+            ExpressionAttributeValues={
+                ":running": RUNNING,
+                ":done": DONE,
+                ":now": int(time.time() * 1000),
+                ":one": 1,
+            },
+            ReturnValues="ALL_OLD",
+        )
+        return resp.get("Attributes", {})
+    except Exception as e:
+        if not _condition_failed(e):
+            raise
+    return None
+
+
+def complete_job(job_id: str, reply: str, conversation_id: str) -> Dict[str, Any]:
+    """Store the reply. Returns the item as it was before (empty if it had expired)."""
+    resp = table.update_item(
+        Key={"JobId": job_id},
+        UpdateExpression="SET #s = :done, Reply = :reply, ConversationId = :cid REMOVE LastError",
+        ExpressionAttributeNames={"#s": "Status"},
+        ExpressionAttributeValues={":done": DONE, ":reply": reply, ":cid": conversation_id},
+        ReturnValues="ALL_OLD",
+    )
+    return resp.get("Attributes", {})
+
+
+def fail_attempt(job_id: str, error: str) -> Optional[Dict[str, Any]]:
+    """
+    Record a failed attempt; the queue retries the message (and, after that,
+    the DLQ). Returns the item as it was before, or None when it is done.
+    """
+    try:
+        resp = table.update_item(
+            Key={"JobId": job_id},
+            UpdateExpression="SET #s = :retrying, LastError = :err",
+            ConditionExpression="#s <> :done",
+            ExpressionAttributeNames={"#s": "Status"},
+            ExpressionAttributeValues={":retrying": RETRYING, ":done": DONE, ":err": error},
+            ReturnValues="ALL_OLD",
+        )
+        return resp.get("Attributes", {})
+    except Exception as e:
+        if not _condition_failed(e):
+            raise
+    return None
+
+
+def delete_job(job_id: str) -> None:
+    table.delete_item(Key={"JobId": job_id})
+
+
+def add_depth(page_key: str, delta: int) -> int:
+    """Adjust a page's queued-job counter (approximate, see services/chat_jobs); returns the new depth."""
+    resp = table.update_item(
+        Key={"JobId": DEPTH_PREFIX + page_key},
+        UpdateExpression="ADD Depth :d",
+        ExpressionAttributeValues={":d": int(delta)},
+        ReturnValues="UPDATED_NEW",
+    )
+    return int(resp.get("Attributes", {}).get("Depth", 0))
@@ -1,11 +1,58 @@
 # src/storage/conversations_table.py
-import boto3
+import os
+import threading
 import uuid
+from collections import OrderedDict
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Dict, Any
 
-dynamodb = boto3.resource("dynamodb")
-table = dynamodb.Table("UserConversations")
+from src.storage.dynamo import lazy_resource, lazy_table
+from src.utils.logging_utils import log_event
+
+# Built on first use (keeps boto3 out of the import path)
+dynamodb = lazy_resource()
+table = lazy_table("UserConversations")
+
+# GSI on ConversationId (projecting all attributes). Required for conversation
+# chaining and rolling summaries across containers: without it a header is only
+# found through a key this container already knows. There is deliberately no
+# fallback query over the user's partition: guests all share the "anonymous"
+# partition, so it would read a hot, ever-growing partition on every turn.
+CONVERSATION_ID_INDEX = os.getenv("CONVERSATIONS_ID_INDEX", "")
+
+# conversation_id -> (UserId, Timestamp), warm across invocations. An LRU of
+# HEADER_KEY_CACHE_SIZE entries: a long-running server sees every conversation.
+_header_keys: "OrderedDict[str, tuple]" = OrderedDict()
+_header_lock = threading.Lock()
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def _header_capacity() -> int:
+    return max(0, _env_int("HEADER_KEY_CACHE_SIZE", 4096))
+
+
+def _remember_header(conversation_id: str, user_id: str, timestamp: str) -> None:
+    if not _header_capacity():
+        return
+    with _header_lock:
+        _header_keys[conversation_id] = (user_id, timestamp)
+        _header_keys.move_to_end(conversation_id)
+        while len(_header_keys) > _header_capacity():
+            _header_keys.popitem(last=False)
+
+
+def _known_header(conversation_id: str) -> Optional[tuple]:
+    with _header_lock:
+        key = _header_keys.get(conversation_id)
+        if key is not None:
+            _header_keys.move_to_end(conversation_id)
+        return key
 
 # Only these attrs must NOT be empty (because of GSIs)
 KEYS_DISALLOW_EMPTY = {"Email"}
@@ -49,6 +96,11 @@ def save_conversation(
         - Page (S)
         - Name (S)
         - Email (S, optional)
+        - LastResponseId (S, optional)  # Responses API chain (see update_conversation_chain)
+        - LastResponseAt (S, optional)
+        - Summary (S, optional)         # rolling summary (see update_conversation_summary)
+        - SummaryThrough (S, optional)
+        - SummaryAt (S, optional)
     """
     if not user_id or (isinstance(user_id, str) and user_id.strip() == ""):
         raise ValueError("user_id must be a non-empty string")
@@ -71,6 +123,7 @@ def save_conversation(
 
     safe_item = _omit_invalid_attrs(item)
     table.put_item(Item=safe_item)
+    _remember_header(conversation_id, user_id, timestamp)
 
     return {
         "ConversationId": conversation_id,
@@ -80,3 +133,110 @@ def save_conversation(
         "Title": title,
         "Page": page,
     }
+
+
+def get_conversation(user_id: str, timestamp: str) -> Optional[Dict[str, Any]]:
+    """Header by its table key (GetItem)."""
+    resp = table.get_item(Key={"UserId": user_id, "Timestamp": timestamp})
+    item = resp.get("Item")
+    if item:
+        _remember_header(item["ConversationId"], user_id, timestamp)
+    return item
+
+
+_index_warned = False
+
+
+def find_conversation(user_id: str, conversation_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Return the UserConversations header for conversation_id, or None.
+
+    A GetItem when the header key is known in this container, otherwise a
+    one-item query on the CONVERSATIONS_ID_INDEX GSI. Without the GSI an
+    unknown header is reported missing (chaining falls back to the transcript,
+    summaries are skipped) and a warning is logged once per container.
+    """
+    global _index_warned
+    if not conversation_id:
+        return None
+
+    cached = _known_header(conversation_id)
+    if cached:
+        item = get_conversation(cached[0], cached[1])
+        if item:
+            return item
+
+    if not CONVERSATION_ID_INDEX:
+        if not _index_warned:
+            _index_warned = True
+            log_event("conversation_index_missing", {
+                "reason": "CONVERSATIONS_ID_INDEX not set; headers from other containers can't be found",
+            }, level="warning")
+        return None
+
+    from boto3.dynamodb.conditions import Key
+
+    resp = table.query(
+        IndexName=CONVERSATION_ID_INDEX,
+        KeyConditionExpression=Key("ConversationId").eq(conversation_id),
+        Limit=1,
+    )
+    items = resp.get("Items", [])
+    item = items[0] if items else None
+    if item:
+        _remember_header(conversation_id, item["UserId"], item["Timestamp"])
+    return item
+
+
+def update_conversation_chain(user_id: str, timestamp: str, conversation_id: str, response_id: str) -> None:
+    """
+    Store the last Responses API response id on the conversation header so the
+    next turn can chain with previous_response_id.
+    """
+    table.update_item(
+        Key={"UserId": user_id, "Timestamp": timestamp},
+        UpdateExpression="SET LastResponseId = :rid, LastResponseAt = :at",
+        ExpressionAttributeValues={
+            ":rid": response_id,
+            ":at": datetime.utcnow().isoformat(),
+        },
+    )
+    _remember_header(conversation_id, user_id, timestamp)
+
+
+def update_conversation_summary(
+    user_id: str,
+    timestamp: str,
+    summary: str,
+    through: str,
+    expected_through: Optional[str],
+) -> bool:
+    """
+    Store the rolling summary of the conversation up to message `through`.
+    Conditional on SummaryThrough still being `expected_through`, so two
+    concurrent refreshes can't overwrite each other; returns False when this
+    one lost.
+    """
+    if expected_through:
+        condition = "SummaryThrough = :prev"
+        values = {":prev": expected_through}
+    else:
+        condition = "attribute_not_exists(SummaryThrough)"
+        values = {}
+    try:
+        table.update_item(
+            Key={"UserId": user_id, "Timestamp": timestamp},
+            UpdateExpression="SET Summary = :s, SummaryThrough = :t, SummaryAt = :at",
+            ConditionExpression=condition,
+            ExpressionAttributeValues={
+                ":s": summary,
+                ":t": through,
+                ":at": datetime.utcnow().isoformat(),
+                **values,
+            },
+        )
+    except Exception as e:
+        if (getattr(e, "response", None) or {}).get("Error", {}).get("Code") == "ConditionalCheckFailedException":
+            return False
+        raise
+    return True
@@ -0,0 +1,64 @@
+# src/storage/dynamo.py
+"""
+Lazily built DynamoDB handles shared by the storage modules.
+
+Importing boto3 and creating a resource costs a few hundred milliseconds, so
+it is deferred to the first real call: entry points that never touch a table
+(or only touch one) don't pay for the rest at cold start. The module-level
+`dynamodb` / `table` names in each storage module are LazyHandle proxies, so
+call sites (and tests that monkeypatch them) are unchanged.
+"""
+import os
+import threading
+from functools import lru_cache
+from typing import Any, Callable
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+@lru_cache(maxsize=1)
+def get_resource():
+    """
+    Env (optional):
+    - DYNAMODB_MAX_POOL_CONNECTIONS  (default: 10, botocore's own default;
+      raise it when many threads share the resource, as in the container server)
+    """
+    import boto3
+    from botocore.config import Config
+
+    pool = max(1, _env_int("DYNAMODB_MAX_POOL_CONNECTIONS", 10))
+    return boto3.resource("dynamodb", config=Config(max_pool_connections=pool))
+
+
+class LazyHandle:
+    """Builds the wrapped object on first attribute access, once per container."""
+
+    def __init__(self, factory: Callable[[], Any]):
+        self._factory = factory
+        self._obj = None
+        self._lock = threading.Lock()
+
+    def _get(self):
+        obj = self._obj
+        if obj is None:
+            with self._lock:
+                if self._obj is None:
+                    self._obj = self._factory()
+                obj = self._obj
+        return obj
+
+    def __getattr__(self, name: str):
+        return getattr(self._get(), name)
+
+
+def lazy_resource() -> LazyHandle:
+    return LazyHandle(get_resource)
+
+
+def lazy_table(name: str) -> LazyHandle:
+    return LazyHandle(lambda: get_resource().Table(name))
@@ -1,11 +1,12 @@
 # src/storage/feedback_table.py
 
-import boto3
 from datetime import datetime
 
-# DynamoDB setup (same pattern as your other tables)
-dynamodb = boto3.resource("dynamodb")
-table = dynamodb.Table("MessageFeedback")  # existing table name
+from src.storage.dynamo import lazy_resource, lazy_table
+
+# DynamoDB setup (same pattern as your other tables; built on first use)
+dynamodb = lazy_resource()
+table = lazy_table("MessageFeedback")  # existing table name
 
 
 def save_feedback(
@@ -0,0 +1,112 @@
+# src/storage/idempotency_table.py
+
+import os
+import time
+from typing import Optional, Dict, Any, Tuple
+
+from src.storage.dynamo import lazy_resource, lazy_table
+
+# DynamoDB setup (built on first use)
+dynamodb = lazy_resource()
+table = lazy_table(os.getenv("IDEMPOTENCY_TABLE", "ChatIdempotency"))
+
+IN_FLIGHT = "in_flight"
+COMPLETED = "completed"
+
+
+def _condition_failed(err: Exception) -> bool:
+    # botocore ClientError, checked by shape so botocore isn't imported up front
+    return (getattr(err, "response", None) or {}).get("Error", {}).get("Code") == "ConditionalCheckFailedException"
+
+
+def claim_key(key: str, turn_timestamp: str, lease_seconds: int, ttl_seconds: int) -> Tuple[str, Dict[str, Any]]:
+    """
+    Try to take ownership of a request key with a conditional write.
+
+    SCHEMA:
+      PK  = IdempotencyKey (S)
+      Attrs:
+        - Status ('in_flight' | 'completed')
+        - LeaseUntil (N, epoch seconds; an expired lease can be taken over)
+        - TurnTimestamp (S)    # fixed on first claim, reused by every attempt
+        - ConversationId (S, once created)
+        - Reply (S, when completed)
+        - Attempts (N)
+        - ExpiresAt (N, epoch seconds; DynamoDB TTL attribute)
+
+    Returns ("claimed", item) when this caller owns the key, otherwise
+    ("completed" | "in_flight", current item).
+    """
+    now = int(time.time())
+    try:
+        resp = table.update_item(
+            Key={"IdempotencyKey": key},
+            UpdateExpression=(
+                "SET #s = :inflight, LeaseUntil = :lease, ExpiresAt = :exp, "
+                "TurnTimestamp = if_not_exists(TurnTimestamp, :ts), "
+                "Attempts = if_not_exists(Attempts, :zero) + :one"
+            ),
+            ConditionExpression="attribute_not_exists(IdempotencyKey) OR (#s = :inflight AND LeaseUntil < :now)",
+            ExpressionAttributeNames={"#s": "Status"},
+            ExpressionAttributeValues={
+                ":inflight": IN_FLIGHT,
+                ":lease": now + int(lease_seconds),
+                ":exp": now + int(ttl_seconds),
+                ":ts": turn_timestamp,
+                ":zero": 0,
+                ":one": 1,
+                ":now": now,
+            },
+            ReturnValues="ALL_NEW",
+        )
+        return "claimed", resp.get("Attributes", {})
+    except Exception as e:
+        if not _condition_failed(e):
+            raise
+    item = get_key(key) or {}
+    return item.get("Status", IN_FLIGHT), item
+
+
+def get_key(key: str) -> Optional[Dict[str, Any]]:
+    resp = table.get_item(Key={"IdempotencyKey": key}, ConsistentRead=True)
+    return resp.get("Item")
+
+
+def set_conversation(key: str, conversation_id: str) -> None:
+    table.update_item(
+        Key={"IdempotencyKey": key},
+        UpdateExpression="SET ConversationId = :cid",
+        ExpressionAttributeValues={":cid": conversation_id},
+    )
+
+
+def complete_key(key: str, reply: str, conversation_id: str, ttl_seconds: int) -> None:
+    table.update_item(
+        Key={"IdempotencyKey": key},
+        UpdateExpression="SET #s = :done, Reply = :reply, ConversationId = :cid, ExpiresAt = :exp REMOVE LeaseUntil",
+        ExpressionAttributeNames={"#s": "Status"},
+        ExpressionAttributeValues={
+            ":done": COMPLETED,
+            ":reply": reply,
+            ":cid": conversation_id,
+            ":exp": int(time.time()) + int(ttl_seconds),
+        },
+    )
+
+
+def release_key(key: str) -> None:
+    """
+    Expire the lease of a failed attempt so a retry can claim the key at once.
+    TurnTimestamp/ConversationId stay, so the retry writes to the same places.
+    """
+    try:
+        table.update_item(
+            Key={"IdempotencyKey": key},
+            UpdateExpression="SET LeaseUntil = :zero",
+            ConditionExpression="#s = :inflight",
+            ExpressionAttributeNames={"#s": "Status"},
+            ExpressionAttributeValues={":zero": 0, ":inflight": IN_FLIGHT},
+        )
+    except Exception as e:
+        if not _condition_failed(e):
+            raise
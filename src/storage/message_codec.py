@@ -0,0 +1,167 @@
+# src/storage/message_codec.py
+"""
+Item encoding for ConversationMessages.
+
+Schema v1 (legacy): one item per message
+  Role ('user' | 'assistant'), MessageText (S); images as "[Imagen] <url>" messages.
+
+Schema v2: one item per turn
+  SchemaVersion = 2, Role = 'turn'
+  UserText (S)      or UserTextZ (B, compressed)
+  Images (L of S, optional)
+  AssistantText (S) or AssistantTextZ (B, compressed)
+  Codec ('zlib' | 'zstd', only when a *Z attribute is present)
+
+Text fields at or above MESSAGES_COMPRESS_MIN_BYTES (UTF-8) are compressed;
+short fields stay readable in the console. expand_item() turns either schema
+into the message dicts (Role, MessageText, Timestamp) the history builder uses.
+
+Env (optional):
+- MESSAGES_SCHEMA_VERSION     (default: 1, legacy per-message items; set 2 to
+                                write turn records once the readers are deployed
+                                and src/scripts/migrate_messages.py has run)
+- MESSAGES_COMPRESSION        (default: zlib; zstd needs the 'zstandard' package)
+- MESSAGES_COMPRESS_MIN_BYTES (default: 1024)
+"""
+import os
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+IMAGE_PREFIX = "[Imagen] "
+SCHEMA_V2 = 2
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def schema_version() -> int:
+    # v2 is opt-in: external readers of ConversationMessages may only know v1
+    return SCHEMA_V2 if _env_int("MESSAGES_SCHEMA_VERSION", 1) >= SCHEMA_V2 else 1
+
+
+def _codec() -> str:
+    if os.getenv("MESSAGES_COMPRESSION", "zlib").strip().lower() == "zstd":
+        try:
+            import zstandard  # noqa: F401
+            return "zstd"
+        except ImportError:
+            pass  # optional dependency; zlib is always available
+    return "zlib"
+
+
+def compress_text(text: str, codec: str) -> bytes:
+    raw = text.encode("utf-8")
+    if codec == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(level=6).compress(raw)
+    return zlib.compress(raw, 6)
+
+
+def decompress_text(blob: Any, codec: str) -> str:
+    raw = getattr(blob, "value", blob)  # boto3 returns Binary for B attributes
+    if codec == "zstd":
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(bytes(raw)).decode("utf-8")
+    return zlib.decompress(bytes(raw)).decode("utf-8")
+
+
+def _put_text(item: Dict[str, Any], name: str, text: Optional[str], codec: str, min_bytes: int) -> bool:
+    """Store text as name (S) or nameZ (B). Returns True if compressed."""
+    if not text:
+        return False
+    if len(text.encode("utf-8")) >= min_bytes:
+        blob = compress_text(text, codec)
+        if len(blob) < len(text.encode("utf-8")):
+            item[f"{name}Z"] = blob
+            return True
+    item[name] = text
+    return False
+
+
+def encode_turn(
+    conversation_id: str,
+    timestamp: str,
+    user_text: Optional[str],
+    image_urls: Optional[List[str]],
+    assistant_text: Optional[str],
+) -> Dict[str, Any]:
+    """Build one v2 turn item (timestamp is the full sort key)."""
+    codec = _codec()
+    min_bytes = max(0, _env_int("MESSAGES_COMPRESS_MIN_BYTES", 1024))
+    item: Dict[str, Any] = {
+        "ConversationId": conversation_id,
+        "Timestamp": timestamp,
+        "SchemaVersion": SCHEMA_V2,
+        "Role": "turn",
+    }
+    compressed = _put_text(item, "UserText", user_text, codec, min_bytes)
+    compressed = _put_text(item, "AssistantText", assistant_text, codec, min_bytes) or compressed
+    if image_urls:
+        item["Images"] = list(image_urls)
+    if compressed:
+        item["Codec"] = codec
+    return item
+
+
+def _get_text(item: Dict[str, Any], name: str) -> Optional[str]:
+    if f"{name}Z" in item:
+        return decompress_text(item[f"{name}Z"], item.get("Codec", "zlib"))
+    return item.get(name)
+
+
+def is_turn_item(item: Dict[str, Any]) -> bool:
+    return int(item.get("SchemaVersion", 1) or 1) >= SCHEMA_V2
+
+
+def expand_item(item: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Message dicts (Role, MessageText, Timestamp) for a v1 or v2 item, in turn order."""
+    ts = item.get("Timestamp")
+    if not is_turn_item(item):
+        return [{"Role": item.get("Role", "user"), "MessageText": item.get("MessageText", ""), "Timestamp": ts}]
+    messages = []
+    user_text = _get_text(item, "UserText")
+    if user_text:
+        messages.append({"Role": "user", "MessageText": user_text, "Timestamp": ts})
+    for url in item.get("Images") or []:
+        messages.append({"Role": "user", "MessageText": f"{IMAGE_PREFIX}{url}", "Timestamp": ts})
+    assistant_text = _get_text(item, "AssistantText")
+    if assistant_text:
+        messages.append({"Role": "assistant", "MessageText": assistant_text, "Timestamp": ts})
+    return messages
+
+
+# Attributes get_recent_messages needs for both schemas
+PROJECTION = "#r, MessageText, #ts, SchemaVersion, UserText, UserTextZ, Images, AssistantText, AssistantTextZ, Codec"
+PROJECTION_NAMES = {"#r": "Role", "#ts": "Timestamp"}  # reserved words
+
+
+def group_legacy_turns(messages: List[Dict[str, Any]]) -> List[Tuple[str, Optional[str], List[str], Optional[str], list]]:
+    """
+    Group one conversation's v1 items (sorted by Timestamp) into turns:
+    (turn_timestamp, user_text, image_urls, assistant_text, source_items).
+    A turn is the user messages up to and including the assistant reply(ies)
+    that follow them.
+    """
+    turns = []
+    current = None
+    for msg in messages:
+        role = msg.get("Role", "user")
+        if current is None or (role == "user" and current["assistant"]):
+            current = {"ts": str(msg["Timestamp"]).split("#")[0], "user": [], "images": [], "assistant": [], "items": []}
+            turns.append(current)
+        text = msg.get("MessageText", "")
+        if role == "assistant":
+            current["assistant"].append(text)
+        elif text.startswith(IMAGE_PREFIX):
+            current["images"].append(text[len(IMAGE_PREFIX):])
+        else:
+            current["user"].append(text)
+        current["items"].append(msg)
+    return [
+        (t["ts"], "\n".join(t["user"]) or None, t["images"], "\n\n".join(t["assistant"]) or None, t["items"])
+        for t in turns
+    ]
@@ -1,12 +1,31 @@
 # src/storage/messages_table.py
 
-import boto3
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
 from typing import Optional, Dict, Any, List
 
-# DynamoDB setup
-dynamodb = boto3.resource("dynamodb")
-table = dynamodb.Table("ConversationMessages")
+from src.storage.dynamo import lazy_resource, lazy_table
+from src.storage.message_codec import PROJECTION, PROJECTION_NAMES, encode_turn, expand_item, schema_version
+from src.utils.logging_utils import log_event
+
+# DynamoDB setup (built on first use)
+dynamodb = lazy_resource()
+table = lazy_table("ConversationMessages")
+
+# BatchWriteItem takes up to 25 puts, TransactWriteItems up to 100 actions
+_BATCH_LIMIT = 25
+_TRANSACT_LIMIT = 100
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
 
 
 def save_message(
@@ -40,9 +59,129 @@ def save_message(
         item["Meta"] = meta
 
     table.put_item(Item=item)
+    update_tail_cache([item])
     return item
 
 
+# -------- Conversation tail cache (warm containers) --------
+# conversation_id -> {"messages": [...oldest→newest], "complete": bool, "at": monotonic,
+#                     "last_key": newest item sort key known here (None: no items)}
+# "complete" means the list holds the whole conversation, so any limit is served.
+# Another container may append turns meanwhile, so a hit is checked against the
+# table's newest key (a keys-only Limit=1 query) before it is served; the cache
+# saves reading the tail, not the round trip. TAIL_CACHE_TTL_S bounds memory use.
+_tail_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_tail_lock = threading.Lock()
+_tail_stats = {"hits": 0, "misses": 0, "stale": 0}
+
+
+def _tail_capacity() -> int:
+    return max(0, _env_int("TAIL_CACHE_CONVERSATIONS", 256))
+
+
+def _tail_max_messages() -> int:
+    return max(1, _env_int("TAIL_CACHE_MAX_MESSAGES", 40))
+
+
+def _tail_ttl_s() -> float:
+    return float(max(0, _env_int("TAIL_CACHE_TTL_S", 300)))
+
+
+def _tail_validate() -> bool:
+    """TAIL_CACHE_VALIDATE=0 skips the freshness check (single-container setups only)."""
+    return os.getenv("TAIL_CACHE_VALIDATE", "1").strip().lower() not in ("0", "false", "no")
+
+
+def _tail_put(conversation_id: str, messages: List[Dict[str, Any]], complete: bool,
+              last_key: Optional[str] = None) -> None:
+    if not _tail_capacity():
+        return
+    with _tail_lock:
+        _tail_cache[conversation_id] = {"messages": list(messages), "complete": complete,
+                                        "at": time.monotonic(), "last_key": last_key}
+        _tail_cache.move_to_end(conversation_id)
+        while len(_tail_cache) > _tail_capacity():
+            _tail_cache.popitem(last=False)
+
+
+def _tail_get(conversation_id: str, limit: int) -> Optional[Dict[str, Any]]:
+    """The cached entry if it can serve `limit` messages: {"messages", "last_key"}."""
+    with _tail_lock:
+        entry = _tail_cache.get(conversation_id)
+        if entry and time.monotonic() - entry["at"] > _tail_ttl_s():
+            del _tail_cache[conversation_id]
+            entry = None
+        if entry and (entry["complete"] or len(entry["messages"]) >= limit):
+            _tail_cache.move_to_end(conversation_id)
+            return {"messages": entry["messages"][-limit:], "last_key": entry["last_key"]}
+        return None
+
+
+def _newest_key(conversation_id: str) -> Optional[str]:
+    """Sort key of the conversation's newest item (keys only, one item)."""
+    resp = table.query(
+        KeyConditionExpression="ConversationId = :cid",
+        ExpressionAttributeValues={":cid": conversation_id},
+        ProjectionExpression="#ts",
+        ExpressionAttributeNames={"#ts": "Timestamp"},
+        Limit=1,
+        ScanIndexForward=False,
+    )
+    items = resp.get("Items", [])
+    return items[0]["Timestamp"] if items else None
+
+
+def _tail_is_current(conversation_id: str, last_key: Optional[str]) -> bool:
+    """
+    True unless the table holds an item newer than the cached tail (written by
+    another container). A tail ahead of the table (write-behind turn not
+    written yet) is current.
+    """
+    if not _tail_validate():
+        return True
+    newest = _newest_key(conversation_id)
+    return newest is None or (last_key is not None and newest <= last_key)
+
+
+def seed_tail(conversation_id: str) -> None:
+    """A conversation created in this container starts with a known-empty tail."""
+    _tail_put(conversation_id, [], complete=True)
+
+
+def update_tail_cache(items: List[Dict[str, Any]]) -> None:
+    """Append freshly written items to their conversation's cached tail (if cached)."""
+    if not items:
+        return
+    conversation_id = items[0]["ConversationId"]
+    with _tail_lock:
+        entry = _tail_cache.get(conversation_id)
+        if entry is None:
+            return  # unknown history before these items; the next read fills it
+        merged = entry["messages"] + [msg for it in items for msg in expand_item(it)]
+        if len(merged) > _tail_max_messages():
+            merged = merged[-_tail_max_messages():]
+            entry["complete"] = False
+        entry["messages"] = merged
+        entry["last_key"] = max([entry["last_key"] or ""] + [it["Timestamp"] for it in items])
+
+
+def get_tail_cache_stats() -> Dict[str, Any]:
+    hits, misses = _tail_stats["hits"], _tail_stats["misses"]
+    return {
+        "hits": hits,
+        "misses": misses,
+        "stale": _tail_stats["stale"],
+        "hit_rate": round(hits / (hits + misses), 3) if hits + misses else None,
+        "size": len(_tail_cache),
+    }
+
+
+def clear_tail_cache() -> None:
+    with _tail_lock:
+        _tail_cache.clear()
+        _tail_stats.update(hits=0, misses=0, stale=0)
+
+
 def get_recent_messages(
     conversation_id: str,
     limit: int = 10,
@@ -51,18 +190,210 @@ def get_recent_messages(
     """
     Fetch the most recent N messages from a conversation.
 
+    Always reads newest-first (so Limit keeps the latest messages, not the
+    opening ones) and projects only the text attributes. Legacy per-message
+    items and v2 turn items (see message_codec) are both expanded into
+    Role/MessageText/Timestamp dicts. Served from the in-container tail cache
+    when it can answer the request and no other container has written a newer
+    item since (checked with a keys-only Limit=1 query).
+
     :param conversation_id: ID of the conversation
     :param limit: number of messages to fetch
     :param ascending: if True, return in chronological order (oldest→newest),
                       if False, return newest→oldest
     :return: list of message items
     """
-    resp = table.query(
-        KeyConditionExpression="ConversationId = :cid",
-        ExpressionAttributeValues={":cid": conversation_id},
-        Limit=limit,
-        ScanIndexForward=ascending,  # False = newest first
-    )
+    entry = _tail_get(conversation_id, limit)
+    if entry is not None and not _tail_is_current(conversation_id, entry["last_key"]):
+        _tail_stats["stale"] += 1
+        entry = None
+    _tail_stats["hits" if entry is not None else "misses"] += 1
+    cached = entry["messages"] if entry is not None else None
+    consumed = None
+    if cached is None:
+        resp = table.query(
+            KeyConditionExpression="ConversationId = :cid",
+            ExpressionAttributeValues={":cid": conversation_id},
+            ProjectionExpression=PROJECTION,
+            ExpressionAttributeNames=PROJECTION_NAMES,
+            Limit=limit,  # items; a v2 turn item holds 2+ messages
+            ScanIndexForward=False,  # newest first
+            ReturnConsumedCapacity="TOTAL",
+        )
+        newest_first = resp.get("Items", [])
+        consumed = (resp.get("ConsumedCapacity") or {}).get("CapacityUnits")
+        expanded = [msg for it in reversed(newest_first) for msg in expand_item(it)]
+        complete = len(newest_first) < limit and len(expanded) <= _tail_max_messages()
+        _tail_put(conversation_id, expanded[-_tail_max_messages():], complete=complete,
+                  last_key=newest_first[0]["Timestamp"] if newest_first else None)
+        messages = expanded[-limit:]
+    else:
+        messages = cached
 
-    messages = resp.get("Items", [])
+    log_event("history_tail_read", {
+        "conversation_id": conversation_id,
+        "source": "cache" if cached is not None else "dynamodb",
+        "count": len(messages),
+        "consumed_rcu": consumed,
+        "cache": get_tail_cache_stats(),
+    })
     return messages if ascending else list(reversed(messages))
+
+
+def get_messages_between(
+    conversation_id: str,
+    after: Optional[str],
+    before: str,
+    limit: int = 200,
+) -> List[Dict[str, Any]]:
+    """
+    Messages with after < Timestamp < before, oldest→newest (after=None: from
+    the start). Used to summarize the turns that left the history window;
+    never served from the tail cache, which only holds the newest messages.
+    """
+    from boto3.dynamodb.conditions import Key
+
+    low = after or ""
+    kwargs = {
+        "KeyConditionExpression": Key("ConversationId").eq(conversation_id) & Key("Timestamp").between(low, before),
+        "ProjectionExpression": PROJECTION,
+        "ExpressionAttributeNames": PROJECTION_NAMES,
+        "ScanIndexForward": True,
+    }
+    messages: List[Dict[str, Any]] = []
+    while True:
+        resp = table.query(**kwargs)
+        for item in resp.get("Items", []):
+            if item["Timestamp"] in (low, before):
+                continue  # BETWEEN is inclusive on both ends
+            messages.extend(expand_item(item))
+        last = resp.get("LastEvaluatedKey")
+        if not last or len(messages) >= limit:
+            return messages[:limit]
+        kwargs["ExclusiveStartKey"] = last
+
+
+# -------- Turn writer (one round-trip per turn) --------
+def turn_sort_key(turn_timestamp: str, seq: int) -> str:
+    """
+    Sort key for the seq-th item of a turn: "<ISO timestamp>#<seq>".
+    Items of one turn share the timestamp and sort by the suffix, after any
+    plain-timestamp key written at the same instant by save_message.
+    """
+    return f"{turn_timestamp}#{seq:02d}"
+
+
+def new_turn_timestamp() -> str:
+    # Fixed microsecond precision so keys always compare correctly as strings
+    return datetime.utcnow().isoformat(timespec="microseconds")
+
+
+def build_turn_items(
+    conversation_id: str,
+    user_text: Optional[str],
+    image_urls: Optional[List[str]],
+    assistant_text: str,
+    turn_timestamp: str,
+) -> List[Dict[str, Any]]:
+    """
+    Schema v2: one turn item. Legacy v1: user text, one item per image
+    reference, then the assistant reply — in that order.
+    """
+    if schema_version() >= 2:
+        return [encode_turn(conversation_id, turn_sort_key(turn_timestamp, 0), user_text, image_urls, assistant_text)]
+    rows = []
+    if user_text:
+        rows.append(("user", user_text))
+    for img in image_urls or []:
+        rows.append(("user", f"[Imagen] {img}"))
+    rows.append(("assistant", assistant_text))
+    return [
+        {
+            "ConversationId": conversation_id,
+            "Timestamp": turn_sort_key(turn_timestamp, seq),
+            "Role": role,
+            "MessageText": text,
+        }
+        for seq, (role, text) in enumerate(rows)
+    ]
+
+
+def _batch_put(items: List[Dict[str, Any]], max_attempts: int, base_ms: int) -> int:
+    """
+    BatchWriteItem with retries of UnprocessedItems (full-jitter backoff).
+    Returns the number of retry rounds; raises if items are still unprocessed.
+    """
+    retries = 0
+    for start in range(0, len(items), _BATCH_LIMIT):
+        pending = {table.name: [{"PutRequest": {"Item": it}} for it in items[start:start + _BATCH_LIMIT]]}
+        for attempt in range(1, max_attempts + 1):
+            resp = dynamodb.batch_write_item(RequestItems=pending)
+            pending = resp.get("UnprocessedItems") or {}
+            if not pending:
+                break
+            if attempt == max_attempts:
+                left = sum(len(v) for v in pending.values())
+                raise RuntimeError(f"{left} message item(s) still unprocessed after {attempt} attempts")
+            retries += 1
+            time.sleep(random.uniform(0, base_ms * (2 ** (attempt - 1))) / 1000.0)
+    return retries
+
+
+def _transact_put(items: List[Dict[str, Any]]) -> int:
+    """All-or-nothing write (costs twice the WCUs of a batch)."""
+    from boto3.dynamodb.types import TypeSerializer
+
+    serializer = TypeSerializer()
+    for start in range(0, len(items), _TRANSACT_LIMIT):
+        dynamodb.meta.client.transact_write_items(TransactItems=[
+            {"Put": {"TableName": table.name, "Item": {k: serializer.serialize(v) for k, v in it.items()}}}
+            for it in items[start:start + _TRANSACT_LIMIT]
+        ])
+    return 0
+
+
+def save_turn(
+    conversation_id: str,
+    user_text: Optional[str],
+    image_urls: Optional[List[str]],
+    assistant_text: str,
+    turn_timestamp: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Persist a whole turn (user text, image references, assistant reply) in
+    one BatchWriteItem call instead of one put_item per message.
+
+    Sort keys are turn_timestamp#00, #01, ... so the turn keeps its order
+    (a single turn_timestamp#00 item with schema v2).
+    Pass the same turn_timestamp when retrying a turn: the keys are then
+    identical and the write overwrites instead of duplicating.
+
+    Env (optional):
+    - MESSAGES_TURN_WRITE_MODE   "batch" (default) | "transaction"
+    - MESSAGES_BATCH_MAX_ATTEMPTS (default: 5)
+    - MESSAGES_BATCH_BASE_MS      (default: 50)
+    """
+    turn_timestamp = turn_timestamp or new_turn_timestamp()
+    items = build_turn_items(conversation_id, user_text, image_urls, assistant_text, turn_timestamp)
+    mode = os.getenv("MESSAGES_TURN_WRITE_MODE", "batch").strip().lower()
+
+    t0 = time.perf_counter()
+    if mode == "transaction":
+        retries = _transact_put(items)
+    else:
+        mode = "batch"
+        retries = _batch_put(
+            items,
+            max_attempts=max(1, _env_int("MESSAGES_BATCH_MAX_ATTEMPTS", 5)),
+            base_ms=max(0, _env_int("MESSAGES_BATCH_BASE_MS", 50)),
+        )
+
+    log_event("turn_saved", {
+        "conversation_id": conversation_id,
+        "item_count": len(items),
+        "mode": mode,
+        "unprocessed_retries": retries,
+        "latency_ms": round((time.perf_counter() - t0) * 1000.0, 1),
+    })
+    update_tail_cache(items)
+    return items
@@ -0,0 +1,31 @@
+# src/storage/page_routes_table.py
+
+import os
+from typing import Dict
+
+from src.storage.dynamo import lazy_table
+
+# Config table (optional): small, read whole on each routes reload
+table = lazy_table(os.getenv("PAGE_ROUTES_TABLE", "PageRoutes"))
+
+
+def list_page_routes() -> Dict[str, str]:
+    """
+    Read every page route.
+
+    SCHEMA:
+      PK  = Prefix (S)        # e.g. "/simulacro-icfes/matematicas", or "global"
+      Attrs:
+        - StoreId (S)         # vector store id, or "$ENV_VAR" to read it from the environment
+        - Enabled (BOOL, optional; false hides the route)
+    """
+    routes: Dict[str, str] = {}
+    kwargs = {"ProjectionExpression": "Prefix, StoreId, Enabled"}
+    while True:
+        resp = table.scan(**kwargs)
+        for item in resp.get("Items", []):
+            if item.get("Enabled", True) and item.get("Prefix"):
+                routes[item["Prefix"]] = item.get("StoreId", "")
+        if "LastEvaluatedKey" not in resp:
+            return routes
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
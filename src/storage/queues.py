@@ -0,0 +1,57 @@
+# src/storage/queues.py
+"""
+Minimal queue abstraction over SQS, with an in-process stand-in for tests.
+
+Both expose send(payload: dict) -> message id, so callers don't care which
+one they got from get_queue().
+"""
+import json
+import uuid
+from collections import deque
+from functools import lru_cache
+from typing import Optional
+
+
+@lru_cache(maxsize=1)
+def _sqs_client():
+    import boto3  # deferred: only paid by the first send
+    return boto3.client("sqs")
+
+
+class SqsQueue:
+    def __init__(self, queue_url: str):
+        self.queue_url = queue_url
+
+    def send(self, payload: dict, group_id: Optional[str] = None, dedup_id: Optional[str] = None) -> str:
+        kwargs = {"QueueUrl": self.queue_url, "MessageBody": json.dumps(payload, ensure_ascii=False)}
+        # FIFO queues need a group id; standard queues reject it
+        if self.queue_url.endswith(".fifo"):
+            kwargs["MessageGroupId"] = group_id or "default"
+            if dedup_id:
+                kwargs["MessageDeduplicationId"] = dedup_id
+        resp = _sqs_client().send_message(**kwargs)
+        return resp["MessageId"]
+
+
+class LocalQueue:
+    """In-memory queue with the same send() contract, plus helpers to drain it."""
+
+    def __init__(self):
+        self.messages = deque()
+
+    def send(self, payload: dict, group_id: Optional[str] = None, dedup_id: Optional[str] = None) -> str:
+        mid = str(uuid.uuid4())
+        # Round-trip through JSON so tests see exactly what SQS would carry
+        self.messages.append({"messageId": mid, "body": json.dumps(payload, ensure_ascii=False)})
+        return mid
+
+    def drain(self) -> list:
+        """Pop every pending message as SQS-shaped records."""
+        records = list(self.messages)
+        self.messages.clear()
+        return records
+
+
+def get_queue(queue_url: Optional[str]):
+    """SqsQueue for a URL, or None when the queue is not configured."""
+    return SqsQueue(queue_url) if queue_url else None
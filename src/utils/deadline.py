@@ -0,0 +1,116 @@
+# src/utils/deadline.py
+"""
+Request deadline and degradation tiers.
+
+A Deadline is built from context.get_remaining_time_in_millis() (optionally
+capped by the API Gateway integration timeout) and passed down through
+chat_service and assistant_client. plan() maps the time left to a tier:
+
+  full      → everything as usual
+  reduced   → skip the history fetch
+  minimal   → skip history, fewer file_search results, capped output tokens
+  fail_fast → don't call the model; hand the request to the DLQ
+
+Env (optional):
+- API_GATEWAY_BUDGET_MS        (default: 29000; API Gateway's hard limit)
+- DEADLINE_REDUCED_BELOW_MS    (default: 20000)
+- DEADLINE_MINIMAL_BELOW_MS    (default: 12000)
+- DEADLINE_FAIL_FAST_BELOW_MS  (default: 5000)
+- DEADLINE_PERSIST_RESERVE_MS  (default: 1500; kept for DynamoDB writes)
+- DEADLINE_MIN_RESULTS         (default: 3; max_num_results in 'minimal')
+- DEADLINE_MAX_OUTPUT_TOKENS   (default: 700; output cap in 'minimal')
+"""
+import os
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+class DeadlineExceeded(RuntimeError):
+    """
+    Raised when there is not enough time left to attempt the model call.
+    conversation_id is set when the conversation was already created, so the
+    job hand-off (chat_jobs) continues it instead of creating a second one.
+    """
+
+    def __init__(self, message: str = "", conversation_id: Optional[str] = None):
+        super().__init__(message)
+        self.conversation_id = conversation_id
+
+
+@dataclass(frozen=True)
+class DegradationPlan:
+    tier: str
+    remaining_ms: int
+    skip_history: bool = False
+    max_num_results: Optional[int] = None     # None → configured default
+    max_output_tokens: Optional[int] = None   # None → no cap
+    timeout_s: Optional[float] = None         # per-call timeout for the model
+
+
+FULL_PLAN = DegradationPlan(tier="full", remaining_ms=-1)
+
+
+class Deadline:
+    """Absolute deadline on the monotonic clock."""
+
+    def __init__(self, budget_ms: int):
+        self.budget_ms = max(0, int(budget_ms))
+        self._expires_at = time.monotonic() + self.budget_ms / 1000.0
+
+    @classmethod
+    def from_context(cls, context, cap_ms: Optional[int] = None) -> Optional["Deadline"]:
+        """
+        Build from the Lambda context. cap_ms bounds the budget further (e.g. the
+        API Gateway timeout for synchronous chat requests). Returns None when
+        there is no usable context (local runs), meaning "no deadline".
+        """
+        try:
+            remaining = int(context.get_remaining_time_in_millis())
+        except Exception:
+            return None
+        if cap_ms is not None:
+            remaining = min(remaining, int(cap_ms))
+        return cls(remaining)
+
+    @classmethod
+    def for_api_gateway(cls, context) -> Optional["Deadline"]:
+        return cls.from_context(context, cap_ms=_env_int("API_GATEWAY_BUDGET_MS", 29000))
+
+    def remaining_ms(self) -> int:
+        return max(0, int((self._expires_at - time.monotonic()) * 1000))
+
+    def expired(self) -> bool:
+        return self.remaining_ms() <= 0
+
+    def plan(self) -> DegradationPlan:
+        remaining = self.remaining_ms()
+        reserve = _env_int("DEADLINE_PERSIST_RESERVE_MS", 1500)
+        timeout_s = max(0.5, (remaining - reserve) / 1000.0)
+
+        if remaining < _env_int("DEADLINE_FAIL_FAST_BELOW_MS", 5000):
+            return DegradationPlan(tier="fail_fast", remaining_ms=remaining)
+        if remaining < _env_int("DEADLINE_MINIMAL_BELOW_MS", 12000):
+            return DegradationPlan(
+                tier="minimal",
+                remaining_ms=remaining,
+                skip_history=True,
+                max_num_results=_env_int("DEADLINE_MIN_RESULTS", 3),
+                max_output_tokens=_env_int("DEADLINE_MAX_OUTPUT_TOKENS", 700),
+                timeout_s=timeout_s,
+            )
+        if remaining < _env_int("DEADLINE_REDUCED_BELOW_MS", 20000):
+            return DegradationPlan(tier="reduced", remaining_ms=remaining, skip_history=True, timeout_s=timeout_s)
+        return DegradationPlan(tier="full", remaining_ms=remaining, timeout_s=timeout_s)
+
+
+def plan_for(deadline: Optional[Deadline]) -> DegradationPlan:
+    """Plan for an optional deadline (no deadline → full tier, no timeouts)."""
+    return deadline.plan() if deadline is not None else FULL_PLAN
@@ -1,9 +1,16 @@
 import json
 import logging
 import os
+import queue
+import random
 import sys
+import threading
+import time
 import traceback
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
 from typing import Any, Dict, Optional
 
 # Global logger instance
@@ -31,18 +38,250 @@ def set_invocation_context(context: Any) -> None:
         _context["request_id"] = getattr(context, "aws_request_id", None)
     except Exception:
         pass
+    reset_stage_timings()
+    with _samples_lock:
+        _samples.clear()
+        _page_samples.clear()
+
+
+# A host serving concurrent requests in one process (src/asgi_server.py) binds
+# each request's id here instead of calling set_invocation_context.
+_request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+
+def bind_request_id(request_id: Optional[str]) -> None:
+    """Tag the logs of the current thread / asyncio task with a request id."""
+    _request_id_var.set(request_id)
+
+
+def _log_context() -> Dict[str, Any]:
+    request_id = _request_id_var.get()
+    return dict(_context, request_id=request_id) if request_id else _context
+
+
+# -------- Stage timings (spans) + EMF metrics --------
+# Timings and dimensions live in context variables: each thread (concurrent DLQ
+# records) and each asyncio task (async chat path) gets its own set, and work
+# offloaded with asyncio.to_thread records into the set of the request that
+# started it. Metric samples are collected for the whole invocation and
+# written by flush_metrics().
+_timings_var: ContextVar[Optional[Dict[str, float]]] = ContextVar("stage_timings", default=None)
+_dims_var: ContextVar[Optional[Dict[str, str]]] = ContextVar("metric_dims", default=None)
+_samples: list = []
+_page_samples: list = []
+_samples_lock = threading.Lock()
+
+
+def _timings() -> Dict[str, float]:
+    timings = _timings_var.get()
+    if timings is None:
+        timings = {}
+        _timings_var.set(timings)
+    return timings
+
+
+def _dims() -> Dict[str, str]:
+    dims = _dims_var.get()
+    if dims is None:
+        dims = {}
+        _dims_var.set(dims)
+    return dims
+
+
+def reset_stage_timings(page: Optional[str] = None, model: Optional[str] = None) -> None:
+    """Start a fresh set of timings for one request (and set its metric dimensions)."""
+    _timings_var.set({})
+    _dims_var.set({})
+    set_metric_dimensions(page=page, model=model)
+
+
+def set_metric_dimensions(page: Optional[str] = None, model: Optional[str] = None) -> None:
+    """Page/Model dimensions for the stages recorded after this call (None keeps the current value)."""
+    dims = _dims()
+    if page is not None:
+        dims["Page"] = str(page)
+    if model is not None:
+        dims["Model"] = str(model)
+
+
+def get_stage_timings() -> Dict[str, float]:
+    """Milliseconds per stage for the current request (repeated stages are summed)."""
+    return {k: round(v, 1) for k, v in _timings().items()}
+
+
+def record_stage(name: str, duration_ms: float, ok: bool = True, model: Optional[str] = None) -> None:
+    timings = _timings()
+    timings[name] = timings.get(name, 0.0) + duration_ms
+    dims = _dims()
+    sample = (name, dims.get("Page", "unknown"), model or dims.get("Model", "unknown"), ok, duration_ms)
+    with _samples_lock:
+        _samples.append(sample)
+
+
+def record_page_metric(name: str, value: float, unit: str = "Count", page: Optional[str] = None) -> None:
+    """
+    Queue one sample of a per-page metric that is not a stage latency
+    (e.g. chat_job_queue_depth). Page defaults to the request's Page dimension.
+    """
+    sample = (name, page or _dims().get("Page", "unknown"), unit, float(value))
+    with _samples_lock:
+        _page_samples.append(sample)
+
+
+@contextmanager
+def stage(name: str, model: Optional[str] = None):
+    """
+    Time a block of work:
+        with stage("history_fetch"):
+            ...
+    The duration is added to the request's timings (attached to every
+    following log record as "timings_ms") and queued as a stage_latency_ms
+    metric sample. Exceptions propagate; the sample is tagged ok=False.
+    """
+    t0 = time.perf_counter()
+    ok = True
+    try:
+        yield
+    except BaseException:
+        ok = False
+        raise
+    finally:
+        record_stage(name, (time.perf_counter() - t0) * 1000.0, ok=ok, model=model)
+
+
+def _emf_enabled() -> bool:
+    return os.getenv("METRICS_EMF", "1").strip().lower() in ("1", "true", "yes")
+
+
+def flush_metrics(stream=None) -> int:
+    """
+    Write queued samples as CloudWatch Embedded Metric Format lines (one per
+    Stage/Page/Model combination, values batched as an array; page metrics
+    one per metric/Page) and clear the queue. Call once at the end of each
+    invocation. Returns lines written.
+
+    Env (optional):
+    - METRICS_EMF        (default: "1")
+    - METRICS_NAMESPACE  (default: SimulacrosAI)
+    """
+    with _samples_lock:
+        samples = list(_samples)
+        page_samples = list(_page_samples)
+        _samples.clear()
+        _page_samples.clear()
+    if not (samples or page_samples) or not _emf_enabled():
+        return 0
+
+    grouped: Dict[tuple, list] = {}
+    errors: Dict[tuple, int] = {}
+    for name, page, model, ok, ms in samples:
+        key = (name, page, model)
+        grouped.setdefault(key, []).append(round(ms, 1))
+        errors[key] = errors.get(key, 0) + (0 if ok else 1)
+
+    out = stream or sys.stdout
+    namespace = os.getenv("METRICS_NAMESPACE", "SimulacrosAI")
+    lines = 0
+    for (name, page, model), values in grouped.items():
+        for i in range(0, len(values), 100):  # EMF allows up to 100 values per metric
+            doc = {
+                "_aws": {
+                    "Timestamp": int(time.time() * 1000),
+                    "CloudWatchMetrics": [{
+                        "Namespace": namespace,
+                        "Dimensions": [["Stage", "Page", "Model"], ["Stage"]],
+                        "Metrics": [
+                            {"Name": "stage_latency_ms", "Unit": "Milliseconds"},
+                            {"Name": "stage_errors", "Unit": "Count"},
+                        ],
+                    }],
+                },
+                "Stage": name,
+                "Page": page,
+                "Model": model,
+                "stage_latency_ms": values[i:i + 100],
+                "stage_errors": errors[(name, page, model)] if i == 0 else 0,
+                "function": _context.get("function"),
+                "request_id": _context.get("request_id"),
+            }
+            out.write(json.dumps(doc, ensure_ascii=False) + "\n")
+            lines += 1
+    lines += _write_page_metrics(out, namespace, page_samples)
+    out.flush()
+    return lines
+
+
+def _write_page_metrics(out, namespace: str, samples: list) -> int:
+    """One EMF line per metric/Page/unit from record_page_metric samples."""
+    grouped: Dict[tuple, list] = {}
+    for name, page, unit, value in samples:
+        grouped.setdefault((name, page, unit), []).append(round(value, 1))
+    lines = 0
+    for (name, page, unit), values in grouped.items():
+        for i in range(0, len(values), 100):
+            doc = {
+                "_aws": {
+                    "Timestamp": int(time.time() * 1000),
+                    "CloudWatchMetrics": [{
+                        "Namespace": namespace,
+                        "Dimensions": [["Page"], []],
+                        "Metrics": [{"Name": name, "Unit": unit}],
+                    }],
+                },
+                "Page": page,
+                name: values[i:i + 100],
+                "function": _context.get("function"),
+                "request_id": _context.get("request_id"),
+            }
+            out.write(json.dumps(doc, ensure_ascii=False) + "\n")
+            lines += 1
+    return lines
+
+
+# -------- JSON encoding --------
+def _select_encoder():
+    """
+    LOG_JSON_ENCODER=orjson uses orjson when it is installed (several times
+    faster than json.dumps for these payloads); anything else uses json.
+    """
+    if os.getenv("LOG_JSON_ENCODER", "json").strip().lower() == "orjson":
+        try:
+            import orjson
+
+            def _orjson_dumps(payload: dict) -> str:
+                return orjson.dumps(payload, default=str).decode("utf-8")
+            return _orjson_dumps
+        except ImportError:
+            pass
+
+    def _json_dumps(payload: dict) -> str:
+        return json.dumps(payload, ensure_ascii=False, default=str)
+    return _json_dumps
+
+
+_dumps = _select_encoder()
 
 
 # -------- JSON formatter --------
 class JSONFormatter(logging.Formatter):
     def format(self, record: logging.LogRecord) -> str:
+        # Async mode snapshots context/timings in the request thread (see _ContextQueueHandler)
+        ctx = getattr(record, "ctx", None) or _log_context()
+        timings = getattr(record, "timings_ms", None)
+        if timings is None:
+            timings = get_stage_timings()
+
         payload = {
-            "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
             "level": record.levelname,
             "event": getattr(record, "event", record.getMessage()),
             "details": getattr(record, "details", None),
-            **_context,  # service, stage, region, function, request_id
+            **ctx,  # service, stage, region, function, request_id
         }
+        if getattr(record, "sample_rate", None) is not None:
+            payload["sample_rate"] = record.sample_rate  # scale counts by 1/sample_rate
+        if timings:
+            payload["timings_ms"] = timings
 
         # Include exception info if attached
         if hasattr(record, "exc_info") and record.exc_info:
@@ -52,40 +291,133 @@ class JSONFormatter(logging.Formatter):
                 "stack": "".join(traceback.format_exception(*record.exc_info)),
             }
 
-        return json.dumps(payload, ensure_ascii=False)
+        return _dumps(payload)
+
+
+# -------- Handlers (sync or queued) --------
+class _ContextQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread without formatting them. Only the
+    per-request state the formatter needs is copied here; JSON encoding and
+    the stdout write happen on the listener thread.
+    """
+
+    def handle(self, record: logging.LogRecord):
+        # queue.Queue is already thread-safe; skip the per-handler lock
+        rv = self.filter(record)
+        if rv:
+            self.emit(record if isinstance(rv, bool) else rv)
+        return rv
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.ctx = dict(_log_context())
+        record.timings_ms = get_stage_timings()
+        return record
+
+
+_handler: Optional[logging.Handler] = None
+_listener: Optional[QueueListener] = None
+_queue: Optional["queue.Queue"] = None
+
+
+def _async_enabled() -> bool:
+    return os.getenv("LOG_ASYNC", "0").strip().lower() in ("1", "true", "yes")
+
+
+def configure_logging(stream=None, async_mode: Optional[bool] = None) -> None:
+    """
+    (Re)install the JSON handler on the root logger.
+
+    Env (optional):
+    - LOG_ASYNC         (default: "0"; "1" writes through a QueueHandler/QueueListener)
+    - LOG_JSON_ENCODER  (default: json; "orjson" if installed)
+    - LOG_SAMPLE_RATES  (e.g. "openai_request_sent=0.1,image_blocks_formatted=0")
+    """
+    global _handler, _listener, _queue, _dumps
+    flush_logs()
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    if _handler is not None:
+        logger.removeHandler(_handler)
+
+    _dumps = _select_encoder()
+    _sample_rates.clear()
+    _sample_rates.update(_parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", "")))
+
+    stream_handler = logging.StreamHandler(stream=stream or sys.stdout)
+    stream_handler.setFormatter(JSONFormatter())
+    if async_mode if async_mode is not None else _async_enabled():
+        _queue = queue.Queue(-1)
+        _handler = _ContextQueueHandler(_queue)
+        _listener = QueueListener(_queue, stream_handler)
+        _listener.start()
+    else:
+        _queue = None
+        _handler = stream_handler
+    logger.addHandler(_handler)
+
+
+def flush_logs() -> None:
+    """Block until queued records are written. Call before the handler returns."""
+    if _queue is not None and _listener is not None:
+        _queue.join()  # QueueListener marks task_done after each record is handled
+
+
+# -------- Sampling --------
+_sample_rates: Dict[str, float] = {}
+
+
+def _parse_sample_rates(raw: str) -> Dict[str, float]:
+    rates = {}
+    for part in raw.split(","):
+        name, _, value = part.partition("=")
+        try:
+            rates[name.strip()] = min(1.0, max(0.0, float(value)))
+        except ValueError:
+            continue
+    return rates
 
 
 # Attach handler once
 if not logger.handlers or not any(isinstance(h.formatter, JSONFormatter) for h in logger.handlers):
-    handler = logging.StreamHandler(stream=sys.stdout)
-    handler.setFormatter(JSONFormatter())
-    logger.addHandler(handler)
+    configure_logging()
 
 
 # -------- Public API --------
-def log_event(event_type: str, details: Optional[dict] = None, level: str = "info", error: Exception = None):
+_LEVELS = {"info": logging.INFO, "warning": logging.WARNING, "error": logging.ERROR, "debug": logging.DEBUG}
+
+
+def log_event(event_type: str, details: Optional[Any] = None, level: str = "info", error: Exception = None):
     """
     Structured logging wrapper.
 
+    details may be a dict or a zero-argument callable returning one; the
+    callable only runs if the event is actually logged (level enabled and
+    not sampled out), so expensive details cost nothing when dropped.
+    Info/debug events listed in LOG_SAMPLE_RATES are kept with that
+    probability; warnings and errors are never sampled.
+
     Example:
         log_event("conversation_created", {"conversation_id": "123"})
+        log_event("openai_request_sent", lambda: {"vector_stores": get_stores_for_page(page)})
         log_event("lambda_exception", {"error": str(e)}, level="error", error=e)
     """
+    levelno = logging.ERROR if error else _LEVELS.get(level.lower(), logging.DEBUG)
+    if not logger.isEnabledFor(levelno):
+        return
+
+    rate = _sample_rates.get(event_type) if levelno < logging.WARNING else None
+    if rate is not None and (rate <= 0.0 or random.random() >= rate):
+        return
+
     record = {
         "event": event_type,
-        "details": details or {},
+        "details": (details() if callable(details) else details) or {},
+        "sample_rate": rate,
     }
 
     if error:
-        logger.error(record, exc_info=error)
+        logger.error(event_type, exc_info=error, extra=record)
         return
-
-    level = level.lower()
-    if level == "info":
-        logger.info(record)
-    elif level == "warning":
-        logger.warning(record)
-    elif level == "error":
-        logger.error(record)
-    else:
-        logger.debug(record)
+    logger.log(levelno, event_type, extra=record)
@@ -0,0 +1,34 @@
+# src/utils/sse_utils.py
+"""
+Server-sent events helpers for the streaming chat mode.
+
+Each chat stream event ({"type": "start"|"delta"|"reset"|"done"|"error", ...})
+becomes one SSE frame whose event name is the type and whose data is the JSON
+payload. "reset" tells the client to discard the deltas received so far.
+"""
+import json
+from typing import Iterable, Iterator
+
+
+def format_sse(event: dict) -> str:
+    """Format one chat stream event as an SSE frame."""
+    etype = event.get("type", "message")
+    data = json.dumps(event, ensure_ascii=False)
+    return f"event: {etype}\ndata: {data}\n\n"
+
+
+def iter_sse(events: Iterable[dict]) -> Iterator[str]:
+    """
+    Yield SSE frames for a stream of chat events. If the stream raises after
+    it started, a final "error" frame is emitted and the exception re-raised,
+    so the caller can still log it.
+    """
+    started = False
+    try:
+        for ev in events:
+            started = True
+            yield format_sse(ev)
+    except Exception:
+        if started:
+            yield format_sse({"type": "error", "error": "Internal error"})
+        raise
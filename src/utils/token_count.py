@@ -0,0 +1,45 @@
+# src/utils/token_count.py
+"""
+Token counting for prompt budgets.
+
+Uses tiktoken (o200k_base, the gpt-4o / gpt-4.1 encoding) when it is
+installed and falls back to ~4 characters per token otherwise. The fallback
+overestimates slightly for Spanish prose, which is the safe side for a budget.
+
+Env (optional):
+- TOKEN_COUNTER  (default: "auto"; "heuristic" skips tiktoken)
+"""
+import os
+from functools import lru_cache
+
+_CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    if os.getenv("TOKEN_COUNTER", "auto").strip().lower() == "heuristic":
+        return None
+    try:
+        import tiktoken  # optional dependency
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str | None) -> int:
+    if not text:
+        return 0
+    enc = _encoding()
+    if enc is None:
+        return (len(text) + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def clip_to_tokens(text: str, max_tokens: int) -> str:
+    """Keep the first max_tokens tokens of text, marking the cut with "…"."""
+    if max_tokens <= 0 or count_tokens(text) <= max_tokens:
+        return text
+    enc = _encoding()
+    if enc is None:
+        return text[:max_tokens * _CHARS_PER_TOKEN].rstrip() + "…"
+    return enc.decode(enc.encode(text, disallowed_special=())[:max_tokens]).rstrip() + "…"
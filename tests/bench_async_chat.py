@@ -0,0 +1,160 @@
+# tests/bench_async_chat.py
+"""
+Benchmark: chat_service.get_ai_response (sequential steps) vs
+async_chat_service.get_ai_response_async (independent steps overlapped).
+
+DynamoDB and the model are local fakes with a fixed delay per call, so the
+numbers only reflect how the steps are scheduled, not network jitter. The
+scenarios cover where the two paths differ:
+  new            new conversation (header write ‖ model call)
+  new_chained    same, with CONVERSATION_CHAINING=1 (+ chain update ‖ message write)
+  transcript     existing conversation, transcript history (no overlap expected)
+  chained        existing conversation, chain found (chain update ‖ message write)
+  chain_missing  existing conversation, chain missing (chain lookup ‖ history fetch)
+and a burst of --concurrency requests: back to back on the blocking path
+(one request per Lambda container) vs together on one event loop.
+
+Usage:
+  python -m tests.bench_async_chat
+  python -m tests.bench_async_chat --delay save=20 persist=30 model=800 --repeat 10 --concurrency 16
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+from src.assistant import assistant_client
+from src.services import chat_service
+from src.services.async_chat_service import get_ai_response_async
+from tests.fakes import FakeAsyncOpenAI, FakeOpenAI
+
+# Milliseconds per call
+DEFAULT_DELAYS = {"save": 15, "header": 8, "history": 12, "persist": 20, "chain": 10, "model": 600}
+
+SCENARIOS = {
+    # name: (conversation_id, chaining, chain present)
+    "new": (None, False, False),
+    "new_chained": (None, True, False),
+    "transcript": ("c1", False, False),
+    "chained": ("c1", True, True),
+    "chain_missing": ("c1", True, False),
+}
+
+
+def _sleeper(ms: float, fn):
+    def call(*args, **kwargs):
+        time.sleep(ms / 1000.0)
+        return fn(*args, **kwargs)
+    return call
+
+
+@contextmanager
+def fakes(delays: dict, chaining: bool, chain_present: bool):
+    header = {"UserId": "u1", "Timestamp": "2025-01-01T00:00:00"}
+    if chain_present:
+        header.update(LastResponseId="resp_prev", LastResponseAt=datetime.utcnow().isoformat())
+    history = [
+        {"Role": "user" if i % 2 == 0 else "assistant", "MessageText": f"mensaje {i}",
+         "Timestamp": f"2025-01-01T00:00:{i:02d}"}
+        for i in range(8)
+    ]
+    model_s = delays["model"] / 1000.0
+    sync_client = FakeOpenAI(chunks=["Listo."], first_token_delay=model_s)
+    async_client = FakeAsyncOpenAI(chunks=["Listo."], first_token_delay=model_s)
+    patches = [
+        (chat_service, "save_conversation", _sleeper(delays["save"], lambda **kw: {
+            "ConversationId": "conv-new", "Timestamp": "2025-01-01T00:00:00"})),
+        (chat_service, "find_conversation", _sleeper(delays["header"], lambda uid, cid: header)),
+        (chat_service, "get_recent_messages", _sleeper(delays["history"], lambda **kw: history)),
+        (chat_service, "persist_turn", _sleeper(delays["persist"], lambda *a, **kw: "direct")),
+        (chat_service, "update_conversation_chain", _sleeper(delays["chain"], lambda *a: None)),
+        (chat_service, "seed_tail", lambda cid: None),
+        (assistant_client, "get_openai_client", lambda: sync_client),
+        (assistant_client, "get_async_openai_client", lambda: async_client),
+    ]
+    saved = [(mod, name, getattr(mod, name)) for mod, name, _ in patches]
+    old_chaining = os.environ.get("CONVERSATION_CHAINING")
+    os.environ["CONVERSATION_CHAINING"] = "1" if chaining else "0"
+    for mod, name, value in patches:
+        setattr(mod, name, value)
+    try:
+        yield
+    finally:
+        for mod, name, value in saved:
+            setattr(mod, name, value)
+        if old_chaining is None:
+            os.environ.pop("CONVERSATION_CHAINING", None)
+        else:
+            os.environ["CONVERSATION_CHAINING"] = old_chaining
+
+
+def _timed(fn) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return (time.perf_counter() - t0) * 1000.0
+
+
+def run_scenario(loop, delays: dict, scenario: str, repeat: int) -> tuple:
+    conversation_id, chaining, chain_present = SCENARIOS[scenario]
+    args = ("hola, ¿cómo resuelvo x + 2 = 5?", "u1", "Ana", None, "/", conversation_id)
+    sync_ms, async_ms = [], []
+    with fakes(delays, chaining, chain_present):
+        for _ in range(repeat):
+            sync_ms.append(_timed(lambda: chat_service.get_ai_response(*args)))
+            async_ms.append(_timed(lambda: loop.run_until_complete(get_ai_response_async(*args))))
+    return statistics.median(sync_ms), statistics.median(async_ms)
+
+
+def run_burst(loop, delays: dict, concurrency: int) -> tuple:
+    args = ("hola", "u1", "Ana", None, "/", "c1")
+
+    async def burst():
+        await asyncio.gather(*(get_ai_response_async(*args) for _ in range(concurrency)))
+
+    with fakes(delays, False, False):
+        sync_ms = _timed(lambda: [chat_service.get_ai_response(*args) for _ in range(concurrency)])
+        async_ms = _timed(lambda: loop.run_until_complete(burst()))
+    return sync_ms, async_ms
+
+
+def _parse_delays(items) -> dict:
+    delays = dict(DEFAULT_DELAYS)
+    for item in items or []:
+        name, _, ms = item.partition("=")
+        if name not in delays:
+            raise SystemExit(f"unknown delay '{name}' (expected one of {', '.join(delays)})")
+        delays[name] = float(ms)
+    return delays
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--delay", nargs="*", metavar="CALL=MS",
+                    help=f"Per-call delays in ms (defaults: {DEFAULT_DELAYS})")
+    ap.add_argument("--repeat", type=int, default=5, help="Requests per scenario and path (median reported)")
+    ap.add_argument("--concurrency", type=int, default=8, help="Requests in the burst")
+    args = ap.parse_args()
+    delays = _parse_delays(args.delay)
+
+    # One long-lived loop, as in a server; its default executor runs the DynamoDB calls
+    loop = asyncio.new_event_loop()
+
+    print(f"delays (ms): {delays}")
+    print(f"{'scenario':<16}{'sync p50':>10}{'async p50':>11}{'saved':>9}")
+    for scenario in SCENARIOS:
+        sync_p50, async_p50 = run_scenario(loop, delays, scenario, args.repeat)
+        print(f"{scenario:<16}{sync_p50:>9.1f}ms{async_p50:>9.1f}ms{sync_p50 - async_p50:>7.1f}ms")
+
+    sync_ms, async_ms = run_burst(loop, delays, args.concurrency)
+    loop.close()
+    print(f"\nburst of {args.concurrency}: sequential {sync_ms:.0f} ms, one event loop {async_ms:.0f} ms "
+          f"({sync_ms / async_ms:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
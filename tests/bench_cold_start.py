@@ -0,0 +1,135 @@
+# tests/bench_cold_start.py
+"""
+Cold-start harness for the Lambda entry points.
+
+Each handler is imported in a fresh interpreter (like a new Lambda container)
+and measured for:
+  import_ms     module import (what every cold start pays)
+  first_use_ms  building the lazy clients the handler needs on its first
+                request (OpenAI client, DynamoDB resource, timezone data)
+  peak_rss_mb   peak resident memory after first use
+  heavy_at_import  heavy libraries already loaded right after import (should be empty)
+
+Usage:
+  python -m tests.bench_cold_start                # report
+  python -m tests.bench_cold_start --check        # exit 1 if a budget is exceeded
+  python -m tests.bench_cold_start --runs 5 --json
+
+Budgets (median import_ms) default to BUDGETS_MS below and can be overridden
+with COLD_START_BUDGET_<HANDLER>_MS, e.g. COLD_START_BUDGET_CHAT_MS=250. They
+are only enforced by --check (run it on a quiet machine); the pytest suite
+(tests/test_cold_start.py) checks the lazy imports alone.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+HANDLERS = {
+    "chat": "src.lambda_chat_handler",
+    "chat_worker": "src.lambda_chat_worker",
+    "dlq": "src.lambda_dlq_reprocessor",
+    "feedback": "src.lambda_feedback_handler",
+    "turn_writer": "src.lambda_turn_writer",
+}
+
+# What the first request of each handler builds
+FIRST_USE = {
+    "chat": ["openai", "dynamodb", "tz"],
+    "chat_worker": ["openai", "dynamodb", "tz"],
+    "dlq": ["openai", "dynamodb", "tz"],
+    "feedback": ["dynamodb"],
+    "turn_writer": ["dynamodb"],
+}
+
+BUDGETS_MS = {"chat": 300, "chat_worker": 300, "dlq": 300, "feedback": 150, "turn_writer": 150}
+
+HEAVY = ("openai", "httpx", "boto3", "botocore", "pytz", "dotenv")
+
+_PROBE = r"""
+import importlib, json, resource, sys, time
+t0 = time.perf_counter()
+importlib.import_module(sys.argv[1])
+import_ms = (time.perf_counter() - t0) * 1000.0
+heavy = sorted(m for m in {heavy!r} if m in sys.modules)
+
+t1 = time.perf_counter()
+for what in sys.argv[2].split(","):
+    if what == "openai":
+        from src.config.openai_client import get_client
+        get_client("sk-cold-start-bench")
+    elif what == "dynamodb":
+        from src.storage.dynamo import get_resource
+        get_resource().Table("ConversationMessages")
+    elif what == "tz":
+        from src.utils.time_utils import get_current_time_info
+        get_current_time_info()
+first_use_ms = (time.perf_counter() - t1) * 1000.0
+
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{"import_ms": import_ms, "first_use_ms": first_use_ms,
+                   "peak_rss_mb": rss_kb / 1024.0, "heavy_at_import": heavy}}))
+""".format(heavy=HEAVY)
+
+
+def measure_once(handler: str) -> dict:
+    env = dict(os.environ)
+    env.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    env["AWS_LAMBDA_FUNCTION_NAME"] = f"bench-{handler}"  # behave like Lambda (no .env loading)
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE, HANDLERS[handler], ",".join(FIRST_USE[handler])],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def budget_ms(handler: str) -> float:
+    try:
+        return float(os.getenv(f"COLD_START_BUDGET_{handler.upper()}_MS", BUDGETS_MS[handler]))
+    except ValueError:
+        return float(BUDGETS_MS[handler])
+
+
+def measure(handler: str, runs: int = 3) -> dict:
+    samples = [measure_once(handler) for _ in range(max(1, runs))]
+    result = {
+        "handler": handler,
+        "import_ms": round(statistics.median(s["import_ms"] for s in samples), 1),
+        "first_use_ms": round(statistics.median(s["first_use_ms"] for s in samples), 1),
+        "peak_rss_mb": round(max(s["peak_rss_mb"] for s in samples), 1),
+        "heavy_at_import": samples[0]["heavy_at_import"],
+        "budget_ms": budget_ms(handler),
+    }
+    result["within_budget"] = result["import_ms"] <= result["budget_ms"]
+    return result
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=3, help="Fresh interpreters per handler (median is reported)")
+    ap.add_argument("--handler", choices=sorted(HANDLERS), action="append", help="Limit to these handlers")
+    ap.add_argument("--check", action="store_true", help="Exit 1 when a handler exceeds its budget")
+    ap.add_argument("--json", action="store_true", help="Print JSON instead of a table")
+    args = ap.parse_args()
+
+    results = [measure(h, args.runs) for h in (args.handler or HANDLERS)]
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'handler':<12} {'import_ms':>10} {'first_use_ms':>13} {'rss_mb':>8} {'budget':>8}  heavy_at_import")
+        for r in results:
+            flag = "✅" if r["within_budget"] else "❌"
+            print(f"{r['handler']:<12} {r['import_ms']:>10} {r['first_use_ms']:>13} {r['peak_rss_mb']:>8} "
+                  f"{r['budget_ms']:>8} {flag} {','.join(r['heavy_at_import']) or '-'}")
+
+    if args.check and not all(r["within_budget"] for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+# tests/bench_history.py
+"""
+Benchmark: token-budgeted history window vs the old fixed window, replayed
+turn by turn over long conversations.
+
+Every turn of every conversation is replayed with the history a real request
+would have had (all earlier messages). For each turn it compares:
+  legacy  last 16 messages, 600 chars each, "[Imagen]" lines included
+  window  services/history_window.build_window under HISTORY_TOKEN_BUDGET,
+          with a rolling summary (a stand-in of HISTORY_SUMMARY_MAX_TOKENS
+          tokens, refreshed every HISTORY_SUMMARY_EVERY_TURNS turns, as in
+          production)
+and reports history tokens per turn, the total saved, and how many earlier
+turns each approach still covers (verbatim or through the summary).
+
+Sources (pick one):
+  python -m tests.bench_history                                # synthetic
+  python -m tests.bench_history --jsonl export.jsonl           # one ConversationMessages item per line
+  python -m tests.bench_history --table ConversationMessages --max-conversations 200
+"""
+import argparse
+import json
+import random
+import statistics
+from collections import defaultdict
+
+from src.services import conversation_summary
+from src.services.history_window import build_window, token_budget
+from src.storage.message_codec import expand_item
+from src.utils import token_count
+
+
+def synthetic(conversations: int, turns: int, seed: int = 7) -> dict:
+    rng = random.Random(seed)
+    words = ("ecuación función ángulo derivada probabilidad lectura párrafo autor célula energía "
+             "fuerza velocidad historia constitución gráfica tabla porcentaje triángulo").split()
+    out = {}
+    for c in range(conversations):
+        msgs = []
+        for t in range(turns):
+            ts = f"2025-01-01T{t // 3600:02d}:{t // 60 % 60:02d}:{t % 60:02d}.000000#00"
+            q = " ".join(rng.choice(words) for _ in range(rng.randint(8, 60)))
+            msgs.append({"Role": "user", "MessageText": f"¿{q}?", "Timestamp": ts})
+            for i in range(rng.choice((0, 0, 0, 1, 2))):
+                msgs.append({"Role": "user", "MessageText": f"[Imagen] https://cdn.example.com/{c}/{t}/{i}.png",
+                             "Timestamp": ts})
+            a = " ".join(rng.choice(words) for _ in range(rng.randint(60, 400)))
+            msgs.append({"Role": "assistant", "MessageText": a, "Timestamp": ts})
+        out[f"synthetic-{c}"] = msgs
+    return out
+
+
+def _group(items) -> dict:
+    by_conv = defaultdict(list)
+    for item in items:
+        by_conv[item["ConversationId"]].append(item)
+    return {cid: [m for it in sorted(its, key=lambda x: x["Timestamp"]) for m in expand_item(it)]
+            for cid, its in by_conv.items()}
+
+
+def from_jsonl(path: str) -> dict:
+    with open(path, encoding="utf-8") as fh:
+        return _group(json.loads(line) for line in fh if line.strip())
+
+
+def from_table(name: str, max_conversations: int) -> dict:
+    import boto3
+    table = boto3.resource("dynamodb").Table(name)
+    items, kwargs = [], {}
+    while True:
+        resp = table.scan(**kwargs)
+        items.extend(resp.get("Items", []))
+        if "LastEvaluatedKey" not in resp or len({i["ConversationId"] for i in items}) > max_conversations:
+            break
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+    grouped = _group(items)
+    return dict(list(grouped.items())[:max_conversations])
+
+
+def _turn_starts(msgs):
+    """Index of the first message of each turn (a user message after an assistant one)."""
+    starts, prev_role = [], "assistant"
+    for i, m in enumerate(msgs):
+        if m.get("Role") == "user" and prev_role == "assistant":
+            starts.append(i)
+        prev_role = m.get("Role")
+    return starts
+
+
+def replay(conversations: dict, every: int, summary_tokens: int, min_turns: int):
+    legacy, window_tokens, covered_legacy, covered_window = [], [], [], []
+    summary_text = "resumen " * max(1, summary_tokens // 2)  # ~summary_tokens tokens
+    replayed = 0
+    for msgs in conversations.values():
+        starts = _turn_starts(msgs)
+        if len(starts) < min_turns:
+            continue
+        replayed += 1
+        summarized_turns = 0
+        for t, start in enumerate(starts[1:], 1):
+            history = msgs[:start]
+            w = build_window(history, summary=summary_text if summarized_turns else None)
+            legacy.append(w.legacy_tokens)
+            window_tokens.append(w.tokens)
+
+            first_kept = history[-16:][0]["Timestamp"]
+            covered_legacy.append(sum(1 for s in starts[:t] if msgs[s]["Timestamp"] >= first_kept) / t)
+            kept = {m["Timestamp"] for m in w.included}
+            verbatim = sum(1 for s in starts[:t] if msgs[s]["Timestamp"] in kept)
+            covered_window.append(min(t, verbatim + summarized_turns) / t)
+
+            # Production refreshes once `every` turns have left the window
+            pending = t - verbatim - summarized_turns
+            if every and pending >= every:
+                summarized_turns = t - verbatim
+    return replayed, legacy, window_tokens, covered_legacy, covered_window
+
+
+def _p(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--jsonl", help="ConversationMessages items, one JSON object per line")
+    ap.add_argument("--table", help="Scan this DynamoDB table")
+    ap.add_argument("--max-conversations", type=int, default=200)
+    ap.add_argument("--conversations", type=int, default=50, help="Synthetic conversations")
+    ap.add_argument("--turns", type=int, default=40, help="Turns per synthetic conversation")
+    ap.add_argument("--min-turns", type=int, default=10, help="Skip shorter conversations")
+    args = ap.parse_args()
+
+    if args.jsonl:
+        conversations = from_jsonl(args.jsonl)
+    elif args.table:
+        conversations = from_table(args.table, args.max_conversations)
+    else:
+        conversations = synthetic(args.conversations, args.turns)
+
+    every = conversation_summary.summary_every_turns()
+    summary_tokens = conversation_summary._env_int("HISTORY_SUMMARY_MAX_TOKENS", 350)
+    n, legacy, window, cov_l, cov_w = replay(conversations, every, summary_tokens, args.min_turns)
+    if not legacy:
+        print("no conversation has enough turns")
+        return
+
+    saved = sum(legacy) - sum(window)
+    print(f"conversations={n} turns={len(legacy)} budget={token_budget()} "
+          f"summary_every={every} summary_tokens≈{summary_tokens} counter={'tiktoken' if token_count._encoding() else 'heuristic'}")
+    print(f"{'':8} {'p50':>7} {'p95':>7} {'max':>7} {'total':>10} {'coverage':>9}")
+    for name, toks, cov in (("legacy", legacy, cov_l), ("window", window, cov_w)):
+        print(f"{name:8} {_p(toks, .5):>7} {_p(toks, .95):>7} {max(toks):>7} {sum(toks):>10} "
+              f"{statistics.mean(cov):>8.0%}")
+    print(f"\nhistory tokens saved: {saved} ({saved / sum(legacy):.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# tests/bench_logging.py
+"""
+Microbenchmark: logging overhead per chat request on the request thread.
+
+Replays the events one get_ai_response turn emits (~12, two of them carrying
+get_stores_for_page) into /dev/null under each logging mode:
+
+  sync-eager     LOG_ASYNC=0, details built eagerly, json   (previous behavior)
+  sync-lazy      details as callables + LOG_SAMPLE_RATES
+  async          QueueHandler/QueueListener, lazy details
+  async-sampled  async + sampling + orjson (if installed)
+
+Reports µs per request spent in the request thread, and the total including
+flush_logs() (the wait before the handler returns). A real turn spends
+seconds waiting on OpenAI/DynamoDB between events, which is when the listener
+thread drains the queue; --gap-ms inserts that idle time between requests
+(0 measures the worst case, where the listener competes for the GIL).
+
+Usage:
+  python -m tests.bench_logging [--requests 1000] [--gap-ms 1]
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+from src.config.page_vectorstores import get_stores_for_page
+from src.utils.logging_utils import configure_logging, flush_logs, log_event, stage
+
+PAGE = "/simulacro-icfes/matematicas"
+SAMPLE_RATES = "image_blocks_formatted=0.1,openai_request_sent=0.1,conversation_reused=0.1,history_tail_read=0.1"
+
+
+def _details(lazy: bool, build):
+    return build if lazy else build()
+
+
+def one_request(lazy: bool) -> None:
+    log_event("lambda_invocation", {"source": "RomaChatHandler", "has_body": True})
+    log_event("conversation_reused", _details(lazy, lambda: {
+        "conversation_id": "c1", "user_id": "u1", "page": PAGE, "vector_stores": get_stores_for_page(PAGE),
+    }))
+    with stage("image_format"):
+        log_event("image_blocks_formatted", {"image_count": 0, "user_id": "u1"})
+    log_event("history_tail_read", {"conversation_id": "c1", "source": "cache", "count": 16})
+    log_event("openai_request_sent", _details(lazy, lambda: {
+        "user_id": "u1", "page": PAGE, "content_parts_count": 2, "history_mode": "transcript",
+        "tier": "full", "vector_stores": get_stores_for_page(PAGE),
+    }))
+    log_event("openai_attempt", {"label": "responses.create", "attempt": 1, "outcome": "success", "latency_ms": 812.3})
+    log_event("openai_response_received", {"conversation_id": "c1", "reply_snippet": "x" * 100})
+    log_event("history_mode_usage", {"conversation_id": "c1", "history_mode": "transcript", "input_tokens": 2400})
+    log_event("prompt_cache_usage", {"page_key": PAGE, "input_tokens": 2400, "cached_tokens": 1920})
+    log_event("turn_saved", {"conversation_id": "c1", "item_count": 1, "mode": "batch", "latency_ms": 9.1})
+    log_event("messages_saved", {"conversation_id": "c1", "user_id": "u1", "mode": "direct"})
+    log_event("chat_response_success", {"user_id": "u1", "conversation_id": "c1", "reply_snippet": "x" * 100})
+
+
+MODES = {
+    "sync-eager": dict(env={}, async_mode=False, lazy=False),
+    "sync-lazy": dict(env={"LOG_SAMPLE_RATES": SAMPLE_RATES}, async_mode=False, lazy=True),
+    "async": dict(env={}, async_mode=True, lazy=True),
+    "async-sampled": dict(env={"LOG_SAMPLE_RATES": SAMPLE_RATES, "LOG_JSON_ENCODER": "orjson"}, async_mode=True, lazy=True),
+}
+
+
+def run_mode(name: str, requests: int, sink, gap_ms: float = 0.0) -> dict:
+    mode = MODES[name]
+    saved = {k: os.environ.get(k) for k in ("LOG_SAMPLE_RATES", "LOG_JSON_ENCODER")}
+    os.environ.pop("LOG_SAMPLE_RATES", None)
+    os.environ.pop("LOG_JSON_ENCODER", None)
+    os.environ.update(mode["env"])
+    try:
+        configure_logging(stream=sink, async_mode=mode["async_mode"])
+        for _ in range(50):  # warm up
+            one_request(mode["lazy"])
+        flush_logs()
+
+        request_thread = flush = 0.0
+        for _ in range(requests):
+            t0 = time.perf_counter()
+            one_request(mode["lazy"])
+            request_thread += time.perf_counter() - t0
+            if gap_ms:
+                time.sleep(gap_ms / 1000.0)  # simulated model/DynamoDB wait
+            t1 = time.perf_counter()
+            flush_logs()
+            flush += time.perf_counter() - t1
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+    return {
+        "mode": name,
+        "request_thread_us": round(request_thread / requests * 1e6, 1),
+        "with_flush_us": round((request_thread + flush) / requests * 1e6, 1),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=1000)
+    ap.add_argument("--gap-ms", type=float, default=1.0, help="Idle time per request (simulated I/O)")
+    args = ap.parse_args()
+
+    with open(os.devnull, "w") as sink:
+        results = [run_mode(name, args.requests, sink, args.gap_ms) for name in MODES]
+        configure_logging()  # back to the default handler
+    base = results[0]["request_thread_us"]
+    print(f"{'mode':<15} {'request µs':>11} {'+flush µs':>10} {'vs sync-eager':>14}")
+    for r in results:
+        print(f"{r['mode']:<15} {r['request_thread_us']:>11} {r['with_flush_us']:>10} "
+              f"{base / r['request_thread_us']:>13.1f}x")
+    try:
+        import orjson  # noqa: F401
+        print("(orjson installed: async-sampled uses it)")
+    except ImportError:
+        print("(orjson not installed: async-sampled falls back to json)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# tests/bench_retrieval.py
+"""
+Benchmark: local retrieval recall and latency on a fixed question set.
+
+Builds the BM25 index from src/knowledge into a temp folder (or uses --index),
+then runs student-style paraphrases of the knowledge content against the
+stores a chat turn on that page would search ([page store, general]).
+A question counts as recalled at k when any of its expected chunk ids is in
+the top k. Latency covers tokenize + search + merge, in-process.
+
+Usage:
+  python -m tests.bench_retrieval [--index DIR] [--k 8] [--repeat 200]
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from src.assistant import local_retrieval
+from src.scripts import knowledge_admin
+
+# (page store, question, acceptable chunk ids)
+QUESTIONS = [
+    ("icfes-matematicas", "¿cuánto se paga por entrar a la torre de pisa si reservo?",
+     {"simulacro-icfes/matematicas/context_mat01"}),
+    ("icfes-matematicas", "precio de la boleta de cine según la edad",
+     {"simulacro-icfes/matematicas/context_mat04"}),
+    ("icfes-matematicas", "exportaciones en millones de dólares de Ecuador y Venezuela",
+     {"simulacro-icfes/matematicas/context_mat02"}),
+    ("icfes-matematicas", "polinomio de la curva de la montaña rusa",
+     {"simulacro-icfes/matematicas/context_mat13", "simulacro-icfes/matematicas/q19"}),
+    ("icfes-ciencias-naturales", "qué pasa en la red trófica si desaparecen los tiburones",
+     {"simulacro-icfes/ciencias-naturales/q08", "simulacro-icfes/ciencias-naturales/context_nat04"}),
+    ("icfes-ciencias-naturales", "la bacteria shewanella que vive en el fondo de los ríos",
+     {"simulacro-icfes/ciencias-naturales/context_nat03"}),
+    ("icfes-ciencias-naturales", "hipótesis de los girasoles y el nitrógeno en clima cálido",
+     {"simulacro-icfes/ciencias-naturales/context_nat13", "simulacro-icfes/ciencias-naturales/q17"}),
+    ("icfes-ingles", "what happens inside the hidden layers of a neural network",
+     {"simulacro-icfes/ingles/q10"}),
+    ("icfes-ingles", "transformers analyze information simultaneously",
+     {"simulacro-icfes/ingles/context_transformers01", "simulacro-icfes/ingles/q15"}),
+    ("icfes-lectura-critica", "por qué darwin se enfermaba con la pluma del pavo real",
+     {"simulacro-icfes/lectura-critica/q14", "simulacro-icfes/lectura-critica/context_darwin01"}),
+    ("icfes-lectura-critica", "los jóvenes de esparta robaban comida",
+     {"simulacro-icfes/lectura-critica/q18", "simulacro-icfes/lectura-critica/context_esparta01"}),
+    ("icfes-lectura-critica", "impacto de las novelas de hermann hesse en los jóvenes",
+     {"simulacro-icfes/lectura-critica/context_hesse01"}),
+    ("icfes-sociales-ciudadanas", "qué descubrió milgram sobre obedecer a la autoridad",
+     {"simulacro-icfes/sociales-y-cuidadanas/q06", "simulacro-icfes/sociales-y-cuidadanas/context_milgram01"}),
+    ("icfes-sociales-ciudadanas", "carta de cristóbal colón al volver de américa",
+     {"simulacro-icfes/sociales-y-cuidadanas/context_colon01", "simulacro-icfes/sociales-y-cuidadanas/q01"}),
+    ("unal-matematicas", "distancia de un planeta al sol con la ley de kepler",
+     {"simulacro-unal/matematicas/context_kepler01"}),
+    ("unal-matematicas", "paquete de correos largo más contorno",
+     {"simulacro-unal/matematicas/context_paquete01", "simulacro-unal/matematicas/q01"}),
+    ("unal-matematicas", "costo de producir camisas C(x)",
+     {"simulacro-unal/matematicas/q11"}),
+    ("unal-ciencias-naturales", "aceleración positiva en la gráfica de posición tiempo",
+     {"simulacro-unal/ciencias-naturales/q05", "simulacro-unal/ciencias-naturales/context_movimiento01"}),
+    ("unal-ciencias-naturales", "carburo de silicio a partir de arena",
+     {"simulacro-unal/ciencias-naturales/q12"}),
+    ("unal-ciencias-sociales", "toma de la bastilla 14 de julio",
+     {"simulacro-unal/ciencias-sociales/context_bastilla01", "simulacro-unal/ciencias-sociales/q01"}),
+    ("unal-tematica-comun", "cómo murió plinio el viejo",
+     {"simulacro-unal/tematica-comun/q05"}),
+    ("unal-analisis-imagen", "imagen en espejo respecto a un eje vertical",
+     {"simulacro-unal/analisis-de-imagen/q14", "simulacro-unal/analisis-de-imagen/context_simetria01"}),
+]
+
+
+def _percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--index", default=None, help="Existing index folder (default: build into a temp dir)")
+    ap.add_argument("--k", type=int, default=8)
+    ap.add_argument("--repeat", type=int, default=200, help="Timed passes over the question set")
+    args = ap.parse_args()
+
+    tmp = None
+    if args.index:
+        root = Path(args.index)
+    else:
+        tmp = tempfile.TemporaryDirectory()
+        root = Path(tmp.name)
+        t0 = time.perf_counter()
+        knowledge_admin.cmd_build_index(SimpleNamespace(root="src/knowledge", out=str(root), dense=False, force=True))
+        print(f"build: {(time.perf_counter() - t0) * 1000:.0f} ms\n")
+
+    local_retrieval.clear_cache()
+    t0 = time.perf_counter()
+    for store, _q, _ids in QUESTIONS:  # first query per store pays the lazy load
+        local_retrieval.retrieve([store, "general"], "carga", 1, root=root)
+    load_ms = (time.perf_counter() - t0) * 1000.0
+
+    recall = {1: 0, 3: 0, args.k: 0}
+    for store, question, expected in QUESTIONS:
+        ranked = [h.chunk_id for h in local_retrieval.retrieve([store, "general"], question, args.k, root=root)]
+        for k in recall:
+            recall[k] += bool(expected & set(ranked[:k]))
+        if not expected & set(ranked):
+            print(f"  miss: [{store}] {question!r} → {ranked[:3]}")
+
+    latencies = []
+    for _ in range(args.repeat):
+        for store, question, _ids in QUESTIONS:
+            t0 = time.perf_counter()
+            local_retrieval.retrieve([store, "general"], question, args.k, root=root)
+            latencies.append((time.perf_counter() - t0) * 1000.0)
+
+    n = len(QUESTIONS)
+    print(f"questions={n} k={args.k} lazy load (all stores)={load_ms:.1f} ms")
+    print("  ".join(f"recall@{k}={recall[k] / n:.2f}" for k in sorted(recall)))
+    print(f"latency ms: p50={statistics.median(latencies):.3f} p95={_percentile(latencies, 0.95):.3f} "
+          f"max={max(latencies):.3f}")
+    if tmp:
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
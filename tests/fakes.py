@@ -0,0 +1,241 @@
+# tests/fakes.py
+"""
+Local stand-ins for the OpenAI client and AWS resources used by the tests. No network.
+"""
+import asyncio
+import itertools
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+
+class FakeAPIError(Exception):
+    """Mimics openai.APIStatusError closely enough for status-based checks."""
+
+    def __init__(self, message, status_code=500, headers=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers=headers or {})
+
+
+class FakeStream:
+    """Iterates Responses API stream events with configurable delays."""
+
+    def __init__(self, chunks, first_token_delay=0.0, chunk_delay=0.0, incomplete=False):
+        self.chunks = list(chunks)
+        self.first_token_delay = first_token_delay
+        self.chunk_delay = chunk_delay
+        self.incomplete = incomplete
+        self.closed = False
+
+    def __iter__(self):
+        yield SimpleNamespace(type="response.created")
+        for i, chunk in enumerate(self.chunks):
+            time.sleep(self.first_token_delay if i == 0 else self.chunk_delay)
+            yield SimpleNamespace(type="response.output_text.delta", delta=chunk)
+        final = SimpleNamespace(id="resp_stream", output_text="".join(self.chunks))
+        yield SimpleNamespace(type="response.incomplete" if self.incomplete else "response.completed", response=final)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeResponses:
+    def __init__(self, owner):
+        self.owner = owner
+
+    def create(self, stream=False, **kwargs):
+        index, delay = self._begin(stream, kwargs)
+        time.sleep(delay)
+        return self._finish(index, stream, kwargs)
+
+    def _begin(self, stream, kwargs):
+        """Record the call; return its index and its injected delay in seconds."""
+        self.owner.calls.append({"stream": stream, **kwargs})
+        index = len(self.owner.calls) - 1
+        # Injected latency / errors, one entry per call (None = no injection)
+        delay = 0.0
+        if index < len(self.owner.latencies) and self.owner.latencies[index]:
+            delay += self.owner.latencies[index]
+        failing = index < len(self.owner.errors) and self.owner.errors[index] is not None
+        if not stream and not failing:
+            delay += self.owner.first_token_delay + self.owner.chunk_delay * max(0, len(self.owner.chunks) - 1)
+        return index, delay
+
+    def _finish(self, index, stream, kwargs):
+        if index < len(self.owner.errors) and self.owner.errors[index] is not None:
+            raise self.owner.errors[index]
+        if self.owner.reject_chain and kwargs.get("previous_response_id"):
+            raise FakeAPIError(
+                f"Previous response with id '{kwargs['previous_response_id']}' not found.", status_code=404,
+            )
+        text = "".join(self.owner.chunks)
+        if index < len(self.owner.replies) and self.owner.replies[index] is not None:
+            text = self.owner.replies[index]
+        if stream:
+            chunks = self.owner.chunks if text == "".join(self.owner.chunks) else [text]
+            incomplete = index < len(self.owner.incomplete) and bool(self.owner.incomplete[index])
+            return FakeStream(chunks, self.owner.first_token_delay, self.owner.chunk_delay, incomplete)
+        return SimpleNamespace(
+            id=f"resp_{len(self.owner.calls)}",
+            output_text=text,
+            usage=SimpleNamespace(
+                input_tokens=self.owner.input_tokens,
+                output_tokens=10,
+                input_tokens_details=SimpleNamespace(cached_tokens=self.owner.cached_tokens),
+            ),
+        )
+
+
+class FakeAsyncResponses(FakeResponses):
+    async def create(self, stream=False, **kwargs):
+        index, delay = self._begin(stream, kwargs)
+        await asyncio.sleep(delay)
+        return self._finish(index, stream, kwargs)
+
+
+class FakeOpenAI:
+    """Minimal client exposing .responses.create(...) like openai.OpenAI."""
+
+    def __init__(self, chunks=("Hola", ", ", "mundo."), first_token_delay=0.0, chunk_delay=0.0,
+                 reject_chain=False, input_tokens=100, cached_tokens=0, errors=(), latencies=(), replies=(),
+                 incomplete=()):
+        self.chunks = list(chunks)
+        self.first_token_delay = first_token_delay
+        self.chunk_delay = chunk_delay
+        self.reject_chain = reject_chain
+        self.input_tokens = input_tokens
+        self.cached_tokens = cached_tokens
+        self.errors = list(errors)
+        self.latencies = list(latencies)
+        self.replies = list(replies)
+        self.incomplete = list(incomplete)   # per streamed call: end with response.incomplete
+        self.calls = []
+        self.responses = FakeResponses(self)
+
+
+class FakeAsyncOpenAI(FakeOpenAI):
+    """Same knobs as FakeOpenAI, but .responses.create is awaited like openai.AsyncOpenAI."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.responses = FakeAsyncResponses(self)
+
+
+class FakeTable:
+    name = "ConversationMessages"
+
+
+class FakeDynamo:
+    """
+    boto3 resource stand-in for messages_table: batch_write_item leaves the last
+    item unprocessed `throttle` times. `items` is keyed like the real table.
+    """
+
+    def __init__(self, throttle=0):
+        self.throttle = throttle
+        self.calls = []
+        self.written = []
+        self.items = {}
+
+    def batch_write_item(self, RequestItems):
+        requests = RequestItems["ConversationMessages"]
+        self.calls.append(len(requests))
+        done, left = requests, []
+        if self.throttle:
+            self.throttle -= 1
+            done, left = requests[:-1], requests[-1:]
+        for r in done:
+            item = r["PutRequest"]["Item"]
+            self.written.append(item)
+            self.items[(item["ConversationId"], item["Timestamp"])] = item
+        return {"UnprocessedItems": {"ConversationMessages": left} if left else {}}
+
+
+class FakeVectorStoreAPI:
+    """
+    files / vector_stores stand-in for knowledge_admin: keeps uploaded files,
+    stores and their attached file ids in memory and counts every call.
+    """
+
+    def __init__(self, stores=()):
+        self._ids = itertools.count(1)  # next() is atomic: uploads run on a thread pool
+        self.uploaded = {}          # file_id -> (filename, bytes)
+        self.stores = {}            # store_id -> {"name", "file_ids"}
+        self.calls = {"files.create": 0, "files.delete": 0, "vs.list": 0, "vs.create": 0,
+                      "vs.files.create": 0, "vs.files.delete": 0, "file_batches": 0}
+        self.fail_upload = set()    # filenames whose upload raises
+        self.fail_index = set()     # filenames a file batch reports as failed
+        self.batches = {}           # batch_id -> failed file ids
+        for name in stores:
+            self._create_store(name)
+        api = self
+
+        class _Files:
+            def create(self, file, purpose):
+                api.calls["files.create"] += 1
+                if Path(getattr(file, "name", "")).name in api.fail_upload:
+                    raise ConnectionError("upload failed")
+                fid = f"file_{next(api._ids)}"
+                api.uploaded[fid] = (getattr(file, "name", ""), file.read())
+                return SimpleNamespace(id=fid)
+
+            def delete(self, file_id):
+                api.calls["files.delete"] += 1
+                api.uploaded.pop(file_id)
+                return SimpleNamespace(id=file_id, deleted=True)
+
+        class _StoreFiles:
+            def create(self, vector_store_id, file_id):
+                api.calls["vs.files.create"] += 1
+                api.stores[vector_store_id]["file_ids"].append(file_id)
+
+            def delete(self, file_id, vector_store_id):
+                api.calls["vs.files.delete"] += 1
+                api.stores[vector_store_id]["file_ids"].remove(file_id)
+
+        class _FileBatches:
+            def create_and_poll(self, vector_store_id, file_ids):
+                api.calls["file_batches"] += 1
+                api.stores[vector_store_id]["file_ids"].extend(file_ids)
+                failed = [fid for fid in file_ids if Path(api.uploaded[fid][0]).name in api.fail_index]
+                bid = f"vsfb_{next(api._ids)}"
+                api.batches[bid] = failed
+                return SimpleNamespace(id=bid, status="completed", file_counts=SimpleNamespace(
+                    completed=len(file_ids) - len(failed), failed=len(failed), cancelled=0))
+
+            def list_files(self, batch_id, vector_store_id, filter=None):
+                return [SimpleNamespace(id=fid, status="failed") for fid in api.batches[batch_id]
+                        if filter in (None, "failed")]
+
+        class _VectorStores:
+            files = _StoreFiles()
+            file_batches = _FileBatches()
+
+            def list(self, limit=20, after=None):
+                """Cursor pages, newest store first, like the real endpoint."""
+                api.calls["vs.list"] += 1
+                ids = list(reversed(api.stores))
+                start = ids.index(after) + 1 if after else 0
+                page = ids[start:start + limit]
+                return SimpleNamespace(
+                    data=[SimpleNamespace(id=sid, name=api.stores[sid]["name"]) for sid in page],
+                    has_more=start + limit < len(ids),
+                )
+
+            def create(self, name):
+                api.calls["vs.create"] += 1
+                return SimpleNamespace(id=api._create_store(name))
+
+        self.files = _Files()
+        self.vector_stores = _VectorStores()
+
+    def _create_store(self, name):
+        sid = f"vs_{next(self._ids)}"
+        self.stores[sid] = {"name": name, "file_ids": []}
+        return sid
+
+    def attached(self, name):
+        """Filenames attached to the store called `name`."""
+        sid = next(sid for sid, s in self.stores.items() if s["name"] == name)
+        return sorted(Path(self.uploaded[fid][0]).name for fid in self.stores[sid]["file_ids"])
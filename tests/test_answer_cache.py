@@ -0,0 +1,80 @@
+import time
+
+from src.services import answer_cache
+from src.storage import answer_cache_table
+from src.services.answer_cache import MemoryAnswerCache, normalize_question, question_key, vectorize
+
+
+def _put(cache, ns, question, answer):
+    norm = normalize_question(question)
+    cache.put(ns, question_key(norm), norm, answer)
+
+
+def _similar(cache, ns, question, threshold=0.85):
+    norm = normalize_question(question)
+    return cache.get_similar(ns, norm, vectorize(norm), threshold)
+
+
+def test_exact_and_approximate_matches():
+    cache = MemoryAnswerCache(max_entries=10, ttl_seconds=60)
+    _put(cache, "ns", "¿Cuánto cuesta el simulacro UNAL?", "Cuesta X.")
+
+    norm = normalize_question("cuanto cuesta el simulacro unal")
+    assert cache.get_exact("ns", question_key(norm)) == "Cuesta X."
+
+    answer, score = _similar(cache, "ns", "Cuanto cuesta el simulacro de la UNAL")
+    assert answer == "Cuesta X." and score >= 0.85
+    assert _similar(cache, "other-ns", "Cuanto cuesta el simulacro de la UNAL")[0] is None
+    print("✅ Similarity:", round(score, 3))
+
+
+def test_different_item_numbers_never_match():
+    cache = MemoryAnswerCache()
+    _put(cache, "ns", "Explica la pregunta 3 del simulacro", "Respuesta 3")
+    assert _similar(cache, "ns", "Explica la pregunta 5 del simulacro", threshold=0.5)[0] is None
+
+
+def test_ttl_and_lru_eviction():
+    cache = MemoryAnswerCache(max_entries=2, ttl_seconds=0.05)
+    _put(cache, "ns", "uno", "1")
+    _put(cache, "ns", "dos", "2")
+    _put(cache, "ns", "tres", "3")
+    assert len(cache) == 2
+    assert cache.get_exact("ns", question_key("uno")) is None
+    time.sleep(0.06)
+    assert cache.get_exact("ns", question_key("tres")) is None
+
+
+def test_bypass_and_private_values(monkeypatch):
+    monkeypatch.setenv("ANSWER_CACHE_BACKEND", "memory")
+    assert not answer_cache.is_cacheable("hola", ["https://img"], has_history=False)
+    assert not answer_cache.is_cacheable("hola", [], has_history=True)
+    assert answer_cache.is_cacheable("hola", [], has_history=False)
+
+    assert not answer_cache.store("hola", ["vs_1"], "m", "Hola Ana, bienvenida.", ("Ana", None))
+    assert answer_cache.store("hola", ["vs_1"], "m", "Hola, bienvenida.", ("Ana", None))
+    answer, info = answer_cache.lookup("Hola!", ["vs_1"], "m")
+    assert answer == "Hola, bienvenida." and info["match"] == "exact"
+
+def test_dynamo_candidates_are_the_newest_entries(monkeypatch):
+    queries = []
+
+    class _Table:
+        def query(self, **kw):
+            queries.append(kw)
+            return {"Items": [{"QuestionKey": "k", "Question": "q", "ExpiresAt": time.time() + 60}]}
+
+    monkeypatch.setattr(answer_cache_table, "table", _Table())
+    monkeypatch.setattr(answer_cache_table, "RECENT_INDEX", "")
+    assert answer_cache_table.list_cached_questions("ns") == [] and queries == []
+
+    monkeypatch.setattr(answer_cache_table, "RECENT_INDEX", "NamespaceCreatedAt")
+    assert len(answer_cache_table.list_cached_questions("ns", limit=50)) == 1
+    assert queries[0]["IndexName"] == "NamespaceCreatedAt"
+    assert queries[0]["ScanIndexForward"] is False and queries[0]["Limit"] == 50
+
+
+# This makes it executable directly:
+if __name__ == "__main__":
+    import pytest
+    pytest.main([__file__, "-q"])
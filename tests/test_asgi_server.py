@@ -0,0 +1,165 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+from src import asgi_server, lambda_chat_handler, lambda_dlq_reprocessor, lambda_feedback_handler
+from src.asgi_server import ChatServer, ServerConfig
+from src.services import chat_jobs
+from src.storage.queues import LocalQueue
+
+
+async def _request(app, method, path, body=None, headers=(), query=b""):
+    """Drive one HTTP request through the ASGI app; returns (status, headers, body, chunk count)."""
+    raw = json.dumps(body).encode() if body is not None else b""
+    sent, disconnected = [], asyncio.Event()
+    delivered = False
+
+    async def receive():
+        nonlocal delivered
+        if not delivered:
+            delivered = True
+            return {"type": "http.request", "body": raw, "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "query_string": query,
+             "headers": [(k.encode(), v.encode()) for k, v in headers]}
+    await app(scope, receive, send)
+    disconnected.set()
+    start = sent[0]
+    chunks = [m.get("body", b"") for m in sent[1:]]
+    return start["status"], dict((k.decode(), v.decode()) for k, v in start["headers"]), \
+        b"".join(chunks).decode(), len([c for c in chunks if c])
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture
+def server():
+    return ChatServer(ServerConfig(max_concurrency=2, queue_timeout_ms=50, dlq_queue_url="dlq"))
+
+
+def test_chat_matches_lambda_contract(server, monkeypatch):
+    async def fake_response(**kw):
+        assert kw["user_id"] == "anonymous" and kw["deadline"] is not None
+        return "Listo.", "conv-1"
+
+    monkeypatch.setattr(asgi_server, "get_ai_response_async", fake_response)
+
+    status, headers, body, _ = _run(_request(server, "POST", "/chat", {"message": "hola"}))
+    expected = lambda_chat_handler.response(200, {"reply": "Listo.", "conversationId": "conv-1"})
+    assert status == 200 and body == expected["body"]
+    assert headers["access-control-allow-origin"] == "*"
+
+    status, _, body, _ = _run(_request(server, "POST", "/chat", {"page": "/"}))
+    assert status == 400 and json.loads(body) == {"error": "Missing message or imageUrls"}
+    assert _run(_request(server, "GET", "/nope"))[0] == 404
+    print("✅ /chat:", body)
+
+
+def test_stream_is_relayed_frame_by_frame(server, monkeypatch):
+    def fake_stream(**kw):
+        yield {"type": "start", "conversationId": "conv-1"}
+        yield {"type": "delta", "text": "Hola"}
+        yield {"type": "done", "reply": "Hola", "conversationId": "conv-1"}
+
+    monkeypatch.setattr(asgi_server, "stream_ai_response", fake_stream)
+
+    status, headers, body, chunks = _run(_request(server, "POST", "/chat", {"message": "hola", "stream": True}))
+    assert status == 200 and headers["content-type"].startswith("text/event-stream")
+    assert chunks == 3 and body.count("event: ") == 3
+
+
+def test_busy_server_fails_fast_like_a_deadline(server, monkeypatch):
+    monkeypatch.delenv("CHAT_DLQ_URL", raising=False)
+    release = None
+
+    async def slow_response(**kw):
+        await release.wait()
+        return "Listo.", "conv-1"
+
+    monkeypatch.setattr(asgi_server, "get_ai_response_async", slow_response)
+
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        held = [asyncio.create_task(_request(server, "POST", "/chat", {"message": f"m{i}"})) for i in range(2)]
+        await asyncio.sleep(0.01)
+        health = await _request(server, "GET", "/healthz")
+        rejected = await _request(server, "POST", "/chat", {"message": "otra"})
+        release.set()
+        return health, rejected, await asyncio.gather(*held)
+
+    health, rejected, held = _run(scenario())
+    assert json.loads(health[2])["inflight"] == 2
+    assert rejected[0] == 503 and json.loads(rejected[2]) == {"error": "Service busy, please retry", "queued": False}
+    assert [r[0] for r in held] == [200, 200]
+
+
+def test_job_mode_submits_and_polls_like_the_lambda(server, monkeypatch):
+    monkeypatch.setenv("CHAT_JOB_MODE", "opt_in")
+    monkeypatch.setenv("CHAT_JOB_BACKEND", "memory")
+    monkeypatch.setattr(chat_jobs, "_backend", None)
+    queue = LocalQueue()
+    monkeypatch.setattr(chat_jobs, "_job_queue", lambda: queue)
+
+    async def no_model(**kw):
+        raise AssertionError("a job must not run in the request")
+
+    monkeypatch.setattr(asgi_server, "get_ai_response_async", no_model)
+
+    status, _, body, _ = _run(_request(server, "POST", "/chat", {"message": "hola", "async": True}))
+    job = json.loads(body)
+    assert status == 202 and job["status"] == "queued" and len(queue.drain()) == 1
+
+    status, _, body, _ = _run(_request(server, "GET", "/chat", query=f"jobId={job['jobId']}".encode()))
+    assert status == 200 and json.loads(body)["status"] == "queued"
+    status, _, body, _ = _run(_request(server, "POST", "/chat", {"jobId": job["jobId"]}))
+    assert status == 200 and json.loads(body)["jobId"] == job["jobId"]
+    assert _run(_request(server, "GET", "/chat", query=b"jobId=nope"))[0] == 404
+
+
+def test_feedback_route(server, monkeypatch):
+    monkeypatch.setattr(lambda_feedback_handler, "save_feedback", lambda **kw: {"ConversationId": kw["conversation_id"]})
+    status, _, body, _ = _run(_request(server, "POST", "/feedback", {"conversationId": "c1", "rating": "up"}))
+    assert status == 200 and json.loads(body)["ok"] is True
+
+
+class _FakeSqs:
+    def __init__(self, bodies):
+        self.messages = [{"MessageId": f"m{i}", "ReceiptHandle": f"r{i}", "Body": json.dumps(b)}
+                         for i, b in enumerate(bodies)]
+        self.deleted = []
+
+    def receive_message(self, **kw):
+        batch, self.messages = self.messages, []
+        return {"Messages": batch}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        self.deleted += [e["ReceiptHandle"] for e in Entries]
+
+
+def test_dlq_consumer_deletes_only_successful_records(server, monkeypatch):
+    def fake_reprocess(record, context=None):
+        if json.loads(record["body"])["message"] == "falla":
+            raise RuntimeError("model down")
+
+    monkeypatch.setattr(lambda_dlq_reprocessor, "_process_record", fake_reprocess)
+    sqs = _FakeSqs([{"message": "hola", "conversationId": "a"}, {"message": "falla", "conversationId": "b"}])
+
+    assert _run(server.drain_dlq_once(sqs, wait_s=0)) == 2
+    assert sqs.deleted == ["r0"]
+
+
+# This makes it executable directly:
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
@@ -0,0 +1,127 @@
+import asyncio
+import os
+import time
+from datetime import datetime
+
+import pytest
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+from src.assistant import assistant_client
+from src.services import chat_service, idempotency
+from src.services.async_chat_service import get_ai_response_async
+from tests.fakes import FakeAsyncOpenAI
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    """DynamoDB fakes that log when each call starts and ends."""
+    events, state = [], {"turns": [], "chain_updates": []}
+    header = {"UserId": "u1", "Timestamp": "2025-01-01T00:00:00"}
+
+    def slow(name, seconds, fn):
+        def call(*args, **kwargs):
+            events.append(f"{name}:start")
+            time.sleep(seconds)
+            events.append(f"{name}:end")
+            return fn(*args, **kwargs)
+        return call
+
+    monkeypatch.setattr(chat_service, "save_conversation", slow(
+        "save", 0.05, lambda **kw: {"ConversationId": "conv-new", "Timestamp": "2025-01-01T00:00:00"}))
+    monkeypatch.setattr(chat_service, "find_conversation", slow("header", 0.05, lambda uid, cid: header))
+    monkeypatch.setattr(chat_service, "get_recent_messages", slow("history", 0.05, lambda **kw: [
+        {"Role": "user", "MessageText": "¿Qué es un ángulo?", "Timestamp": "2025-01-01T00:00:01"},
+        {"Role": "assistant", "MessageText": "Es la abertura entre dos rayos.", "Timestamp": "2025-01-01T00:00:02"},
+    ]))
+    monkeypatch.setattr(chat_service, "persist_turn", slow(
+        "persist", 0.0, lambda *a, turn_timestamp=None, **kw: state["turns"].append(a[0]) or "direct"))
+    monkeypatch.setattr(chat_service, "update_conversation_chain", lambda *a: state["chain_updates"].append(a))
+    state.update(events=events, header=header)
+    return state
+
+
+def _client(monkeypatch, **kwargs):
+    client = FakeAsyncOpenAI(chunks=["Listo."], **kwargs)
+    monkeypatch.setattr(assistant_client, "get_async_openai_client", lambda: client)
+    return client
+
+
+def test_new_conversation_model_call_overlaps_header_write(storage, monkeypatch):
+    client = _client(monkeypatch)
+    started = []
+    create = client.responses.create
+
+    async def tracked_create(**kwargs):
+        started.append(list(storage["events"]))
+        return await create(**kwargs)
+
+    monkeypatch.setattr(client.responses, "create", tracked_create)
+
+    reply, conv_id = _run(get_ai_response_async("hola", "u1", "", None, "/"))
+
+    assert (reply, conv_id) == ("Listo.", "conv-new")
+    assert "save:end" not in started[0]          # the model did not wait for the header write
+    assert storage["turns"] == ["conv-new"]      # the message write did
+    print("✅ events:", storage["events"])
+
+
+def test_chained_lookup_and_history_fetch_run_together(storage, monkeypatch):
+    monkeypatch.setenv("CONVERSATION_CHAINING", "1")
+    storage["header"].update(LastResponseId="resp_prev", LastResponseAt=datetime.utcnow().isoformat())
+    client = _client(monkeypatch)
+
+    reply, conv_id = _run(get_ai_response_async("y ahora?", "u1", "", None, "/", conversation_id="c1"))
+
+    events = storage["events"]
+    assert (reply, conv_id) == ("Listo.", "c1")
+    assert events.index("history:start") < events.index("header:end")
+    assert client.calls[0]["previous_response_id"] == "resp_prev"
+    assert storage["chain_updates"] == [("u1", "2025-01-01T00:00:00", "c1", "resp_1")]
+
+
+def test_missing_chain_uses_prefetched_history(storage, monkeypatch):
+    monkeypatch.setenv("CONVERSATION_CHAINING", "1")
+    client = _client(monkeypatch)
+
+    _run(get_ai_response_async("y ahora?", "u1", "", None, "/", conversation_id="c1"))
+
+    call = client.calls[0]
+    assert "previous_response_id" not in call
+    assert "¿Qué es un ángulo?" in call["input"][0]["content"][0]["text"]
+    assert storage["events"].count("history:start") == 1
+
+
+def test_errors_match_sync_path_and_release_claim(storage, monkeypatch):
+    monkeypatch.setenv("IDEMPOTENCY_BACKEND", "memory")
+    monkeypatch.setenv("IDEMPOTENCY_WAIT_MS", "0")
+    monkeypatch.setattr(idempotency, "_backend", None)
+    client = _client(monkeypatch)
+    key = idempotency.resolve_key("k-1", "u1", None, "hola", [], "/")
+
+    def broken_save(**kw):
+        raise RuntimeError("dynamodb down")
+
+    monkeypatch.setattr(chat_service, "save_conversation", broken_save)
+    with pytest.raises(RuntimeError, match="Failed to save/reuse conversation"):
+        _run(get_ai_response_async("hola", "u1", "", None, "/", idempotency_key=key))
+
+    # The claim was released: the retry runs, and a second retry replays it
+    monkeypatch.setattr(chat_service, "save_conversation",
+                        lambda **kw: {"ConversationId": "conv-2", "Timestamp": "2025-01-01T00:00:00"})
+    first = _run(get_ai_response_async("hola", "u1", "", None, "/", idempotency_key=key))
+    second = _run(get_ai_response_async("hola", "u1", "", None, "/", idempotency_key=key))
+    assert first == second == ("Listo.", "conv-2")
+
+    client.replies = [None] * len(client.calls) + [""]
+    with pytest.raises(ValueError):
+        _run(get_ai_response_async("otra", "u1", "", None, "/", conversation_id="c1"))
+
+
+# This makes it executable directly:
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
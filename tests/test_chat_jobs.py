@@ -0,0 +1,177 @@
+import hashlib
+import hmac
+import io
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+from src import lambda_chat_handler, lambda_chat_worker, lambda_dlq_reprocessor
+from src.services import chat_jobs
+from src.storage.queues import LocalQueue
+from src.utils.logging_utils import flush_metrics
+
+
+def _context(remaining_ms=300000):
+    return SimpleNamespace(
+        function_name="worker", aws_request_id="r1",
+        get_remaining_time_in_millis=lambda: remaining_ms,
+    )
+
+
+def _post(body, headers=None):
+    return {"httpMethod": "POST", "headers": headers or {}, "body": json.dumps(body)}
+
+
+def _poll(job_id):
+    resp = lambda_chat_handler.lambda_handler(
+        {"httpMethod": "GET", "queryStringParameters": {"jobId": job_id}}, _context())
+    return resp["statusCode"], json.loads(resp["body"])
+
+
+@pytest.fixture
+def jobs(monkeypatch):
+    """Memory job store, a local worker queue and a fake model."""
+    monkeypatch.setenv("CHAT_JOB_MODE", "opt_in")
+    monkeypatch.setenv("CHAT_JOB_BACKEND", "memory")
+    monkeypatch.setenv("METRICS_EMF", "1")
+    monkeypatch.setattr(chat_jobs, "_backend", None)
+    queue = LocalQueue()
+    monkeypatch.setattr(chat_jobs, "_job_queue", lambda: queue)
+    calls = []
+
+    def fake_get_ai_response(message, conversation_id=None, **kw):
+        calls.append(message)
+        if message == "falla":
+            raise RuntimeError("model down")
+        return f"re: {message}", conversation_id or "conv-1"
+
+    monkeypatch.setattr(lambda_chat_handler, "get_ai_response", fake_get_ai_response)
+    monkeypatch.setattr(lambda_dlq_reprocessor, "get_ai_response", fake_get_ai_response)
+    return SimpleNamespace(queue=queue, calls=calls)
+
+
+def test_submit_returns_202_and_worker_stores_the_reply(jobs):
+    flush_metrics(io.StringIO())
+    resp = lambda_chat_handler.lambda_handler(_post({"message": "hola", "page": "/", "async": True}), _context())
+    job = json.loads(resp["body"])
+    assert resp["statusCode"] == 202 and job["status"] == "queued"
+    assert jobs.calls == []                       # nothing ran in the request
+
+    assert _poll(job["jobId"]) == (200, {"jobId": job["jobId"], "status": "queued", "pollAfterMs": 2000})
+
+    records = jobs.queue.drain()
+    assert lambda_chat_worker.lambda_handler({"Records": records}, _context())["batchItemFailures"] == []
+    status, view = _poll(job["jobId"])
+    assert status == 200 and view == {"jobId": job["jobId"], "status": "done",
+                                      "reply": "re: hola", "conversationId": "conv-1"}
+
+    # A redelivered message is skipped once the job is done
+    lambda_chat_worker.lambda_handler({"Records": records}, _context())
+    assert jobs.calls == ["hola"]
+    print("✅ job:", view)
+
+
+def test_job_ids_are_random_and_only_the_submitter_can_poll(jobs, monkeypatch):
+    monkeypatch.setenv("IDEMPOTENCY_BACKEND", "memory")
+    body = {"message": "hola", "userId": "u1", "page": "/", "async": True}
+    first = json.loads(lambda_chat_handler.lambda_handler(_post(body), _context())["body"])
+    again = json.loads(lambda_chat_handler.lambda_handler(_post(body), _context())["body"])
+
+    # Double-submit: same job, and its id is not derived from the (guessable) idempotency key
+    records = jobs.queue.drain()
+    assert again["jobId"] == first["jobId"] and len(records) == 1
+    key = json.loads(records[0]["body"])["idempotencyKey"]
+    assert key and first["jobId"] != hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+    poll = {"httpMethod": "GET", "queryStringParameters": {"jobId": first["jobId"], "userId": "u1"}}
+    assert lambda_chat_handler.lambda_handler(poll, _context())["statusCode"] == 200
+    assert _poll(first["jobId"])[0] == 404                       # guest
+    poll["queryStringParameters"]["userId"] = "u2"
+    assert lambda_chat_handler.lambda_handler(poll, _context())["statusCode"] == 404
+
+
+def test_queue_depth_metrics_per_page(jobs, capsys):
+    flush_metrics(io.StringIO())
+    capsys.readouterr()
+    for i in range(3):
+        lambda_chat_handler.lambda_handler(
+            _post({"message": f"m{i}", "page": "/"}, {"Prefer": "respond-async"}), _context())
+    lambda_chat_worker.lambda_handler({"Records": jobs.queue.drain()[:1]}, _context())
+
+    # Each invocation flushes its EMF lines to stdout
+    docs = [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith('{"_aws"')]
+    depth = [d for d in docs if "chat_job_queue_depth" in d]
+    assert depth and depth[0]["_aws"]["CloudWatchMetrics"][0]["Dimensions"] == [["Page"], []]
+    assert [v for d in depth for v in d["chat_job_queue_depth"]] == [1, 2, 3, 2]
+    assert any("chat_job_wait_ms" in d for d in docs)
+
+
+def test_depth_is_reconciled_when_start_fails_open(jobs, monkeypatch, capsys):
+    lambda_chat_handler.lambda_handler(_post({"message": "hola", "page": "/", "async": True}), _context())
+    store = chat_jobs.get_backend()
+
+    def broken_start(job_id):
+        raise RuntimeError("throttled")
+
+    monkeypatch.setattr(store, "start", broken_start)
+    capsys.readouterr()
+    lambda_chat_worker.lambda_handler({"Records": jobs.queue.drain()}, _context())
+
+    # finish() saw the job still queued and took it off the counter
+    docs = [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith('{"_aws"')]
+    assert [v for d in docs if "chat_job_queue_depth" in d for v in d["chat_job_queue_depth"]] == [0]
+    assert store.add_depth("/", 0) == 0
+
+
+def test_failed_job_is_retried_and_mode_off_runs_inline(jobs, monkeypatch):
+    resp = lambda_chat_handler.lambda_handler(_post({"message": "falla", "async": True}), _context())
+    job_id = json.loads(resp["body"])["jobId"]
+    records = jobs.queue.drain()
+    result = lambda_chat_worker.lambda_handler({"Records": records}, _context())
+    assert [f["itemIdentifier"] for f in result["batchItemFailures"]] == [records[0]["messageId"]]
+    assert _poll(job_id)[1]["status"] == "retrying"
+    assert _poll("nope")[0] == 404
+
+    # Not opted in, or no queue configured: answered in the request as before
+    resp = lambda_chat_handler.lambda_handler(_post({"message": "hola"}), _context())
+    assert resp["statusCode"] == 200 and json.loads(resp["body"])["reply"] == "re: hola"
+    monkeypatch.setattr(chat_jobs, "_job_queue", lambda: None)
+    resp = lambda_chat_handler.lambda_handler(_post({"message": "otra", "async": True}), _context())
+    assert resp["statusCode"] == 200 and jobs.queue.drain() == []
+
+
+def test_webhook_is_signed(jobs, monkeypatch):
+    import urllib.request
+
+    monkeypatch.setenv("CHAT_JOB_WEBHOOK_URL", "https://hooks.example.com/roma")
+    monkeypatch.setenv("CHAT_JOB_WEBHOOK_SECRET", "s3cret")
+    sent = []
+
+    class _Resp:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *a):
+            return False
+
+        def read(self):
+            return b""
+
+    monkeypatch.setattr(urllib.request, "urlopen", lambda req, timeout: sent.append(req) or _Resp())
+
+    lambda_chat_handler.lambda_handler(_post({"message": "hola", "async": True}), _context())
+    lambda_chat_worker.lambda_handler({"Records": jobs.queue.drain()}, _context())
+
+    req = sent[0]
+    expected = "sha256=" + hmac.new(b"s3cret", req.data, hashlib.sha256).hexdigest()
+    assert req.get_header("X-signature") == expected
+    assert json.loads(req.data)["reply"] == "re: hola"
+
+
+# This makes it executable directly:
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
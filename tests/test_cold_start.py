@@ -0,0 +1,16 @@
+import pytest
+
+from tests.bench_cold_start import HANDLERS, measure
+
+
+@pytest.mark.parametrize("handler", sorted(HANDLERS))
+def test_entry_point_imports_lazily(handler):
+    result = measure(handler, runs=1)
+    # openai/httpx/boto3/pytz/dotenv are built on first use, never at import.
+    # Wall-clock budgets depend on the machine: `python -m tests.bench_cold_start --check`.
+    assert result["heavy_at_import"] == []
+    print(f"✅ {handler}: import {result['import_ms']} ms, first use {result['first_use_ms']} ms")
+
+# This makes it executable directly:
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
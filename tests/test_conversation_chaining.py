@@ -0,0 +1,116 @@
+import os
+from collections import OrderedDict
+from datetime import datetime
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+from src.assistant import assistant_client
+from src.services import chat_service
+from tests.fakes import FakeOpenAI
+
+
+def _patch_storage(monkeypatch, header):
+    updates, history_reads = [], []
+    monkeypatch.setenv("CONVERSATION_CHAINING", "1")
+    monkeypatch.setattr(chat_service, "find_conversation", lambda user_id, cid: header)
+    monkeypatch.setattr(chat_service, "update_conversation_chain", lambda *args: updates.append(args))
+    monkeypatch.setattr(chat_service, "persist_turn", lambda *args, **kwargs: None)
+
+    def fake_history(conversation_id, limit, ascending):
+        history_reads.append(conversation_id)
+        return [{"Role": "user", "MessageText": "¿Qué es un ángulo?"}, {"Role": "assistant", "MessageText": "Es..."}]
+
+    monkeypatch.setattr(chat_service, "get_recent_messages", fake_history)
+    return updates, history_reads
+
+
+def test_chained_turn_skips_transcript(monkeypatch):
+    header = {
+        "UserId": "u1", "Timestamp": "2025-01-01T00:00:00",
+        "LastResponseId": "resp_prev", "LastResponseAt": datetime.utcnow().isoformat(),
+    }
+    updates, history_reads = _patch_storage(monkeypatch, header)
+    client = FakeOpenAI(chunks=["Listo."])
+    monkeypatch.setattr(assistant_client, "get_openai_client", lambda: client)
+
+    reply, cid = chat_service.get_ai_response("y ahora?", "u1", "", None, "/", conversation_id="c1")
+
+    call = client.calls[0]
+    assert reply == "Listo." and cid == "c1"
+    assert call["previous_response_id"] == "resp_prev"
+    assert "instructions" in call and all(m["role"] == "user" for m in call["input"])
+    assert history_reads == []
+    assert updates == [("u1", "2025-01-01T00:00:00", "c1", "resp_1")]
+
+
+def test_expired_chain_falls_back_to_transcript(monkeypatch):
+    header = {
+        "UserId": "u1", "Timestamp": "2025-01-01T00:00:00",
+        "LastResponseId": "resp_gone", "LastResponseAt": datetime.utcnow().isoformat(),
+    }
+    updates, history_reads = _patch_storage(monkeypatch, header)
+    client = FakeOpenAI(chunks=["Listo."], reject_chain=True)
+    monkeypatch.setattr(assistant_client, "get_openai_client", lambda: client)
+
+    reply, _ = chat_service.get_ai_response("y ahora?", "u1", "", None, "/", conversation_id="c1")
+
+    assert reply == "Listo."
+    assert len(client.calls) == 2
+    retry = client.calls[1]
+    assert "previous_response_id" not in retry
+    assert "[HISTORIAL RECIENTE]" in retry["input"][0]["content"][0]["text"]
+    assert history_reads == ["c1"]
+    assert updates[-1][3] == "resp_2"
+
+def test_header_lookup_never_queries_a_partition(monkeypatch):
+    from src.storage import conversations_table
+    from tests.fakes import FakeTable
+
+    class Table(FakeTable):
+        def __init__(self):
+            self.queries, self.gets = [], []
+
+        def query(self, **kw):
+            self.queries.append(kw)
+            return {"Items": [{"UserId": "anonymous", "Timestamp": "t1", "ConversationId": "c1"}]}
+
+        def get_item(self, Key):
+            self.gets.append(Key)
+            return {"Item": {**Key, "ConversationId": "c1"}}
+
+    table = Table()
+    monkeypatch.setattr(conversations_table, "table", table)
+    monkeypatch.setattr(conversations_table, "_header_keys", OrderedDict())
+
+    # No GSI: an unknown header is missing, without reading the guests' partition
+    monkeypatch.setattr(conversations_table, "CONVERSATION_ID_INDEX", "")
+    assert conversations_table.find_conversation("anonymous", "c1") is None
+    assert table.queries == []
+
+    # With the GSI: one indexed query, then GetItem on the remembered key
+    monkeypatch.setattr(conversations_table, "CONVERSATION_ID_INDEX", "ConversationIdIndex")
+    assert conversations_table.find_conversation("anonymous", "c1")["Timestamp"] == "t1"
+    assert conversations_table.find_conversation("anonymous", "c1")["Timestamp"] == "t1"
+    assert [q["IndexName"] for q in table.queries] == ["ConversationIdIndex"]
+    assert table.gets == [{"UserId": "anonymous", "Timestamp": "t1"}]
+
+
+
+def test_header_key_cache_is_bounded(monkeypatch):
+    from src.storage import conversations_table
+
+    monkeypatch.setenv("HEADER_KEY_CACHE_SIZE", "2")
+    monkeypatch.setattr(conversations_table, "_header_keys", OrderedDict())
+    conversations_table._remember_header("c1", "u1", "t1")
+    conversations_table._remember_header("c2", "u2", "t2")
+    assert conversations_table._known_header("c1") == ("u1", "t1")  # c1 is now the most recent
+    conversations_table._remember_header("c3", "u3", "t3")
+
+    assert list(conversations_table._header_keys) == ["c1", "c3"]
+    assert conversations_table._known_header("c2") is None
+
+
+# This makes it executable directly:
+if __name__ == "__main__":
+    import pytest
+    pytest.main([__file__, "-q"])
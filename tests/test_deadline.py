@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+from src.assistant import assistant_client
+from src.services import chat_service
+from src.utils.deadline import Deadline, DeadlineExceeded
+from tests.fakes import FakeOpenAI
+
+
+def test_tiers_follow_remaining_time():
+    assert Deadline(28000).plan().tier == "full"
+    assert Deadline(15000).plan().tier == "reduced"
+    minimal = Deadline(8000).plan()
+    assert minimal.tier == "minimal" and minimal.skip_history
+    assert minimal.max_output_tokens and minimal.max_num_results
+    assert minimal.timeout_s < 8
+    assert Deadline(1000).plan().tier == "fail_fast"
+
+
+def test_fail_fast_happens_before_any_side_effect(monkeypatch):
+    created = []
+    monkeypatch.setattr(chat_service, "save_conversation", lambda **kw: created.append(kw))
+    with pytest.raises(DeadlineExceeded):
+        chat_service.get_ai_response("hola", "u1", "", None, "/", deadline=Deadline(100))
+    assert created == []
+
+
+def test_minimal_tier_skips_history_and_caps_output(monkeypatch):
+    history_reads = []
+    monkeypatch.setattr(chat_service, "get_recent_messages", lambda **kw: history_reads.append(kw) or [])
+    monkeypatch.setattr(chat_service, "persist_turn", lambda *a, **kw: None)
+    client = FakeOpenAI(chunks=["Listo."])
+    monkeypatch.setattr(assistant_client, "get_openai_client", lambda: client)
+
+    reply, _ = chat_service.get_ai_response("hola", "u1", "", None, "/", conversation_id="c1", deadline=Deadline(8000))
+
+    call = client.calls[0]
+    assert reply == "Listo."
+    assert history_reads == []
+    assert call["max_output_tokens"] == 700
+    assert call["tools"][0]["max_num_results"] == 3
+    assert 0 < call["timeout"] < 8
+
+def test_late_fail_fast_hands_off_the_created_conversation(monkeypatch):
+    import json
+    from types import SimpleNamespace
+
+    from src import lambda_chat_handler
+    from src.services import chat_jobs
+    from src.storage.queues import LocalQueue
+    from src.utils.deadline import FULL_PLAN, plan_for
+
+    # Time runs out between creating the conversation and the model call
+    plans = iter([FULL_PLAN, plan_for(Deadline(100))])
+    monkeypatch.setattr(chat_service, "plan_for", lambda deadline: next(plans))
+    monkeypatch.setattr(chat_service, "save_conversation",
+                        lambda **kw: {"ConversationId": "conv-new", "Timestamp": "2025-01-01T00:00:00"})
+    monkeypatch.setattr(chat_service, "seed_tail", lambda cid: None)
+    monkeypatch.setenv("CHAT_JOB_BACKEND", "memory")
+    monkeypatch.setattr(chat_jobs, "_backend", None)
+    queue = LocalQueue()
+    monkeypatch.setattr(chat_jobs, "_job_queue", lambda: queue)
+
+    context = SimpleNamespace(function_name="chat", aws_request_id="r1", get_remaining_time_in_millis=lambda: 28000)
+    event = {"body": json.dumps({"message": "hola", "userId": "u1"})}
+    resp = lambda_chat_handler.lambda_handler(event, context)
+
+    # Accepted as a pollable job, not "please retry": the worker continues the same conversation
+    job = json.loads(resp["body"])
+    assert resp["statusCode"] == 202 and job["status"] == "queued" and job["pollAfterMs"]
+    record = json.loads(queue.drain()[0]["body"])
+    assert record["conversationId"] == "conv-new" and record["jobId"] == job["jobId"]
+
+    # Without a job queue the client is asked to retry
+    plans = iter([FULL_PLAN, plan_for(Deadline(100))])
+    monkeypatch.setattr(chat_jobs, "_job_queue", lambda: None)
+    resp = lambda_chat_handler.lambda_handler(event, context)
+    assert resp["statusCode"] == 503 and json.loads(resp["body"])["queued"] is False
+
+
+# This makes it executable directly:
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
@@ -0,0 +1,81 @@
+import json
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+import src.lambda_dlq_reprocessor as dlq
+
+
+def _record(mid, conv=None, message="hola"):
+    body = {"message": message, "userId": "u1", "page": "/"}
+    if conv:
+        body["conversationId"] = conv
+    return {"messageId": mid, "body": json.dumps(body), "attributes": {"ApproximateReceiveCount": "1"}}
+
+
+def _context(remaining_ms=300000):
+    return SimpleNamespace(
+        function_name="dlq", aws_request_id="r1",
+        get_remaining_time_in_millis=lambda: remaining_ms,
+    )
+
+
+def test_parallel_groups_ordered_and_partial_failures(monkeypatch):
+    calls, lock = [], threading.Lock()
+
+    def fake_get_ai_response(message, conversation_id=None, **_):
+        time.sleep(0.05)
+        with lock:
+            calls.append((conversation_id, message))
+        if message == "boom":
+            raise RuntimeError("model down")
+        return "ok", conversation_id or "new"
+
+    monkeypatch.setattr(dlq, "get_ai_response", fake_get_ai_response)
+    monkeypatch.setattr(dlq, "RECORD_ESTIMATE_MS", 1000)
+    monkeypatch.setattr(dlq, "MAX_WORKERS", 4)
+    monkeypatch.setattr(dlq, "_worker_count", lambda *a: 4)
+
+    records = [
+        _record("a1", "A", "1"), _record("a2", "A", "2"),
+        _record("b1", "B", "boom"), _record("b2", "B", "after-boom"),
+        _record("c1"), _record("d1"),
+    ]
+    t0 = time.perf_counter()
+    result = dlq.lambda_handler({"Records": records}, _context())
+    elapsed = time.perf_counter() - t0
+
+    failed = {f["itemIdentifier"] for f in result["batchItemFailures"]}
+    assert failed == {"b1", "b2"}           # b2 deferred to keep B ordered
+    assert [m for c, m in calls if c == "A"] == ["1", "2"]
+    assert ("B", "after-boom") not in calls
+    assert elapsed < 0.05 * len(calls)      # ran concurrently
+    print(f"✅ {len(calls)} records in {elapsed * 1000:.0f} ms, failures: {sorted(failed)}")
+
+
+def test_no_time_left_defers_whole_batch(monkeypatch):
+    monkeypatch.setattr(dlq, "get_ai_response", lambda **_: ("ok", "c"))
+    result = dlq.lambda_handler({"Records": [_record("x1"), _record("x2")]}, _context(remaining_ms=2000))
+    assert {f["itemIdentifier"] for f in result["batchItemFailures"]} == {"x1", "x2"}
+
+
+def test_malformed_body_is_dropped_not_redelivered(monkeypatch):
+    monkeypatch.setattr(dlq, "get_ai_response", lambda **_: ("ok", "c"))
+    records = [{"messageId": "bad", "body": "{not json"}, {"messageId": "list", "body": "[]"}, _record("ok1")]
+    result = dlq.lambda_handler({"Records": records}, _context())
+    assert result["batchItemFailures"] == [] and result["processed"] == 3
+
+
+def test_worker_count_is_one_per_group_up_to_the_cap(monkeypatch):
+    monkeypatch.setattr(dlq, "MAX_WORKERS", 8)
+    assert dlq._worker_count(10) == 8    # a burst of independent conversations fans out
+    assert dlq._worker_count(3) == 3     # never more than groups
+    assert dlq._worker_count(0) == 1
+
+# This makes it executable directly:
+if __name__ == "__main__":
+    import pytest
+    pytest.main([__file__, "-q"])
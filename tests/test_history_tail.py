@@ -0,0 +1,87 @@
+import os
+
+import pytest
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+from src.storage import messages_table
+from tests.fakes import FakeDynamo, FakeTable
+
+
+class QueryTable(FakeTable):
+    """Serves query() from a list of stored items, honoring order and Limit."""
+
+    def __init__(self, items):
+        self.items = items
+        self.queries = []
+
+    def query(self, **kw):
+        self.queries.append(kw)
+        items = sorted(self.items, key=lambda it: it["Timestamp"], reverse=not kw["ScanIndexForward"])
+        return {"Items": items[:kw["Limit"]], "ConsumedCapacity": {"CapacityUnits": 0.5}}
+
+
+def _tail_reads(table):
+    """Full tail reads, leaving out the keys-only freshness checks."""
+    return [q for q in table.queries if q["ProjectionExpression"] != "#ts"]
+
+
+def _messages(n):
+    return [{"ConversationId": "c1", "Timestamp": f"2025-01-01T00:00:{i:02d}", "Role": "user", "MessageText": f"m{i}"}
+            for i in range(n)]
+
+
+def _setup(monkeypatch, items):
+    table = QueryTable(items)
+    monkeypatch.setattr(messages_table, "table", table)
+    monkeypatch.setattr(messages_table, "dynamodb", FakeDynamo())
+    messages_table.clear_tail_cache()
+    return table
+
+
+def test_returns_newest_messages_in_chronological_order(monkeypatch):
+    table = _setup(monkeypatch, _messages(30))
+    msgs = messages_table.get_recent_messages("c1", limit=16, ascending=True)
+    assert [m["MessageText"] for m in msgs] == [f"m{i}" for i in range(14, 30)]
+    query = table.queries[0]
+    assert query["ScanIndexForward"] is False
+    assert query["ExpressionAttributeNames"] == {"#r": "Role", "#ts": "Timestamp"}
+
+
+def test_warm_tail_is_updated_on_write_and_skips_dynamodb(monkeypatch):
+    table = _setup(monkeypatch, _messages(30))
+    messages_table.get_recent_messages("c1", limit=16, ascending=True)
+
+    messages_table.save_turn("c1", "nueva", [], "respuesta")
+    msgs = messages_table.get_recent_messages("c1", limit=16, ascending=True)
+
+    assert len(_tail_reads(table)) == 1
+    assert table.queries[-1]["Limit"] == 1          # only the freshness check ran
+    assert [m["MessageText"] for m in msgs][-2:] == ["nueva", "respuesta"]
+    assert messages_table.get_tail_cache_stats()["hits"] == 1
+
+
+def test_turn_written_by_another_container_invalidates_the_tail(monkeypatch):
+    table = _setup(monkeypatch, _messages(30))
+    messages_table.get_recent_messages("c1", limit=16, ascending=True)
+
+    table.items.append({"ConversationId": "c1", "Timestamp": "2025-01-01T00:01:00",
+                        "Role": "user", "MessageText": "otro contenedor"})
+    msgs = messages_table.get_recent_messages("c1", limit=16, ascending=True)
+
+    assert msgs[-1]["MessageText"] == "otro contenedor"
+    assert len(_tail_reads(table)) == 2
+    assert messages_table.get_tail_cache_stats()["stale"] == 1
+
+
+def test_new_conversation_is_served_from_seeded_tail(monkeypatch):
+    table = _setup(monkeypatch, [])
+    messages_table.seed_tail("c2")
+    messages_table.save_turn("c2", "hola", [], "¡Hola!")
+    msgs = messages_table.get_recent_messages("c2", limit=16, ascending=True)
+    assert _tail_reads(table) == [] and len(msgs) == 2
+    print("✅ tail cache served without a query")
+
+# This makes it executable directly:
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
@@ -0,0 +1,133 @@
+import os
+
+import pytest
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+import src.lambda_turn_writer as turn_writer
+from src.services import chat_service, conversation_summary
+from src.services.history_window import build_window
+from src.storage.queues import LocalQueue
+from src.utils import token_count
+from tests.fakes import FakeOpenAI
+
+
+@pytest.fixture(autouse=True)
+def heuristic_tokens(monkeypatch):
+    monkeypatch.setenv("TOKEN_COUNTER", "heuristic")
+    token_count._encoding.cache_clear()
+    yield
+    token_count._encoding.cache_clear()
+
+
+def _conversation(turns, start=0, images=True):
+    msgs = []
+    for i in range(start, start + turns):
+        ts = f"2025-01-01T00:{i // 60:02d}:{i % 60:02d}.000000#00"
+        msgs.append({"Role": "user", "MessageText": f"Pregunta {i}: " + "explícame el tema " * 20, "Timestamp": ts})
+        if images:
+            msgs.append({"Role": "user", "MessageText": f"[Imagen] https://cdn.example.com/img-{i}.png", "Timestamp": ts})
+        msgs.append({"Role": "assistant", "MessageText": f"Respuesta {i}: " + "paso a paso " * 60, "Timestamp": ts})
+    return msgs
+
+
+def test_window_fits_budget_keeps_newest_and_drops_image_lines():
+    msgs = _conversation(10)
+    window = build_window(msgs, budget=600)
+
+    assert window.tokens <= 600
+    assert "[Imagen]" not in window.text and window.images_dropped == 10
+    assert window.text.rstrip().endswith(msgs[-1]["MessageText"].rstrip()[-40:])   # newest message kept whole
+    assert window.included[0] is not msgs[0] and window.dropped                     # older turns left out
+    assert window.tokens_saved > 0
+    print("✅ tokens saved:", window.tokens_saved, "of", window.legacy_tokens)
+
+
+def test_summary_goes_first_and_shares_the_budget():
+    msgs = _conversation(10, images=False)
+    window = build_window(msgs, summary="El estudiante repasa trigonometría.", budget=600)
+    assert window.text.startswith("[RESUMEN DE LA CONVERSACIÓN ANTERIOR]\nEl estudiante repasa trigonometría.")
+    assert window.summary_used and window.tokens <= 600
+    assert len(window.included) < len(build_window(msgs, budget=600).included) + 1
+
+
+def test_pending_turns_counts_unsummarized_turns_outside_the_window(monkeypatch):
+    monkeypatch.setenv("HISTORY_SUMMARY_EVERY_TURNS", "3")
+    msgs = _conversation(10, images=False)
+    window = build_window(msgs, budget=600)
+    dropped_users = sum(1 for m in window.dropped if m["Role"] == "user")
+
+    assert conversation_summary.pending_turns(window, None) == dropped_users
+    assert conversation_summary.pending_turns(window, window.dropped[-1]["Timestamp"]) == 0
+    # Fetch did not reach the start and the summary does not cover it: due now
+    partial = build_window(msgs, budget=600, complete=False)
+    assert conversation_summary.pending_turns(partial, None) >= 3
+
+
+def test_refresh_is_queued_and_folded_by_the_turn_writer(monkeypatch):
+    monkeypatch.setenv("HISTORY_SUMMARY_EVERY_TURNS", "2")
+    queue = LocalQueue()
+    monkeypatch.setattr(conversation_summary, "get_summary_queue", lambda: queue)
+    msgs = _conversation(8)
+    header = {"UserId": "u1", "Timestamp": "2025-01-01T00:00:00", "ConversationId": "c1"}
+    window = build_window(msgs, budget=600)
+
+    assert conversation_summary.maybe_schedule_refresh("c1", header, window) == "queued"
+    records = queue.drain()
+
+    stored = []
+    monkeypatch.setattr(conversation_summary, "get_conversation", lambda uid, ts: header)
+    monkeypatch.setattr(conversation_summary, "get_messages_between",
+                        lambda cid, after, before, limit: [m for m in msgs if m["Timestamp"] < before])
+    monkeypatch.setattr(conversation_summary, "update_conversation_summary",
+                        lambda *args: stored.append(args) or True)
+    client = FakeOpenAI(chunks=["Resumen: el estudiante pidió 5 explicaciones."])
+    monkeypatch.setattr("src.config.settings.get_openai_client", lambda: client)
+
+    assert turn_writer.lambda_handler({"Records": records}, None) == {"batchItemFailures": []}
+    user_id, header_ts, summary, through, expected = stored[0]
+    assert (user_id, header_ts, expected) == ("u1", "2025-01-01T00:00:00", None)
+    assert summary.startswith("Resumen:") and through == window.dropped[-1]["Timestamp"]
+    prompt = client.calls[0]["input"][0]["content"][0]["text"]
+    assert "[Imagen]" not in prompt and "Pregunta 0" in prompt
+    print("✅ summary refreshed through", through)
+
+
+def test_turn_cut_by_the_budget_goes_to_the_summary(monkeypatch):
+    monkeypatch.setenv("HISTORY_SUMMARY_EVERY_TURNS", "1")
+    queue = LocalQueue()
+    monkeypatch.setattr(conversation_summary, "get_summary_queue", lambda: queue)
+    msgs = _conversation(6, images=False)
+    header = {"UserId": "u1", "Timestamp": "2025-01-01T00:00:00", "ConversationId": "c1"}
+    # Room for the newest turn and the reply of the one before it, not its question
+    budget = next(b for b in range(100, 4000, 10)
+                  if len(build_window(msgs, budget=b).included) == 3)
+    window = build_window(msgs, budget=budget)
+    cut_turn = window.included[0]["Timestamp"]
+    assert window.dropped[-1]["Timestamp"] == cut_turn
+
+    conversation_summary.maybe_schedule_refresh("c1", header, window)
+    until = queue.drain()[0]["body"]
+    assert '"until": "%s"' % msgs[-1]["Timestamp"] in until and cut_turn not in until
+
+
+def test_chat_history_uses_header_summary(monkeypatch):
+    monkeypatch.setenv("HISTORY_TOKEN_BUDGET", "800")
+    scheduled = []
+    monkeypatch.setattr(conversation_summary, "maybe_schedule_refresh",
+                        lambda cid, header, window: scheduled.append(window) or "thread")
+    msgs = _conversation(20)
+    monkeypatch.setattr(chat_service, "get_recent_messages", lambda **kw: msgs[-kw["limit"]:])
+    monkeypatch.setattr(chat_service, "find_conversation", lambda uid, cid: {
+        "UserId": uid, "Timestamp": "t0", "Summary": "Repasaron funciones cuadráticas.",
+        "SummaryThrough": msgs[0]["Timestamp"],
+    })
+
+    window = chat_service._build_history_block("c1", "u1")
+    assert window.summary_used and "funciones cuadráticas" in window.text
+    assert window.tokens <= 800 < window.legacy_tokens
+    assert scheduled == [window]
+
+# This makes it executable directly:
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
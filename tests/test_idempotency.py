@@ -0,0 +1,97 @@
+import os
+
+import pytest
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+from src.assistant import assistant_client
+from src.services import chat_service, idempotency
+from tests.fakes import FakeOpenAI
+
+
+@pytest.fixture
+def env(monkeypatch):
+    monkeypatch.setenv("IDEMPOTENCY_BACKEND", "memory")
+    monkeypatch.setenv("IDEMPOTENCY_WAIT_MS", "0")
+    monkeypatch.setattr(idempotency, "_backend", None)
+    state = {"conversations": [], "turns": []}
+
+    def fake_save_conversation(**kw):
+        state["conversations"].append(kw)
+        return {"ConversationId": f"conv-{len(state['conversations'])}", "Timestamp": "2025-01-01T00:00:00"}
+
+    monkeypatch.setattr(chat_service, "save_conversation", fake_save_conversation)
+    monkeypatch.setattr(chat_service, "get_recent_messages", lambda **kw: [])
+    monkeypatch.setattr(chat_service, "persist_turn",
+                        lambda *a, turn_timestamp=None, **kw: state["turns"].append(turn_timestamp) or "direct")
+    client = FakeOpenAI(chunks=["Listo."])
+    monkeypatch.setattr(assistant_client, "get_openai_client", lambda: client)
+    state["client"] = client
+    return state
+
+
+def _key(message="hola", client_key="k-1"):
+    return idempotency.resolve_key(client_key, "u1", None, message, [], "/")
+
+
+def test_duplicate_request_replays_stored_reply(env):
+    first = chat_service.get_ai_response("hola", "u1", "", None, "/", idempotency_key=_key())
+    second = chat_service.get_ai_response("hola", "u1", "", None, "/", idempotency_key=_key())
+
+    assert first == second == ("Listo.", "conv-1")
+    assert len(env["client"].calls) == 1
+    assert len(env["conversations"]) == 1 and len(env["turns"]) == 1
+
+
+def test_retry_after_failure_reuses_conversation_and_turn_timestamp(env, monkeypatch):
+    def failing_persist(*a, turn_timestamp=None, **kw):
+        env["turns"].append(turn_timestamp)
+        raise RuntimeError("dynamodb down")
+
+    monkeypatch.setattr(chat_service, "persist_turn", failing_persist)
+    with pytest.raises(RuntimeError):
+        chat_service.get_ai_response("hola", "u1", "", None, "/", idempotency_key=_key())
+
+    monkeypatch.setattr(chat_service, "persist_turn",
+                        lambda *a, turn_timestamp=None, **kw: env["turns"].append(turn_timestamp) or "direct")
+    reply, conv_id = chat_service.get_ai_response("hola", "u1", "", None, "/", idempotency_key=_key())
+
+    assert (reply, conv_id) == ("Listo.", "conv-1")
+    assert len(env["conversations"]) == 1
+    assert env["turns"][0] == env["turns"][1]
+
+
+def test_in_flight_duplicate_is_rejected(env):
+    claim = idempotency.begin(_key())
+    assert claim is not None and not claim.replay
+    with pytest.raises(idempotency.DuplicateRequestInFlight):
+        chat_service.get_ai_response("hola", "u1", "", None, "/", idempotency_key=_key())
+    assert env["client"].calls == []
+
+
+def test_resolved_keys_pass_through_and_derived_keys_bucket(env):
+    key = _key()
+    assert idempotency.resolve_key(key, "other", "c9", "x", [], "/", trusted=True) == key
+    a = idempotency.resolve_key(None, "u1", "c1", "hola", [], "/", now=1000)
+    b = idempotency.resolve_key(None, "u1", "c1", "hola", [], "/", now=1100)
+    c = idempotency.resolve_key(None, "u1", "c1", "hola", [], "/", now=2000)
+    assert a == b != c
+    print("✅ idempotency keys resolved:", key)
+
+
+def test_guests_and_forged_keys_are_not_shared(env):
+    # Two guests with the same first message: no derived key at all
+    assert idempotency.resolve_key(None, None, None, "hola", [], "/") is None
+    assert idempotency.resolve_key(None, "anonymous", None, "hola", [], "/") is None
+    # A guest's own client key still works
+    assert idempotency.resolve_key("k-9", "anonymous", None, "hola", [], "/") is not None
+
+    # A resolved-looking key from the client is scoped to the caller, not passed through
+    victim = _key()
+    assert idempotency.resolve_key(victim, "attacker", None, "hola", [], "/") != victim
+    assert idempotency.resolve_key(victim, "u1", None, "hola", [], "/") != victim
+
+
+# This makes it executable directly:
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
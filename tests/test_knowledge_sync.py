@@ -0,0 +1,110 @@
+from types import SimpleNamespace
+
+import pytest
+
+from src.scripts import knowledge_admin
+from tests.fakes import FakeVectorStoreAPI
+
+
+def _tree(root):
+    (root / "general").mkdir(parents=True)
+    (root / "general" / "faq.json").write_text('{"q": "precio"}')
+    (root / "icfes" / "matematicas").mkdir(parents=True)
+    (root / "icfes" / "matematicas" / "algebra.md").write_text("# Álgebra")
+    (root / "icfes" / "matematicas" / "geometria.md").write_text("# Geometría")
+    (root / "icfes" / "matematicas" / "notes.bin").write_text("ignored")
+
+
+def _args(root, dry_run=False):
+    return SimpleNamespace(root=str(root), manifest=None, workers=4, dry_run=dry_run,
+                           index=str(root.parent / "stores.json"), refresh_index=False)
+
+
+def test_sync_uploads_only_changes_and_retires_removed_files(tmp_path, capsys):
+    root = tmp_path / "knowledge"
+    _tree(root)
+    api = FakeVectorStoreAPI(stores=["general"])
+
+    first = knowledge_admin.cmd_sync(_args(root), client=api)
+    assert (first["added"], first["changed"], first["removed"]) == (3, 0, 0)
+    assert api.calls["vs.list"] == 1                  # one listing for the whole run (no cached index yet)
+    assert api.calls["vs.create"] == 1                # "general" reused, "icfes-matematicas" created
+    assert api.calls["file_batches"] == 2             # one batch per store, no per-file attach
+    assert api.calls["vs.files.create"] == 0
+    assert api.attached("icfes-matematicas") == ["algebra.md", "geometria.md"]
+
+    # Nothing changed → nothing uploaded
+    second = knowledge_admin.cmd_sync(_args(root), client=api)
+    assert (second["added"], second["changed"], second["removed"], second["unchanged"]) == (0, 0, 0, 3)
+    assert api.calls["files.create"] == 3
+
+    # Edit one file, delete another
+    (root / "icfes" / "matematicas" / "algebra.md").write_text("# Álgebra v2")
+    (root / "icfes" / "matematicas" / "geometria.md").unlink()
+    third = knowledge_admin.cmd_sync(_args(root), client=api)
+    assert (third["added"], third["changed"], third["removed"]) == (0, 1, 1)
+    assert api.calls["files.create"] == 4
+    assert api.calls["vs.files.delete"] == 2 and api.calls["files.delete"] == 2
+    assert api.attached("icfes-matematicas") == ["algebra.md"]
+    assert len(api.uploaded) == 2                     # old versions are gone from Files too
+
+    out = capsys.readouterr().out
+    assert "[icfes-matematicas] ~ icfes/matematicas/algebra.md" in out
+    assert "[icfes-matematicas] - icfes/matematicas/geometria.md" in out
+    assert "VECTOR_STORE_ICFES_MATEMATICAS=" in out
+    print("✅ sync uploads only the diff")
+
+
+def test_failed_files_keep_their_old_version_and_are_retried(tmp_path):
+    root = tmp_path / "knowledge"
+    _tree(root)
+    api = FakeVectorStoreAPI(stores=["general"])
+    knowledge_admin.cmd_sync(_args(root), client=api)
+
+    # algebra.md fails to index, a new file fails to upload, geometria.md goes through
+    (root / "icfes" / "matematicas" / "algebra.md").write_text("# Álgebra v2")
+    (root / "icfes" / "matematicas" / "geometria.md").write_text("# Geometría v2")
+    (root / "icfes" / "matematicas" / "trigonometria.md").write_text("# Trigonometría")
+    api.fail_index = {"algebra.md"}
+    api.fail_upload = {"trigonometria.md"}
+    result = knowledge_admin.cmd_sync(_args(root), client=api)
+
+    assert result["failed"] == 2
+    assert api.attached("icfes-matematicas") == ["algebra.md", "geometria.md"]   # old algebra.md still there
+    sid = next(sid for sid, st in api.stores.items() if st["name"] == "icfes-matematicas")
+    assert [api.uploaded[fid][1] for fid in api.stores[sid]["file_ids"]] == [b"# \xc3\x81lgebra", "# Geometría v2".encode()]
+    assert len(api.uploaded) == 3                    # the broken copy was deleted, nothing orphaned
+
+    # Next run retries both (the manifest never recorded them)
+    api.fail_index, api.fail_upload = set(), set()
+    retry = knowledge_admin.cmd_sync(_args(root), client=api)
+    assert (retry["added"], retry["changed"], retry["failed"]) == (1, 1, 0)
+    assert api.attached("icfes-matematicas") == ["algebra.md", "geometria.md", "trigonometria.md"]
+
+
+def test_sync_dry_run_changes_nothing(tmp_path):
+    root = tmp_path / "knowledge"
+    _tree(root)
+    api = FakeVectorStoreAPI()
+    result = knowledge_admin.cmd_sync(_args(root, dry_run=True), client=api)
+    assert result["added"] == 3
+    assert api.calls["files.create"] == 0 and api.calls["vs.create"] == 0
+    assert not (root / knowledge_admin.MANIFEST_NAME).exists()
+
+
+def test_sync_reuploads_when_store_was_deleted_remotely(tmp_path):
+    root = tmp_path / "knowledge"
+    _tree(root)
+    api = FakeVectorStoreAPI()
+    knowledge_admin.cmd_sync(_args(root), client=api)
+    api.stores = {sid: s for sid, s in api.stores.items() if s["name"] != "general"}
+    (tmp_path / "stores.json").unlink()  # as after the index TTL
+
+    result = knowledge_admin.cmd_sync(_args(root), client=api)
+    assert result["added"] == 1 and result["unchanged"] == 2
+    assert api.attached("general") == ["faq.json"]
+    assert api.attached("icfes-matematicas") == ["algebra.md", "geometria.md"]
+
+# This makes it executable directly:
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
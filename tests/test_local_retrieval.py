@@ -0,0 +1,119 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from src.assistant import assistant_client, local_retrieval
+from src.assistant.assistant_client import _build_request
+from src.scripts import knowledge_admin
+
+
+@pytest.fixture
+def index_root(tmp_path, monkeypatch):
+    knowledge = tmp_path / "knowledge"
+    (knowledge / "general").mkdir(parents=True)
+    (knowledge / "general" / "fechas.json").write_text(json.dumps({
+        "exam": "UNAL",
+        "events": [{"name": "Inscripciones", "date": "2026-02-10"}, {"name": "Examen", "date": "2026-03-15"}],
+    }), encoding="utf-8")
+    (knowledge / "icfes" / "matematicas").mkdir(parents=True)
+    (knowledge / "icfes" / "matematicas" / "sim.json").write_text(json.dumps([
+        {"id": "mat/context01", "text": "La Torre de Pisa cobra 17 euros de entrada y 5,5 más con reserva."},
+        {"id": "mat/q02", "stem_text": "¿Cuántas ecuaciones lineales tiene el sistema?", "choices": ["1", "2"]},
+    ]), encoding="utf-8")
+    (knowledge / "icfes" / "matematicas" / "guia.md").write_text("# Guía\n\nLos ángulos suplementarios suman 180°.")
+
+    out = tmp_path / "index"
+    knowledge_admin.cmd_build_index(SimpleNamespace(root=str(knowledge), out=str(out), dense=False, force=False))
+    monkeypatch.setenv("LOCAL_INDEX_DIR", str(out))
+    monkeypatch.setenv("VECTOR_STORE_ICFES_MATEMATICAS", "vs_mat")
+    monkeypatch.setenv("VECTOR_STORE_GLOBAL", "vs_global")
+    local_retrieval.clear_cache()
+    yield out
+    local_retrieval.clear_cache()
+
+
+def test_bm25_ranks_the_matching_chunk_first(index_root):
+    hits = local_retrieval.retrieve(["vs_mat", "vs_global"], "precio de la torre de pisa con reserva", 3)
+    assert hits[0].chunk_id == "mat/context01" and hits[0].store == "icfes-matematicas"
+
+    # Accents and plurals fold: "angulo" finds "ángulos", "ecuacion" finds "ecuaciones"
+    assert local_retrieval.retrieve(["vs_mat"], "angulo suplementario", 1)[0].source == "icfes/matematicas/guia.md"
+    assert local_retrieval.retrieve(["vs_mat"], "ecuacion", 1)[0].chunk_id == "mat/q02"
+    assert local_retrieval.retrieve(["vs_global"], "inscripciones unal", 1)[0].store == "general"
+
+    assert local_retrieval.retrieve(["vs_mat"], "fotosíntesis", 3) == []          # indexed, no match
+    assert local_retrieval.retrieve(["vs_unknown"], "torre de pisa", 3) is None  # no local index
+    print("✅ local BM25 retrieval")
+
+
+def test_rebuild_skips_unchanged_stores(index_root, tmp_path):
+    args = SimpleNamespace(root=str(tmp_path / "knowledge"), out=str(index_root), dense=False, force=False)
+    assert knowledge_admin.cmd_build_index(args)["built"] == 0
+    (tmp_path / "knowledge" / "general" / "nuevo.md").write_text("Horario de atención")
+    assert knowledge_admin.cmd_build_index(args) == {
+        "built": 1, "skipped": 1, "stores": ["general", "icfes-matematicas"],
+    }
+
+
+def test_local_mode_injects_context_instead_of_file_search(index_root, monkeypatch):
+    monkeypatch.setattr(assistant_client, "get_stores_for_page", lambda page: ["vs_mat", "vs_global"])
+    parts = [{"type": "text", "text": "¿cuánto cuesta la torre de pisa?"}]
+
+    req = _build_request(parts, None, "/simulacro-icfes/matematicas", None, None, retrieval_mode="local")
+    assert "tools" not in req
+    user = req["input"][-1]["content"]
+    assert user[0]["type"] == "input_text" and "17 euros" in user[0]["text"]
+    assert user[-1]["text"] == "¿cuánto cuesta la torre de pisa?"
+
+    # Chained turns: the context is per-turn instructions, not part of the stored chain
+    req = _build_request(parts, None, "/simulacro-icfes/matematicas", None, None, chained=True,
+                         previous_response_id="resp_1", retrieval_mode="local")
+    assert "17 euros" in req["instructions"] and "tools" not in req
+    assert req["input"] == [{"role": "user", "content": [{"type": "input_text", "text": parts[0]["text"]}]}]
+
+    # No local match: the hosted tool searches instead
+    req = _build_request([{"type": "text", "text": "fotosíntesis"}], None, "/simulacro-icfes/matematicas",
+                         None, None, retrieval_mode="local")
+    assert req["tools"][0]["type"] == "file_search"
+
+    # Stores without a local index keep using the hosted tool
+    monkeypatch.setattr(assistant_client, "get_stores_for_page", lambda page: ["vs_other"])
+    req = _build_request(parts, None, "/blog", None, None, retrieval_mode="local")
+    assert req["tools"][0]["type"] == "file_search"
+
+    req = _build_request(parts, None, "/simulacro-icfes/matematicas", None, None)
+    assert req["tools"][0]["vector_store_ids"] == ["vs_other"]  # default mode: file_search
+
+
+def test_dense_vectors_fuse_with_bm25(tmp_path):
+    pytest.importorskip("numpy")
+    chunks = [{"id": f"c{i}", "source": "s", "text": t} for i, t in enumerate(["gato negro", "perro blanco", "ave"])]
+    vectors = {"gato negro": [1, 0, 0], "perro blanco": [0, 1, 0], "ave": [0, 0, 1]}
+    local_retrieval.build_store_index(chunks, tmp_path / "s", store_name="s", env_key="VS_S",
+                                      embed=lambda texts: [vectors[t] for t in texts])
+    local_retrieval.write_catalog(tmp_path, {"s": json.loads((tmp_path / "s" / "meta.json").read_text())})
+    local_retrieval.clear_cache()
+    hits = local_retrieval.retrieve(["s"], "pájaro", 2, root=tmp_path, query_vector=[0, 0.1, 1])
+    assert hits[0].chunk_id == "c2"  # no BM25 match; dense ranking decides
+
+
+def test_stores_are_merged_by_rank_not_raw_score(tmp_path):
+    texts = {
+        "a": ["reserva reserva reserva de la torre de pisa", "torre de pisa, reserva y entrada"],
+        "b": ["reserva"],
+    }
+    metas = {}
+    for name, store_texts in texts.items():
+        chunks = [{"id": f"{name}{i}", "source": name, "text": t} for i, t in enumerate(store_texts)]
+        metas[name] = local_retrieval.build_store_index(chunks, tmp_path / name, store_name=name, env_key=f"VS_{name}")
+    local_retrieval.write_catalog(tmp_path, metas)
+    local_retrieval.clear_cache()
+
+    hits = local_retrieval.retrieve(["a", "b"], "reserva torre de pisa", 3, root=tmp_path)
+    # Store a's second chunk outscores b's best in BM25, but each store's top hit comes first
+    assert [h.chunk_id for h in hits] == ["a0", "b0", "a1"]
+
+# This makes it executable directly:
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
@@ -0,0 +1,65 @@
+import io
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from src.utils import logging_utils
+from src.utils.logging_utils import configure_logging, flush_logs, log_event, set_invocation_context
+
+
+@pytest.fixture
+def sink(monkeypatch):
+    out = io.StringIO()
+    yield out, monkeypatch
+    monkeypatch.delenv("LOG_SAMPLE_RATES", raising=False)
+    monkeypatch.delenv("LOG_JSON_ENCODER", raising=False)
+    configure_logging(async_mode=False)
+
+
+def _lines(out):
+    return [json.loads(line) for line in out.getvalue().splitlines() if line.startswith("{")]
+
+
+def test_async_mode_writes_after_flush_with_request_context(sink):
+    out, _ = sink
+    configure_logging(stream=out, async_mode=True)
+    set_invocation_context(SimpleNamespace(function_name="chat", aws_request_id="req-1"))
+    log_event("evt_a", {"n": 1})
+    set_invocation_context(SimpleNamespace(function_name="chat", aws_request_id="req-2"))
+    log_event("evt_b", {"n": 2})
+    flush_logs()
+
+    lines = {line["event"]: line for line in _lines(out)}
+    assert lines["evt_a"]["request_id"] == "req-1"   # snapshot taken in the request thread
+    assert lines["evt_b"]["details"] == {"n": 2}
+
+
+def test_sampled_and_disabled_events_never_build_details(sink):
+    out, monkeypatch = sink
+    monkeypatch.setenv("LOG_SAMPLE_RATES", "noisy=0,half=0.5")
+    configure_logging(stream=out, async_mode=False)
+    built = []
+
+    log_event("noisy", lambda: built.append("noisy") or {})
+    log_event("debug_only", lambda: built.append("debug") or {}, level="debug")
+    log_event("noisy", {"kept": True}, level="warning")  # warnings are never sampled
+
+    assert built == []
+    assert [line["event"] for line in _lines(out)] == ["noisy"]
+    assert logging_utils._sample_rates == {"noisy": 0.0, "half": 0.5}
+
+
+def test_orjson_encoder_handles_non_json_values(sink):
+    pytest.importorskip("orjson")
+    out, monkeypatch = sink
+    monkeypatch.setenv("LOG_JSON_ENCODER", "orjson")
+    configure_logging(stream=out, async_mode=False)
+    from decimal import Decimal
+    log_event("evt", {"count": Decimal("3")})
+    assert _lines(out)[0]["details"] == {"count": "3"}
+    print("✅ orjson encoder active")
+
+# This makes it executable directly:
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
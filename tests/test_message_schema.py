@@ -0,0 +1,115 @@
+import os
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+from src.scripts import migrate_messages
+from src.storage import message_codec, messages_table
+from tests.fakes import FakeTable
+
+
+def test_turn_item_round_trips_with_compression(monkeypatch):
+    monkeypatch.setenv("MESSAGES_COMPRESS_MIN_BYTES", "200")
+    answer = "Paso 1: $\\frac{a}{b}$ " * 100
+    item = message_codec.encode_turn("c1", "2025-01-01T00:00:00.000000#00", "hola", ["a.png"], answer)
+
+    assert "AssistantTextZ" in item and "AssistantText" not in item
+    assert item["UserText"] == "hola" and item["Codec"] == "zlib"
+    assert len(item["AssistantTextZ"]) < len(answer) / 10
+    msgs = message_codec.expand_item(item)
+    assert [m["Role"] for m in msgs] == ["user", "user", "assistant"]
+    assert msgs[1]["MessageText"] == "[Imagen] a.png" and msgs[2]["MessageText"] == answer
+
+
+def test_v2_is_opt_in(monkeypatch):
+    monkeypatch.delenv("MESSAGES_SCHEMA_VERSION", raising=False)
+    assert message_codec.schema_version() == 1
+    monkeypatch.setenv("MESSAGES_SCHEMA_VERSION", "2")
+    assert message_codec.schema_version() == 2
+
+
+def test_reader_handles_both_schemas(monkeypatch):
+    legacy = [
+        {"ConversationId": "c1", "Timestamp": "2025-01-01T00:00:01", "Role": "user", "MessageText": "viejo"},
+        {"ConversationId": "c1", "Timestamp": "2025-01-01T00:00:02", "Role": "assistant", "MessageText": "resp vieja"},
+    ]
+    new = message_codec.encode_turn("c1", "2025-01-02T00:00:00.000000#00", "nuevo", [], "resp nueva")
+
+    class Table(FakeTable):
+        def query(self, **kw):
+            return {"Items": [new] + legacy[::-1]}
+
+    monkeypatch.setattr(messages_table, "table", Table())
+    messages_table.clear_tail_cache()
+    msgs = messages_table.get_recent_messages("c1", limit=16, ascending=True)
+    assert [m["MessageText"] for m in msgs] == ["viejo", "resp vieja", "nuevo", "resp nueva"]
+
+
+class ScanTable(FakeTable):
+    """scan() by segment (hash of ConversationId) + a batch_writer recording writes."""
+
+    def __init__(self, items):
+        self.items = {(it["ConversationId"], it["Timestamp"]): it for it in items}
+        self.lock = threading.Lock()
+
+    def scan(self, Segment, TotalSegments, Limit, ExclusiveStartKey=None, **kw):
+        # Pages resume after the last key, like DynamoDB's LastEvaluatedKey
+        after = ExclusiveStartKey or ("", "")
+        with self.lock:
+            keys = sorted(k for k, it in self.items.items()
+                          if hash(k[0]) % TotalSegments == Segment and k > after)
+            page = [self.items[k] for k in keys[:Limit]]
+        rows = [it for it in page if "SchemaVersion" not in it]
+        more = {"LastEvaluatedKey": keys[Limit - 1]} if len(keys) > Limit else {}
+        return {"Items": rows, **more}
+
+    def batch_writer(self, **kw):
+        table = self
+
+        class Writer:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *a):
+                return False
+
+            def put_item(self, Item):
+                with table.lock:
+                    table.items[(Item["ConversationId"], Item["Timestamp"])] = Item
+
+            def delete_item(self, Key):
+                with table.lock:
+                    table.items.pop((Key["ConversationId"], Key["Timestamp"]))
+        return Writer()
+
+
+def test_backfill_groups_turns_across_parallel_segments():
+    items = []
+    for c in range(6):
+        items += [
+            {"ConversationId": f"c{c}", "Timestamp": "2025-01-01T00:00:01", "Role": "user", "MessageText": "hola"},
+            {"ConversationId": f"c{c}", "Timestamp": "2025-01-01T00:00:02", "Role": "user", "MessageText": "[Imagen] x.png"},
+            {"ConversationId": f"c{c}", "Timestamp": "2025-01-01T00:00:03", "Role": "assistant", "MessageText": "ok"},
+            {"ConversationId": f"c{c}", "Timestamp": "2025-01-01T00:00:04", "Role": "user", "MessageText": "otra"},
+            {"ConversationId": f"c{c}", "Timestamp": "2025-01-01T00:00:05", "Role": "assistant", "MessageText": "listo"},
+        ]
+    table = ScanTable(items)
+    # Pages smaller than a conversation: turns are still grouped across page boundaries
+    args = SimpleNamespace(segments=3, dry_run=False, keep_old=False, page_size=2)
+
+    totals = migrate_messages.cmd_backfill(args, table_factory=lambda: table)
+
+    assert totals["items"] == 30 and totals["turns"] == 12 and totals["deleted"] == 30
+    turn = table.items[("c0", "2025-01-01T00:00:01#00")]
+    assert turn["UserText"] == "hola" and turn["Images"] == ["x.png"] and turn["AssistantText"] == "ok"
+    assert len(table.items) == 12
+    # Second run finds nothing left to migrate
+    assert migrate_messages.cmd_backfill(args, table_factory=lambda: table)["items"] == 0
+    print("✅ backfill migrated", totals)
+
+# This makes it executable directly:
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
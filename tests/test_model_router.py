@@ -0,0 +1,144 @@
+import os
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+from src.assistant import assistant_client
+from src.config.model_router import looks_truncated, route_request
+from src.services import answer_cache, chat_service
+from tests.fakes import FakeOpenAI
+
+
+def test_routes(monkeypatch):
+    monkeypatch.setenv("MODEL_ROUTER_ENABLED", "1")
+    monkeypatch.setenv("OPENAI_FAST_MODEL", "small-model")
+    monkeypatch.setenv("OPENAI_TEXT_MODEL", "main-model")
+
+    assert route_request("hola", False, "/").name == "fast"
+    assert route_request("¿Cuánto cuesta el simulacro?", False, "/precios").name == "fast"
+    assert route_request("¿Cuánto cuesta el simulacro, $50.000 o $45.000 con descuento?", False, "/precios").name == "fast"
+    assert route_request("¡Muchas gracias!", False, "/simulacro-icfes/lectura-critica").name == "fast"
+    # Substantive questions without a trivial signal stay on the main model
+    assert route_request("¿Por qué la respuesta correcta de la pregunta 7 es la B y no la C?", False,
+                         "/simulacro-icfes/lectura-critica").name == "main"
+    assert route_request("What is the difference between 'since' and 'for'?", False, "/ingles").name == "main"
+    assert route_request("hola, no entiendo por qué la pregunta 12 del simulacro de sociales es la D", False,
+                         "/simulacro-icfes/sociales").name == "main"
+    assert route_request("Resuelve $x^2 - 5x + 6 = 0$ paso a paso", False, "/simulacro-unal/matematicas").name == "main"
+    assert route_request("¿Qué muestra esta gráfica?", True, "/").name == "main"
+
+    monkeypatch.setenv("MODEL_ROUTER_ENABLED", "0")
+    assert route_request("hola", False, "/").config.model == "main-model"
+
+
+def test_truncation_heuristic():
+    assert looks_truncated("")
+    assert looks_truncated("La respuesta es $x = ")
+    assert looks_truncated("Todo bien", incomplete=True)
+    assert not looks_truncated("El simulacro cuesta $50.000 COP.")
+    assert not looks_truncated("Entonces $x = 2$.")
+
+
+def test_fast_answer_escalates_to_main_model(monkeypatch):
+    monkeypatch.setenv("MODEL_ROUTER_ENABLED", "1")
+    monkeypatch.setenv("OPENAI_FAST_MODEL", "small-model")
+    monkeypatch.setenv("OPENAI_TEXT_MODEL", "main-model")
+    monkeypatch.setattr(chat_service, "get_recent_messages", lambda **kw: [])
+    monkeypatch.setattr(chat_service, "persist_turn", lambda *a, **kw: None)
+    client = FakeOpenAI(replies=["Hola, la fórmula es $", "Hola. ¿En qué te ayudo?"])
+    monkeypatch.setattr(assistant_client, "get_openai_client", lambda: client)
+
+    reply, _ = chat_service.get_ai_response("hola", "u1", "", None, "/", conversation_id="c1")
+
+    assert [c["model"] for c in client.calls] == ["small-model", "main-model"]
+    assert reply == "Hola. ¿En qué te ayudo?"
+
+def _new_conversations(monkeypatch):
+    """Each turn opens its own conversation: only first turns use the answer cache."""
+    ids = iter(["c1", "c2", "c3"])
+    monkeypatch.setattr(chat_service, "save_conversation",
+                        lambda **kw: {"ConversationId": next(ids), "Timestamp": "2025-01-01T00:00:00"})
+    monkeypatch.setattr(chat_service, "seed_tail", lambda cid: None)
+
+
+def test_answer_cache_uses_the_model_that_answered(monkeypatch):
+    monkeypatch.setenv("MODEL_ROUTER_ENABLED", "1")
+    monkeypatch.setenv("OPENAI_FAST_MODEL", "small-model")
+    monkeypatch.setenv("OPENAI_TEXT_MODEL", "main-model")
+    monkeypatch.setenv("ANSWER_CACHE_BACKEND", "memory")
+    monkeypatch.setattr(answer_cache, "_backend", None)
+    monkeypatch.setattr(chat_service, "get_recent_messages", lambda **kw: [])
+    monkeypatch.setattr(chat_service, "persist_turn", lambda *a, **kw: None)
+    _new_conversations(monkeypatch)
+    client = FakeOpenAI(replies=["Hola. ¿En qué te ayudo?"])
+    monkeypatch.setattr(assistant_client, "get_openai_client", lambda: client)
+
+    chat_service.get_ai_response("hola", "u1", "", None, "/")
+    reply, _ = chat_service.get_ai_response("hola", "u1", "", None, "/")
+
+    assert [c["model"] for c in client.calls] == ["small-model"]   # second turn: cache hit
+    assert reply == "Hola. ¿En qué te ayudo?"
+    stores = chat_service.get_stores_for_page("/")
+    assert answer_cache.lookup("hola", stores, "main-model")[0] is None
+
+
+def test_streamed_fast_answer_cut_short_is_reset_and_escalated(monkeypatch):
+    monkeypatch.setenv("MODEL_ROUTER_ENABLED", "1")
+    monkeypatch.setenv("OPENAI_FAST_MODEL", "small-model")
+    monkeypatch.setenv("OPENAI_TEXT_MODEL", "main-model")
+    monkeypatch.setenv("ANSWER_CACHE_BACKEND", "memory")
+    monkeypatch.setattr(answer_cache, "_backend", None)
+    monkeypatch.setattr(chat_service, "get_recent_messages", lambda **kw: [])
+    monkeypatch.setattr(chat_service, "persist_turn", lambda *a, **kw: None)
+    _new_conversations(monkeypatch)
+    client = FakeOpenAI(replies=["Hola, te cuento que", "Hola. ¿En qué te ayudo?"], incomplete=[True])
+    monkeypatch.setattr(assistant_client, "get_openai_client", lambda: client)
+
+    events = list(chat_service.stream_ai_response("hola", "u1", "", None, "/"))
+
+    assert [e["type"] for e in events] == ["start", "delta", "reset", "delta", "done"]
+    assert events[-1]["reply"] == "Hola. ¿En qué te ayudo?"
+    assert [c["model"] for c in client.calls] == ["small-model", "main-model"]
+    stores = chat_service.get_stores_for_page("/")
+    assert answer_cache.lookup("hola", stores, "main-model")[0] == "Hola. ¿En qué te ayudo?"
+
+
+def test_incomplete_streamed_answer_is_not_cached(monkeypatch):
+    monkeypatch.setenv("MODEL_ROUTER_ENABLED", "0")
+    monkeypatch.setenv("OPENAI_TEXT_MODEL", "main-model")
+    monkeypatch.setenv("ANSWER_CACHE_BACKEND", "memory")
+    monkeypatch.setattr(answer_cache, "_backend", None)
+    monkeypatch.setattr(chat_service, "get_recent_messages", lambda **kw: [])
+    monkeypatch.setattr(chat_service, "persist_turn", lambda *a, **kw: None)
+    _new_conversations(monkeypatch)
+    client = FakeOpenAI(replies=["Hola, te cuento que"], incomplete=[True])
+    monkeypatch.setattr(assistant_client, "get_openai_client", lambda: client)
+
+    events = list(chat_service.stream_ai_response("hola", "u1", "", None, "/"))
+
+    assert events[-1]["reply"] == "Hola, te cuento que"
+    assert answer_cache.lookup("hola", chat_service.get_stores_for_page("/"), "main-model")[0] is None
+
+
+def test_follow_up_skips_the_answer_cache_even_without_history(monkeypatch):
+    monkeypatch.setenv("MODEL_ROUTER_ENABLED", "0")
+    monkeypatch.setenv("OPENAI_TEXT_MODEL", "main-model")
+    monkeypatch.setenv("ANSWER_CACHE_BACKEND", "memory")
+    monkeypatch.setattr(answer_cache, "_backend", None)
+    monkeypatch.setattr(chat_service, "get_recent_messages", lambda **kw: [])  # history lookup came back empty
+    monkeypatch.setattr(chat_service, "persist_turn", lambda *a, **kw: None)
+    stores = chat_service.get_stores_for_page("/")
+    answer_cache.store("¿Y el segundo?", stores, "main-model", "El segundo simulacro cuesta $40.000.", [])
+    client = FakeOpenAI(replies=["El segundo ejercicio se resuelve así."])
+    monkeypatch.setattr(assistant_client, "get_openai_client", lambda: client)
+
+    reply, _ = chat_service.get_ai_response("¿Y el segundo?", "u1", "", None, "/", conversation_id="c1")
+
+    assert reply == "El segundo ejercicio se resuelve así."
+    assert len(client.calls) == 1
+    assert answer_cache.lookup("¿Y el segundo?", stores, "main-model")[0] == "El segundo simulacro cuesta $40.000."
+
+
+# This makes it executable directly:
+if __name__ == "__main__":
+    import pytest
+    pytest.main([__file__, "-q"])
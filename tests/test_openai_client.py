@@ -0,0 +1,38 @@
+import os
+
+from src.config import openai_client
+from src.config.settings import get_openai_client
+
+
+def test_client_is_reused_and_rebuilt_on_key_rotation():
+    openai_client.reset_client()
+    os.environ["OPENAI_API_KEY"] = "sk-test-one"
+
+    first = get_openai_client()
+    assert get_openai_client() is first
+
+    os.environ["OPENAI_API_KEY"] = "sk-test-two"
+    rotated = get_openai_client()
+    assert rotated is not first
+    assert rotated.api_key == "sk-test-two"
+
+    stats = openai_client.get_pool_stats()
+    assert stats["key_rotations"] >= 1
+    assert "reused_connections" in stats
+    openai_client.reset_client()
+    print("✅ Pool stats:", stats)
+
+
+def test_pool_config_from_env():
+    os.environ["OPENAI_HTTP_MAX_CONNECTIONS"] = "7"
+    os.environ["OPENAI_READ_TIMEOUT"] = "not-a-number"
+    cfg = openai_client.get_pool_config()
+    assert cfg.max_connections == 7
+    assert cfg.read_timeout == 60.0
+    del os.environ["OPENAI_HTTP_MAX_CONNECTIONS"]
+    del os.environ["OPENAI_READ_TIMEOUT"]
+
+# This makes it executable directly:
+if __name__ == "__main__":
+    test_client_is_reused_and_rebuilt_on_key_rotation()
+    test_pool_config_from_env()
@@ -0,0 +1,61 @@
+import json
+import os
+import time
+
+import pytest
+
+from src.config import page_vectorstores as pv
+from src.config.page_vectorstores import RouteTable
+
+
+def test_longest_prefix_wins_and_deeper_pages_collapse():
+    table = RouteTable({
+        "/simulacro-icfes": "vs_icfes",
+        "/simulacro-icfes/matematicas": "vs_mat",
+        "/simulacro-icfes/ingles": "",               # known page, no store yet
+    }, global_store="vs_global")
+
+    assert table.resolve("https://x.com/Simulacro-ICFES/matematicas/quiz-3?x=1") == (
+        "/simulacro-icfes/matematicas", ("vs_mat", "vs_global"))
+    assert table.resolve("/simulacro-icfes/ingles") == ("/simulacro-icfes/ingles", ("vs_icfes", "vs_global"))
+    assert table.resolve("/simulacro-icfes/matematicas-extra") == ("/simulacro-icfes", ("vs_icfes", "vs_global"))
+    assert table.resolve("/blog") == ("/", ("vs_global",))
+    assert table.resolve(None) == ("/", ("vs_global",))
+
+
+def test_routes_file_hot_reloads_after_ttl(tmp_path, monkeypatch):
+    routes_file = tmp_path / "routes.json"
+    routes_file.write_text(json.dumps({"global": "$VS_TEST_GLOBAL", "routes": {"/simulacro-nuevo/fisica": "vs_fis"}}))
+    monkeypatch.setenv("VS_TEST_GLOBAL", "vs_g")
+    monkeypatch.setenv("PAGE_ROUTES_FILE", str(routes_file))
+    monkeypatch.setenv("PAGE_ROUTES_TTL_SECONDS", "0")
+    pv.reload_routes()
+
+    assert pv.get_stores_for_page("/simulacro-nuevo/fisica") == ["vs_fis", "vs_g"]
+
+    routes_file.write_text(json.dumps({"global": "vs_g", "routes": {"/simulacro-nuevo/fisica": "vs_fis2"}}))
+    os.utime(routes_file, (time.time() + 5, time.time() + 5))
+    assert pv.get_stores_for_page("/simulacro-nuevo/fisica") == ["vs_fis2", "vs_g"]
+
+    routes_file.write_text("{ not json")
+    os.utime(routes_file, (time.time() + 10, time.time() + 10))
+    assert pv.get_stores_for_page("/simulacro-nuevo/fisica") == ["vs_fis2", "vs_g"]  # bad file keeps old routes
+
+    monkeypatch.delenv("PAGE_ROUTES_FILE")
+    pv.reload_routes()
+    print("✅ routes reloaded from file")
+
+
+def test_yaml_routes_file(tmp_path, monkeypatch):
+    pytest.importorskip("yaml")
+    routes_file = tmp_path / "routes.yaml"
+    routes_file.write_text("routes:\n  /simulacro-nuevo/quimica: vs_qui\n")
+    monkeypatch.setenv("PAGE_ROUTES_FILE", str(routes_file))
+    table = pv.reload_routes()
+    assert table.resolve("/simulacro-nuevo/quimica/1")[0] == "/simulacro-nuevo/quimica"
+    monkeypatch.delenv("PAGE_ROUTES_FILE")
+    pv.reload_routes()
+
+# This makes it executable directly:
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
@@ -0,0 +1,32 @@
+from src.assistant.assistant_client import _build_request, get_prompt_cache_key
+from src.config.system_instructions import BASE_SYSTEM_INSTRUCTIONS
+
+
+def _system_text(**kwargs):
+    req = _build_request([{"type": "text", "text": "hola"}], **kwargs)
+    return req["input"][0]["content"][0]["text"], req
+
+
+def test_stable_prefix_shared_across_users_on_same_page():
+    page = "https://invicto.co/simulacro-icfes/matematicas?utm_source=x"
+    a, req = _system_text(user_id="u1", page=page, name="Ana", email="ana@example.com")
+    b, _ = _system_text(user_id="anonymous", page="/simulacro-icfes/matematicas", name=None, email=None)
+
+    assert a.startswith(BASE_SYSTEM_INSTRUCTIONS)
+    # Page + date blocks come before anything user-specific
+    user_at = a.index("Their user ID is u1")
+    assert a.index("/simulacro-icfes/matematicas") < a.index("Today is") < user_at
+    shared = a[:user_at]
+    assert b.startswith(shared)
+    assert req["extra_body"]["prompt_cache_key"] == "roma:/simulacro-icfes/matematicas"
+    print("✅ Shared prefix chars:", len(shared))
+
+
+def test_cache_key_collapses_deeper_routes():
+    assert get_prompt_cache_key("/simulacro-unal/matematicas/pregunta-3") == "roma:/simulacro-unal/matematicas"
+    assert get_prompt_cache_key("/precios") == "roma:/"
+
+# This makes it executable directly:
+if __name__ == "__main__":
+    test_stable_prefix_shared_across_users_on_same_page()
+    test_cache_key_collapses_deeper_routes()
@@ -0,0 +1,91 @@
+import contextvars
+import time
+
+import pytest
+
+from src.assistant import resilience
+from src.assistant.assistant_client import send_message_to_assistant
+from src.assistant.resilience import RetryPolicy, call_with_resilience, retry_after_ms
+from src.utils.deadline import Deadline
+from tests.fakes import FakeAPIError, FakeOpenAI
+
+FAST = RetryPolicy(max_attempts=3, base_delay_ms=1, max_delay_ms=5)
+
+
+def test_retries_transient_errors_and_honors_retry_after():
+    resilience.reset_retry_budget(4)
+    client = FakeOpenAI(chunks=["ok"], errors=[
+        FakeAPIError("rate limited", 429, headers={"retry-after-ms": "30"}),
+        FakeAPIError("bad gateway", 502),
+    ])
+    t0 = time.perf_counter()
+    reply = call_with_resilience(lambda: client.responses.create(input=[]), policy=FAST)
+    assert reply.output_text == "ok"
+    assert len(client.calls) == 3
+    assert time.perf_counter() - t0 >= 0.03
+
+
+def test_non_retryable_and_budget_and_deadline():
+    resilience.reset_retry_budget(4)
+    client = FakeOpenAI(errors=[FakeAPIError("bad request", 400)])
+    with pytest.raises(FakeAPIError):
+        call_with_resilience(lambda: client.responses.create(), policy=FAST)
+    assert len(client.calls) == 1
+
+    resilience.reset_retry_budget(0)
+    client = FakeOpenAI(errors=[FakeAPIError("busy", 503)])
+    with pytest.raises(FakeAPIError):
+        call_with_resilience(lambda: client.responses.create(), policy=FAST)
+    assert len(client.calls) == 1
+
+    resilience.reset_retry_budget(4)
+    client = FakeOpenAI(errors=[FakeAPIError("slow down", 429, headers={"retry-after": "5"})])
+    with pytest.raises(FakeAPIError):
+        call_with_resilience(lambda: client.responses.create(), policy=FAST, deadline=Deadline(1000))
+    assert len(client.calls) == 1
+
+
+def test_each_request_context_has_its_own_budget():
+    resilience.reset_retry_budget(0)  # the process-wide pool is spent
+
+    def one_request():
+        resilience.start_request_budget(1)
+        client = FakeOpenAI(chunks=["ok"], errors=[FakeAPIError("busy", 503)])
+        return call_with_resilience(lambda: client.responses.create(), policy=FAST).output_text
+
+    assert contextvars.copy_context().run(one_request) == "ok"
+    assert contextvars.copy_context().run(one_request) == "ok"  # not drained by the first one
+
+    client = FakeOpenAI(errors=[FakeAPIError("busy", 503)])
+    with pytest.raises(FakeAPIError):
+        call_with_resilience(lambda: client.responses.create(), policy=FAST)
+    assert len(client.calls) == 1
+
+
+def test_hedge_returns_the_faster_request():
+    resilience.reset_retry_budget(4)
+    client = FakeOpenAI(chunks=["ok"], latencies=[0.5, 0.01])
+    policy = RetryPolicy(max_attempts=1, hedge=True, hedge_after_ms=50)
+    t0 = time.perf_counter()
+    call_with_resilience(lambda: client.responses.create(), policy=policy)
+    elapsed = time.perf_counter() - t0
+    assert len(client.calls) == 2
+    assert elapsed < 0.3
+    print(f"✅ Hedged call finished in {elapsed * 1000:.0f} ms (slow attempt: 500 ms)")
+
+
+def test_assistant_client_uses_the_layer(monkeypatch):
+    monkeypatch.setenv("OPENAI_RETRY_BASE_MS", "1")
+    resilience.reset_retry_budget(4)
+    client = FakeOpenAI(chunks=["Hola"], errors=[FakeAPIError("overloaded", 500)])
+    assert send_message_to_assistant([{"type": "text", "text": "hola"}], client=client) == "Hola"
+    assert len(client.calls) == 2
+
+
+def test_retry_after_formats():
+    assert retry_after_ms(FakeAPIError("x", 429, headers={"retry-after": "2"})) == 2000.0
+    assert retry_after_ms(FakeAPIError("x", 429)) is None
+
+# This makes it executable directly:
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
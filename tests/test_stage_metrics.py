@@ -0,0 +1,74 @@
+import io
+import json
+import logging
+import os
+
+import pytest
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+from src.assistant import assistant_client
+from src.services import chat_service
+from src.utils import logging_utils
+from src.utils.logging_utils import JSONFormatter, flush_metrics, get_stage_timings, reset_stage_timings, stage
+from tests.fakes import FakeOpenAI
+
+
+def _emf_lines(out: io.StringIO) -> list:
+    return [json.loads(line) for line in out.getvalue().splitlines()]
+
+
+def test_stage_timings_attach_to_log_records():
+    flush_metrics(io.StringIO())
+    reset_stage_timings(page="/matematicas")
+    with stage("history_fetch"):
+        pass
+    record = logging.LogRecord("x", logging.INFO, __file__, 1, "evt", None, None)
+    record.event, record.details = "evt", {"a": 1}
+    payload = json.loads(JSONFormatter().format(record))
+    assert payload["event"] == "evt" and payload["details"] == {"a": 1}
+    assert "history_fetch" in payload["timings_ms"]
+
+
+def test_flush_writes_emf_per_stage_and_dimensions():
+    flush_metrics(io.StringIO())
+    reset_stage_timings(page="/matematicas", model="gpt-4.1")
+    for _ in range(3):
+        with stage("messages_save"):
+            pass
+    with pytest.raises(ValueError):
+        with stage("model_call"):
+            raise ValueError("boom")
+
+    out = io.StringIO()
+    assert flush_metrics(out) == 2
+    docs = {d["Stage"]: d for d in _emf_lines(out)}
+    save = docs["messages_save"]
+    assert save["Page"] == "/matematicas" and save["Model"] == "gpt-4.1"
+    assert len(save["stage_latency_ms"]) == 3
+    assert docs["model_call"]["stage_errors"] == 1
+    directive = save["_aws"]["CloudWatchMetrics"][0]
+    assert ["Stage", "Page", "Model"] in directive["Dimensions"]
+    assert flush_metrics(io.StringIO()) == 0  # queue cleared
+
+
+def test_get_ai_response_times_each_stage(monkeypatch):
+    monkeypatch.setattr(chat_service, "get_recent_messages", lambda **kw: [])
+    monkeypatch.setattr(chat_service, "persist_turn", lambda *a, **kw: None)
+    monkeypatch.setattr(assistant_client, "get_openai_client", lambda: FakeOpenAI(chunks=["Listo."]))
+    flush_metrics(io.StringIO())
+
+    chat_service.get_ai_response("hola", "u1", "", None, "/", conversation_id="c1")
+
+    timings = get_stage_timings()
+    for name in ("history_fetch", "image_format", "model_call", "messages_save"):
+        assert name in timings
+    out = io.StringIO()
+    flush_metrics(out)
+    assert {d["Stage"] for d in _emf_lines(out)} >= {"model_call", "messages_save"}
+    assert logging_utils._samples == []
+    print("✅ stage timings recorded:", timings)
+
+# This makes it executable directly:
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
@@ -0,0 +1,71 @@
+from types import SimpleNamespace
+
+import pytest
+
+from src.scripts import knowledge_admin
+from src.scripts.knowledge_admin import StoreIndex
+from tests.fakes import FakeVectorStoreAPI
+
+
+def _tree(root, folders):
+    for rel in folders:
+        (root / rel).mkdir(parents=True)
+        (root / rel / "data.json").write_text("{}")
+
+
+def test_index_walks_every_page_once(tmp_path):
+    api = FakeVectorStoreAPI(stores=[f"old-{i}" for i in range(250)] + ["icfes-matematicas"])
+    index = StoreIndex.load(api, path=tmp_path / "stores.json")
+
+    assert api.calls["vs.list"] == 3                       # 251 stores / 100 per page
+    assert index.get("old-0") and index.get("icfes-matematicas")
+    # The oldest store sits on the last page: found, not duplicated
+    assert index.ensure("old-0") == index.get("old-0")
+    assert api.calls["vs.create"] == 0 and api.calls["vs.list"] == 3
+
+
+def test_bootstrap_lists_once_and_reuses_the_cache(tmp_path, capsys):
+    root = tmp_path / "knowledge"
+    _tree(root, ["general", "icfes/matematicas", "icfes/ingles", "unal/matematicas"])
+    api = FakeVectorStoreAPI(stores=[f"other-{i}" for i in range(150)] + ["general"])
+    args = SimpleNamespace(root=str(root), index=str(tmp_path / "stores.json"), refresh_index=False)
+
+    index = knowledge_admin.cmd_bootstrap(args, client=api)
+    assert api.calls["vs.list"] == 2                       # one pass over 2 pages, not one per folder
+    assert api.calls["vs.create"] == 3                     # general reused
+    out = capsys.readouterr().out
+    assert f"VECTOR_STORE_GLOBAL={index.get('general')}" in out
+    assert f"VECTOR_STORE_DEFAULT={index.get('general')}" in out
+    assert f"VECTOR_STORE_UNAL_MATEMATICAS={index.get('unal-matematicas')}" in out
+
+    # Second run: the persisted index answers every lookup
+    knowledge_admin.cmd_bootstrap(args, client=api)
+    assert api.calls["vs.list"] == 2 and api.calls["vs.create"] == 3
+    print("✅ one listing pass per bootstrap")
+
+
+def test_cache_miss_relists_before_creating(tmp_path):
+    api = FakeVectorStoreAPI(stores=["general"])
+    StoreIndex.load(api, path=tmp_path / "stores.json")
+    api._create_store("icfes-ingles")                      # created by someone else after the cache
+
+    index = StoreIndex.load(api, path=tmp_path / "stores.json")
+    assert api.calls["vs.list"] == 1                       # served from the cache
+    sid = index.ensure("icfes-ingles")
+    assert api.calls["vs.list"] == 2 and api.calls["vs.create"] == 0
+    assert api.stores[sid]["name"] == "icfes-ingles"
+
+    expired = StoreIndex.load(api, path=tmp_path / "stores.json", ttl_s=0)
+    assert expired.fresh and api.calls["vs.list"] == 3
+
+
+def test_duplicate_names_resolve_to_the_newest(tmp_path):
+    api = FakeVectorStoreAPI(stores=["general", "general"])
+    index = StoreIndex.load(api)
+    newest = list(api.stores)[-1]
+    assert index.get("general") == newest
+    assert index.duplicates == {"general": [newest, list(api.stores)[0]]}
+
+# This makes it executable directly:
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
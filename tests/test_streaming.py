@@ -0,0 +1,45 @@
+import time
+
+from src.assistant.assistant_client import send_message_to_assistant, stream_message_to_assistant
+from src.utils.sse_utils import format_sse
+from tests.fakes import FakeOpenAI
+
+
+def test_stream_first_token_arrives_before_full_reply():
+    chunks = ["Paso 1: ", "$x^2$", " = 4", ", luego x = 2."]
+    client = FakeOpenAI(chunks=chunks, first_token_delay=0.02, chunk_delay=0.05)
+    parts = [{"type": "text", "text": "Resuelve x^2 = 4"}]
+
+    t0 = time.perf_counter()
+    ttft = None
+    received = []
+    for delta in stream_message_to_assistant(parts, page="/simulacro-icfes/matematicas", client=client):
+        if ttft is None:
+            ttft = time.perf_counter() - t0
+        received.append(delta)
+    total = time.perf_counter() - t0
+
+    assert "".join(received) == "".join(chunks)
+    assert client.calls[0]["stream"] is True
+    assert ttft < total / 2
+    print(f"✅ TTFT {ttft * 1000:.0f} ms vs full reply {total * 1000:.0f} ms")
+
+
+def test_blocking_path_returns_same_text():
+    client = FakeOpenAI(chunks=["Hola", "."])
+    reply = send_message_to_assistant([{"type": "text", "text": "hola"}], client=client)
+    assert reply == "Hola."
+    assert client.calls[0]["stream"] is False
+
+
+def test_format_sse_frame():
+    frame = format_sse({"type": "delta", "text": "á"})
+    assert frame.startswith("event: delta\ndata: ")
+    assert frame.endswith("\n\n")
+    assert "á" in frame
+
+# This makes it executable directly:
+if __name__ == "__main__":
+    test_stream_first_token_arrives_before_full_reply()
+    test_blocking_path_returns_same_text()
+    test_format_sse_frame()
@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+from src.storage import messages_table
+from tests.fakes import FakeDynamo, FakeTable
+
+
+def _use(monkeypatch, fake):
+    monkeypatch.setattr(messages_table, "dynamodb", fake)
+    monkeypatch.setattr(messages_table, "table", FakeTable())
+    monkeypatch.setenv("MESSAGES_BATCH_BASE_MS", "0")
+    monkeypatch.setenv("MESSAGES_SCHEMA_VERSION", "1")  # one item per message
+
+
+def test_turn_is_one_call_with_ordered_keys(monkeypatch):
+    fake = FakeDynamo()
+    _use(monkeypatch, fake)
+
+    items = messages_table.save_turn("c1", "hola", ["a.png", "b.png", "c.png"], "Respuesta")
+
+    assert fake.calls == [5]
+    keys = [it["Timestamp"] for it in items]
+    assert keys == sorted(keys) and len(set(keys)) == 5
+    assert [it["Role"] for it in items] == ["user", "user", "user", "user", "assistant"]
+    assert items[1]["MessageText"] == "[Imagen] a.png"
+
+
+def test_unprocessed_items_are_retried(monkeypatch):
+    fake = FakeDynamo(throttle=2)
+    _use(monkeypatch, fake)
+
+    messages_table.save_turn("c1", "hola", [], "Respuesta", turn_timestamp="2025-01-01T00:00:00.000000")
+
+    assert fake.calls == [2, 1, 1]
+    assert [it["Timestamp"] for it in fake.written] == ["2025-01-01T00:00:00.000000#00", "2025-01-01T00:00:00.000000#01"]
+
+
+def test_gives_up_after_max_attempts(monkeypatch):
+    _use(monkeypatch, FakeDynamo(throttle=10))
+    monkeypatch.setenv("MESSAGES_BATCH_MAX_ATTEMPTS", "3")
+    with pytest.raises(RuntimeError):
+        messages_table.save_turn("c1", "hola", [], "Respuesta")
+    print("✅ unprocessed items surface as an error")
+
+# This makes it executable directly:
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
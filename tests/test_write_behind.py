@@ -0,0 +1,59 @@
+import os
+
+import pytest
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+import src.lambda_turn_writer as turn_writer
+from src.services import turn_persistence
+from src.storage import messages_table
+from src.storage.queues import LocalQueue
+from tests.fakes import FakeDynamo, FakeTable
+
+
+class BrokenQueue:
+    def send(self, *a, **kw):
+        raise ConnectionError("sqs unavailable")
+
+
+def _setup(monkeypatch, queue):
+    db = FakeDynamo()
+    monkeypatch.setattr(messages_table, "dynamodb", db)
+    monkeypatch.setattr(messages_table, "table", FakeTable())
+    monkeypatch.setattr(turn_persistence, "get_turn_queue", lambda: queue)
+    monkeypatch.setenv("MESSAGES_WRITE_BEHIND", "1")
+    monkeypatch.setenv("MESSAGES_SCHEMA_VERSION", "2")
+    return db
+
+
+def test_queued_turn_is_written_by_consumer_idempotently(monkeypatch):
+    queue = LocalQueue()
+    db = _setup(monkeypatch, queue)
+
+    mode = turn_persistence.persist_turn("c1", "hola", ["a.png"], "Respuesta")
+    assert mode == "queued" and db.items == {}
+
+    records = queue.drain()
+    assert turn_writer.lambda_handler({"Records": records}, None) == {"batchItemFailures": []}
+    assert len(db.items) == 1  # one v2 turn item
+
+    # Redelivery (at-least-once) overwrites the same keys
+    turn_writer.lambda_handler({"Records": records}, None)
+    assert len(db.items) == 1 and len(db.written) == 2
+
+
+def test_enqueue_failure_falls_back_to_direct_write(monkeypatch):
+    db = _setup(monkeypatch, BrokenQueue())
+    assert turn_persistence.persist_turn("c1", "hola", [], "Respuesta") == "direct"
+    assert len(db.items) == 1
+
+
+def test_bad_record_is_reported_for_retry(monkeypatch):
+    _setup(monkeypatch, LocalQueue())
+    out = turn_writer.lambda_handler({"Records": [{"messageId": "m1", "body": "{}"}]}, None)
+    assert out == {"batchItemFailures": [{"itemIdentifier": "m1"}]}
+    print("✅ write-behind turns survive redelivery and queue outages")
+
+# This makes it executable directly:
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])